@@ -1,3 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from typing import Callable
+
+from one_dragon.base.conditional_operation.op_timer_wheel import OpTimerWheel
+from one_dragon.utils import thread_utils
+
+_od_op_task_executor = ThreadPoolExecutor(thread_name_prefix='_od_op_task_executor', max_workers=32)
+
+
 class AtomicOp:
 
     def __init__(self, op_name: str, async_op: bool = False):
@@ -15,6 +25,27 @@ class AtomicOp:
         """
         pass
 
+    def start(self, timer: OpTimerWheel, on_done: Callable[[], None]) -> None:
+        """
+        在指令任务中开始执行 执行完毕后调用 on_done
+        默认在线程池中执行 execute
+        需要等待的指令可以重写这个方法 将等待交给时间轮 不占用线程
+        :param timer: 时间轮
+        :param on_done: 执行完毕的回调 被停止时可以不调用
+        """
+        AtomicOp.run_in_thread(self.execute, on_done)
+
+    @staticmethod
+    def run_in_thread(func: Callable[[], None], on_done: Callable[[], None]) -> None:
+        """
+        在线程池中执行可能阻塞的操作 例如按键
+        :param func: 执行的方法
+        :param on_done: 执行完毕的回调 出错时也会调用
+        """
+        future: Future = _od_op_task_executor.submit(func)
+        future.add_done_callback(thread_utils.handle_future_result)
+        future.add_done_callback(lambda _: on_done())
+
     def dispose(self) -> None:
         """
         销毁时 解除事件监听
@@ -5,12 +5,13 @@ from threading import Lock
 from typing import Optional, Callable, List
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
+from one_dragon.base.conditional_operation.op_timer_wheel import op_timer_wheel
 from one_dragon.base.conditional_operation.operation_def import OperationDef
 from one_dragon.base.conditional_operation.operation_task import OperationTask
 from one_dragon.base.conditional_operation.operation_template import OperationTemplate
 from one_dragon.base.conditional_operation.scene_handler import SceneHandler
 from one_dragon.base.conditional_operation.state_handler_template import StateHandlerTemplate
-from one_dragon.base.conditional_operation.state_recorder import StateRecorder, StateRecord
+from one_dragon.base.conditional_operation.state_recorder import StateRecorder, StateRecord, StateRecorderTable
 from one_dragon.base.conditional_operation.utils import construct_scene_handler
 from one_dragon.base.config.yaml_config import YamlConfig
 from one_dragon.thread.atomic_int import AtomicInt
@@ -43,6 +44,8 @@ class ConditionalOperator(YamlConfig):
         self.running_task: Optional[OperationTask] = None  # 正在运行的任务
         self.running_task_cnt: AtomicInt = AtomicInt()
 
+        self.state_recorder_table: StateRecorderTable = StateRecorderTable()  # 子类创建状态记录器时使用
+
     def init(
             self,
             op_getter: Callable[[OperationDef], AtomicOp],
@@ -104,6 +107,7 @@ class ConditionalOperator(YamlConfig):
 
         self.is_running = True
         self.running_task_cnt.set(0)  # 每次重置计数器 防止有bug导致无法正常运行
+        op_timer_wheel.reset_stats()
 
         if self.normal_scene_handler is not None:
             future: Future = _od_conditional_op_executor.submit(self._normal_scene_loop)
@@ -215,6 +219,7 @@ class ConditionalOperator(YamlConfig):
         with self._task_lock:
             self.is_running = False
             self._stop_running_task()
+        op_timer_wheel.log_stats()
 
     def _stop_running_task(self) -> None:
         """
@@ -354,7 +359,10 @@ class ConditionalOperator(YamlConfig):
             recorder.clear_state_record()
         else:
             recorder.update_state_record(new_record)
-            if recorder.mutex_list is not None:
+            if recorder.table is self.state_recorder_table:
+                # 互斥状态已经在状态表中转化为下标
+                self.state_recorder_table.clear_mutex_states(recorder.idx)
+            elif recorder.mutex_list is not None:
                 for mutex_state in recorder.mutex_list:
                     mutex_recorder = self.get_state_recorder(mutex_state)
                     if mutex_recorder is None:
@@ -0,0 +1,267 @@
+import time
+
+import threading
+from typing import Callable, List, Optional
+
+from one_dragon.utils.log_utils import log
+
+
+class OpTimerEvent:
+
+    def __init__(self, deadline: float, tick: int, callback: Callable[[], None]):
+        """
+        时间轮中的一个定时事件
+        :param deadline: 预定的执行时间 perf_counter
+        :param tick: 所在的刻度
+        :param callback: 到时后执行的方法
+        """
+        self.deadline: float = deadline
+        self.tick: int = tick
+        self.callback: Callable[[], None] = callback
+        self.cancelled: bool = False
+
+    def cancel(self) -> None:
+        """
+        取消事件 只做标记 时间轮遇到时直接丢弃
+        """
+        self.cancelled = True
+
+
+class OpTimerJitterStats:
+
+    def __init__(self):
+        """
+        定时事件的实际执行时间与预定时间的偏差统计
+        """
+        self.fire_cnt: int = 0  # 执行的事件数量
+        self.cancel_cnt: int = 0  # 取消的事件数量
+        self.late_cnt: int = 0  # 延迟超过阈值的事件数量
+        self.total_late_seconds: float = 0  # 累计延迟
+        self.max_late_seconds: float = 0  # 最大延迟
+
+    @property
+    def avg_late_seconds(self) -> float:
+        return self.total_late_seconds / self.fire_cnt if self.fire_cnt > 0 else 0
+
+
+class OpTimerWheel:
+
+    def __init__(self, name: str = 'od_op_timer_wheel',
+                 tick_seconds: float = 0.001,
+                 slot_cnt: int = 512,
+                 spin_seconds: float = 0.002,
+                 late_threshold: float = 0.005):
+        """
+        单线程的时间轮 用于指令中的按键、等待等定时操作
+        - 定时事件放入 (预定刻度 % 槽数) 的槽中 添加和取消都是O(1)
+        - 线程只在有事件到期前醒来 最后一小段时间使用自旋等待 减少系统睡眠精度带来的误差
+        - 事件的回调在时间轮线程中执行 不能有阻塞操作
+        :param name: 线程名称
+        :param tick_seconds: 每个刻度的秒数
+        :param slot_cnt: 槽的数量
+        :param spin_seconds: 到期前多少秒开始自旋等待
+        :param late_threshold: 延迟超过多少秒时计入统计
+        """
+        self.name: str = name
+        self.tick_seconds: float = tick_seconds
+        self.slot_cnt: int = slot_cnt
+        self.spin_seconds: float = spin_seconds
+        self.late_threshold: float = late_threshold
+
+        self.stats: OpTimerJitterStats = OpTimerJitterStats()
+
+        self._condition = threading.Condition()
+        self._slots: List[List[OpTimerEvent]] = [[] for _ in range(slot_cnt)]
+        self._event_cnt: int = 0  # 槽中的事件数量 包括已取消但还没丢弃的
+        self._current_tick: int = self._get_tick(time.perf_counter())  # 下一个需要处理的刻度
+        self._thread: Optional[threading.Thread] = None
+
+    def _get_tick(self, t: float) -> int:
+        return int(t / self.tick_seconds)
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> OpTimerEvent:
+        """
+        添加一个定时事件
+        :param delay: 多少秒后执行
+        :param callback: 执行的方法
+        :return: 事件 可用于取消
+        """
+        deadline = time.perf_counter() + max(delay, 0)
+        with self._condition:
+            if self._event_cnt == 0:
+                # 空闲时刻度没有推进 先跳到当前刻度
+                self._current_tick = self._get_tick(time.perf_counter())
+            # 不能放到已经处理过的刻度里
+            tick = max(self._get_tick(deadline), self._current_tick)
+            event = OpTimerEvent(deadline, tick, callback)
+            self._slots[tick % self.slot_cnt].append(event)
+            self._event_cnt += 1
+            self._ensure_thread()
+            self._condition.notify()
+        return event
+
+    def call_soon(self, callback: Callable[[], None]) -> OpTimerEvent:
+        """
+        尽快在时间轮线程中执行
+        :param callback: 执行的方法
+        :return: 事件
+        """
+        return self.schedule(0, callback)
+
+    def _ensure_thread(self) -> None:
+        """
+        按需启动时间轮线程 需要在持有锁时调用
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """
+        时间轮线程
+        """
+        while True:
+            due_list = self._wait_due_events()
+            for event in due_list:
+                self._fire(event)
+
+    def _wait_due_events(self) -> List[OpTimerEvent]:
+        """
+        等待到有事件到期
+        :return: 到期的事件 按预定时间排序
+        """
+        with self._condition:
+            while True:
+                if self._event_cnt == 0:
+                    self._condition.wait()
+                    continue
+
+                now = time.perf_counter()
+                due_list = self._pop_due_events(now)
+                if len(due_list) > 0:
+                    break
+
+                next_deadline = self._find_next_deadline()
+                if next_deadline is None:
+                    # 剩下的都是已取消的事件
+                    self._clear_cancelled_events()
+                    continue
+                to_wait = next_deadline - time.perf_counter() - self.spin_seconds
+                if to_wait > 0:
+                    self._condition.wait(to_wait)
+                else:
+                    # 最后一小段时间 放开锁自旋等待
+                    self._condition.release()
+                    try:
+                        time.sleep(0)
+                    finally:
+                        self._condition.acquire()
+
+        # 同一批到期的事件 按预定时间先后执行
+        due_list.sort(key=lambda e: e.deadline)
+        return due_list
+
+    def _pop_due_events(self, now: float) -> List[OpTimerEvent]:
+        """
+        取出已经到期的事件 需要在持有锁时调用
+        :param now: 当前时间
+        :return:
+        """
+        due_list: List[OpTimerEvent] = []
+        now_tick = self._get_tick(now)
+        while self._current_tick <= now_tick and self._event_cnt > 0:
+            slot = self._slots[self._current_tick % self.slot_cnt]
+            if len(slot) > 0:
+                remain_list: List[OpTimerEvent] = []
+                for event in slot:
+                    if event.cancelled:
+                        self.stats.cancel_cnt += 1
+                        self._event_cnt -= 1
+                    elif event.tick > self._current_tick:  # 超过一圈的事件
+                        remain_list.append(event)
+                    elif event.tick < now_tick or event.deadline <= now:
+                        due_list.append(event)
+                        self._event_cnt -= 1
+                    else:
+                        remain_list.append(event)
+                slot[:] = remain_list
+                if len(remain_list) > 0 and self._current_tick == now_tick:
+                    break  # 当前刻度还有没到期的 下次再处理这个刻度
+            self._current_tick += 1
+
+        if self._event_cnt == 0:
+            # 没有事件时 直接跳到当前刻度
+            self._current_tick = max(self._current_tick, now_tick)
+        return due_list
+
+    def _find_next_deadline(self) -> Optional[float]:
+        """
+        找出最早的预定时间 需要在持有锁时调用
+        :return:
+        """
+        next_deadline: Optional[float] = None
+        for i in range(self.slot_cnt):
+            tick = self._current_tick + i
+            for event in self._slots[tick % self.slot_cnt]:
+                if event.cancelled:
+                    continue
+                if next_deadline is None or event.deadline < next_deadline:
+                    next_deadline = event.deadline
+            if next_deadline is not None and next_deadline < (tick + 1) * self.tick_seconds:
+                break  # 后面的槽不会更早了
+        return next_deadline
+
+    def _clear_cancelled_events(self) -> None:
+        """
+        清除所有已取消的事件 需要在持有锁时调用
+        """
+        for slot in self._slots:
+            if len(slot) == 0:
+                continue
+            remain_list = [event for event in slot if not event.cancelled]
+            self.stats.cancel_cnt += len(slot) - len(remain_list)
+            self._event_cnt -= len(slot) - len(remain_list)
+            slot[:] = remain_list
+
+    def _fire(self, event: OpTimerEvent) -> None:
+        """
+        执行一个到期的事件 并记录延迟
+        :param event: 事件
+        """
+        if event.cancelled:
+            self.stats.cancel_cnt += 1
+            return
+
+        late_seconds = time.perf_counter() - event.deadline
+        stats = self.stats
+        stats.fire_cnt += 1
+        stats.total_late_seconds += late_seconds
+        stats.max_late_seconds = max(stats.max_late_seconds, late_seconds)
+        if late_seconds > self.late_threshold:
+            stats.late_cnt += 1
+
+        try:
+            event.callback()
+        except Exception:
+            log.error('定时事件执行出错', exc_info=True)
+
+    def reset_stats(self) -> None:
+        """
+        重置延迟统计
+        """
+        self.stats = OpTimerJitterStats()
+
+    def log_stats(self) -> None:
+        """
+        输出延迟统计
+        """
+        s = self.stats
+        if s.fire_cnt == 0:
+            return
+        log.info('指令定时 执行 %d 取消 %d 平均延迟 %.2fms 最大延迟 %.2fms 延迟超过%.0fms %d次',
+                 s.fire_cnt, s.cancel_cnt, s.avg_late_seconds * 1000, s.max_late_seconds * 1000,
+                 self.late_threshold * 1000, s.late_cnt)
+
+
+op_timer_wheel = OpTimerWheel()
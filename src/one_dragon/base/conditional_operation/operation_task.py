@@ -1,21 +1,21 @@
-from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import Future
 
 from threading import Lock
 from typing import Optional, List, Set
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
-from one_dragon.utils import thread_utils
+from one_dragon.base.conditional_operation.op_timer_wheel import OpTimerWheel, op_timer_wheel
 from one_dragon.utils.log_utils import log
 
-_od_op_task_executor = ThreadPoolExecutor(thread_name_prefix='_od_op_task_executor', max_workers=32)
-
 
 class OperationTask:
 
-    def __init__(self, op_list: List[AtomicOp]):
+    def __init__(self, op_list: List[AtomicOp], timer: Optional[OpTimerWheel] = None):
         """
         包含一串指令的任务
+        指令按顺序在时间轮中调度 等待和按键间隔不占用线程 停止时只需要取消当前的定时事件
         :param op_list:
+        :param timer: 使用的时间轮 为空时使用全局的时间轮
         """
         self.trigger: Optional[str] = None  # 触发器
         self.interrupt_states: Set[str] = set()  # 可被打断的状态
@@ -24,6 +24,9 @@ class OperationTask:
 
         self.op_list: List[AtomicOp] = op_list
         self.running: bool = False
+        self._timer: OpTimerWheel = op_timer_wheel if timer is None else timer
+        self._future: Optional[Future] = None  # 结果为是否完成所有指令
+        self._current_idx: int = -1  # 当前执行的指令下标
         self._current_op: Optional[AtomicOp] = None  # 当前执行的指令
         self._async_ops: List[AtomicOp] = []  # 执行过异步操作
         self._op_lock: Lock = Lock()  # 操作锁 用于保证stop里的一定是最后执行的op
@@ -33,44 +36,63 @@ class OperationTask:
     def run_async(self) -> Future:
         """
         异步执行
-        :return:
+        :return: 结果为是否完成所有指令了
         """
         self.running = True
-        future: Future = _od_op_task_executor.submit(self._run)
-        future.add_done_callback(thread_utils.handle_future_result)
-        return future
-
-    def _run(self) -> bool:
-        """
-        执行
-        :return: 是否完成所有指令了
-        """
-        for idx in range(len(self.op_list)):
-            with self._op_lock:
-                if not self.running:
-                    # 被stop中断了 不继续后续的操作
-                    break
-                self._current_op = self.op_list[idx]
-                if self._current_op.async_op:
-                    self._async_ops.append(self._current_op)
-                future: Future = _od_op_task_executor.submit(self._current_op.execute)
-                future.add_done_callback(thread_utils.handle_future_result)
-
-            try:
-                future.result()
-            except Exception:
-                log.error('指令执行出错', exc_info=True)
-
-            with self._op_lock:
-                if not self.running:
-                    # 被stop中断了 那么应该认为这个op没有执行完 不进行后续判断
-                    break
+        self._future = Future()
+        self._timer.call_soon(lambda: self._run_op(0))
+        return self._future
+
+    def _run_op(self, idx: int) -> None:
+        """
+        开始执行一个指令 在时间轮线程中调用
+        :param idx: 指令下标
+        """
+        with self._op_lock:
+            if not self.running:
+                # 被stop中断了 不继续后续的操作
+                return
+
+            finish = idx >= len(self.op_list)
+            if finish:
                 self._current_op = None
-                if self.running and idx == len(self.op_list) - 1:
-                    self.running = False
-                    return True
+                self.running = False
+            else:
+                self._start_op(idx)
 
-        return False
+        if finish:
+            # 结果的回调中可能需要获取其它锁 不能在操作锁内设置
+            self._future.set_result(True)
+
+    def _start_op(self, idx: int) -> None:
+        """
+        开始一个指令 调用时需要持有操作锁
+        :param idx: 指令下标
+        """
+        self._current_idx = idx
+        self._current_op = self.op_list[idx]
+        if self._current_op.async_op:
+            self._async_ops.append(self._current_op)
+
+        # 在锁内开始 保证stop时停止的是已经开始的op
+        # 完成回调可能在当前线程直接触发 因此放回时间轮再处理 避免重复加锁
+        try:
+            self._current_op.start(self._timer, lambda: self._timer.call_soon(lambda: self._on_op_done(idx)))
+        except Exception:
+            log.error('指令执行出错', exc_info=True)
+            self._timer.call_soon(lambda: self._on_op_done(idx))
+
+    def _on_op_done(self, idx: int) -> None:
+        """
+        一个指令执行完毕 开始下一个指令
+        :param idx: 完成的指令下标
+        """
+        with self._op_lock:
+            if not self.running or idx != self._current_idx:
+                # 被stop中断了 那么应该认为这个op没有执行完 不进行后续判断
+                return
+            self._current_op = None
+        self._run_op(idx + 1)
 
     def stop(self) -> bool:
         """
@@ -79,7 +101,7 @@ class OperationTask:
         """
         with self._op_lock:
             if not self.running:
-                # _run里面已经把op执行完了 就不需要额外的停止操作了
+                # _run_op里面已经把op执行完了 就不需要额外的停止操作了
                 self._current_op = None
                 self._async_ops.clear()
                 return True
@@ -91,7 +113,12 @@ class OperationTask:
             for op in self._async_ops:
                 op.stop()
             self._async_ops.clear()
-            return False
+
+        # 调用方可能持有锁并在回调中等待同一个锁 因此放到时间轮线程中设置结果
+        future = self._future
+        if future is not None:
+            self._timer.call_soon(lambda: future.set_result(False))
+        return False
 
     def add_expr(self, expr: str) -> None:
         """
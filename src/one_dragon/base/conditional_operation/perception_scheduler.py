@@ -0,0 +1,266 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import threading
+from cv2.typing import MatLike
+from typing import Callable, Optional, List, Union, Tuple
+
+from one_dragon.utils import thread_utils, cal_utils
+from one_dragon.utils.log_utils import log
+
+
+class PerceptionStageMetrics:
+
+    def __init__(self):
+        """
+        一个识别阶段的统计数据
+        """
+        self.submit_cnt: int = 0  # 收到的截图数量
+        self.run_cnt: int = 0  # 实际识别的次数
+        self.skip_cnt: int = 0  # 未达到识别间隔而跳过的次数
+        self.drop_cnt: int = 0  # 丢弃的截图数量 包括还没开始识别就被新截图替换 以及已经过时的
+        self.over_budget_cnt: int = 0  # 识别耗时超过预算的次数
+        self.error_cnt: int = 0  # 识别出错的次数
+        self.total_run_seconds: float = 0  # 识别累计耗时
+        self.max_run_seconds: float = 0  # 识别最大耗时
+        self.total_latency_seconds: float = 0  # 从截图到识别完成的累计耗时
+        self.max_latency_seconds: float = 0  # 从截图到识别完成的最大耗时
+
+    @property
+    def avg_run_seconds(self) -> float:
+        return self.total_run_seconds / self.run_cnt if self.run_cnt > 0 else 0
+
+    @property
+    def avg_latency_seconds(self) -> float:
+        return self.total_latency_seconds / self.run_cnt if self.run_cnt > 0 else 0
+
+
+class PerceptionStage:
+
+    def __init__(self, name: str,
+                 check_func: Callable[[MatLike, float], None],
+                 period: Union[float, List[float], Callable[[], Union[float, List[float]]]] = 0,
+                 budget: float = 0.05,
+                 max_frame_age: Optional[float] = None):
+        """
+        一个识别阶段 例如闪避识别、角色识别
+        每个阶段有自己的识别线程 同一时间只会识别一张截图 识别期间收到的新截图只保留最新的一张
+        :param name: 阶段名称
+        :param check_func: 识别方法 入参为 (截图, 截图时间)
+        :param period: 识别间隔 可以是范围 也可以是获取间隔的方法(用于识别间隔会变化的情况)
+        :param budget: 单次识别的预计耗时 超过时计入统计
+        :param max_frame_age: 截图最多允许过时多少秒 超过时直接丢弃 为空时不限制
+        """
+        self.name: str = name
+        self.check_func: Callable[[MatLike, float], None] = check_func
+        self.period: Union[float, List[float], Callable[[], Union[float, List[float]]]] = period
+        self.budget: float = budget
+        self.max_frame_age: Optional[float] = max_frame_age
+        self.check_frame_age: bool = True  # 是否判断截图过时 回放录制的截图时 截图时间不是当前时间 需要关闭
+
+        self.metrics: PerceptionStageMetrics = PerceptionStageMetrics()
+        self.last_run_frame_time: float = 0  # 上一次识别的截图时间
+
+        self._condition = threading.Condition()
+        self._pending_frame: Optional[Tuple[MatLike, float]] = None  # 等待识别的截图
+        self._run_lock = threading.Lock()  # 保证同一时间只有一个识别
+
+    def get_period(self) -> float:
+        """
+        :return: 本次使用的识别间隔
+        """
+        period = self.period() if callable(self.period) else self.period
+        return cal_utils.random_in_range(period)
+
+    def offer(self, screen: MatLike, screenshot_time: float) -> None:
+        """
+        放入一张新截图 之前还没识别的截图会被丢弃
+        :param screen: 截图
+        :param screenshot_time: 截图时间
+        """
+        with self._condition:
+            self.metrics.submit_cnt += 1
+            if self._pending_frame is not None:
+                self.metrics.drop_cnt += 1
+            self._pending_frame = (screen, screenshot_time)
+            self._condition.notify()
+
+    def take(self, running: Callable[[], bool]) -> Optional[Tuple[MatLike, float]]:
+        """
+        等待并取出一张截图
+        :param running: 是否还在运行
+        :return: 截图, 截图时间 停止运行时返回None
+        """
+        with self._condition:
+            while self._pending_frame is None and running():
+                self._condition.wait(0.5)
+            frame = self._pending_frame
+            self._pending_frame = None
+            return frame
+
+    def wake_up(self) -> None:
+        """
+        唤醒等待中的识别线程 用于停止
+        """
+        with self._condition:
+            self._pending_frame = None
+            self._condition.notify_all()
+
+    def run(self, screen: MatLike, screenshot_time: float) -> None:
+        """
+        识别一张截图 会判断识别间隔和截图是否过时
+        :param screen: 截图
+        :param screenshot_time: 截图时间
+        """
+        with self._run_lock:
+            now = time.time()
+            if (self.check_frame_age and self.max_frame_age is not None
+                    and now - screenshot_time > self.max_frame_age):
+                self.metrics.drop_cnt += 1
+                return
+            if screenshot_time - self.last_run_frame_time < self.get_period():
+                self.metrics.skip_cnt += 1
+                return
+            self.last_run_frame_time = screenshot_time
+
+            try:
+                self.check_func(screen, screenshot_time)
+            except Exception:
+                self.metrics.error_cnt += 1
+                log.error('识别阶段 %s 出错', self.name, exc_info=True)
+
+            end_time = time.time()
+            run_seconds = end_time - now
+            latency_seconds = end_time - screenshot_time
+            metrics = self.metrics
+            metrics.run_cnt += 1
+            metrics.total_run_seconds += run_seconds
+            metrics.max_run_seconds = max(metrics.max_run_seconds, run_seconds)
+            metrics.total_latency_seconds += latency_seconds
+            metrics.max_latency_seconds = max(metrics.max_latency_seconds, latency_seconds)
+            if run_seconds > self.budget:
+                metrics.over_budget_cnt += 1
+
+    def reset(self) -> None:
+        """
+        重置识别时间和统计
+        """
+        self.metrics = PerceptionStageMetrics()
+        self.last_run_frame_time = 0
+
+
+class PerceptionScheduler:
+
+    def __init__(self, name: str):
+        """
+        识别调度器 管理多个识别阶段
+        每个阶段使用固定的识别线程 每帧只需要把截图交给各阶段 不需要每帧提交新的任务
+        识别较慢的阶段只会丢弃中间的截图 不会阻塞其他阶段
+        :param name: 名称 用于日志
+        """
+        self.name: str = name
+        self.stage_map: dict[str, PerceptionStage] = {}
+
+        self.running: bool = False
+        self._run_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None  # 每次启动新建 每个阶段一个线程
+        self._generation: int = 0  # 每次启动加1 旧的识别线程发现不一致时退出
+
+    def register_stage(self, stage: PerceptionStage) -> None:
+        """
+        注册一个识别阶段 需要在启动前注册
+        :param stage: 识别阶段
+        """
+        self.stage_map[stage.name] = stage
+
+    def set_check_frame_age(self, enabled: bool) -> None:
+        """
+        设置各阶段是否判断截图过时
+        回放录制的截图时 截图时间是录制时的时间 需要关闭 否则所有截图都会被当作过时丢弃
+        :param enabled: 是否判断
+        """
+        for stage in self.stage_map.values():
+            stage.check_frame_age = enabled
+
+    def start(self) -> None:
+        """
+        启动各阶段的识别线程 已经启动时不会重复启动
+        """
+        with self._run_lock:
+            if self.running:
+                return
+            self.running = True
+            self._generation += 1
+            # 上一次启动的识别线程可能还没退出 新建线程池 避免新的识别循环排队等待
+            self._executor = ThreadPoolExecutor(thread_name_prefix='od_perception',
+                                                max_workers=max(1, len(self.stage_map)))
+            for stage in self.stage_map.values():
+                stage.reset()
+                future = self._executor.submit(self._stage_loop, stage, self._generation)
+                future.add_done_callback(thread_utils.handle_future_result)
+
+    def stop(self) -> None:
+        """
+        停止各阶段的识别线程 并输出统计
+        """
+        with self._run_lock:
+            if not self.running:
+                return
+            self.running = False
+            for stage in self.stage_map.values():
+                stage.wake_up()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)  # 识别循环被唤醒后自行退出 不需要等待
+                self._executor = None
+        self.log_metrics()
+
+    def _stage_loop(self, stage: PerceptionStage, generation: int) -> None:
+        """
+        单个阶段的识别循环
+        :param stage: 识别阶段
+        :param generation: 启动的批次
+        """
+        def is_running() -> bool:
+            return self.running and self._generation == generation
+
+        while is_running():
+            frame = stage.take(is_running)
+            if frame is None:
+                continue
+            stage.run(frame[0], frame[1])
+
+    def submit_frame(self, screen: MatLike, screenshot_time: float,
+                     stage_names: List[str], sync: bool = False) -> None:
+        """
+        将截图交给各阶段识别 未启动时丢弃截图
+        :param screen: 截图
+        :param screenshot_time: 截图时间
+        :param stage_names: 本次需要识别的阶段
+        :param sync: 是否在当前线程直接识别完
+        """
+        if sync:
+            for name in stage_names:
+                self.stage_map[name].run(screen, screenshot_time)
+            return
+
+        if not self.running:
+            return
+        for name in stage_names:
+            self.stage_map[name].offer(screen, screenshot_time)
+
+    def get_metrics(self) -> dict[str, PerceptionStageMetrics]:
+        """
+        :return: 各阶段的统计数据
+        """
+        return {name: stage.metrics for name, stage in self.stage_map.items()}
+
+    def log_metrics(self) -> None:
+        """
+        输出各阶段的统计数据
+        """
+        for name, m in self.get_metrics().items():
+            if m.submit_cnt == 0 and m.run_cnt == 0:
+                continue
+            log.info('%s 识别阶段 %s 收到 %d 识别 %d 跳过 %d 丢弃 %d 超时 %d 平均耗时 %.3f 最大耗时 %.3f 平均延迟 %.3f',
+                     self.name, name, m.submit_cnt, m.run_cnt, m.skip_cnt, m.drop_cnt, m.over_budget_cnt,
+                     m.avg_run_seconds, m.max_run_seconds, m.avg_latency_seconds)
@@ -1,7 +1,8 @@
+import numpy as np
 from enum import Enum
-from typing import Optional, Callable
+from typing import Optional, Callable, List, Tuple
 
-from one_dragon.base.conditional_operation.state_recorder import StateRecorder
+from one_dragon.base.conditional_operation.state_recorder import StateRecorder, StateRecord, StateRecorderTable
 from one_dragon.utils.log_utils import log
 
 
@@ -125,6 +126,213 @@ class StateCalNode:
             self.state_recorder.dispose()
 
 
+class StateCalProgram:
+
+    # 指令类型
+    OP_TRUE: int = 0  # 结果置为True
+    OP_STATE: int = 1  # 结果置为某个状态节点的判断结果
+    OP_NOT: int = 2  # 结果取反
+    OP_JUMP_IF_FALSE: int = 3  # 结果为False时跳转 用于AND短路
+    OP_JUMP_IF_TRUE: int = 4  # 结果为True时跳转 用于OR短路
+
+    VECTOR_STATE_CNT: int = 8  # 状态节点数量达到这个值时 使用数组一次性判断所有状态节点
+
+    def __init__(self, root: StateCalNode):
+        """
+        将状态计算树编译成扁平的指令列表 判断时不需要递归
+        只使用一个结果寄存器 AND/OR 通过跳转实现短路
+
+        每个状态节点缓存了生效的时间窗口 [记录时间+最小值, 记录时间+最大值]
+        状态记录器没有变化时 (update_cnt 不变) 只需要比较当前时间是否在窗口内
+
+        状态节点较多并且都属于同一个状态表时 时间窗口的刷新和判断都使用数组一次完成
+        :param root: 状态计算树的根节点
+        """
+        self.root: StateCalNode = root
+        self.op_list: List[Tuple[int, int]] = []  # (指令类型, 参数) 参数为状态节点下标或跳转位置
+        self.state_node_list: List[StateCalNode] = []
+
+        self._compile(root)
+
+        state_cnt = len(self.state_node_list)
+        self._state_table_list: List[StateRecorderTable] = [i.state_recorder.table for i in self.state_node_list]
+        self._state_idx_list: List[int] = [i.state_recorder.idx for i in self.state_node_list]
+        self._state_update_cnt: List[int] = [-1] * state_cnt  # 计算时间窗口时 状态记录器的变更次数
+        self._state_valid_start: List[float] = [0] * state_cnt  # 生效时间窗口的开始
+        self._state_valid_end: List[float] = [0] * state_cnt  # 生效时间窗口的结束
+
+        # 数组判断
+        self._table: Optional[StateRecorderTable] = None
+        if state_cnt >= StateCalProgram.VECTOR_STATE_CNT and all(i is self._state_table_list[0] for i in self._state_table_list):
+            self._table = self._state_table_list[0]
+            self._state_idx_arr: np.ndarray = np.array(self._state_idx_list, dtype=np.int64)
+            self._time_min_arr: np.ndarray = np.array([i.state_time_range_min for i in self.state_node_list], dtype=np.float64)
+            self._time_max_arr: np.ndarray = np.array([i.state_time_range_max for i in self.state_node_list], dtype=np.float64)
+            has_value_range = [i.state_value_range_min is not None and i.state_value_range_max is not None
+                               for i in self.state_node_list]
+            self._has_value_range_arr: np.ndarray = np.array(has_value_range, dtype=bool)
+            self._value_min_arr: np.ndarray = np.array([i.state_value_range_min if has_value_range[idx] else 0
+                                                        for idx, i in enumerate(self.state_node_list)], dtype=np.int64)
+            self._value_max_arr: np.ndarray = np.array([i.state_value_range_max if has_value_range[idx] else 0
+                                                        for idx, i in enumerate(self.state_node_list)], dtype=np.int64)
+            self._update_cnt_arr: np.ndarray = np.full(state_cnt, -1, dtype=np.int64)
+            self._valid_start_arr: np.ndarray = np.zeros(state_cnt, dtype=np.float64)
+            self._valid_end_arr: np.ndarray = np.zeros(state_cnt, dtype=np.float64)
+
+    def _compile(self, node: StateCalNode) -> None:
+        """
+        编译一个节点 结果会放在寄存器中
+        :param node: 节点
+        """
+        if node.node_type == StateCalNodeType.TRUE:
+            self.op_list.append((StateCalProgram.OP_TRUE, 0))
+        elif node.node_type == StateCalNodeType.STATE:
+            self.op_list.append((StateCalProgram.OP_STATE, len(self.state_node_list)))
+            self.state_node_list.append(node)
+        elif node.op_type == StateCalOpType.NOT:
+            self._compile(node.left_child)
+            self.op_list.append((StateCalProgram.OP_NOT, 0))
+        else:
+            self._compile(node.left_child)
+            jump_idx = len(self.op_list)
+            jump_op = StateCalProgram.OP_JUMP_IF_FALSE if node.op_type == StateCalOpType.AND else StateCalProgram.OP_JUMP_IF_TRUE
+            self.op_list.append((jump_op, -1))  # 跳转位置在右子节点编译后回填
+            self._compile(node.right_child)
+            self.op_list[jump_idx] = (jump_op, len(self.op_list))
+
+    def _refresh_state(self, idx: int) -> None:
+        """
+        状态记录器有变化时 重新计算生效的时间窗口
+        值不符合要求时 窗口为空
+        :param idx: 状态节点下标
+        """
+        node = self.state_node_list[idx]
+        table = self._state_table_list[idx]
+        table_idx = self._state_idx_list[idx]
+        update_cnt = int(table.update_cnt[table_idx])  # 先读取变更次数 计算期间有变化的话 下次会再计算
+        last_record_time = float(table.last_record_time[table_idx])
+        last_value = table.get_last_value(table_idx)
+
+        value_valid = True
+        if node.state_value_range_min is not None and node.state_value_range_max is not None:
+            if last_value is None:
+                value_valid = False
+            else:
+                value_valid = node.state_value_range_min <= last_value <= node.state_value_range_max
+
+        if value_valid:
+            self._state_valid_start[idx] = last_record_time + node.state_time_range_min
+            self._state_valid_end[idx] = last_record_time + node.state_time_range_max
+        else:
+            self._state_valid_start[idx] = float('inf')
+            self._state_valid_end[idx] = float('-inf')
+        self._state_update_cnt[idx] = update_cnt
+
+    def _refresh_state_vector(self) -> None:
+        """
+        数组判断时 重新计算有变化的状态节点的时间窗口
+        """
+        table = self._table
+        update_cnt = table.update_cnt[self._state_idx_arr]  # 先读取变更次数 计算期间有变化的话 下次会再计算
+        changed = update_cnt != self._update_cnt_arr
+        if not changed.any():
+            return
+
+        table_idx = self._state_idx_arr[changed]
+        last_record_time = table.last_record_time[table_idx]
+        last_value = table.last_value[table_idx]
+        value_valid = (
+                ~self._has_value_range_arr[changed]
+                | (table.has_value[table_idx]
+                   & (self._value_min_arr[changed] <= last_value)
+                   & (last_value <= self._value_max_arr[changed]))
+        )
+
+        self._valid_start_arr[changed] = np.where(value_valid, last_record_time + self._time_min_arr[changed], np.inf)
+        self._valid_end_arr[changed] = np.where(value_valid, last_record_time + self._time_max_arr[changed], -np.inf)
+        self._update_cnt_arr[changed] = update_cnt[changed]
+
+    def in_time_range(self, now: float) -> bool:
+        """
+        根据当前时间 判断是否在状态的生效时间范围内
+        结果与 StateCalNode.in_time_range 一致
+        :param now: 当前时间
+        :return:
+        """
+        if self._table is not None:
+            self._refresh_state_vector()
+            state_result = ((self._valid_start_arr <= now) & (now <= self._valid_end_arr)).tolist()
+            return self._execute(state_result)
+
+        op_list = self.op_list
+        op_cnt = len(op_list)
+        state_table_list = self._state_table_list
+        state_idx_list = self._state_idx_list
+        state_update_cnt = self._state_update_cnt
+        valid_start = self._state_valid_start
+        valid_end = self._state_valid_end
+
+        result: bool = True
+        pc = 0
+        while pc < op_cnt:
+            op, arg = op_list[pc]
+            pc += 1
+            if op == StateCalProgram.OP_STATE:
+                if state_update_cnt[arg] != state_table_list[arg].update_cnt[state_idx_list[arg]]:
+                    self._refresh_state(arg)
+                result = valid_start[arg] <= now <= valid_end[arg]
+            elif op == StateCalProgram.OP_JUMP_IF_FALSE:
+                if not result:
+                    pc = arg
+            elif op == StateCalProgram.OP_JUMP_IF_TRUE:
+                if result:
+                    pc = arg
+            elif op == StateCalProgram.OP_NOT:
+                result = not result
+            else:
+                result = True
+
+        return result
+
+    def _execute(self, state_result: List[bool]) -> bool:
+        """
+        使用已经计算好的状态节点结果 执行指令
+        :param state_result: 各状态节点的判断结果
+        :return:
+        """
+        op_list = self.op_list
+        op_cnt = len(op_list)
+
+        result: bool = True
+        pc = 0
+        while pc < op_cnt:
+            op, arg = op_list[pc]
+            pc += 1
+            if op == StateCalProgram.OP_STATE:
+                result = state_result[arg]
+            elif op == StateCalProgram.OP_JUMP_IF_FALSE:
+                if not result:
+                    pc = arg
+            elif op == StateCalProgram.OP_JUMP_IF_TRUE:
+                if result:
+                    pc = arg
+            elif op == StateCalProgram.OP_NOT:
+                result = not result
+            else:
+                result = True
+
+        return result
+
+
+def compile_state_cal_tree(root: StateCalNode) -> StateCalProgram:
+    """
+    将状态判断树编译成指令列表
+    :param root: 状态判断树的根节点
+    :return:
+    """
+    return StateCalProgram(root)
+
+
 def construct_state_cal_tree(expr_str: str, state_getter: Callable[[str], StateRecorder]) -> StateCalNode:
     """
     根据表达式 构造出状态判断树
@@ -276,15 +484,19 @@ def __debug():
     expr = "( [闪避识别-黄光, 0, 1] | [闪避识别-红光, 0, 1] ) & ![按键-闪避, 0, 1]{0, 1}"
     ctx = None
     sr1 = StateRecorder('闪避识别-黄光')
-    sr1.last_record_time = 1
+    sr1.update_state_record(StateRecord('闪避识别-黄光', trigger_time=1))
     sr2 = StateRecorder('闪避识别-红光')
-    sr2.last_record_time = 2
+    sr2.update_state_record(StateRecord('闪避识别-红光', trigger_time=2))
     sr3 = StateRecorder('按键-闪避')
-    sr3.last_record_time = 1
-    node = construct_state_cal_tree(expr, [sr1, sr2, sr3])
+    sr3.update_state_record(StateRecord('按键-闪避', trigger_time=1, value=2))
+    recorder_map = {i.state_name: i for i in [sr1, sr2, sr3]}
+    node = construct_state_cal_tree(expr, recorder_map.get)
+    program = compile_state_cal_tree(node)
     assert node.in_time_range(2)  # True
-    sr3.last_value = 1
+    assert program.in_time_range(2)
+    sr3.update_state_record(StateRecord('按键-闪避', trigger_time=1, value=1))
     assert not node.in_time_range(2)  # False
+    assert not program.in_time_range(2)
 
 
 if __name__ == '__main__':
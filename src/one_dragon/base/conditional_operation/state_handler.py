@@ -2,7 +2,7 @@ from typing import List, Optional, Set
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
 from one_dragon.base.conditional_operation.operation_task import OperationTask
-from one_dragon.base.conditional_operation.state_cal_tree import StateCalNode
+from one_dragon.base.conditional_operation.state_cal_tree import StateCalNode, StateCalProgram, compile_state_cal_tree
 from one_dragon.utils.log_utils import log
 
 
@@ -23,6 +23,7 @@ class StateHandler:
         """
         self.expr: str = expr
         self.state_cal_tree: StateCalNode = state_cal_tree
+        self.state_cal_program: Optional[StateCalProgram] = None if state_cal_tree is None else compile_state_cal_tree(state_cal_tree)
         self.sub_handlers: List[StateHandler] = sub_handlers
         self.operations: List[AtomicOp] = operations
         self.interrupt_states: Set[str] = interrupt_states
@@ -33,7 +34,7 @@ class StateHandler:
         :param trigger_time:
         :return:
         """
-        if self.state_cal_tree.in_time_range(trigger_time):
+        if self.state_cal_program.in_time_range(trigger_time):
             if self.sub_handlers is not None and len(self.sub_handlers) > 0:
                 for sub_handler in self.sub_handlers:
                     task = sub_handler.get_operations(trigger_time)
@@ -0,0 +1,100 @@
+import json
+from collections import Counter
+
+import threading
+from typing import List, Tuple
+
+from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
+from one_dragon.base.conditional_operation.state_recorder import StateRecord
+
+
+class StateRecordCollector(ConditionalOperator):
+
+    def __init__(self):
+        """
+        只收集状态记录 不触发任何指令
+        用于回放时 代替自动战斗的指令 记录识别产生的所有状态
+        """
+        ConditionalOperator.__init__(self, '', '', is_mock=True)
+        self.record_list: List[StateRecord] = []
+        self._record_lock = threading.Lock()
+
+    def update_state(self, state_record: StateRecord) -> None:
+        with self._record_lock:
+            self.record_list.append(state_record)
+
+    def batch_update_states(self, state_records: List[StateRecord]) -> None:
+        with self._record_lock:
+            self.record_list.extend(state_records)
+
+    def clear(self) -> None:
+        """
+        清除已收集的记录
+        """
+        with self._record_lock:
+            self.record_list.clear()
+
+    def save(self, file_path: str) -> None:
+        """
+        保存到文件 每行一个记录
+        :param file_path: 文件路径
+        """
+        with self._record_lock:
+            record_list = list(self.record_list)
+        with open(file_path, 'w', encoding='utf-8') as file:
+            for record in record_list:
+                file.write(json.dumps(state_record_to_dict(record), ensure_ascii=False))
+                file.write('\n')
+
+
+def state_record_to_dict(record: StateRecord) -> dict:
+    return {
+        'state_name': record.state_name,
+        'trigger_time': record.trigger_time,
+        'value': record.value,
+        'value_add': record.value_add,
+        'is_clear': record.is_clear,
+    }
+
+
+def load_state_records(file_path: str) -> List[StateRecord]:
+    """
+    读取 StateRecordCollector.save 保存的记录
+    :param file_path: 文件路径
+    :return:
+    """
+    record_list: List[StateRecord] = []
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            data = json.loads(line)
+            record_list.append(StateRecord(data['state_name'], data.get('trigger_time', 0),
+                                           value=data.get('value'), value_to_add=data.get('value_add'),
+                                           is_clear=data.get('is_clear', False)))
+    return record_list
+
+
+def diff_state_records(expected_list: List[StateRecord], actual_list: List[StateRecord],
+                       time_precision: int = 3) -> Tuple[List[tuple], List[tuple]]:
+    """
+    对比两组状态记录 不考虑顺序
+    :param expected_list: 期望的记录
+    :param actual_list: 实际的记录
+    :param time_precision: 比较时间时保留的小数位数
+    :return: 缺少的记录, 多出的记录 每个记录为 (时间, 状态, 值, 增加值, 是否清除)
+    """
+    def to_key(record: StateRecord) -> tuple:
+        return (round(record.trigger_time, time_precision), record.state_name,
+                record.value, record.value_add, record.is_clear)
+
+    expected_counter = Counter(to_key(i) for i in expected_list)
+    actual_counter = Counter(to_key(i) for i in actual_list)
+    missing_list = sorted((expected_counter - actual_counter).elements(), key=_sort_key)
+    extra_list = sorted((actual_counter - expected_counter).elements(), key=_sort_key)
+    return missing_list, extra_list
+
+
+def _sort_key(key: tuple) -> Tuple[float, str]:
+    return key[0], key[1]
@@ -1,3 +1,5 @@
+import threading
+import numpy as np
 from typing import Optional, List
 
 
@@ -17,14 +19,204 @@ class StateRecord:
         self.value_add: int = value_to_add
 
 
+class StateRecorderTable:
+
+    def __init__(self, capacity: int = 1024):
+        """
+        按列存储的状态记录
+        每个状态只占一行 记录时间、值等都放在 numpy 数组中
+        StateRecorder 只是其中一行的视图
+
+        互斥状态预先转化为下标数组 清除时只需要一次数组操作
+        只有新增状态时需要加锁 新增状态应尽量在运行前完成
+        :param capacity: 初始容量 不够时会扩容
+        """
+        self._lock = threading.Lock()
+
+        self.state_name_list: List[str] = []
+        self.state_idx_map: dict[str, int] = {}
+        self.mutex_idx_list: List[Optional[np.ndarray]] = []  # 每个状态的互斥状态下标
+
+        capacity = max(capacity, 1)
+        self.last_record_time: np.ndarray = np.full(capacity, -1, dtype=np.float64)  # -1代表还没有触发过 0代表被清除
+        self.last_value: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self.has_value: np.ndarray = np.zeros(capacity, dtype=bool)  # last_value 是否有值
+        self.update_cnt: np.ndarray = np.zeros(capacity, dtype=np.int64)  # 变更次数
+
+    @property
+    def state_cnt(self) -> int:
+        return len(self.state_name_list)
+
+    def get_idx(self, state_name: str) -> Optional[int]:
+        """
+        获取状态的下标
+        :param state_name: 状态名称
+        :return: 不存在时返回None
+        """
+        return self.state_idx_map.get(state_name)
+
+    def add_state(self, state_name: str, mutex_list: Optional[List[str]] = None) -> int:
+        """
+        新增一个状态 已存在时返回原来的下标
+        :param state_name: 状态名称
+        :param mutex_list: 互斥的状态 会一并新增 传入时覆盖原来的互斥状态
+        :return: 下标
+        """
+        with self._lock:
+            idx = self._add_state(state_name)
+            if mutex_list is not None:
+                mutex_idx = [self._add_state(i) for i in mutex_list]
+                self.mutex_idx_list[idx] = np.array(mutex_idx, dtype=np.int64)
+            return idx
+
+    def _add_state(self, state_name: str) -> int:
+        """
+        新增一个状态 需要在持有锁时调用
+        :param state_name: 状态名称
+        :return: 下标
+        """
+        idx = self.state_idx_map.get(state_name)
+        if idx is not None:
+            return idx
+
+        idx = len(self.state_name_list)
+        if idx >= len(self.last_record_time):
+            self._grow(len(self.last_record_time) * 2)
+
+        self.state_name_list.append(state_name)
+        self.state_idx_map[state_name] = idx
+        self.mutex_idx_list.append(None)
+        return idx
+
+    def _grow(self, capacity: int) -> None:
+        """
+        扩容 需要在持有锁时调用
+        扩容期间其它线程对旧数组的写入会丢失 因此状态应尽量在运行前新增
+        :param capacity: 新的容量
+        """
+        old_capacity = len(self.last_record_time)
+
+        last_record_time = np.full(capacity, -1, dtype=np.float64)
+        last_record_time[:old_capacity] = self.last_record_time
+        last_value = np.zeros(capacity, dtype=np.int64)
+        last_value[:old_capacity] = self.last_value
+        has_value = np.zeros(capacity, dtype=bool)
+        has_value[:old_capacity] = self.has_value
+        update_cnt = np.zeros(capacity, dtype=np.int64)
+        update_cnt[:old_capacity] = self.update_cnt
+
+        self.last_record_time = last_record_time
+        self.last_value = last_value
+        self.has_value = has_value
+        self.update_cnt = update_cnt
+
+    def update_state_record(self, idx: int, record: StateRecord) -> None:
+        """
+        状态事件被触发时 记录触发的时间
+        :param idx: 状态下标
+        :param record: 状态记录
+        """
+        self.last_record_time[idx] = record.trigger_time
+        if not self.has_value[idx]:
+            self.last_value[idx] = 0
+            self.has_value[idx] = True
+
+        if record.value is not None:
+            self.last_value[idx] = record.value
+
+        if record.value_add is not None:
+            self.last_value[idx] += record.value_add
+
+        self.update_cnt[idx] += 1
+
+    def clear_state_record(self, idx: int) -> None:
+        """
+        清除一个状态 原来没有出现过的话 就不重置
+        :param idx: 状态下标
+        """
+        if self.last_record_time[idx] == -1:
+            return
+        self.last_record_time[idx] = 0
+        self.has_value[idx] = False
+        self.update_cnt[idx] += 1
+
+    def clear_mutex_states(self, idx: int) -> None:
+        """
+        清除一个状态的所有互斥状态
+        :param idx: 状态下标
+        """
+        mutex_idx = self.mutex_idx_list[idx]
+        if mutex_idx is None or len(mutex_idx) == 0:
+            return
+        # 原来没有出现过的 不重置
+        to_clear = mutex_idx[self.last_record_time[mutex_idx] != -1]
+        if len(to_clear) == 0:
+            return
+        self.last_record_time[to_clear] = 0
+        self.has_value[to_clear] = False
+        self.update_cnt[to_clear] += 1
+
+    def get_last_value(self, idx: int) -> Optional[int]:
+        """
+        获取上一次记录的值
+        :param idx: 状态下标
+        :return: 没有值时返回None
+        """
+        return int(self.last_value[idx]) if self.has_value[idx] else None
+
+    def reset(self) -> None:
+        """
+        重置所有状态的记录 保留状态和互斥关系
+        """
+        with self._lock:
+            cnt = self.state_cnt
+            self.last_record_time[:cnt] = -1
+            self.last_value[:cnt] = 0
+            self.has_value[:cnt] = False
+            self.update_cnt[:cnt] += 1
+
+
 class StateRecorder:
 
-    def __init__(self, state_name: str, mutex_list: Optional[List[str]] = None):
+    __slots__ = ('state_name', 'mutex_list', 'table', 'idx')
+
+    def __init__(self, state_name: str, mutex_list: Optional[List[str]] = None,
+                 table: Optional[StateRecorderTable] = None):
+        """
+        一个状态的记录器 数据存放在 StateRecorderTable 中
+        :param state_name: 状态名称
+        :param mutex_list: 互斥的状态 这种状态出现的时候 就会将自身状态清空
+        :param table: 所属的状态表 为空时单独使用一个
+        """
         self.state_name: str = state_name
-        self.mutex_list: List[str] = mutex_list  # 互斥的状态 这种状态出现的时候 就会将自身状态清空
+        self.mutex_list: List[str] = mutex_list
+        if table is None:
+            self.table: StateRecorderTable = StateRecorderTable(capacity=1)
+            self.idx: int = self.table.add_state(state_name)
+        else:
+            self.table: StateRecorderTable = table
+            self.idx: int = table.add_state(state_name, mutex_list)
+
+    @property
+    def last_record_time(self) -> float:
+        """
+        上次记录这个状态的时间 -1代表还没有触发过 0代表被清除
+        """
+        return float(self.table.last_record_time[self.idx])
+
+    @property
+    def last_value(self) -> Optional[int]:
+        """
+        上一次记录的值
+        """
+        return self.table.get_last_value(self.idx)
 
-        self.last_record_time: float = -1  # 上次记录这个状态的时间 -1代表还没有触发过 0代表被清除
-        self.last_value: Optional[int] = None  # 上一次记录的值
+    @property
+    def update_cnt(self) -> int:
+        """
+        变更次数 每次记录或清除都会增加 用于判断状态是否有变化
+        """
+        return int(self.table.update_cnt[self.idx])
 
     def update_state_record(self, record: StateRecord) -> None:
         """
@@ -32,25 +224,13 @@ class StateRecorder:
         :param record:
         :return:
         """
-        self.last_record_time = record.trigger_time
-        if self.last_value is None:
-            self.last_value = 0
-
-        if record.value is not None:
-            self.last_value = record.value
-
-        if record.value_add is not None:
-            self.last_value += record.value_add
+        self.table.update_state_record(self.idx, record)
 
     def clear_state_record(self) -> None:
         """
         互斥事件发生时 清空
         """
-        if self.last_record_time == -1:
-            # 原来没有出现过的话 就不重置
-            return
-        self.last_record_time = 0
-        self.last_value = None
+        self.table.clear_state_record(self.idx)
 
     def dispose(self) -> None:
         """
@@ -59,5 +239,3 @@ class StateRecorder:
         """
         self.state_name = None
         self.mutex_list = None
-        self.last_value = None
-        self.last_value = None
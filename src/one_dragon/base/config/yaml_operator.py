@@ -8,10 +8,11 @@ from one_dragon.utils.log_utils import log
 
 class YamlOperator:
 
-    def __init__(self, file_path: Optional[str] = None):
+    def __init__(self, file_path: Optional[str] = None, data: Optional[dict] = None):
         """
         yml文件的操作器
         :param file_path: yml文件的路径。不传入时认为是mock，用于测试。
+        :param data: 已经读取好的数据。传入时不再读取文件，例如从资源包中加载。
         """
 
         self.file_path: str = file_path
@@ -20,7 +21,10 @@ class YamlOperator:
         self.data: dict = {}
         """存放数据的地方"""
 
-        self.__read_from_file()
+        if data is not None:
+            self.data = data
+        else:
+            self.__read_from_file()
 
     def __read_from_file(self) -> None:
         """
@@ -24,6 +24,7 @@ class ControllerBase:
         self.screenshot_history: List[ScreenshotWithTime] = []
         self.screenshot_alive_seconds: float = screenshot_alive_seconds  # 截图在内存的存活时间
         self.max_screenshot_cnt: int = max_screenshot_cnt  # 内存中最多保持的截图数量
+        self.last_screenshot_time: float = 0  # 最近一次截图的实际截取时间 使用后台截图时会早于调用时间
 
     def init_before_context_run(self) -> bool:
         """
@@ -56,10 +57,11 @@ class ControllerBase:
         """
         self.before_screenshot()
         now = time.time()
-        screen = self.get_screenshot(independent)
+        self.last_screenshot_time = now
+        screen = self.get_screenshot(independent)  # 子类使用后台截图时 会更新 last_screenshot_time
         fix_screen = self.fill_uid_black(screen)
 
-        self.screenshot_history.append(ScreenshotWithTime(fix_screen, now))
+        self.screenshot_history.append(ScreenshotWithTime(fix_screen, self.last_screenshot_time))
         while len(self.screenshot_history) > self.max_screenshot_cnt:
             self.screenshot_history.pop(0)
 
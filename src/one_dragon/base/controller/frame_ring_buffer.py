@@ -0,0 +1,156 @@
+import time
+
+import threading
+import numpy as np
+from typing import Optional, Tuple, List
+
+
+class FrameRingBuffer:
+
+    def __init__(self, capacity: int, frame_shape: Tuple[int, ...], dtype=np.uint8):
+        """
+        预先分配好内存的截图环形缓冲区
+        只有一个写入线程 可以有多个读取线程
+
+        每个槽位有一个序号 写入前后各加1 奇数代表正在写入
+        读取时前后对比序号 不一致说明读取期间被覆盖了 此时丢弃读取结果
+        :param capacity: 槽位数量
+        :param frame_shape: 截图的形状 (height, width, channel)
+        :param dtype: 截图的数据类型
+        """
+        self.capacity: int = capacity
+        self.frame_shape: Tuple[int, ...] = frame_shape
+        self.frames: np.ndarray = np.zeros((capacity,) + tuple(frame_shape), dtype=dtype)
+        self.frame_time: np.ndarray = np.full(capacity, -1, dtype=np.float64)  # 每个槽位的截图时间 -1为无效
+
+        self._seq: List[int] = [0] * capacity
+        self._latest_idx: int = -1  # 最新一张完整截图的槽位
+        self._writing_idx: int = -1  # 正在写入的槽位
+        self._new_frame_condition = threading.Condition()
+
+        self.total_frame_cnt: int = 0  # 累计写入的截图数量
+
+    def begin_write(self) -> Tuple[int, np.ndarray]:
+        """
+        开始写入下一个槽位
+        :return: 槽位下标, 槽位内存 直接写入即可
+        """
+        idx = (self._latest_idx + 1) % self.capacity
+        self._seq[idx] += 1
+        self._writing_idx = idx
+        return idx, self.frames[idx]
+
+    def end_write(self, idx: int, frame_time: float) -> None:
+        """
+        完成写入
+        :param idx: 槽位下标
+        :param frame_time: 截图时间
+        """
+        self.frame_time[idx] = frame_time
+        self._seq[idx] += 1
+        with self._new_frame_condition:
+            self._latest_idx = idx
+            self._writing_idx = -1
+            self.total_frame_cnt += 1
+            self._new_frame_condition.notify_all()
+
+    def cancel_write(self, idx: int) -> None:
+        """
+        放弃写入 槽位的内容已经被破坏 标记为无效
+        :param idx: 槽位下标
+        """
+        self.frame_time[idx] = -1
+        self._seq[idx] += 1
+        self._writing_idx = -1
+
+    def _read(self, idx: int, copy: bool = True,
+              out: Optional[np.ndarray] = None) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        读取一个槽位
+        :param idx: 槽位下标
+        :param copy: 是否复制 不复制时返回的是槽位内存 会在之后被覆盖
+        :param out: 复制到这个内存中 避免新分配
+        :return: 截图, 截图时间 槽位无效或读取期间被覆盖时返回None
+        """
+        seq = self._seq[idx]
+        if seq % 2 == 1:
+            return None
+        frame_time = float(self.frame_time[idx])
+        if frame_time < 0:
+            return None
+
+        if out is not None:
+            np.copyto(out, self.frames[idx])
+            frame = out
+        elif copy:
+            frame = self.frames[idx].copy()
+        else:
+            frame = self.frames[idx]
+
+        if self._seq[idx] != seq:
+            return None
+        return frame, frame_time
+
+    def latest_frame(self, max_age: Optional[float] = None, copy: bool = True,
+                     out: Optional[np.ndarray] = None) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        获取最新的截图
+        :param max_age: 最多允许多少秒之前的截图 为空时不限制
+        :param copy: 是否复制 不复制时返回的是槽位内存 会在 capacity 张截图后被覆盖
+        :param out: 复制到这个内存中 避免新分配
+        :return: 截图, 截图时间 没有符合的截图时返回None
+        """
+        idx = self._latest_idx
+        if idx == -1:
+            return None
+        if max_age is not None and time.time() - self.frame_time[idx] > max_age:
+            return None
+        return self._read(idx, copy=copy, out=out)
+
+    def frames_since(self, since_time: float, copy: bool = True) -> List[Tuple[np.ndarray, float]]:
+        """
+        获取某个时间之后的所有截图 最多 capacity-1 张
+        :param since_time: 开始时间 不包含
+        :param copy: 是否复制
+        :return: 按时间顺序排列的 [(截图, 截图时间)]
+        """
+        result_list: List[Tuple[np.ndarray, float]] = []
+        latest_idx = self._latest_idx
+        if latest_idx == -1:
+            return result_list
+
+        for i in range(self.capacity):
+            idx = (latest_idx - i) % self.capacity
+            if idx == self._writing_idx:
+                break
+            if self.frame_time[idx] <= since_time:
+                break
+            frame = self._read(idx, copy=copy)
+            if frame is None:
+                break
+            result_list.append(frame)
+
+        result_list.reverse()
+        return result_list
+
+    def wait_new_frame(self, after_time: float, timeout: float,
+                       copy: bool = True) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        等待一张比某个时间更新的截图
+        :param after_time: 截图时间需要晚于这个时间
+        :param timeout: 最多等待的秒数
+        :param copy: 是否复制
+        :return: 截图, 截图时间 超时返回None
+        """
+        deadline = time.time() + timeout
+        with self._new_frame_condition:
+            while True:
+                idx = self._latest_idx
+                if idx != -1 and self.frame_time[idx] > after_time:
+                    break
+                remain = deadline - time.time()
+                if remain <= 0:
+                    return None
+                self._new_frame_condition.wait(remain)
+
+        return self._read(idx, copy=copy)
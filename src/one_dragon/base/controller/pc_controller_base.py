@@ -2,13 +2,14 @@ import time
 
 import ctypes
 import cv2
+import importlib.util
 import numpy as np
 import pyautogui
 from PIL.Image import Image
 from cv2.typing import MatLike
 from functools import lru_cache
 from pynput import keyboard
-from typing import Optional
+from typing import Optional, List, Tuple
 
 from one_dragon.base.controller.controller_base import ControllerBase
 from one_dragon.base.controller.pc_button import pc_button_utils
@@ -17,6 +18,7 @@ from one_dragon.base.controller.pc_button.keyboard_mouse_controller import Keybo
 from one_dragon.base.controller.pc_button.pc_button_controller import PcButtonController
 from one_dragon.base.controller.pc_button.xbox_button_controller import XboxButtonController
 from one_dragon.base.controller.pc_game_window import PcGameWindow
+from one_dragon.base.controller.screen_capture import AsyncScreenCapture, MssCaptureSource
 from one_dragon.base.geometry.point import Point
 from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.utils.log_utils import log
@@ -44,6 +46,9 @@ class PcControllerBase(ControllerBase):
         self.btn_controller: PcButtonController = self.keyboard_controller
         self.sct = None
 
+        self.async_capture: Optional[AsyncScreenCapture] = None  # 后台截图
+        self.async_capture_max_age: float = 0.05  # 后台截图超过这个秒数就等待新的截图
+
     def init_before_context_run(self) -> bool:
         pyautogui.FAILSAFE = False  # 禁用 Fail-Safe,防止鼠标接近屏幕的边缘或角落时报错
         if self.sct is not None:  # 新一次app前 先关闭上一个
@@ -117,11 +122,79 @@ class PcControllerBase(ControllerBase):
             self.keyboard_controller.keyboard.release(keyboard.Key.alt)
         return True
 
+    def start_async_capture(self, fps: float = 50, buffer_size: int = 8) -> bool:
+        """
+        开启后台截图 之后的截图优先使用后台线程的最新截图 不需要等待截图完成
+        需要安装mss
+        :param fps: 每秒截图次数
+        :param buffer_size: 保留的截图数量
+        :return: 是否开启成功
+        """
+        if importlib.util.find_spec('mss') is None:
+            log.error('未安装mss 无法使用后台截图')
+            return False
+
+        self.stop_async_capture()
+        self.async_capture = AsyncScreenCapture(
+            MssCaptureSource(lambda: self.game_win.win_rect),
+            width=self.standard_width, height=self.standard_height,
+            fps=fps, buffer_size=buffer_size
+        )
+        self.async_capture_max_age = 2.5 / fps if fps > 0 else 0.05  # 允许错过2次截图
+        self.async_capture.start()
+        return True
+
+    def stop_async_capture(self) -> None:
+        """
+        停止后台截图
+        """
+        if self.async_capture is None:
+            return
+        self.async_capture.stop()
+        log.debug('后台截图 次数 %d 失败 %d 平均耗时 %.4f秒',
+                  self.async_capture.capture_cnt, self.async_capture.fail_cnt,
+                  self.async_capture.avg_capture_seconds)
+        self.async_capture = None
+
+    @property
+    def is_async_capture_running(self) -> bool:
+        return self.async_capture is not None and self.async_capture.running
+
+    def latest_frame(self, max_age: Optional[float] = None) -> Optional[Tuple[MatLike, float]]:
+        """
+        获取后台截图的最新一张
+        :param max_age: 最多允许多少秒之前的截图
+        :return: 截图, 截图时间 没有开启后台截图时返回None
+        """
+        if not self.is_async_capture_running:
+            return None
+        return self.async_capture.latest_frame(max_age=max_age)
+
+    def frames_since(self, since_time: float) -> List[Tuple[MatLike, float]]:
+        """
+        获取后台截图中 某个时间之后的所有截图 可用于补上两次识别之间错过的画面
+        :param since_time: 开始时间 不包含
+        :return: 按时间顺序排列的 [(截图, 截图时间)]
+        """
+        if not self.is_async_capture_running:
+            return []
+        return self.async_capture.frames_since(since_time)
+
     def get_screenshot(self, independent: bool = False) -> MatLike:
         """
         截图 如果分辨率和默认不一样则进行缩放
+        开启后台截图时 直接使用足够新的后台截图
         :return: 截图
         """
+        if not independent and self.is_async_capture_running:
+            frame = self.async_capture.latest_frame(max_age=self.async_capture_max_age)
+            if frame is None:
+                frame = self.async_capture.wait_new_frame(time.time() - self.async_capture_max_age,
+                                                          timeout=self.async_capture_max_age)
+            if frame is not None:
+                self.last_screenshot_time = frame[1]
+                return frame[0]
+
         rect: Rect = self.game_win.win_rect
 
         left = rect.x1
@@ -0,0 +1,195 @@
+import os
+import re
+
+import cv2
+from cv2.typing import MatLike
+from typing import Optional, List, Tuple
+
+from one_dragon.base.controller.controller_base import ControllerBase, ScreenshotWithTime
+from one_dragon.utils import cv2_utils
+from one_dragon.utils.log_utils import log
+
+_IMAGE_SUFFIX_LIST = ['.png', '.jpg', '.jpeg', '.bmp']
+
+
+class ReplayFrameSource:
+
+    def __init__(self, source_path: str, fps: float = 30, start_time: float = 0):
+        """
+        录制好的截图序列 可以是图片文件夹或视频文件
+        - 图片文件夹 按文件名排序 文件名最后一段数字为截图时间 例如 save_debug_image 保存的 xxx_1720000000123.png
+          超过 1e11 的视为毫秒 没有数字时按 fps 计算时间
+        - 视频文件 使用视频中的时间 加上 start_time
+        :param source_path: 图片文件夹或视频文件的路径
+        :param fps: 无法获取截图时间时 使用的帧率
+        :param start_time: 第一张截图的时间 用于没有时间信息的情况
+        """
+        self.source_path: str = source_path
+        self.fps: float = fps
+        self.start_time: float = start_time
+        self.is_video: bool = not os.path.isdir(source_path)
+
+        self._image_list: List[Tuple[str, float]] = []  # 图片文件夹中的 (路径, 截图时间)
+        self._video: Optional[cv2.VideoCapture] = None
+        self._frame_idx: int = 0
+
+        if self.is_video:
+            self._video = cv2.VideoCapture(source_path)
+            if not self._video.isOpened():
+                raise ValueError(f'无法打开视频 {source_path}')
+            video_fps = self._video.get(cv2.CAP_PROP_FPS)
+            if video_fps > 0:
+                self.fps = video_fps
+        else:
+            self._init_image_list()
+
+    def _init_image_list(self) -> None:
+        """
+        读取图片文件夹中的图片和截图时间
+        """
+        file_list = sorted(i for i in os.listdir(self.source_path)
+                           if os.path.splitext(i)[1].lower() in _IMAGE_SUFFIX_LIST)
+        time_list = [_get_time_from_file_name(i) for i in file_list]
+        if any(t is None for t in time_list):
+            time_list = [self.start_time + idx / self.fps for idx in range(len(file_list))]
+        else:
+            # 按时间排序 文件名前缀不同时 字符串排序不一定是时间顺序
+            order = sorted(range(len(file_list)), key=lambda idx: time_list[idx])
+            file_list = [file_list[idx] for idx in order]
+            time_list = [time_list[idx] for idx in order]
+
+        self._image_list = [(os.path.join(self.source_path, f), t) for f, t in zip(file_list, time_list)]
+
+    @property
+    def frame_cnt(self) -> int:
+        """
+        截图总数 视频文件时为视频中记录的帧数
+        """
+        if self.is_video:
+            return int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+        return len(self._image_list)
+
+    def read_next(self) -> Optional[ScreenshotWithTime]:
+        """
+        读取下一张截图
+        :return: RGB截图和截图时间 已经读取完时返回None
+        """
+        if self.is_video:
+            ret, frame = self._video.read()
+            if not ret:
+                return None
+            pos_msec = self._video.get(cv2.CAP_PROP_POS_MSEC)
+            frame_time = self.start_time + (pos_msec / 1000 if pos_msec > 0 else self._frame_idx / self.fps)
+            self._frame_idx += 1
+            return ScreenshotWithTime(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), frame_time)
+
+        if self._frame_idx >= len(self._image_list):
+            return None
+        image_path, frame_time = self._image_list[self._frame_idx]
+        self._frame_idx += 1
+        image = cv2_utils.read_image(image_path)
+        if image is None:
+            log.error('无法读取图片 %s', image_path)
+            return self.read_next()
+        return ScreenshotWithTime(image, frame_time)
+
+    def reset(self) -> None:
+        """
+        回到第一张截图
+        """
+        self._frame_idx = 0
+        if self._video is not None:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self) -> None:
+        """
+        释放视频
+        """
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+
+class ReplayController(ControllerBase):
+
+    def __init__(self, frame_source: ReplayFrameSource,
+                 standard_width: int = 1920,
+                 standard_height: int = 1080):
+        """
+        回放录制好的截图 用于没有游戏的环境中 调试和测量识别逻辑
+        每次截图返回下一张录制的截图 截图时间为录制时的时间
+        不进行任何实际的点击和按键
+        :param frame_source: 截图序列
+        :param standard_width: 默认分辨率的宽 尺寸不同的截图会被缩放
+        :param standard_height: 默认分辨率的高
+        """
+        ControllerBase.__init__(self)
+        self.frame_source: ReplayFrameSource = frame_source
+        self.standard_width: int = standard_width
+        self.standard_height: int = standard_height
+        self.is_finished: bool = False  # 是否已经回放完所有截图
+        self._last_frame: Optional[ScreenshotWithTime] = None
+
+    def init_before_context_run(self) -> bool:
+        return True
+
+    @property
+    def is_game_window_ready(self) -> bool:
+        return True
+
+    def click(self, pos=None, press_time: float = 0, pc_alt: bool = False) -> bool:
+        return True
+
+    def read_next_frame(self) -> Optional[ScreenshotWithTime]:
+        """
+        读取下一张截图
+        :return: 截图和截图时间 回放完毕时返回None
+        """
+        frame = self.frame_source.read_next()
+        if frame is None:
+            self.is_finished = True
+            return None
+
+        if frame.image.shape[1] != self.standard_width or frame.image.shape[0] != self.standard_height:
+            frame.image = cv2.resize(frame.image, (self.standard_width, self.standard_height))
+        self._last_frame = frame
+        self.last_screenshot_time = frame.create_time
+
+        self.screenshot_history.append(frame)
+        while len(self.screenshot_history) > self.max_screenshot_cnt:
+            self.screenshot_history.pop(0)
+        return frame
+
+    def get_screenshot(self, independent: bool = False) -> MatLike:
+        """
+        返回下一张录制的截图 回放完毕后一直返回最后一张
+        """
+        frame = self.read_next_frame()
+        if frame is None:
+            frame = self._last_frame
+        if frame is None:
+            return None
+        self.last_screenshot_time = frame.create_time
+        return frame.image
+
+    def screenshot(self, independent: bool = False) -> MatLike:
+        return self.get_screenshot(independent)
+
+    def fill_uid_black(self, screen: MatLike) -> MatLike:
+        return screen
+
+    def close_game(self):
+        self.frame_source.release()
+
+
+def _get_time_from_file_name(file_name: str) -> Optional[float]:
+    """
+    文件名最后一段数字为截图时间
+    :param file_name: 文件名
+    :return: 截图时间 秒
+    """
+    match = re.search(r'(\d+(?:\.\d+)?)$', os.path.splitext(file_name)[0])
+    if match is None:
+        return None
+    value = float(match.group(1))
+    return value / 1000 if value > 1e11 else value
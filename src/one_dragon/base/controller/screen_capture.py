@@ -0,0 +1,238 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import threading
+from typing import Optional, Callable, List, Tuple
+
+from one_dragon.base.controller.frame_ring_buffer import FrameRingBuffer
+from one_dragon.base.geometry.rectangle import Rect
+from one_dragon.utils import thread_utils, cv2_utils
+from one_dragon.utils.log_utils import log
+
+_screen_capture_executor = ThreadPoolExecutor(thread_name_prefix='od_screen_capture', max_workers=1)
+
+
+class ScreenCaptureSource:
+
+    def open(self) -> None:
+        """
+        在截图线程中初始化 部分截图方式要求在同一个线程中使用
+        """
+        pass
+
+    def grab(self, out: np.ndarray) -> bool:
+        """
+        截图 直接写入到给定的内存中 尺寸不一致时需要缩放
+        :param out: RGB格式 (height, width, 3)
+        :return: 是否成功
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        在截图线程中释放资源
+        """
+        pass
+
+
+class MssCaptureSource(ScreenCaptureSource):
+
+    def __init__(self, get_win_rect: Callable[[], Optional[Rect]]):
+        """
+        使用mss截图
+        除了mss本身返回的原始数据外 颜色转换和缩放都写入预先分配的内存
+        :param get_win_rect: 获取当前游戏窗口位置的方法
+        """
+        self.get_win_rect: Callable[[], Optional[Rect]] = get_win_rect
+        self._sct = None
+        self._rgb_buffer: Optional[np.ndarray] = None  # 窗口尺寸和标准尺寸不一致时 用于缩放前的中转
+
+    def open(self) -> None:
+        import mss
+        self._sct = mss.mss()
+
+    def grab(self, out: np.ndarray) -> bool:
+        rect = self.get_win_rect()
+        if rect is None or rect.width <= 0 or rect.height <= 0:
+            return False
+
+        monitor = {"top": rect.y1, "left": rect.x1, "width": rect.width, "height": rect.height}
+        shot = self._sct.grab(monitor)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape((shot.height, shot.width, 4))
+
+        if bgra.shape[0] == out.shape[0] and bgra.shape[1] == out.shape[1]:
+            cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=out)
+        else:
+            if self._rgb_buffer is None or self._rgb_buffer.shape[:2] != bgra.shape[:2]:
+                self._rgb_buffer = np.empty((bgra.shape[0], bgra.shape[1], 3), dtype=np.uint8)
+            cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=self._rgb_buffer)
+            cv2.resize(self._rgb_buffer, (out.shape[1], out.shape[0]), dst=out)
+        return True
+
+    def close(self) -> None:
+        if self._sct is not None:
+            try:
+                self._sct.close()
+            except Exception:
+                pass
+            self._sct = None
+
+
+class FileCaptureSource(ScreenCaptureSource):
+
+    def __init__(self, file_path_list: List[str], loop: bool = True):
+        """
+        从图片文件中读取截图 按顺序逐张返回 用于在没有游戏的环境下测试
+        :param file_path_list: 图片路径 也可以是一个文件夹 会读取其中所有的png
+        :param loop: 读取完毕后是否从头开始
+        """
+        if len(file_path_list) == 1 and os.path.isdir(file_path_list[0]):
+            dir_path = file_path_list[0]
+            file_path_list = [os.path.join(dir_path, i) for i in sorted(os.listdir(dir_path)) if i.endswith('.png')]
+        self.file_path_list: List[str] = file_path_list
+        self.loop: bool = loop
+        self._image_list: List[np.ndarray] = []
+        self._idx: int = 0
+
+    def open(self) -> None:
+        self._image_list = []
+        for file_path in self.file_path_list:
+            image = cv2_utils.read_image(file_path)
+            if image is not None:
+                self._image_list.append(image)
+        self._idx = 0
+
+    def grab(self, out: np.ndarray) -> bool:
+        if self._idx >= len(self._image_list):
+            if not self.loop or len(self._image_list) == 0:
+                return False
+            self._idx = 0
+
+        image = self._image_list[self._idx]
+        self._idx += 1
+        if image.shape == out.shape:
+            np.copyto(out, image)
+        else:
+            cv2.resize(image, (out.shape[1], out.shape[0]), dst=out)
+        return True
+
+
+class AsyncScreenCapture:
+
+    def __init__(self, source: ScreenCaptureSource,
+                 width: int = 1920, height: int = 1080,
+                 fps: float = 50, buffer_size: int = 8):
+        """
+        后台截图线程 按固定频率截图写入环形缓冲区
+        使用方直接获取最新的截图 不需要自己等待截图
+        :param source: 截图方式
+        :param width: 截图宽度 即标准分辨率
+        :param height: 截图高度 即标准分辨率
+        :param fps: 每秒截图次数
+        :param buffer_size: 缓冲区保留的截图数量
+        """
+        self.source: ScreenCaptureSource = source
+        self.fps: float = fps
+        self.buffer: FrameRingBuffer = FrameRingBuffer(buffer_size, (height, width, 3))
+
+        self.running: bool = False
+        self._run_lock = threading.Lock()
+        self._stopped_event = threading.Event()
+        self._stopped_event.set()
+
+        self.capture_cnt: int = 0  # 成功截图次数
+        self.fail_cnt: int = 0  # 失败截图次数
+        self.total_capture_seconds: float = 0  # 截图累计耗时
+
+    def start(self) -> None:
+        """
+        启动截图线程
+        """
+        with self._run_lock:
+            if self.running:
+                return
+            self.running = True
+            self._stopped_event.clear()
+
+        future = _screen_capture_executor.submit(self._capture_loop)
+        future.add_done_callback(thread_utils.handle_future_result)
+
+    def stop(self, wait: bool = True) -> None:
+        """
+        停止截图线程
+        :param wait: 是否等待线程退出
+        """
+        self.running = False
+        if wait:
+            self._stopped_event.wait(timeout=1)
+
+    def _capture_loop(self) -> None:
+        """
+        截图循环
+        """
+        try:
+            self.source.open()
+            interval = 1.0 / self.fps if self.fps > 0 else 0
+            while self.running:
+                start_time = time.time()
+                idx, slot = self.buffer.begin_write()
+                try:
+                    success = self.source.grab(slot)
+                except Exception:
+                    log.error('后台截图失败', exc_info=True)
+                    success = False
+
+                if success:
+                    self.buffer.end_write(idx, start_time)
+                    self.capture_cnt += 1
+                    self.total_capture_seconds += time.time() - start_time
+                else:
+                    self.buffer.cancel_write(idx)
+                    self.fail_cnt += 1
+
+                to_sleep = interval - (time.time() - start_time)
+                if to_sleep > 0:
+                    time.sleep(to_sleep)
+        except Exception:
+            log.error('后台截图线程异常退出', exc_info=True)
+        finally:
+            self.running = False
+            self.source.close()
+            self._stopped_event.set()
+
+    def latest_frame(self, max_age: Optional[float] = None, copy: bool = True) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        获取最新的截图
+        :param max_age: 最多允许多少秒之前的截图
+        :param copy: 是否复制 不复制时返回的是缓冲区内存 会在之后被覆盖
+        :return: 截图, 截图时间
+        """
+        return self.buffer.latest_frame(max_age=max_age, copy=copy)
+
+    def frames_since(self, since_time: float, copy: bool = True) -> List[Tuple[np.ndarray, float]]:
+        """
+        获取某个时间之后的所有截图
+        :param since_time: 开始时间 不包含
+        :param copy: 是否复制
+        :return: 按时间顺序排列的 [(截图, 截图时间)]
+        """
+        return self.buffer.frames_since(since_time, copy=copy)
+
+    def wait_new_frame(self, after_time: float, timeout: float) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        等待一张新的截图
+        :param after_time: 截图时间需要晚于这个时间
+        :param timeout: 最多等待的秒数
+        :return: 截图, 截图时间
+        """
+        return self.buffer.wait_new_frame(after_time, timeout)
+
+    @property
+    def avg_capture_seconds(self) -> float:
+        """
+        平均截图耗时
+        """
+        return self.total_capture_seconds / self.capture_cnt if self.capture_cnt > 0 else 0
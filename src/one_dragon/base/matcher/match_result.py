@@ -41,6 +41,13 @@ class MatchResult:
         self.x += p.x
         self.y += p.y
 
+    def copy(self) -> 'MatchResult':
+        """
+        复制一个新的结果 data 不会深拷贝
+        """
+        return MatchResult(self.confidence, self.x, self.y, self.w, self.h,
+                           template_scale=self.template_scale, data=self.data)
+
 
 class MatchResultList:
     def __init__(self, only_best: bool = True):
@@ -108,3 +115,15 @@ class MatchResultList:
         """
         for mr in self.arr:
             mr.add_offset(lt)
+
+    def copy(self) -> 'MatchResultList':
+        """
+        复制一个新的结果列表 里面的结果也会复制 避免使用方修改影响缓存
+        """
+        new_list = MatchResultList(only_best=self.only_best)
+        for mr in self.arr:
+            new_mr = mr.copy()
+            new_list.arr.append(new_mr)
+            if mr is self.max:
+                new_list.max = new_mr
+        return new_list
@@ -1,16 +1,25 @@
 from cv2.typing import MatLike
+from typing import Optional, List, Tuple
 
+from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.base.matcher.match_result import MatchResultList
+from one_dragon.base.matcher.screen_analysis_cache import ScreenAnalysisCache
 
 
 class OcrMatcher:
 
-    def __init__(self):
-        pass
+    def __init__(self, analysis_cache: Optional[ScreenAnalysisCache] = None):
+        self.analysis_cache: Optional[ScreenAnalysisCache] = analysis_cache  # 截图分析缓存 同一张截图的相同区域只识别一次
 
     def init_model(self) -> bool:
         pass
 
+    def start_init_model(self) -> None:
+        """
+        开始加载模型 不等待加载完成 默认直接同步加载
+        """
+        self.init_model()
+
     def run_ocr_single_line(self, image: MatLike, threshold: float = None, strict_one_line: bool = True) -> str:
         """
         单行文本识别 手动合成一行 按匹配结果从左到右 从上到下
@@ -32,3 +41,24 @@ class OcrMatcher:
         :return: {key_word: []}
         """
         pass
+
+    def run_ocr_batch(self, region_list: List[Tuple[MatLike, Optional[Rect]]], threshold: float = None,
+                      merge_line_distance: float = -1) -> List[dict[str, MatchResultList]]:
+        """
+        对多个区域一起进行OCR
+        :param region_list: [(图片, 区域)] 区域为空时使用整张图片
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return: 每个区域的结果 {key_word: []} 坐标相对区域左上角
+        """
+        pass
+
+    def run_ocr_single_line_batch(self, region_list: List[Tuple[MatLike, Optional[Rect]]],
+                                  threshold: float = None) -> List[str]:
+        """
+        对多个单行文本区域一起识别
+        :param region_list: [(图片, 区域)] 区域为空时使用整张图片
+        :param threshold: 匹配阈值
+        :return: 每个区域的文本
+        """
+        pass
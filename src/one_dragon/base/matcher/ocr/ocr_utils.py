@@ -88,3 +88,12 @@ def merge_ocr_result_to_multiple_line(ocr_map, join_space: bool = True, merge_li
         merge_ocr_result_map[merge_result.data].append(merge_result)
 
     return merge_ocr_result_map
+
+
+def copy_ocr_result_map(ocr_map: dict[str, MatchResultList]) -> dict[str, MatchResultList]:
+    """
+    复制OCR结果 用于从缓存中取出结果 避免使用方修改结果影响缓存
+    :param ocr_map: run_ocr的结果
+    :return:
+    """
+    return {text: mrl.copy() for text, mrl in ocr_map.items()}
@@ -1,17 +1,23 @@
 import time
 
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from cv2.typing import MatLike
-from typing import List
+from typing import List, Optional, Tuple
 
+from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
 from one_dragon.base.matcher.ocr import ocr_utils
 from one_dragon.base.matcher.ocr.ocr_matcher import OcrMatcher
-from one_dragon.utils import os_utils
+from one_dragon.base.matcher.screen_analysis_cache import ScreenAnalysisCache
+from one_dragon.utils import cv2_utils, os_utils
 from one_dragon.utils import str_utils
 from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
 
+_onnx_ocr_executor = ThreadPoolExecutor(thread_name_prefix='onnx_ocr', max_workers=2)
+
 
 class OnnxOcrMatcher(OcrMatcher):
     """
@@ -19,43 +25,107 @@ class OnnxOcrMatcher(OcrMatcher):
     TODO 未测试使用 RGB图片是否有影响
     """
 
-    def __init__(self):
-        OcrMatcher.__init__(self)
+    def __init__(self, analysis_cache: Optional[ScreenAnalysisCache] = None):
+        OcrMatcher.__init__(self, analysis_cache=analysis_cache)
         self._model = None
-        self._loading: bool = False
+        self._init_lock = threading.Lock()
+        self._det_future: Optional[Future] = None  # 检测模型的加载结果
+        self._rec_future: Optional[Future] = None  # 识别模型的加载结果
+        self._model_kwargs: dict = {}
+        self.load_seconds: dict[str, float] = {}  # 各模型的加载耗时
 
-    def init_model(self) -> bool:
-        log.info('正在加载OCR模型')
-        while self._loading:
-            time.sleep(1)
-            return True
-        self._loading = True
+    def start_init_model(self) -> None:
+        """
+        在后台并行加载检测模型和识别模型 不等待加载完成
+        已经在加载或加载成功的模型不会重复加载 加载失败的会重新加载
+        """
+        with self._init_lock:
+            if self._is_loading_or_loaded(self._det_future) and self._is_loading_or_loaded(self._rec_future):
+                return
 
-        if self._model is None:
             from onnxocr.onnx_paddleocr import ONNXPaddleOcr
+            from onnxocr.predict_det import TextDetector
+            from onnxocr.predict_rec import TextRecognizer
+            from one_dragon.yolo.onnx_session_manager import onnx_session_manager
             models_dir = os_utils.get_path_under_work_dir('assets', 'models', 'onnx_ocr')
 
-            try:
-                self._model = ONNXPaddleOcr(
-                    use_angle_cls=False, use_gpu=False,
-                    det_model_dir=os.path.join(models_dir, 'det.onnx'),
-                    rec_model_dir=os.path.join(models_dir, 'rec.onnx'),
-                    cls_model_dir=os.path.join(models_dir, 'cls.onnx'),
-                    rec_char_dict_path=os.path.join(models_dir, 'ppocr_keys_v1.txt'),
-                    vis_font_path=os.path.join(models_dir, 'simfang.tt'),
-                )
-                self._loading = False
-                log.info('加载OCR模型完毕')
-                return True
-            except Exception:
-                log.error('OCR模型加载出错', exc_info=True)
-                self._loading = False
-                return False
+            self._model_kwargs = dict(
+                use_angle_cls=False, use_gpu=False,
+                det_model_dir=os.path.join(models_dir, 'det.onnx'),
+                rec_model_dir=os.path.join(models_dir, 'rec.onnx'),
+                cls_model_dir=os.path.join(models_dir, 'cls.onnx'),
+                rec_char_dict_path=os.path.join(models_dir, 'ppocr_keys_v1.txt'),
+                vis_font_path=os.path.join(models_dir, 'simfang.tt'),
+                session_creator=onnx_session_manager.get_session,
+            )
+            params = ONNXPaddleOcr.build_params(**self._model_kwargs)
+
+            if not self._is_loading_or_loaded(self._det_future):
+                self._det_future = _onnx_ocr_executor.submit(self._load_part, 'det', TextDetector, params)
+            if not self._is_loading_or_loaded(self._rec_future):
+                self._rec_future = _onnx_ocr_executor.submit(self._load_part, 'rec', TextRecognizer, params)
 
+    @staticmethod
+    def _is_loading_or_loaded(future: Optional[Future]) -> bool:
+        """
+        模型是否正在加载或已经加载成功
+        """
+        return future is not None and (not future.done() or future.exception() is None)
+
+    def _load_part(self, part_name: str, model_class, params):
+        """
+        加载其中一个模型
+        :param part_name: 模型名称
+        :param model_class: 模型类
+        :param params: 模型参数
+        :return: 模型
+        """
+        start_time = time.time()
+        model = model_class(params)
+        self.load_seconds[part_name] = time.time() - start_time
+        log.info('加载OCR模型 %s 耗时 %.2f秒', part_name, self.load_seconds[part_name])
+        return model
+
+    def init_model(self) -> bool:
+        log.info('正在加载OCR模型')
+        if self._get_model() is None:
+            return False
         log.info('加载OCR模型完毕')
-        self._loading = False
         return True
 
+    def _get_rec_model(self):
+        """
+        获取识别模型 只会等待识别模型加载完毕
+        :return: TextRecognizer 加载失败时返回None 下次获取时会重新加载
+        """
+        self.start_init_model()
+        try:
+            return self._rec_future.result()
+        except Exception:
+            log.error('OCR模型加载出错', exc_info=True)
+            return None
+
+    def _get_model(self):
+        """
+        获取完整的OCR模型 会等待检测模型和识别模型都加载完毕
+        :return: ONNXPaddleOcr 加载失败时返回None 下次获取时会重新加载
+        """
+        if self._model is not None:
+            return self._model
+
+        self.start_init_model()
+        try:
+            det = self._det_future.result()
+            rec = self._rec_future.result()
+        except Exception:
+            log.error('OCR模型加载出错', exc_info=True)
+            return None
+        with self._init_lock:
+            if self._model is None:
+                from onnxocr.onnx_paddleocr import ONNXPaddleOcr
+                self._model = ONNXPaddleOcr(text_detector=det, text_recognizer=rec, **self._model_kwargs)
+        return self._model
+
     def run_ocr_single_line(self, image: MatLike, threshold: float = None, strict_one_line: bool = True) -> str:
         """
         单行文本识别 手动合成一行 按匹配结果从左到右 从上到下
@@ -66,7 +136,12 @@ class OnnxOcrMatcher(OcrMatcher):
         :return:
         """
         if strict_one_line:
-            return self._run_ocr_without_det(image, threshold)
+            if self.analysis_cache is None:
+                return self._run_ocr_without_det(image, threshold)
+            return self.analysis_cache.get_or_compute(
+                image, ('ocr_without_det', threshold),
+                lambda: self._run_ocr_without_det(image, threshold)
+            )
         else:
             ocr_map: dict = self.run_ocr(image, threshold)
             tmp = ocr_utils.merge_ocr_result_to_single_line(ocr_map, join_space=False)
@@ -81,14 +156,46 @@ class OnnxOcrMatcher(OcrMatcher):
         :param merge_line_distance: 多少行距内合并结果 -1为不合并 理论中文情况不会出现过长分行的 这里只是为了兼容英语的情况
         :return: {key_word: []}
         """
+        if self.analysis_cache is None:
+            return self._run_ocr(image, threshold, merge_line_distance)
+        return self.analysis_cache.get_or_compute(
+            image, ('ocr', threshold, merge_line_distance),
+            lambda: self._run_ocr(image, threshold, merge_line_distance),
+            copy_result=ocr_utils.copy_ocr_result_map
+        )
+
+    def _run_ocr(self, image: MatLike, threshold: float = None,
+                 merge_line_distance: float = -1) -> dict[str, MatchResultList]:
+        """
+        对图片进行OCR 不经过缓存
+        :param image: 图片
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return: {key_word: []}
+        """
         start_time = time.time()
-        result_map: dict = {}
-        scan_result_list: list = self._model.ocr(image, cls=False)
+        model = self._get_model()
+        if model is None:
+            return {}
+        scan_result_list: list = model.ocr(image, cls=False)
         if len(scan_result_list) == 0:
-            log.debug('OCR结果 %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
-            return result_map
+            log.debug('OCR结果 %s 耗时 %.2f', [], time.time() - start_time)
+            return {}
 
-        scan_result = scan_result_list[0]
+        result_map = self._convert_scan_result(scan_result_list[0], threshold, merge_line_distance)
+        log.debug('OCR结果 %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
+        return result_map
+
+    def _convert_scan_result(self, scan_result: list, threshold: float = None,
+                             merge_line_distance: float = -1) -> dict[str, MatchResultList]:
+        """
+        将模型返回的单张图片结果 转化成 {key_word: []}
+        :param scan_result: 单张图片的结果
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return: {key_word: []}
+        """
+        result_map: dict = {}
         for anchor in scan_result:
             anchor_position = anchor[0]
             anchor_text = anchor[1][0]
@@ -107,9 +214,88 @@ class OnnxOcrMatcher(OcrMatcher):
         if merge_line_distance != -1:
             result_map = ocr_utils.merge_ocr_result_to_multiple_line(result_map, join_space=True,
                                                                      merge_line_distance=merge_line_distance)
-        log.debug('OCR结果 %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
         return result_map
 
+    def run_ocr_batch(self, region_list: List[Tuple[MatLike, Optional[Rect]]], threshold: float = None,
+                      merge_line_distance: float = -1) -> List[dict[str, MatchResultList]]:
+        """
+        对多个区域一起进行OCR 所有区域只跑一次检测模型 再一起识别
+        适合一个画面上需要识别多个区域的情况
+        :param region_list: [(图片, 区域)] 区域为空时使用整张图片
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return: 每个区域的结果 {key_word: []} 坐标与 run_ocr(区域裁剪后图片) 一致 即相对区域左上角
+        """
+        start_time = time.time()
+        part_list: List[MatLike] = [cv2_utils.crop_image_only(image, rect) for image, rect in region_list]
+        analysis_key = ('ocr', threshold, merge_line_distance)
+
+        result_list: List[Optional[dict[str, MatchResultList]]] = [None] * len(part_list)
+        to_ocr_idx_list: List[int] = []
+        for idx, part in enumerate(part_list):
+            if self.analysis_cache is not None:
+                found, cache_result = self.analysis_cache.get(part, analysis_key,
+                                                              copy_result=ocr_utils.copy_ocr_result_map)
+                if found:
+                    result_list[idx] = cache_result
+                    continue
+            to_ocr_idx_list.append(idx)
+
+        model = self._get_model() if len(to_ocr_idx_list) > 0 else None
+        if model is None:  # 加载失败时 返回空结果
+            for idx in to_ocr_idx_list:
+                result_list[idx] = {}
+        else:
+            scan_result_list = model.ocr_batch([part_list[idx] for idx in to_ocr_idx_list], cls=False)
+            for idx, scan_result in zip(to_ocr_idx_list, scan_result_list):
+                result_map = self._convert_scan_result(scan_result, threshold, merge_line_distance)
+                if self.analysis_cache is not None:
+                    self.analysis_cache.put(part_list[idx], analysis_key, result_map)
+                    result_map = ocr_utils.copy_ocr_result_map(result_map)
+                result_list[idx] = result_map
+
+        log.debug('批量OCR %d个区域 实际识别%d个 耗时 %.2f', len(part_list), len(to_ocr_idx_list), time.time() - start_time)
+        return result_list
+
+    def run_ocr_single_line_batch(self, region_list: List[Tuple[MatLike, Optional[Rect]]],
+                                  threshold: float = None) -> List[str]:
+        """
+        对多个单行文本区域一起识别 不使用检测模型 所有区域按宽度排序后一起识别
+        :param region_list: [(图片, 区域)] 区域为空时使用整张图片
+        :param threshold: 匹配阈值
+        :return: 每个区域的文本
+        """
+        start_time = time.time()
+        part_list: List[MatLike] = [cv2_utils.crop_image_only(image, rect) for image, rect in region_list]
+        analysis_key = ('ocr_without_det', threshold)
+
+        result_list: List[Optional[str]] = [None] * len(part_list)
+        to_ocr_idx_list: List[int] = []
+        for idx, part in enumerate(part_list):
+            if self.analysis_cache is not None:
+                found, cache_result = self.analysis_cache.get(part, analysis_key)
+                if found:
+                    result_list[idx] = cache_result
+                    continue
+            to_ocr_idx_list.append(idx)
+
+        rec_model = self._get_rec_model() if len(to_ocr_idx_list) > 0 else None
+        if rec_model is None:  # 加载失败时 返回空结果
+            for idx in to_ocr_idx_list:
+                result_list[idx] = ''
+        else:
+            rec_res: list = rec_model([part_list[idx] for idx in to_ocr_idx_list])
+            for idx, rec_result in zip(to_ocr_idx_list, rec_res):
+                text = rec_result[0]
+                if threshold is not None and rec_result[1] < threshold:
+                    text = ''
+                if self.analysis_cache is not None:
+                    self.analysis_cache.put(part_list[idx], analysis_key, text)
+                result_list[idx] = text
+
+        log.debug('批量单行OCR结果 %s 耗时 %.2f', result_list, time.time() - start_time)
+        return result_list
+
     def _run_ocr_without_det(self, image: MatLike, threshold: float = None) -> str:
         """
         不使用检测模型分析图片内文字的分布
@@ -119,7 +305,10 @@ class OnnxOcrMatcher(OcrMatcher):
         :return: [[("text", "score"),]] 由于禁用了空格，可以直接取第一个元素
         """
         start_time = time.time()
-        scan_result: list = self._model.ocr(image, det=False, cls=False)
+        rec_model = self._get_rec_model()
+        if rec_model is None:
+            return ''
+        scan_result: list = [rec_model([image])]  # 与 ocr(det=False) 的返回格式一致
         img_result = scan_result[0]  # 取第一张图片
         if len(img_result) > 1:
             log.debug("禁检测的OCR模型返回多个识别结果")  # 目前没有出现这种情况
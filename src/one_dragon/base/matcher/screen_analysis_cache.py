@@ -0,0 +1,315 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Optional, Callable, Any, Hashable, Tuple, List
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from one_dragon.base.geometry.rectangle import Rect
+from one_dragon.utils import cv2_utils
+
+
+class _FrameEntry:
+
+    def __init__(self, frame: np.ndarray):
+        """
+        一张截图对应的缓存
+        只持有截图的弱引用 截图被回收后缓存自然失效
+        """
+        self.frame_ref: weakref.ref = weakref.ref(frame)
+        self.result_map: dict[Hashable, Any] = {}  # 分析结果
+        self.derived_map: dict[Hashable, np.ndarray] = {}  # 由截图衍生出来的图片 例如颜色过滤后的区域
+
+
+class ScreenAnalysisCache:
+
+    def __init__(self, max_frame_cnt: int = 8, enabled: bool = True):
+        """
+        以单张截图为生命周期的分析缓存
+        同一张截图的同一个区域 在相同参数下的OCR、模板匹配、颜色过滤结果只计算一次
+
+        截图的识别方式:
+        - 裁剪区域使用的是原图的视图 (numpy view) 通过 base 找到原截图 再用内存偏移量+形状区分区域
+        - 颜色过滤等衍生图片由缓存创建 会记录其来源截图和参数
+        因此要求截图在分析期间不会被原地修改
+
+        :param max_frame_cnt: 最多同时缓存多少张截图 超过时淘汰最久未使用的
+        :param enabled: 是否启用
+        """
+        self.enabled: bool = enabled
+        self.max_frame_cnt: int = max_frame_cnt
+
+        self._lock = threading.Lock()
+        self._frame_map: OrderedDict[int, _FrameEntry] = OrderedDict()  # id(截图) -> 缓存
+        self._derived_owner: dict[int, Tuple[int, Hashable]] = {}  # id(衍生图片) -> (id(截图), 衍生key)
+
+        self.hit_cnt: int = 0
+        self.miss_cnt: int = 0
+
+    def get_or_compute(self, image: MatLike, analysis_key: Hashable,
+                       compute: Callable[[], Any],
+                       copy_result: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        获取图片的分析结果 没有缓存时进行计算
+        :param image: 截图或截图中的区域
+        :param analysis_key: 分析类型及参数 例如 ('ocr', threshold)
+        :param compute: 计算方法
+        :param copy_result: 复制结果的方法 结果可能被使用方修改时需要传入
+        :return: 分析结果
+        """
+        if not self.enabled:
+            return compute()
+
+        found, result = self.get(image, analysis_key, copy_result=copy_result)
+        if found:
+            return result
+
+        # 计算时不持有锁 并发时可能重复计算 但不影响结果
+        result = compute()
+        self.put(image, analysis_key, result)
+
+        return copy_result(result) if copy_result is not None else result
+
+    def get(self, image: MatLike, analysis_key: Hashable,
+            copy_result: Optional[Callable[[Any], Any]] = None) -> Tuple[bool, Any]:
+        """
+        获取图片的分析结果 不会进行计算
+        :param image: 截图或截图中的区域
+        :param analysis_key: 分析类型及参数
+        :param copy_result: 复制结果的方法
+        :return: 是否命中缓存, 分析结果
+        """
+        if not self.enabled:
+            return False, None
+
+        with self._lock:
+            frame_key = self._get_frame_key(image)
+            if frame_key is not None:
+                entry = self._frame_map[frame_key[0]]
+                result_key = (frame_key[1], analysis_key)
+                if result_key in entry.result_map:
+                    self.hit_cnt += 1
+                    result = entry.result_map[result_key]
+                    return True, (copy_result(result) if copy_result is not None else result)
+            self.miss_cnt += 1
+            return False, None
+
+    def put(self, image: MatLike, analysis_key: Hashable, result: Any) -> None:
+        """
+        保存图片的分析结果 用于批量识别等无法使用 get_or_compute 的场景
+        :param image: 截图或截图中的区域
+        :param analysis_key: 分析类型及参数
+        :param result: 分析结果 保存后不应该再被修改
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            frame_key = self._get_frame_key(image)
+            if frame_key is None:
+                return
+            entry = self._frame_map[frame_key[0]]
+            entry.result_map[(frame_key[1], analysis_key)] = result
+
+    def crop_image(self, screen: MatLike, rect: Optional[Rect] = None) -> MatLike:
+        """
+        裁剪区域 返回的是原截图的视图 可以继续用于缓存的识别
+        :param screen: 截图
+        :param rect: 区域
+        :return:
+        """
+        return cv2_utils.crop_image_only(screen, rect)
+
+    def get_color_mask(self, image: MatLike, color_range: List[List[int]], dilate_k: int = 0) -> MatLike:
+        """
+        获取颜色范围内的掩码
+        :param image: 截图或截图中的区域
+        :param color_range: 颜色范围 [下限, 上限]
+        :param dilate_k: 膨胀的大小 0为不膨胀
+        :return: 掩码
+        """
+        def _compute():
+            mask = cv2.inRange(image,
+                               np.array(color_range[0], dtype=np.uint8),
+                               np.array(color_range[1], dtype=np.uint8))
+            return cv2_utils.dilate(mask, dilate_k)
+
+        return self._get_or_create_derived(image, ('color_mask', _to_hashable(color_range), dilate_k), _compute)
+
+    def crop_by_color_range(self, screen: MatLike, rect: Optional[Rect],
+                            color_range: Optional[List[List[int]]] = None,
+                            dilate_k: int = 0) -> MatLike:
+        """
+        裁剪区域后 只保留颜色范围内的部分
+        返回的图片会被缓存记录 继续用于OCR等识别时可以命中缓存
+        :param screen: 截图
+        :param rect: 区域
+        :param color_range: 颜色范围 [下限, 上限] 为空时只裁剪
+        :param dilate_k: 掩码膨胀的大小 0为不膨胀
+        :return:
+        """
+        part = self.crop_image(screen, rect)
+        if color_range is None:
+            return part
+
+        def _compute():
+            mask = self.get_color_mask(part, color_range, dilate_k)
+            return cv2.bitwise_and(part, part, mask=mask)
+
+        return self._get_or_create_derived(part, ('color_part', _to_hashable(color_range), dilate_k), _compute)
+
+    def _get_or_create_derived(self, image: MatLike, derived_key: Hashable,
+                               compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        获取由图片衍生出来的新图片 新图片会登记来源 以便后续识别能找到对应的缓存
+        :param image: 来源图片
+        :param derived_key: 衍生方式及参数
+        :param compute: 计算方法
+        :return:
+        """
+        if not self.enabled:
+            return compute()
+
+        with self._lock:
+            frame_key = self._get_frame_key(image)
+            if frame_key is None:
+                self.miss_cnt += 1
+                entry = None
+                full_key = None
+            else:
+                entry = self._frame_map[frame_key[0]]
+                full_key = (frame_key[1], derived_key)
+                derived = entry.derived_map.get(full_key)
+                if derived is not None:
+                    self.hit_cnt += 1
+                    return derived
+                self.miss_cnt += 1
+
+        derived = compute()
+
+        if entry is not None:
+            with self._lock:
+                existed = entry.derived_map.get(full_key)
+                if existed is not None:  # 并发时已经有其它线程计算好了
+                    return existed
+                entry.derived_map[full_key] = derived
+                self._derived_owner[id(derived)] = (frame_key[0], full_key)
+
+        return derived
+
+    def _get_frame_key(self, image: MatLike) -> Optional[Tuple[int, Hashable]]:
+        """
+        找到图片所属的截图 以及在截图中的区域标识
+        需要在持有锁时调用
+        :param image: 图片
+        :return: (id(截图), 区域标识) 无法识别时返回None
+        """
+        if not isinstance(image, np.ndarray):
+            return None
+
+        # 缓存自己创建的衍生图片
+        owner = self._derived_owner.get(id(image))
+        if owner is not None:
+            entry = self._frame_map.get(owner[0])
+            if entry is not None and entry.derived_map.get(owner[1]) is image:
+                self._frame_map.move_to_end(owner[0])
+                return owner[0], ('derived', owner[1])
+            self._derived_owner.pop(id(image), None)
+
+        root = image
+        while isinstance(root.base, np.ndarray):
+            root = root.base
+
+        frame_id = id(root)
+        entry = self._frame_map.get(frame_id)
+        if entry is None or entry.frame_ref() is not root:
+            # 没有缓存 或者 id被新的截图复用了
+            if entry is not None:
+                self._remove_frame(frame_id)
+            self._frame_map[frame_id] = _FrameEntry(root)
+            self._evict_frames()
+        else:
+            self._frame_map.move_to_end(frame_id)
+
+        offset = image.__array_interface__['data'][0] - root.__array_interface__['data'][0]
+        return frame_id, (offset, image.shape, image.strides)
+
+    def _evict_frames(self) -> None:
+        """
+        淘汰已经被回收的截图 以及超出数量的截图
+        需要在持有锁时调用
+        """
+        dead_list = [frame_id for frame_id, entry in self._frame_map.items() if entry.frame_ref() is None]
+        for frame_id in dead_list:
+            self._remove_frame(frame_id)
+
+        while len(self._frame_map) > self.max_frame_cnt:
+            frame_id = next(iter(self._frame_map))
+            self._remove_frame(frame_id)
+
+    def _remove_frame(self, frame_id: int) -> None:
+        """
+        移除一张截图的缓存
+        需要在持有锁时调用
+        """
+        entry = self._frame_map.pop(frame_id, None)
+        if entry is None:
+            return
+        for derived in entry.derived_map.values():
+            self._derived_owner.pop(id(derived), None)
+
+    def invalidate(self, screen: MatLike) -> None:
+        """
+        截图被原地修改后 需要调用这个方法清除缓存
+        :param screen: 截图
+        """
+        if not isinstance(screen, np.ndarray):
+            return
+        root = screen
+        while isinstance(root.base, np.ndarray):
+            root = root.base
+        with self._lock:
+            self._remove_frame(id(root))
+
+    def clear(self) -> None:
+        """
+        清除所有缓存
+        """
+        with self._lock:
+            self._frame_map.clear()
+            self._derived_owner.clear()
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        缓存统计
+        :return: 命中次数、未命中次数、命中率、当前缓存截图数量
+        """
+        with self._lock:
+            total = self.hit_cnt + self.miss_cnt
+            return {
+                'hit': self.hit_cnt,
+                'miss': self.miss_cnt,
+                'hit_rate': self.hit_cnt / total if total > 0 else 0,
+                'frame_cnt': len(self._frame_map),
+            }
+
+    def reset_stats(self) -> None:
+        """
+        重置统计
+        """
+        with self._lock:
+            self.hit_cnt = 0
+            self.miss_cnt = 0
+
+
+def _to_hashable(value: Any) -> Hashable:
+    """
+    将列表等参数转化成可以作为key的元组
+    """
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_to_hashable(i) for i in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
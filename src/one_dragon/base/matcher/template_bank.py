@@ -0,0 +1,187 @@
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from typing import List, Optional, Tuple
+
+from one_dragon.base.matcher.match_result import MatchResult
+from one_dragon.base.screen.template_info import TemplateInfo
+from one_dragon.utils import cv2_utils
+
+
+class TemplateBank:
+
+    def __init__(self, template_list: List[TemplateInfo],
+                 template_type: str = 'raw',
+                 max_pyramid_level: int = 2,
+                 min_coarse_size: int = 8):
+        """
+        同一类模板的集合 例如所有角色的头像
+        尺寸和掩码相同的模板会缩小后叠放成一个矩阵 一次矩阵乘法就能得到原图和所有模板的粗略匹配度
+        再只对匹配度最高的几个模板 在原图中精确匹配
+
+        尺寸或掩码与第一个模板不同的模板 无法叠放 每次都会单独精确匹配
+        :param template_list: 模板列表
+        :param template_type: 模板类型
+        :param max_pyramid_level: 粗略匹配时最多缩小的层数 每层缩小一半
+        :param min_coarse_size: 缩小后模板短边的最小值
+        """
+        self.template_list: List[TemplateInfo] = template_list
+        self.template_type: str = template_type
+
+        self.stacked_idx_list: List[int] = []  # 叠放在矩阵中的模板下标
+        self.extra_idx_list: List[int] = []  # 无法叠放的模板下标
+
+        self.pyramid_level: int = 0
+        self.template_width: int = 0
+        self.template_height: int = 0
+        self._coarse_mask: Optional[np.ndarray] = None  # 缩小后的掩码 bool
+        self._coarse_width: int = 0
+        self._coarse_height: int = 0
+        self._template_matrix: Optional[np.ndarray] = None  # (掩码内的像素*通道, 模板数量) 每列都减去均值并归一化
+
+        if len(template_list) == 0:
+            return
+
+        first_image = template_list[0].get_image(template_type)
+        first_mask = template_list[0].mask
+        for idx, template in enumerate(template_list):
+            image = template.get_image(template_type)
+            if image is None:
+                continue
+            if image.shape != first_image.shape:
+                self.extra_idx_list.append(idx)
+            elif (template.mask is None) != (first_mask is None):
+                self.extra_idx_list.append(idx)
+            elif template.mask is not None and not np.array_equal(template.mask, first_mask):
+                self.extra_idx_list.append(idx)
+            else:
+                self.stacked_idx_list.append(idx)
+
+        self.template_height, self.template_width = first_image.shape[0], first_image.shape[1]
+        level = max_pyramid_level
+        while level > 0 and min(self.template_width, self.template_height) // (2 ** level) < min_coarse_size:
+            level -= 1
+        self.pyramid_level = level
+
+        self._init_template_matrix()
+
+    def _init_template_matrix(self) -> None:
+        """
+        将可叠放的模板 缩小后转化为矩阵
+        """
+        if len(self.stacked_idx_list) == 0:
+            return
+
+        column_list: List[np.ndarray] = []
+        for idx in self.stacked_idx_list:
+            template = self.template_list[idx]
+            if self.pyramid_level > 0:
+                small_template, small_mask = template.get_pyramid(self.template_type, self.pyramid_level)
+            else:
+                small_template, small_mask = template.get_image(self.template_type), template.mask
+
+            if self._coarse_mask is None:
+                self._coarse_height, self._coarse_width = small_template.shape[0], small_template.shape[1]
+                if small_mask is None:
+                    self._coarse_mask = np.ones((self._coarse_height, self._coarse_width), dtype=bool)
+                else:
+                    self._coarse_mask = small_mask > 0
+
+            column_list.append(_normalize_vectors(small_template[self._coarse_mask][np.newaxis, ...]).ravel())
+
+        self._template_matrix = np.stack(column_list, axis=1)
+
+    def coarse_scores(self, source: MatLike) -> np.ndarray:
+        """
+        原图与可叠放模板的粗略匹配度 为所有位置中的最大值
+        :param source: 原图
+        :return: 按 stacked_idx_list 顺序的匹配度
+        """
+        if self._template_matrix is None:
+            return np.zeros(0, dtype=np.float32)
+
+        if self.pyramid_level > 0:
+            scale = 2 ** self.pyramid_level
+            small_source = cv2.resize(source, (source.shape[1] // scale, source.shape[0] // scale),
+                                      interpolation=cv2.INTER_AREA)
+        else:
+            small_source = source
+
+        if small_source.shape[0] < self._coarse_height or small_source.shape[1] < self._coarse_width:
+            return np.full(len(self.stacked_idx_list), -1, dtype=np.float32)
+
+        # (位置y, 位置x, 模板高, 模板宽, 通道) -> (位置, 掩码内的像素, 通道)
+        window_shape = (self._coarse_height, self._coarse_width) + small_source.shape[2:]
+        windows = np.lib.stride_tricks.sliding_window_view(small_source, window_shape)
+        windows = windows.reshape((-1,) + window_shape)
+        patches = windows[:, self._coarse_mask]
+
+        scores = _normalize_vectors(patches) @ self._template_matrix  # (位置, 模板)
+        return scores.max(axis=0)
+
+    def match(self, source: MatLike, threshold: float,
+              candidate_cnt: int = 3,
+              coarse_threshold_diff: float = 0.3,
+              top_n: int = 1) -> List[Tuple[int, MatchResult]]:
+        """
+        在原图中匹配所有模板
+        :param source: 原图
+        :param threshold: 匹配阈值
+        :param candidate_cnt: 粗略匹配后 最多精确匹配多少个模板
+        :param coarse_threshold_diff: 粗略匹配的阈值比 threshold 低这个值
+        :param top_n: 最多返回多少个结果
+        :return: 按匹配度从高到低排列的 (模板下标, 匹配结果)
+        """
+        to_verify_list: List[int] = []
+
+        scores = self.coarse_scores(source)
+        if len(scores) > 0:
+            # 明显比最高匹配度差的模板 不需要精确匹配
+            coarse_threshold = max(threshold - coarse_threshold_diff, float(np.max(scores)) - coarse_threshold_diff / 2)
+            for i in np.argsort(-scores, kind='stable')[:candidate_cnt]:
+                if scores[i] < coarse_threshold:
+                    break
+                to_verify_list.append(self.stacked_idx_list[i])
+
+        to_verify_list.extend(self.extra_idx_list)
+
+        result_list: List[Tuple[int, MatchResult]] = []
+        for idx in to_verify_list:
+            mr = self._match_one(source, idx, threshold)
+            if mr is not None:
+                result_list.append((idx, mr))
+
+        result_list.sort(key=lambda i: i[1].confidence, reverse=True)
+        return result_list[:top_n]
+
+    def _match_one(self, source: MatLike, idx: int, threshold: float) -> Optional[MatchResult]:
+        """
+        在原图中精确匹配一个模板
+        :param source: 原图
+        :param idx: 模板下标
+        :param threshold: 匹配阈值
+        :return: 最好的匹配结果
+        """
+        template = self.template_list[idx]
+        image = template.get_image(self.template_type)
+        if image is None:
+            return None
+        small_template, small_mask = template.get_pyramid(self.template_type, 1)
+        mrl = cv2_utils.match_template_coarse_to_fine(source, image, threshold, mask=template.mask,
+                                                      only_best=True, ignore_inf=True, pyramid_level=1,
+                                                      small_template=small_template, small_mask=small_mask)
+        return mrl.max
+
+
+def _normalize_vectors(pixels: np.ndarray) -> np.ndarray:
+    """
+    每个向量的每个通道减去均值 再整体归一化 与 TM_CCOEFF_NORMED 的计算方式一致
+    :param pixels: (向量数量, 像素数量, 通道) 或 (向量数量, 像素数量)
+    :return: (向量数量, 像素数量*通道)
+    """
+    pixels = pixels.astype(np.float32)
+    pixels -= pixels.mean(axis=1, keepdims=True)
+    vectors = pixels.reshape(pixels.shape[0], -1)
+    norm = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norm[norm == 0] = 1
+    return vectors / norm
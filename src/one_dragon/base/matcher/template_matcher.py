@@ -1,8 +1,13 @@
+import threading
+from collections import OrderedDict
+
 import cv2
 from cv2.typing import MatLike
-from typing import Optional
+from typing import Optional, List, Tuple
 
 from one_dragon.base.matcher.match_result import MatchResultList, MatchResult
+from one_dragon.base.matcher.screen_analysis_cache import ScreenAnalysisCache
+from one_dragon.base.matcher.template_bank import TemplateBank
 from one_dragon.base.screen.template_info import TemplateInfo
 from one_dragon.base.screen.template_loader import TemplateLoader
 from one_dragon.utils import cv2_utils
@@ -11,8 +16,15 @@ from one_dragon.utils.log_utils import log
 
 class TemplateMatcher:
 
-    def __init__(self, template_loader: TemplateLoader):
+    MAX_TEMPLATE_BANK_CNT: int = 32  # 最多保存的模板集合数量 按最近使用淘汰
+
+    def __init__(self, template_loader: TemplateLoader,
+                 analysis_cache: Optional[ScreenAnalysisCache] = None):
         self.template_loader: TemplateLoader = template_loader
+        self.analysis_cache: Optional[ScreenAnalysisCache] = analysis_cache  # 截图分析缓存 同一张截图的相同区域只匹配一次
+        # 模板集合 按使用时间排序 最近使用的在最后 value为(集合, 创建或检查时模板缓存的 remove_version)
+        self._template_bank_map: OrderedDict[Tuple[str, Tuple[str, ...], str], Tuple[TemplateBank, int]] = OrderedDict()
+        self._template_bank_lock = threading.Lock()
 
     def match_template(self, source: MatLike,
                        template_sub_dir: str,
@@ -22,7 +34,8 @@ class TemplateMatcher:
                        mask: MatLike = None,
                        ignore_template_mask: bool = False,
                        only_best: bool = True,
-                       ignore_inf: bool = True) -> MatchResultList:
+                       ignore_inf: bool = True,
+                       pyramid_level: int = 0) -> MatchResultList:
         """
         在原图中 匹配模板 如果模板图中有掩码图 会自动使用
         :param source: 原图
@@ -34,8 +47,35 @@ class TemplateMatcher:
         :param ignore_template_mask: 是否忽略模板自身的掩码
         :param only_best: 只返回最好的结果
         :param ignore_inf: 是否忽略无限大的结果
+        :param pyramid_level: 大于0时使用金字塔匹配 先在缩小的图中粗略匹配 再在候选位置附近精确匹配 适合原图比模板大很多的情况
         :return: 所有匹配结果
         """
+        if self.analysis_cache is None or mask is not None:  # 额外的掩码无法作为缓存key
+            return self._match_template(source, template_sub_dir, template_id, template_type, threshold,
+                                        mask, ignore_template_mask, only_best, ignore_inf, pyramid_level)
+
+        return self.analysis_cache.get_or_compute(
+            source,
+            ('template', template_sub_dir, template_id, template_type, threshold,
+             ignore_template_mask, only_best, ignore_inf, pyramid_level),
+            lambda: self._match_template(source, template_sub_dir, template_id, template_type, threshold,
+                                         mask, ignore_template_mask, only_best, ignore_inf, pyramid_level),
+            copy_result=MatchResultList.copy
+        )
+
+    def _match_template(self, source: MatLike,
+                        template_sub_dir: str,
+                        template_id: str,
+                        template_type: str = 'raw',
+                        threshold: float = 0.5,
+                        mask: MatLike = None,
+                        ignore_template_mask: bool = False,
+                        only_best: bool = True,
+                        ignore_inf: bool = True,
+                        pyramid_level: int = 0) -> MatchResultList:
+        """
+        在原图中 匹配模板 不经过缓存 参数同 match_template
+        """
         template: TemplateInfo = self.template_loader.get_template(template_sub_dir, template_id)
         if template is None:
             log.error('未加载模板 %s' % template_id)
@@ -46,9 +86,106 @@ class TemplateMatcher:
             mask_usage = cv2.bitwise_or(mask_usage, template.mask) if mask_usage is not None else template.mask
         if mask is not None:
             mask_usage = cv2.bitwise_or(mask_usage, mask) if mask_usage is not None else mask
+        if pyramid_level > 0:
+            if mask is None:  # 只使用模板自身掩码时 可以使用缓存的缩小模板
+                small_template, small_mask = template.get_pyramid(template_type, pyramid_level,
+                                                                  with_mask=not ignore_template_mask)
+            else:
+                small_template, small_mask = None, None
+            return cv2_utils.match_template_coarse_to_fine(source, template.get_image(template_type), threshold,
+                                                           mask=mask_usage, only_best=only_best, ignore_inf=ignore_inf,
+                                                           pyramid_level=pyramid_level,
+                                                           small_template=small_template, small_mask=small_mask)
+
         return cv2_utils.match_template(source, template.get_image(template_type), threshold, mask=mask_usage,
                                         only_best=only_best, ignore_inf=ignore_inf)
 
+    def get_template_bank(self, template_sub_dir: str, template_id_list: List[str],
+                          template_type: str = 'raw') -> TemplateBank:
+        """
+        获取一组模板的集合 创建后保存在内存
+        集合会持有模板 模板缓存淘汰了其中的模板后 集合也一起丢弃 下次使用时重新创建 避免缓存淘汰不生效
+        :param template_sub_dir: 模板的子文件夹
+        :param template_id_list: 模板id列表
+        :param template_type: 模板类型
+        :return:
+        """
+        key = (template_sub_dir, tuple(template_id_list), template_type)
+        with self._template_bank_lock:
+            bank = self._get_cached_template_bank(key)
+        if bank is not None:
+            return bank
+
+        remove_version = self.template_loader.remove_version
+        template_list: List[TemplateInfo] = []
+        for template_id in template_id_list:
+            template = self.template_loader.get_template(template_sub_dir, template_id)
+            if template is None:
+                log.error('未加载模板 %s' % template_id)
+                continue
+            template_list.append(template)
+
+        bank = TemplateBank(template_list, template_type=template_type)
+        with self._template_bank_lock:
+            self._template_bank_map[key] = (bank, remove_version)
+            self._template_bank_map.move_to_end(key)
+            while len(self._template_bank_map) > TemplateMatcher.MAX_TEMPLATE_BANK_CNT:
+                self._template_bank_map.popitem(last=False)
+        return bank
+
+    def _get_cached_template_bank(self, key: Tuple[str, Tuple[str, ...], str]) -> Optional[TemplateBank]:
+        """
+        获取已经创建的模板集合 其中的模板已经不在模板缓存中时丢弃 需要在锁内调用
+        :param key: 集合的key
+        :return:
+        """
+        item = self._template_bank_map.get(key)
+        if item is None:
+            return None
+
+        bank, remove_version = item
+        current_version = self.template_loader.remove_version
+        if remove_version != current_version:  # 模板缓存有淘汰时 才检查集合中的模板
+            if not all(self.template_loader.is_template_cached(i) for i in bank.template_list):
+                self._template_bank_map.pop(key)
+                return None
+            self._template_bank_map[key] = (bank, current_version)
+
+        self._template_bank_map.move_to_end(key)
+        return bank
+
+    def match_template_bank(self, source: MatLike,
+                            template_sub_dir: str,
+                            template_id_list: List[str],
+                            template_type: str = 'raw',
+                            threshold: float = 0.5,
+                            top_n: int = 1) -> List[Tuple[str, MatchResult]]:
+        """
+        在原图中 一次性匹配一组模板 返回匹配度最高的几个
+        适用于同一类的模板 例如所有角色的头像 比逐个调用 match_template 快很多
+        :param source: 原图
+        :param template_sub_dir: 模板的子文件夹
+        :param template_id_list: 模板id列表
+        :param template_type: 模板类型
+        :param threshold: 匹配阈值
+        :param top_n: 最多返回多少个结果
+        :return: 按匹配度从高到低排列的 (模板id, 匹配结果)
+        """
+        def _match() -> List[Tuple[str, MatchResult]]:
+            bank = self.get_template_bank(template_sub_dir, template_id_list, template_type)
+            return [(bank.template_list[idx].template_id, mr)
+                    for idx, mr in bank.match(source, threshold, top_n=top_n)]
+
+        if self.analysis_cache is None:
+            return _match()
+
+        return self.analysis_cache.get_or_compute(
+            source,
+            ('template_bank', template_sub_dir, tuple(template_id_list), template_type, threshold, top_n),
+            _match,
+            copy_result=lambda result: [(template_id, mr.copy()) for template_id, mr in result]
+        )
+
     def match_one_by_feature(self, source: MatLike,
                              template_sub_dir: str,
                              template_id: str,
@@ -119,5 +119,5 @@ class Application(Operation):
         初始化
         """
         if self.need_ocr:
-            self.ctx.ocr.init_model()
+            self.ctx.ocr.start_init_model()  # 不等待 第一次使用OCR时只等待需要的模型
         return True
@@ -1,8 +1,13 @@
+import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor, Future
 
-from typing import Callable, Any, List
+import threading
+from enum import Enum
+from typing import Callable, Any, List, Deque, Optional, Tuple
 
 from one_dragon.utils import thread_utils
+from one_dragon.utils.log_utils import log
 
 _od_event_bus_executor = ThreadPoolExecutor(thread_name_prefix='od_event_bus', max_workers=32)
 
@@ -12,12 +17,137 @@ class ContextEventItem:
     def __init__(self, event_id: str, data: Any):
         self.event_id: str = event_id
         self.data: Any = data
+        self.dispatch_time: float = time.perf_counter()  # 下发的时间
+
+
+class ContextEventDispatchModeEnum(Enum):
+
+    POOL: str = 'pool'  # 每个事件都提交到线程池 不保证顺序
+    QUEUE: str = 'queue'  # 每个监听者一个有界队列 按下发顺序逐个回调
+
+
+class _QueuedEventListener:
+
+    def __init__(self, callback: Callable[[ContextEventItem], None],
+                 max_queue_size: int = 64):
+        """
+        使用队列方式的一个监听者
+        同一个回调以队列方式监听多个事件时 共用一个队列 回调按下发的顺序执行 同一时间只有一个线程在执行这个回调
+        队列满时丢弃最旧的事件 不阻塞下发事件的线程
+        :param callback: 回调
+        :param max_queue_size: 队列最多保存的事件数量
+        """
+        self.callback: Callable[[ContextEventItem], None] = callback
+        self.max_queue_size: int = max(1, max_queue_size)
+
+        self._queue: Deque[ContextEventItem] = deque()
+        self._lock = threading.Lock()
+        self._draining: bool = False  # 是否已经有线程在处理队列
+        self._closed: bool = False
+
+        # 统计
+        self.dispatch_cnt: int = 0  # 收到的事件数量
+        self.deliver_cnt: int = 0  # 执行回调的数量
+        self.drop_cnt: int = 0  # 队列满丢弃的数量
+        self.coalesce_cnt: int = 0  # 被合并的数量
+        self.max_queue_depth: int = 0  # 队列的最大长度
+        self.total_latency: float = 0  # 从下发到开始回调的总耗时
+        self.max_latency: float = 0  # 从下发到开始回调的最大耗时
+
+    def put(self, item: ContextEventItem, coalesce: bool = False) -> None:
+        """
+        放入一个事件 需要的话提交处理队列的任务
+        :param item: 事件
+        :param coalesce: 是否合并事件 是的话同一个事件ID只保留最新未处理的一个 适合只关心最新值的高频事件
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self.dispatch_cnt += 1
+
+            if coalesce:
+                for idx, existed in enumerate(self._queue):
+                    if existed.event_id == item.event_id:
+                        # 保留原来的位置 保证不同事件之间的顺序
+                        self._queue[idx] = item
+                        self.coalesce_cnt += 1
+                        return
+
+            if len(self._queue) >= self.max_queue_size:
+                self._queue.popleft()
+                self.drop_cnt += 1
+
+            self._queue.append(item)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+
+            if self._draining:
+                return
+            self._draining = True
+
+        future: Future = _od_event_bus_executor.submit(self._drain)
+        future.add_done_callback(thread_utils.handle_future_result)
+
+    def _drain(self) -> None:
+        """
+        按顺序处理队列中的事件 直到队列为空
+        关闭后仍会处理完已经在队列中的事件
+        """
+        while True:
+            with self._lock:
+                if len(self._queue) == 0:
+                    self._draining = False
+                    return
+                item = self._queue.popleft()
+                latency = time.perf_counter() - item.dispatch_time
+                self.deliver_cnt += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+            try:
+                self.callback(item)
+            except Exception:
+                log.error('事件回调失败 %s', item.event_id, exc_info=True)
+
+    def close(self) -> None:
+        """
+        不再接收新的事件 已经在队列中的事件仍会按顺序回调
+        例如运行结束时下发的状态事件 在解除监听后仍需要送达
+        """
+        with self._lock:
+            self._closed = True
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        当前队列中的事件数量
+        """
+        with self._lock:
+            return len(self._queue)
+
+    def get_metrics(self) -> dict:
+        """
+        :return: 队列的统计 耗时单位为毫秒
+        """
+        with self._lock:
+            return {
+                'callback': getattr(self.callback, '__qualname__', str(self.callback)),
+                'dispatch_cnt': self.dispatch_cnt,
+                'deliver_cnt': self.deliver_cnt,
+                'drop_cnt': self.drop_cnt,
+                'coalesce_cnt': self.coalesce_cnt,
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self.max_queue_depth,
+                'avg_latency_ms': self.total_latency * 1000 / self.deliver_cnt if self.deliver_cnt > 0 else 0,
+                'max_latency_ms': self.max_latency * 1000,
+            }
 
 
 class ContextEventBus:
 
     def __init__(self):
         self.callbacks: dict[str, List[Callable[[Any], None]]] = {}
+        self._queued_listeners: dict[Callable, _QueuedEventListener] = {}  # 使用队列方式的监听者 key为回调 多个事件共用
+        self._queued_events: dict[Tuple[str, Callable], bool] = {}  # 使用队列方式的 (事件ID, 回调) value为是否合并
 
     def dispatch_event(self, event_id: str, event_obj: Any = None):
         """
@@ -28,21 +158,43 @@ class ContextEventBus:
         """
         if event_id not in self.callbacks:
             return
-        for callback in self.callbacks[event_id]:
-            future: Future = _od_event_bus_executor.submit(callback, ContextEventItem(event_id, event_obj))
+        item = ContextEventItem(event_id, event_obj)
+        # 复制一份 避免下发时其他线程增减监听
+        for callback in list(self.callbacks[event_id]):
+            coalesce = self._queued_events.get((event_id, callback))
+            listener = None if coalesce is None else self._queued_listeners.get(callback)
+            if listener is not None:
+                listener.put(item, coalesce=coalesce)
+                continue
+            future: Future = _od_event_bus_executor.submit(callback, item)
             future.add_done_callback(thread_utils.handle_future_result)
 
-    def listen_event(self, event_id: str, callback: Callable[[ContextEventItem], None]):
+    def listen_event(self, event_id: str, callback: Callable[[ContextEventItem], None],
+                     mode: ContextEventDispatchModeEnum = ContextEventDispatchModeEnum.POOL,
+                     max_queue_size: int = 64,
+                     coalesce: bool = False):
         """
         新增监听事件
         监听的回调，如果耗时过长，应该在自己的线程池的工作，避免阻塞
         :param event_id:
         :param callback:
+        :param mode: 下发方式 只对这个事件生效 POOL 每个事件都提交到线程池; QUEUE 每个监听者一个有界队列 按顺序回调
+        :param max_queue_size: QUEUE 方式下 队列最多保存的事件数量 满了丢弃最旧的 同一个回调以第一次创建队列时的为准
+        :param coalesce: QUEUE 方式下 这个事件是否只保留最新未处理的一个
         :return:
         """
         if event_id not in self.callbacks:
             self.callbacks[event_id] = []
         existed_callbacks = self.callbacks[event_id]
+
+        if mode == ContextEventDispatchModeEnum.QUEUE:
+            if callback not in self._queued_listeners:
+                self._queued_listeners[callback] = _QueuedEventListener(callback, max_queue_size=max_queue_size)
+            self._queued_events[(event_id, callback)] = coalesce
+        else:
+            self._queued_events.pop((event_id, callback), None)
+            self._close_unused_listener(callback)
+
         if callback not in existed_callbacks:
             existed_callbacks.append(callback)
 
@@ -56,6 +208,8 @@ class ContextEventBus:
         if event_id not in self.callbacks:
             return
         self.callbacks[event_id].remove(callback)
+        self._queued_events.pop((event_id, callback), None)
+        self._close_unused_listener(callback)
 
     def unlisten_all_event(self, obj: Any):
         """
@@ -73,3 +227,39 @@ class ContextEventBus:
         for key, removes in to_remove.items():
             for remove in removes:
                 self.callbacks[key].remove(remove)
+                self._queued_events.pop((key, remove), None)
+                self._close_unused_listener(remove)
+
+    def _close_unused_listener(self, callback: Callable[[Any], None]) -> None:
+        """
+        回调已经没有以队列方式监听任何事件时 关闭它的队列 已经在队列中的事件仍会送达
+        :param callback: 回调
+        """
+        listener = self._queued_listeners.get(callback)
+        if listener is None:
+            return
+        for _, existed_callback in self._queued_events:
+            if existed_callback == callback:
+                return
+        listener.close()
+        self._queued_listeners.pop(callback, None)
+
+    def get_event_metrics(self) -> List[dict]:
+        """
+        :return: 使用队列方式的监听者的统计
+        """
+        return [i.get_metrics() for i in list(self._queued_listeners.values())]
+
+    def log_event_metrics(self, listener: Optional[Callable[[Any], None]] = None) -> None:
+        """
+        输出队列方式监听者的统计
+        :param listener: 只输出这个回调的 为空时输出全部
+        """
+        for callback, queued in list(self._queued_listeners.items()):
+            if listener is not None and callback != listener:
+                continue
+            metrics = queued.get_metrics()
+            log.debug('事件监听 %s 收到 %d 回调 %d 丢弃 %d 合并 %d 队列最大 %d 平均延迟 %.2fms 最大延迟 %.2fms',
+                      metrics['callback'], metrics['dispatch_cnt'], metrics['deliver_cnt'],
+                      metrics['drop_cnt'], metrics['coalesce_cnt'], metrics['max_queue_depth'],
+                      metrics['avg_latency_ms'], metrics['max_latency_ms'])
@@ -1,5 +1,4 @@
 import time
-from concurrent.futures import ThreadPoolExecutor
 
 import logging
 from enum import Enum
@@ -12,18 +11,17 @@ from one_dragon.base.controller.controller_base import ControllerBase
 from one_dragon.base.controller.pc_button.pc_button_listener import PcButtonListener
 from one_dragon.base.matcher.ocr.ocr_matcher import OcrMatcher
 from one_dragon.base.matcher.ocr.onnx_ocr_matcher import OnnxOcrMatcher
+from one_dragon.base.matcher.screen_analysis_cache import ScreenAnalysisCache
 from one_dragon.base.matcher.template_matcher import TemplateMatcher
 from one_dragon.base.operation.context_event_bus import ContextEventBus
 from one_dragon.base.operation.one_dragon_env_context import OneDragonEnvContext
+from one_dragon.base.operation.startup_loader import StartupLoader
 from one_dragon.base.screen.screen_loader import ScreenContext
 from one_dragon.base.screen.template_loader import TemplateLoader
 from one_dragon.utils import debug_utils, log_utils
-from one_dragon.utils import thread_utils
 from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
 
-_one_dragon_context_executor = ThreadPoolExecutor(thread_name_prefix='one_dragon_context', max_workers=1)
-
 
 class ContextRunStateEnum(Enum):
 
@@ -71,9 +69,11 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext):
 
         self.screen_loader: ScreenContext = ScreenContext()
         self.template_loader: TemplateLoader = TemplateLoader()
-        self.tm: TemplateMatcher = TemplateMatcher(self.template_loader)
-        self.ocr: OcrMatcher = OnnxOcrMatcher()
+        self.analysis_cache: ScreenAnalysisCache = ScreenAnalysisCache()
+        self.tm: TemplateMatcher = TemplateMatcher(self.template_loader, self.analysis_cache)
+        self.ocr: OcrMatcher = OnnxOcrMatcher(self.analysis_cache)
         self.controller: ControllerBase = controller
+        self.startup_loader: StartupLoader = StartupLoader()
 
         self.keyboard_controller = keyboard.Controller()
         self.mouse_controller = mouse.Controller()
@@ -107,6 +107,8 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext):
             self.switch_context_pause_and_run()
         self.context_running_state = ContextRunStateEnum.STOP
         log.info('停止运行')
+        self.template_loader.log_stats()
+        self.screen_loader.save_screen_transition()
         self.dispatch_event(ContextRunningStateEventEnum.STOP_RUNNING.value, self.context_running_state)
 
     @property
@@ -211,11 +213,20 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext):
 
     def async_init_ocr(self) -> None:
         """
-        异步初始化OCR
+        异步初始化OCR 检测模型和识别模型会分别并行加载
+        :return:
+        """
+        self.ocr.start_init_model()
+
+    def async_preload(self) -> None:
+        """
+        启动时在后台并行加载各项资源
+        使用方不需要等待全部加载完成 OCR等在第一次使用时只会等待自己需要的模型
+        子类可以继续添加需要预先加载的内容
         :return:
         """
-        f = _one_dragon_context_executor.submit(self.ocr.init_model)
-        f.add_done_callback(thread_utils.handle_future_result)
+        self.async_init_ocr()
+        self.startup_loader.submit('template', self.template_loader.preload_all)
 
 
 def __debug_async_init_ocr():
@@ -1,6 +1,5 @@
 import time
 
-import cv2
 import difflib
 import inspect
 from cv2.typing import MatLike
@@ -16,7 +15,7 @@ from one_dragon.base.operation.operation_round_result import OperationRoundResul
 from one_dragon.base.screen import screen_utils
 from one_dragon.base.screen.screen_area import ScreenArea
 from one_dragon.base.screen.screen_utils import OcrClickResultEnum, FindAreaResultEnum
-from one_dragon.utils import debug_utils, cv2_utils, str_utils
+from one_dragon.utils import debug_utils, str_utils
 from one_dragon.utils.i18_utils import coalesce_gt, gt
 from one_dragon.utils.log_utils import log
 
@@ -24,6 +23,7 @@ from one_dragon.utils.log_utils import log
 class Operation(OperationBase):
     STATUS_TIMEOUT: ClassVar[str] = '执行超时'
     STATUS_SCREEN_UNKNOWN: ClassVar[str] = '未能识别当前画面'
+    SCREEN_TRANSITION_POLL_INTERVAL: ClassVar[float] = 0.1  # 点击跳转后 识别是否到达目标画面的间隔秒数
 
     def __init__(self, ctx: OneDragonContext,
                  node_max_retry_times: int = 3,
@@ -736,12 +736,9 @@ class Operation(OperationBase):
         :param color_range: 文本匹配的颜色范围
         :return: 点击结果
         """
-        to_ocr_part = screen if area is None else cv2_utils.crop_image_only(screen, area.rect)
-        if color_range is not None:
-            mask = cv2.inRange(to_ocr_part, color_range[0], color_range[1])
-            mask = cv2_utils.dilate(mask, 5)
-            to_ocr_part = cv2.bitwise_and(to_ocr_part, to_ocr_part, mask=mask)
-            # cv2_utils.show_image(to_ocr_part, win_name='round_by_ocr_and_click', wait=0)
+        to_ocr_part = self.ctx.analysis_cache.crop_by_color_range(screen, None if area is None else area.rect,
+                                                                  color_range, dilate_k=5)
+        # cv2_utils.show_image(to_ocr_part, win_name='round_by_ocr_and_click', wait=0)
 
         ocr_result_map = self.ctx.ocr.run_ocr(to_ocr_part)
 
@@ -755,7 +752,8 @@ class Operation(OperationBase):
             ocr_result_list.append(ocr_result)
             mrl_list.append(mrl)
 
-        results = difflib.get_close_matches(gt(target_cn), ocr_result_list, n=1)
+        target_word = gt(target_cn)
+        results = difflib.get_close_matches(target_word, ocr_result_list, n=1)
         if results is None or len(results) == 0:
             return self.round_retry(f'找不到 {target_cn}', wait=retry_wait, wait_round_time=retry_wait_round)
 
@@ -763,7 +761,7 @@ class Operation(OperationBase):
             idx = ocr_result_list.index(result)
             ocr_result = ocr_result_list[idx]
             mrl = mrl_list[idx]
-            if str_utils.find_by_lcs(gt(target_cn), ocr_result, percent=lcs_percent):
+            if str_utils.find_by_lcs(target_word, ocr_result, percent=lcs_percent):
                 to_click = mrl.max.center
                 break
 
@@ -824,6 +822,7 @@ class Operation(OperationBase):
 
         current_screen_name = screen_utils.get_match_screen_name(self.ctx, screen)
         self.ctx.screen_loader.update_current_screen_name(current_screen_name)
+        self.ctx.screen_loader.finish_screen_transition(current_screen_name)
         if current_screen_name is None:
             return self.round_retry(Operation.STATUS_SCREEN_UNKNOWN, wait=retry_wait, wait_round_time=retry_wait_round)
         log.debug(f'当前识别画面 {current_screen_name}')
@@ -834,13 +833,46 @@ class Operation(OperationBase):
         if route is None or not route.can_go:
             return self.round_fail(f'无法从 {current_screen_name} 前往 {screen_name}')
 
-        result = self.round_by_find_and_click_area(screen, current_screen_name, route.node_list[0].from_area)
+        next_node = route.node_list[0]
+        result = self.round_by_find_and_click_area(screen, current_screen_name, next_node.from_area)
         if result.is_success:
-            self.ctx.screen_loader.update_current_screen_name(route.node_list[0].to_screen)
-            return self.round_wait(result.status, wait=retry_wait, wait_round_time=retry_wait_round)
+            # 记录跳转耗时 用于之后选择最快的路径
+            self.ctx.screen_loader.start_screen_transition(current_screen_name, next_node.from_area, next_node.to_screen)
+            self.ctx.screen_loader.update_current_screen_name(next_node.to_screen)
+            wait = self._wait_screen_transition(next_node.to_screen, retry_wait, retry_wait_round)
+            return self.round_wait(result.status, wait=wait)
         else:
             return self.round_retry(result.status, wait=retry_wait, wait_round_time=retry_wait_round)
 
+    def _wait_screen_transition(self, to_screen: str,
+                                wait: Optional[float] = None, wait_round_time: Optional[float] = None) -> float:
+        """
+        点击跳转后 在原本需要等待的时间内 间隔截图判断是否到达目标画面 尽早发现到达并记录跳转耗时
+        只判断目标画面的标识区域 不识别全部画面 暂停后不再判断
+        只等待原本的时间 到达后仍然等到原本的时间再进行下一轮 不改变原来的节奏
+        :param to_screen: 目标画面
+        :param wait: 等待秒数
+        :param wait_round_time: 等待当前轮的运行时间到达这个时间时再结束 有wait时不生效
+        :return: 剩余需要等待的秒数
+        """
+        if wait is not None and wait > 0:
+            end_time = time.time() + wait
+        elif wait_round_time is not None and wait_round_time > 0:
+            end_time = self.round_start_time + wait_round_time
+        else:
+            return 0
+
+        while self.ctx.is_context_running:
+            to_wait = end_time - time.time()
+            if to_wait <= Operation.SCREEN_TRANSITION_POLL_INTERVAL:
+                return to_wait
+            time.sleep(Operation.SCREEN_TRANSITION_POLL_INTERVAL)
+            if screen_utils.is_target_screen(self.ctx, self.screenshot(), screen_name=to_screen):
+                self.ctx.screen_loader.finish_screen_transition(to_screen)
+                return end_time - time.time()
+
+        return max(0.0, end_time - time.time())
+
     def update_screen_after_operation(self, screen_name: str, area_name: str) -> None:
         """
         点击某个区域后 尝试更新当前画面
@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import threading
+from typing import Callable, Any, Optional
+
+from one_dragon.utils import thread_utils
+from one_dragon.utils.log_utils import log
+
+_startup_loader_executor = ThreadPoolExecutor(thread_name_prefix='od_startup_loader', max_workers=4)
+
+
+class StartupLoadTask:
+
+    def __init__(self, name: str, future: Future):
+        """
+        一个后台加载任务
+        :param name: 任务名称
+        :param future: 加载结果
+        """
+        self.name: str = name
+        self.future: Future = future
+        self.start_time: float = 0  # 开始加载的时间 0为还没有开始
+        self.end_time: float = 0  # 加载完成的时间 0为还没有完成
+
+    @property
+    def load_seconds(self) -> float:
+        """
+        加载耗时 未完成时为已经使用的时间
+        """
+        if self.start_time == 0:
+            return 0
+        end_time = self.end_time if self.end_time > 0 else time.time()
+        return end_time - self.start_time
+
+
+class StartupLoader:
+
+    def __init__(self):
+        """
+        启动时的后台加载
+        各项资源(模型、模板等)在后台并行加载 使用方只等待自己需要的那一项
+        """
+        self._lock = threading.Lock()
+        self._task_map: dict[str, StartupLoadTask] = {}
+
+    def submit(self, name: str, load_func: Callable[[], Any]) -> Future:
+        """
+        提交一个加载任务 同名任务正在加载或已经加载成功时不会重复提交
+        :param name: 任务名称
+        :param load_func: 加载方法
+        :return: 加载结果
+        """
+        with self._lock:
+            task = self._task_map.get(name)
+            if task is not None and (not task.future.done() or task.future.exception() is None):
+                return task.future
+
+            future: Future = Future()
+            task = StartupLoadTask(name, future)
+            self._task_map[name] = task
+
+        run_future = _startup_loader_executor.submit(self._run_task, task, load_func)
+        run_future.add_done_callback(thread_utils.handle_future_result)
+        return future
+
+    @staticmethod
+    def _run_task(task: StartupLoadTask, load_func: Callable[[], Any]) -> None:
+        """
+        执行加载任务 结果和异常都放到任务的 future 中
+        :param task: 任务
+        :param load_func: 加载方法
+        """
+        if not task.future.set_running_or_notify_cancel():
+            return
+        task.start_time = time.time()
+        try:
+            result = load_func()
+        except Exception as e:
+            task.end_time = time.time()
+            log.error('后台加载 %s 失败 耗时 %.2f秒', task.name, task.load_seconds, exc_info=True)
+            task.future.set_exception(e)
+            return
+
+        task.end_time = time.time()
+        log.info('后台加载 %s 完毕 耗时 %.2f秒', task.name, task.load_seconds)
+        task.future.set_result(result)
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> Any:
+        """
+        等待某个任务加载完成 不会等待其他任务
+        :param name: 任务名称
+        :param timeout: 最多等待的秒数 为空时一直等待
+        :return: 加载结果 任务不存在时返回None
+        """
+        task = self._task_map.get(name)
+        if task is None:
+            return None
+        return task.future.result(timeout=timeout)
+
+    def is_done(self, name: str) -> bool:
+        """
+        任务是否已经完成 包括失败
+        :param name: 任务名称
+        :return:
+        """
+        task = self._task_map.get(name)
+        return task is not None and task.future.done()
+
+    def get_load_seconds(self) -> dict[str, float]:
+        """
+        :return: 各任务的加载耗时
+        """
+        return {name: task.load_seconds for name, task in self._task_map.items()}
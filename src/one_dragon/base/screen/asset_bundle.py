@@ -0,0 +1,295 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+import threading
+from cv2.typing import MatLike
+from typing import Optional, List, Tuple, Any
+
+from one_dragon.utils import os_utils, cv2_utils
+from one_dragon.utils.log_utils import log
+
+ASSET_BUNDLE_FILE_NAME = 'asset_bundle.bin'
+_BUNDLE_MAGIC = b'ODAB'
+_BUNDLE_VERSION = 1
+_BUNDLE_HEADER = struct.Struct('<4sIQ')  # 标识 版本 索引长度
+_BUNDLE_ALIGN = 64  # 每个数组的起始位置对齐
+_MTIME_TOLERANCE = 2  # 修改时间允许的误差 秒 压缩包解压后可能有精度损失
+
+
+def get_asset_bundle_path() -> str:
+    """
+    资源包的默认路径
+    :return:
+    """
+    return os.path.join(os_utils.get_path_under_work_dir('assets'), ASSET_BUNDLE_FILE_NAME)
+
+
+def get_template_key(sub_dir: str, template_id: str) -> str:
+    return '%s:%s' % (sub_dir, template_id)
+
+
+def _get_source_dir_list() -> List[Tuple[str, str]]:
+    """
+    打包的来源文件夹
+    :return: [(相对路径前缀, 文件夹路径)]
+    """
+    return [
+        ('template', os_utils.get_path_under_work_dir('assets', 'template')),
+        ('screen_info', os_utils.get_path_under_work_dir('assets', 'game_data', 'screen_info')),
+    ]
+
+
+def scan_source_files() -> dict[str, Tuple[int, float]]:
+    """
+    扫描打包的来源文件 只看大小和修改时间 不读取内容
+    模板为 template/x/y/文件 画面为 screen_info/文件
+    :return: key为相对路径 value为 (大小, 修改时间)
+    """
+    result: dict[str, Tuple[int, float]] = {}
+    for prefix, dir_path in _get_source_dir_list():
+        _scan_dir(dir_path, prefix, 2 if prefix == 'template' else 0, result)
+    return result
+
+
+def _scan_dir(dir_path: str, prefix: str, depth: int, result: dict[str, Tuple[int, float]]) -> None:
+    """
+    递归扫描文件夹
+    :param dir_path: 文件夹路径
+    :param prefix: 相对路径前缀
+    :param depth: 还需要往下的层数 0时只记录文件
+    :param result: 结果
+    """
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            rel_path = f'{prefix}/{entry.name}'
+            if entry.is_dir():
+                if depth > 0:
+                    _scan_dir(entry.path, rel_path, depth - 1, result)
+            elif depth == 0 and entry.is_file():
+                stat = entry.stat()
+                result[rel_path] = (stat.st_size, stat.st_mtime)
+
+
+class AssetBundle:
+
+    def __init__(self, file_path: str):
+        """
+        打包好的模板和画面资源
+        文件结构为 文件头 + json索引 + 对齐后的数组数据
+        数组使用内存映射 只在使用时读取 返回的数组是文件内容的视图 不复制
+        :param file_path: 资源包路径
+        """
+        self.file_path: str = file_path
+
+        with open(file_path, 'rb') as file:
+            magic, version, index_len = _BUNDLE_HEADER.unpack(file.read(_BUNDLE_HEADER.size))
+            if magic != _BUNDLE_MAGIC or version != _BUNDLE_VERSION:
+                raise ValueError(f'资源包格式不支持 {file_path}')
+            index: dict = json.loads(file.read(index_len).decode('utf-8'))
+        self._data_start: int = _get_data_start(index_len)
+
+        self.source_files: dict[str, List] = index.get('source', {})  # 打包时的来源文件 (大小, 修改时间)
+        self.template_map: dict[str, dict] = index.get('template', {})  # key为 分类:模板id
+        self.screen_list: List[dict] = index.get('screen', [])  # 画面的配置 按打包时文件夹中的顺序
+
+        # 写时复制 返回的数组可以修改 但不会写回文件
+        with open(file_path, 'rb') as file:
+            self._mm: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._buffer: np.ndarray = np.frombuffer(self._mm, dtype=np.uint8)
+
+    def is_stale(self, current_files: Optional[dict[str, Tuple[int, float]]] = None) -> bool:
+        """
+        资源包是否过期 即来源文件有增减或改动
+        :param current_files: 当前的来源文件 为空时扫描
+        :return:
+        """
+        if current_files is None:
+            current_files = scan_source_files()
+        if len(current_files) != len(self.source_files):
+            return True
+        for rel_path, (size, mtime) in current_files.items():
+            bundle_file = self.source_files.get(rel_path)
+            if bundle_file is None:
+                return True
+            if bundle_file[0] != size or abs(bundle_file[1] - mtime) > _MTIME_TOLERANCE:
+                return True
+        return False
+
+    def get_array(self, array_info: Optional[List]) -> Optional[np.ndarray]:
+        """
+        根据索引中的描述 获取数组
+        :param array_info: [相对数据区的偏移, 类型, 形状]
+        :return: 文件内容的视图
+        """
+        if array_info is None:
+            return None
+        offset, dtype, shape = array_info
+        offset += self._data_start
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        return self._buffer[offset:offset + nbytes].view(dtype).reshape(shape)
+
+    def get_template(self, sub_dir: str, template_id: str) -> Optional[dict]:
+        """
+        获取模板的索引
+        :param sub_dir: 模板分类
+        :param template_id: 模板id
+        :return: 包含 config raw mask kps desc
+        """
+        return self.template_map.get(get_template_key(sub_dir, template_id))
+
+    def get_template_features(self, template_item: dict) -> Optional[Tuple[Any, Optional[MatLike]]]:
+        """
+        获取预先计算的特征
+        :param template_item: 模板的索引
+        :return: 关键点, 描述 没有预先计算时返回None
+        """
+        if 'kps' not in template_item:
+            return None
+        kps_arr = self.get_array(template_item['kps'])
+        kps = tuple(cv2_utils.feature_keypoints_from_np(kps_arr)) if kps_arr is not None else tuple()
+        return kps, self.get_array(template_item.get('desc'))
+
+
+_bundle_lock = threading.Lock()
+_bundle_cache: Optional[AssetBundle] = None
+
+
+def get_asset_bundle(check_stale: bool = True) -> Optional[AssetBundle]:
+    """
+    获取资源包 不存在或过期时返回None 使用方应退回读取原文件
+    打开过的资源包会缓存
+    :param check_stale: 是否重新检查是否过期 来源文件可能在运行中被开发工具修改
+    :return:
+    """
+    global _bundle_cache
+    with _bundle_lock:
+        bundle = _bundle_cache
+        if bundle is None:
+            file_path = get_asset_bundle_path()
+            if not os.path.exists(file_path):
+                return None
+            try:
+                bundle = AssetBundle(file_path)
+            except Exception:
+                log.error('资源包读取失败 将读取原文件 %s', file_path, exc_info=True)
+                return None
+            _bundle_cache = bundle
+            check_stale = True
+
+        if check_stale and bundle.is_stale():
+            # 不关闭内存映射 已经加载的模板可能还在使用
+            log.info('资源包已过期 将读取原文件 可重新打包 %s', bundle.file_path)
+            return None
+        return bundle
+
+
+def build_asset_bundle(file_path: Optional[str] = None) -> str:
+    """
+    将模板和画面配置打包成一个文件
+    模板保存读取后的原图、掩码、特征；画面保存解析后的配置
+    :param file_path: 保存路径 为空时使用默认路径
+    :return: 保存路径
+    """
+    from one_dragon.base.config.yaml_operator import YamlOperator
+    from one_dragon.base.screen.template_info import TemplateInfo, TEMPLATE_RAW_FILE_NAME, \
+        TEMPLATE_MASK_FILE_NAME, TEMPLATE_CONFIG_FILE_NAME
+
+    if file_path is None:
+        file_path = get_asset_bundle_path()
+
+    # 先记录来源文件 打包过程中被修改的话 下次使用时会认为过期
+    source_files = scan_source_files()
+
+    array_list: List[Tuple[int, np.ndarray]] = []  # (相对数据区的偏移, 数组)
+    data_len: int = 0
+
+    def add_array(arr: Optional[np.ndarray]) -> Optional[List]:
+        nonlocal data_len
+        if arr is None:
+            return None
+        arr = np.ascontiguousarray(arr)
+        data_len = _align(data_len)
+        info = [data_len, arr.dtype.str, list(arr.shape)]
+        array_list.append((data_len, arr))
+        data_len += arr.nbytes
+        return info
+
+    template_map: dict[str, dict] = {}
+    for rel_path in source_files:
+        if not rel_path.startswith('template/'):
+            continue
+        _, sub_dir, template_id, file_name = rel_path.split('/')
+        key = get_template_key(sub_dir, template_id)
+        if key in template_map:
+            continue
+        if file_name not in (TEMPLATE_RAW_FILE_NAME, TEMPLATE_MASK_FILE_NAME, TEMPLATE_CONFIG_FILE_NAME):
+            continue
+
+        template = TemplateInfo(sub_dir, template_id)
+        item = {
+            'config': template.data,
+            'raw': add_array(template.raw),
+            'mask': add_array(template.mask),
+        }
+        if template.raw is not None:
+            kps, desc = template.features
+            item['kps'] = add_array(cv2_utils.feature_keypoints_to_np(kps).astype(np.float32)) if len(kps) > 0 else None
+            item['desc'] = add_array(desc)
+        template_map[key] = item
+
+    screen_list: List[dict] = []
+    screen_dir = os_utils.get_path_under_work_dir('assets', 'game_data', 'screen_info')
+    for file_name in os.listdir(screen_dir):
+        screen_file_path = os.path.join(screen_dir, file_name)
+        if file_name.endswith('.yml') and os.path.isfile(screen_file_path):
+            screen_list.append({
+                'screen_id': file_name[:-4],
+                'data': YamlOperator(screen_file_path).data,
+            })
+
+    index = {
+        'source': source_files,
+        'template': template_map,
+        'screen': screen_list,
+    }
+    index_bytes = json.dumps(index, ensure_ascii=False).encode('utf-8')
+    data_start = _get_data_start(len(index_bytes))
+
+    temp_file_path = file_path + '.tmp'
+    with open(temp_file_path, 'wb') as file:
+        file.write(_BUNDLE_HEADER.pack(_BUNDLE_MAGIC, _BUNDLE_VERSION, len(index_bytes)))
+        file.write(index_bytes)
+        for offset, arr in array_list:
+            file.seek(data_start + offset)
+            file.write(arr.tobytes())
+        file.truncate(data_start + data_len)
+    os.replace(temp_file_path, file_path)
+
+    log.info('资源包打包完成 模板 %d 个 画面 %d 个 大小 %.2fMB %s',
+             len(template_map), len(screen_list), (data_start + data_len) / 1024 / 1024, file_path)
+    return file_path
+
+
+def _get_data_start(index_len: int) -> int:
+    """
+    数组数据的起始位置 数组的偏移都相对于这个位置
+    :param index_len: 索引的长度
+    :return:
+    """
+    return _align(_BUNDLE_HEADER.size + index_len)
+
+
+def _align(offset: int) -> int:
+    return (offset + _BUNDLE_ALIGN - 1) // _BUNDLE_ALIGN * _BUNDLE_ALIGN
+
+
+def __debug_build():
+    build_asset_bundle()
+
+
+if __name__ == '__main__':
+    __debug_build()
@@ -0,0 +1,201 @@
+from typing import List, Optional, Callable, Tuple
+
+from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.screen_info import ScreenInfo
+
+
+class ScreenIdProbe:
+
+    COST_TEMPLATE: int = 1  # 模板匹配 1~3ms
+    COST_TEXT: int = 10  # OCR 几十毫秒
+
+    def __init__(self, probe_id: int, area: ScreenArea):
+        """
+        用于识别画面的一个标识区域
+        不同画面中 位置和识别方式完全相同的区域 会合并成同一个
+        :param probe_id: 下标
+        :param area: 任意一个对应的区域
+        """
+        self.probe_id: int = probe_id
+        self.area: ScreenArea = area
+        self.screen_name_list: List[str] = []  # 需要这个区域的画面
+
+    @property
+    def cost(self) -> int:
+        """
+        识别的开销
+        """
+        if self.area.is_template_area:
+            return ScreenIdProbe.COST_TEMPLATE
+        elif self.area.is_text_area:
+            return ScreenIdProbe.COST_TEXT
+        else:
+            return 0
+
+    @property
+    def is_cheap(self) -> bool:
+        """
+        是否不需要OCR
+        """
+        return not self.area.is_text_area
+
+    @staticmethod
+    def get_area_key(area: ScreenArea) -> tuple:
+        """
+        区域的识别方式 相同的区域识别结果一定相同
+        """
+        color_range = None if area.color_range is None else tuple(tuple(i) for i in area.color_range)
+        if area.is_text_area:
+            return ('text', area.x1, area.y1, area.x2, area.y2, area.text, area.lcs_percent, color_range)
+        elif area.is_template_area:
+            return ('template', area.x1, area.y1, area.x2, area.y2,
+                    area.template_sub_dir, area.template_id, area.template_match_threshold)
+        else:
+            return ('none', area.x1, area.y1, area.x2, area.y2)
+
+
+class ScreenIdentifyResult:
+
+    def __init__(self, screen_name: Optional[str], confidence: float = 0,
+                 matched_screen_list: Optional[List[str]] = None):
+        """
+        画面识别结果
+        :param screen_name: 画面名称 识别不到时为空
+        :param confidence: 置信度 0~1 为该画面所有标识区域得分的平均值
+        :param matched_screen_list: 所有符合的画面 多于1个时说明标识区域有歧义
+        """
+        self.screen_name: Optional[str] = screen_name
+        self.confidence: float = confidence
+        self.matched_screen_list: List[str] = [] if matched_screen_list is None else matched_screen_list
+
+
+class ScreenIdentifyIndex:
+
+    def __init__(self, screen_info_list: List[ScreenInfo]):
+        """
+        画面识别的索引 在加载画面后预先计算
+        - 合并各画面中相同的标识区域 同一个区域只识别一次
+        - 每个画面的标识区域按开销排序 优先使用模板匹配
+        - 模板区域按区分度排序 能排除越多画面的越先识别
+        - OCR 放到最后 并且只对剩下的候选画面一起批量识别
+        """
+        self.screen_name_list: List[str] = []  # 有标识区域的画面 按加载顺序
+        self.probe_list: List[ScreenIdProbe] = []
+        self.screen_probe_map: dict[str, List[ScreenIdProbe]] = {}
+
+        probe_key_map: dict[tuple, ScreenIdProbe] = {}
+        for screen_info in screen_info_list:
+            probe_list: List[ScreenIdProbe] = []
+            for area in screen_info.area_list:
+                if not area.id_mark:
+                    continue
+                key = ScreenIdProbe.get_area_key(area)
+                probe = probe_key_map.get(key)
+                if probe is None:
+                    probe = ScreenIdProbe(len(self.probe_list), area)
+                    probe_key_map[key] = probe
+                    self.probe_list.append(probe)
+                if screen_info.screen_name not in probe.screen_name_list:
+                    probe.screen_name_list.append(screen_info.screen_name)
+                if probe not in probe_list:
+                    probe_list.append(probe)
+
+            if len(probe_list) == 0:
+                continue
+            probe_list.sort(key=lambda i: i.cost)
+            self.screen_name_list.append(screen_info.screen_name)
+            self.screen_probe_map[screen_info.screen_name] = probe_list
+
+        # 识别失败时 能排除的画面越多 区分度越高
+        self.cheap_probe_list: List[ScreenIdProbe] = sorted(
+            [i for i in self.probe_list if i.is_cheap],
+            key=lambda i: len(i.screen_name_list),
+            reverse=True
+        )
+
+    def identify(self, priority_screen_list: List[str],
+                 check_probes: Callable[[List[ScreenIdProbe]], List[Tuple[bool, float]]]) -> ScreenIdentifyResult:
+        """
+        识别画面
+        1. 优先检查 priority_screen_list 中前2个画面 (当前画面和上一个画面) 命中时开销最小
+        2. 使用模板区域排除候选画面
+        3. 对剩下的候选画面的文本区域 一起批量OCR
+        4. 按优先顺序 返回第一个所有标识区域都符合的画面
+        :param priority_screen_list: 优先顺序 一般是当前画面、上一个画面、再按跳转关系往外扩展
+        :param check_probes: 识别标识区域的方法 返回每个区域的 (是否符合, 得分)
+        :return: 识别结果
+        """
+        probe_result: dict[int, Tuple[bool, float]] = {}
+
+        def _check(to_check_list: List[ScreenIdProbe]) -> None:
+            to_check_list = [i for i in to_check_list if i.probe_id not in probe_result]
+            if len(to_check_list) == 0:
+                return
+            for probe, result in zip(to_check_list, check_probes(to_check_list)):
+                probe_result[probe.probe_id] = result
+
+        def _screen_state(name: str) -> Optional[bool]:
+            """
+            :return: 符合=True 不符合=False 还没有确定=None
+            """
+            all_match = True
+            for probe in self.screen_probe_map[name]:
+                result = probe_result.get(probe.probe_id)
+                if result is None:
+                    all_match = False
+                elif not result[0]:
+                    return False
+            return True if all_match else None
+
+        # 候选画面的顺序
+        candidate_list: List[str] = []
+        for name in priority_screen_list:
+            if name in self.screen_probe_map and name not in candidate_list:
+                candidate_list.append(name)
+        for name in self.screen_name_list:
+            if name not in candidate_list:
+                candidate_list.append(name)
+
+        # 1. 当前画面和上一个画面 逐个区域识别 遇到不符合的就停止
+        for name in candidate_list[:2]:
+            if name not in priority_screen_list:
+                break
+            for probe in self.screen_probe_map[name]:
+                _check([probe])
+                if not probe_result[probe.probe_id][0]:
+                    break
+            if _screen_state(name):
+                return self._make_result(name, [name], probe_result)
+
+        # 2. 模板区域 按区分度逐个识别
+        for probe in self.cheap_probe_list:
+            if probe.probe_id in probe_result:
+                continue
+            if not any(_screen_state(name) is None for name in probe.screen_name_list):
+                continue  # 相关画面都已经确定了
+            _check([probe])
+
+        # 3. 剩余候选画面的文本区域 一起识别
+        to_check_list: List[ScreenIdProbe] = []
+        for name in candidate_list:
+            if _screen_state(name) is not None:
+                continue
+            for probe in self.screen_probe_map[name]:
+                if probe.probe_id not in probe_result and probe not in to_check_list:
+                    to_check_list.append(probe)
+        _check(to_check_list)
+
+        # 4. 按优先顺序选择
+        matched_list = [name for name in candidate_list if _screen_state(name)]
+        if len(matched_list) == 0:
+            return ScreenIdentifyResult(None)
+        return self._make_result(matched_list[0], matched_list, probe_result)
+
+    def _make_result(self, screen_name: str, matched_list: List[str],
+                     probe_result: dict[int, Tuple[bool, float]]) -> ScreenIdentifyResult:
+        """
+        生成识别结果
+        """
+        probe_list = self.screen_probe_map[screen_name]
+        confidence = sum(probe_result[i.probe_id][1] for i in probe_list) / len(probe_list)
+        return ScreenIdentifyResult(screen_name, confidence, matched_list)
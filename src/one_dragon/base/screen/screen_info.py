@@ -11,7 +11,13 @@ from one_dragon.utils import os_utils, cv2_utils
 
 class ScreenInfo(YamlOperator):
 
-    def __init__(self, screen_id: Optional[str] = None, create_new: bool = False):
+    def __init__(self, screen_id: Optional[str] = None, create_new: bool = False,
+                 data: Optional[dict] = None):
+        """
+        :param screen_id: 画面ID
+        :param create_new: 是否新建
+        :param data: 已经解析好的配置 例如来自资源包 传入时不读取文件
+        """
         self.old_screen_id: str = screen_id  # 旧的画面ID 用于保存时删掉旧文件
         self.screen_id: str = screen_id  # 画面ID 用于加载文件
         self.screen_name: str = ''  # 画面名称 用于显示
@@ -24,7 +30,7 @@ class ScreenInfo(YamlOperator):
         if create_new:
             YamlOperator.__init__(self)
         else:
-            YamlOperator.__init__(self, self.get_yml_file_path())
+            YamlOperator.__init__(self, self.get_yml_file_path(), data=data)
             self._init_from_data()
 
     @staticmethod
@@ -1,8 +1,15 @@
+import heapq
 import os
+import time
+
+import threading
 from cv2.typing import MatLike
-from typing import Optional
+from typing import Optional, List
 
+from one_dragon.base.config.yaml_config import YamlConfig
+from one_dragon.base.screen.asset_bundle import get_asset_bundle
 from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.screen_identify_index import ScreenIdentifyIndex
 from one_dragon.base.screen.screen_info import ScreenInfo
 from one_dragon.utils.log_utils import log
 
@@ -41,13 +48,55 @@ class ScreenRoute:
         return self.node_list is not None and len(self.node_list) > 0
 
 
+class ScreenRouteConfig(YamlConfig):
+
+    def __init__(self, is_mock: bool = False):
+        """
+        画面跳转的耗时记录 用于计算最快的路径
+        key为 画面名称.区域名称 value为点击后到达目标画面的平均秒数
+        """
+        YamlConfig.__init__(self, 'screen_route', is_mock=is_mock)
+
+    @property
+    def transition_seconds(self) -> dict[str, float]:
+        if 'transition_seconds' not in self.data:
+            self.data['transition_seconds'] = {}
+        return self.data['transition_seconds']
+
+
+class _PendingScreenTransition:
+
+    def __init__(self, from_screen: str, from_area: str, to_screen: str):
+        """
+        点击了跳转区域 还没确认到达目标画面
+        """
+        self.from_screen: str = from_screen
+        self.from_area: str = from_area
+        self.to_screen: str = to_screen
+        self.start_time: float = time.time()
+
+
 class ScreenContext:
 
+    DEFAULT_TRANSITION_SECONDS: float = 1  # 没有记录耗时的跳转 默认的秒数 都没有记录时 等同于点击次数最少
+    TRANSITION_SECONDS_ALPHA: float = 0.3  # 更新平均耗时时 新记录的权重
+    MAX_TRANSITION_SECONDS: float = 30  # 超过这个时间才到达的 不记录
+    REROUTE_CHANGE_RATIO: float = 0.2  # 平均耗时与计算路径时使用的耗时相差超过这个比例 才重新计算路径
+    TRANSITION_SAVE_INTERVAL: float = 60  # 跳转耗时保存到文件的最小间隔秒数 停止运行时会保存剩余的
+
     def __init__(self):
         self.screen_info_list: list[ScreenInfo] = []
         self.screen_info_map: dict[str, ScreenInfo] = {}
         self._screen_area_map: dict[str, ScreenArea] = {}
-        self.screen_route_map: dict[str, dict[str, ScreenRoute]] = {}
+        self.screen_route_map: dict[str, dict[str, ScreenRoute]] = {}  # 已经计算的路径 key为出发画面 按需计算
+        self._screen_edge_map: dict[str, list[ScreenRouteNode]] = {}  # 每个画面可以直接跳转的边
+        self._route_transition_seconds: dict[str, float] = {}  # 计算路径使用的跳转耗时 变化明显时才更新
+        self._screen_route_lock = threading.Lock()
+        self.screen_route_config: ScreenRouteConfig = ScreenRouteConfig()
+        self._pending_transition: Optional[_PendingScreenTransition] = None
+        self._transition_unsaved: bool = False  # 是否有未保存的跳转耗时
+        self._last_transition_save_time: float = 0  # 上一次保存跳转耗时的时间
+        self.screen_identify_index: ScreenIdentifyIndex = ScreenIdentifyIndex([])
 
         self.load_all()
         self.last_screen_name: Optional[str] = None  # 上一个画面名字
@@ -56,24 +105,38 @@ class ScreenContext:
     def load_all(self) -> None:
         """
         加载当前全部的画面
+        资源包没有过期时 使用资源包中解析好的配置
         :return:
         """
         self.screen_info_list.clear()
         self.screen_info_map.clear()
         self._screen_area_map.clear()
 
-        dir_path = ScreenInfo.get_dir_path()
-        for file_name in os.listdir(dir_path):
-            file_path = os.path.join(dir_path, file_name)
-            if file_name.endswith('.yml') and os.path.isfile(file_path):
-                screen_info = ScreenInfo(screen_id=file_name[:-4])
-                self.screen_info_list.append(screen_info)
-                self.screen_info_map[screen_info.screen_name] = screen_info
-
-                for screen_area in screen_info.area_list:
-                    self._screen_area_map[f'{screen_info.screen_name}.{screen_area.area_name}'] = screen_area
+        bundle = get_asset_bundle()
+        if bundle is not None:
+            for screen_data in bundle.screen_list:
+                self._add_screen_info(ScreenInfo(screen_id=screen_data['screen_id'], data=screen_data['data']))
+        else:
+            dir_path = ScreenInfo.get_dir_path()
+            for file_name in os.listdir(dir_path):
+                file_path = os.path.join(dir_path, file_name)
+                if file_name.endswith('.yml') and os.path.isfile(file_path):
+                    self._add_screen_info(ScreenInfo(screen_id=file_name[:-4]))
 
         self.init_screen_route()
+        self.screen_identify_index = ScreenIdentifyIndex(self.screen_info_list)
+
+    def _add_screen_info(self, screen_info: ScreenInfo) -> None:
+        """
+        加入一个画面
+        :param screen_info:
+        :return:
+        """
+        self.screen_info_list.append(screen_info)
+        self.screen_info_map[screen_info.screen_name] = screen_info
+
+        for screen_area in screen_info.area_list:
+            self._screen_area_map[f'{screen_info.screen_name}.{screen_area.area_name}'] = screen_area
 
     def get_screen(self, screen_name: str) -> ScreenInfo:
         """
@@ -94,32 +157,23 @@ class ScreenContext:
 
     def init_screen_route(self) -> None:
         """
-        初始化画面间的跳转路径
+        初始化画面间的跳转边 路径在使用时再按需计算
         :return:
         """
-        # 先对任意两个画面之间做初始化
-        for screen_1 in self.screen_info_list:
-            self.screen_route_map[screen_1.screen_name] = {}
-            for screen_2 in self.screen_info_list:
-                self.screen_route_map[screen_1.screen_name][screen_2.screen_name] = ScreenRoute(
-                    from_screen=screen_1.screen_name,
-                    to_screen=screen_2.screen_name
-                )
+        edge_map: dict[str, list[ScreenRouteNode]] = {}
+        for screen_info in self.screen_info_list:
+            edge_map[screen_info.screen_name] = []
 
         # 根据画面的goto_list来初始化边
         for screen_info in self.screen_info_list:
             for area in screen_info.area_list:
                 if area.goto_list is None or len(area.goto_list) == 0:
                     continue
-                from_screen_route = self.screen_route_map[screen_info.screen_name]
-                if from_screen_route is None:
-                    log.error('画面路径没有初始化 %s', screen_info.screen_name)
-                    continue
                 for goto_screen_name in area.goto_list:
-                    if goto_screen_name not in from_screen_route:
+                    if goto_screen_name not in edge_map:
                         log.error('画面路径 %s -> %s 无法找到目标画面', screen_info.screen_name, goto_screen_name)
                         continue
-                    from_screen_route[goto_screen_name].node_list.append(
+                    edge_map[screen_info.screen_name].append(
                         ScreenRouteNode(
                             from_screen=screen_info.screen_name,
                             from_area=area.area_name,
@@ -127,50 +181,145 @@ class ScreenContext:
                         )
                     )
 
-        # Floyd算出任意两个画面之间的路径
-        screen_len = len(self.screen_info_list)
-        for k in range(screen_len):
-            screen_k = self.screen_info_list[k]
-            for i in range(screen_len):
-                if i == k:
-                    continue
-                screen_i = self.screen_info_list[i]
+        with self._screen_route_lock:
+            self._screen_edge_map = edge_map
+            self._route_transition_seconds = dict(self.screen_route_config.transition_seconds)
+            self.screen_route_map = {}
 
-                route_ik: ScreenRoute = self.screen_route_map[screen_i.screen_name][screen_k.screen_name]
-                if not route_ik.can_go:  # 无法从 i 到 k
+    def get_screen_route(self, from_screen: str, to_screen: str) -> Optional[ScreenRoute]:
+        """
+        获取两个画面之间的
+        第一次从某个画面出发时 计算到所有画面的路径并缓存
+        :param from_screen:
+        :param to_screen:
+        :return:
+        """
+        with self._screen_route_lock:
+            if from_screen not in self._screen_edge_map:
+                return None
+            from_route = self.screen_route_map.get(from_screen, None)
+            if from_route is None:
+                from_route = self._cal_screen_route(from_screen)
+                self.screen_route_map[from_screen] = from_route
+            return from_route.get(to_screen, None)
+
+    def _cal_screen_route(self, from_screen: str) -> dict[str, ScreenRoute]:
+        """
+        Dijkstra算出一个画面到其他所有画面的最快路径
+        边的耗时使用记录的跳转耗时 没有记录的使用默认值
+        :param from_screen: 出发画面
+        :return: key为目标画面
+        """
+        transition_seconds = self._route_transition_seconds
+        cost_map: dict[str, float] = {from_screen: 0}
+        prev_map: dict[str, ScreenRouteNode] = {}  # 到达某个画面的最后一条边
+        visited: set[str] = set()
+        heap: list[tuple[float, int, str]] = [(0, 0, from_screen)]
+        push_cnt = 1  # 耗时相同时 按加入的顺序 即画面和区域配置的顺序
+        while len(heap) > 0:
+            cost, _, screen_name = heapq.heappop(heap)
+            if screen_name in visited:
+                continue
+            visited.add(screen_name)
+            for edge in self._screen_edge_map.get(screen_name, []):
+                if edge.to_screen in visited:
                     continue
+                edge_cost = transition_seconds.get(f'{edge.from_screen}.{edge.from_area}',
+                                                   ScreenContext.DEFAULT_TRANSITION_SECONDS)
+                new_cost = cost + edge_cost
+                if edge.to_screen not in cost_map or new_cost < cost_map[edge.to_screen]:
+                    cost_map[edge.to_screen] = new_cost
+                    prev_map[edge.to_screen] = edge
+                    heapq.heappush(heap, (new_cost, push_cnt, edge.to_screen))
+                    push_cnt += 1
 
-                for j in range(screen_len):
-                    if k == j or i == j:
-                        continue
-                    screen_j = self.screen_info_list[j]
+        route_map: dict[str, ScreenRoute] = {}
+        for screen_name in self._screen_edge_map:
+            route = ScreenRoute(from_screen=from_screen, to_screen=screen_name)
+            node_list: List[ScreenRouteNode] = []
+            current = screen_name
+            while current != from_screen and current in prev_map:
+                edge = prev_map[current]
+                node_list.append(edge)
+                current = edge.from_screen
+            node_list.reverse()
+            route.node_list = node_list
+            route_map[screen_name] = route
+        return route_map
 
-                    route_kj: ScreenRoute = self.screen_route_map[screen_k.screen_name][screen_j.screen_name]
-                    if not route_kj.can_go:  # 无法从 k 到 j
-                        continue
+    def start_screen_transition(self, from_screen: str, from_area: str, to_screen: str) -> None:
+        """
+        点击了跳转区域 开始记录跳转耗时
+        重复点击同一个区域时 按第一次点击的时间计算
+        :param from_screen: 出发画面
+        :param from_area: 点击的区域
+        :param to_screen: 目标画面
+        """
+        pending = self._pending_transition
+        if (pending is not None and pending.from_screen == from_screen
+                and pending.from_area == from_area and pending.to_screen == to_screen):
+            return
+        self._pending_transition = _PendingScreenTransition(from_screen, from_area, to_screen)
 
-                    route_ij: ScreenRoute = self.screen_route_map[screen_i.screen_name][screen_j.screen_name]
+    def finish_screen_transition(self, current_screen_name: Optional[str]) -> None:
+        """
+        识别到当前画面后 如果是跳转的目标画面 记录跳转耗时
+        :param current_screen_name: 当前识别的画面
+        """
+        pending = self._pending_transition
+        if pending is None or current_screen_name is None:
+            return
+        if current_screen_name == pending.from_screen:  # 还没有跳转
+            return
+        self._pending_transition = None
+        if current_screen_name != pending.to_screen:  # 去了别的画面
+            return
 
-                    if (not route_ij.can_go  # 当前无法从 i 到 j
-                        or len(route_ik.node_list) + len(route_kj.node_list) < len(route_ij.node_list)  # 新的更短
-                    ):
-                        route_ij.node_list = []
-                        for node_ik in route_ik.node_list:
-                            route_ij.node_list.append(node_ik)
-                        for node_kj in route_kj.node_list:
-                            route_ij.node_list.append(node_kj)
+        seconds = time.time() - pending.start_time
+        if seconds > ScreenContext.MAX_TRANSITION_SECONDS:
+            return
+        self.record_screen_transition(pending.from_screen, pending.from_area, seconds)
 
-    def get_screen_route(self, from_screen: str, to_screen: str) -> Optional[ScreenRoute]:
+    def record_screen_transition(self, from_screen: str, from_area: str, seconds: float) -> None:
         """
-        获取两个画面之间的
-        :param from_screen:
-        :param to_screen:
-        :return:
+        记录一次跳转的耗时 更新平均耗时
+        平均耗时与计算路径时使用的相差明显时 才重新计算路径
+        文件按间隔保存 避免每次跳转都写文件
+        :param from_screen: 出发画面
+        :param from_area: 点击的区域
+        :param seconds: 点击后到达目标画面的秒数
+        """
+        key = f'{from_screen}.{from_area}'
+        transition_seconds = self.screen_route_config.transition_seconds
+        old_seconds = transition_seconds.get(key, None)
+        if old_seconds is None:
+            new_seconds = seconds
+        else:
+            alpha = ScreenContext.TRANSITION_SECONDS_ALPHA
+            new_seconds = old_seconds * (1 - alpha) + seconds * alpha
+        new_seconds = round(new_seconds, 3)
+        transition_seconds[key] = new_seconds
+        self._transition_unsaved = True
+
+        with self._screen_route_lock:
+            route_seconds = self._route_transition_seconds.get(key, None)
+            if (route_seconds is None
+                    or abs(new_seconds - route_seconds) > route_seconds * ScreenContext.REROUTE_CHANGE_RATIO):
+                self._route_transition_seconds[key] = new_seconds
+                self.screen_route_map = {}
+
+        if time.time() - self._last_transition_save_time >= ScreenContext.TRANSITION_SAVE_INTERVAL:
+            self.save_screen_transition()
+
+    def save_screen_transition(self) -> None:
+        """
+        保存未保存的跳转耗时
         """
-        from_route = self.screen_route_map.get(from_screen, None)
-        if from_route is None:
-            return None
-        return from_route.get(to_screen, None)
+        if not self._transition_unsaved:
+            return
+        self._transition_unsaved = False
+        self._last_transition_save_time = time.time()
+        self.screen_route_config.save()
 
     def update_current_screen_name(self, screen_name: str) -> None:
         """
@@ -1,12 +1,11 @@
-import cv2
-import numpy as np
 from cv2.typing import MatLike
 from enum import Enum
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from one_dragon.base.geometry.point import Point
 from one_dragon.base.operation.one_dragon_context import OneDragonContext
 from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.screen_identify_index import ScreenIdProbe, ScreenIdentifyResult
 from one_dragon.base.screen.screen_info import ScreenInfo
 from one_dragon.utils import cv2_utils, str_utils
 from one_dragon.utils.i18_utils import gt
@@ -53,17 +52,7 @@ def find_area_in_screen(ctx: OneDragonContext, screen: MatLike, area: ScreenArea
 
     find: bool = False
     if area.is_text_area:
-        rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
-
-        if area.color_range is None:
-            to_ocr = part
-        else:
-            mask = cv2.inRange(part,
-                               np.array(area.color_range[0], dtype=np.uint8),
-                               np.array(area.color_range[1], dtype=np.uint8))
-            mask = cv2_utils.dilate(mask, 2)
-            to_ocr = cv2.bitwise_and(part, part, mask=mask)
+        to_ocr = ctx.analysis_cache.crop_by_color_range(screen, area.rect, area.color_range, dilate_k=2)
 
         ocr_result_map = ctx.ocr.run_ocr(to_ocr)
         for ocr_result, mrl in ocr_result_map.items():
@@ -132,39 +121,96 @@ def get_match_screen_name(ctx: OneDragonContext, screen: MatLike) -> str:
     :param screen: 游戏截图
     :return: 画面名字
     """
+    return identify_screen(ctx, screen).screen_name
+
+
+def identify_screen(ctx: OneDragonContext, screen: MatLike) -> ScreenIdentifyResult:
+    """
+    根据游戏截图 识别当前画面
+    优先检查当前画面和上一个画面 再按跳转关系往外扩展的顺序选择
+    具体识别顺序见 ScreenIdentifyIndex
+    :param ctx: 上下文
+    :param screen: 游戏截图
+    :return: 画面名称及置信度
+    """
     bfs_list = []
     if ctx.screen_loader.current_screen_name is not None:  # 如果有记录上次所在画面 则从这个画面开始搜索
         bfs_list.append(ctx.screen_loader.current_screen_name)
-    if ctx.screen_loader.last_screen_name is not None:
+    if ctx.screen_loader.last_screen_name is not None and ctx.screen_loader.last_screen_name not in bfs_list:
         bfs_list.append(ctx.screen_loader.last_screen_name)
-    if len(bfs_list) > 0:
-        bfs_idx = 0
-        while bfs_idx < len(bfs_list):
-            current_screen_name = bfs_list[bfs_idx]
-            bfs_idx += 1
-            if is_target_screen(ctx, screen, screen_name=current_screen_name):
-                return current_screen_name
-
-            screen_info = ctx.screen_loader.get_screen(current_screen_name)
-            if screen_info is None:
-                continue
-            for area in screen_info.area_list:
-                if area.goto_list is None or len(area.goto_list) == 0:
-                    continue
-                for goto_screen in area.goto_list:
-                    if goto_screen not in bfs_list:
-                        bfs_list.append(goto_screen)
-
-        # 最后 尝试搜索中没有出现的画面
-        for screen_info in ctx.screen_loader.screen_info_list:
-            if screen_info.screen_name in bfs_list:
+
+    # 只按跳转关系排出优先顺序 不进行识别
+    bfs_idx = 0
+    while bfs_idx < len(bfs_list):
+        screen_info = ctx.screen_loader.get_screen(bfs_list[bfs_idx])
+        bfs_idx += 1
+        if screen_info is None:
+            continue
+        for area in screen_info.area_list:
+            if area.goto_list is None or len(area.goto_list) == 0:
                 continue
-            if is_target_screen(ctx, screen, screen_info=screen_info):
-                return screen_info.screen_name
+            for goto_screen in area.goto_list:
+                if goto_screen not in bfs_list:
+                    bfs_list.append(goto_screen)
+
+    return ctx.screen_loader.screen_identify_index.identify(
+        bfs_list,
+        lambda probe_list: check_screen_id_probes(ctx, screen, probe_list)
+    )
+
+
+def check_screen_id_probes(ctx: OneDragonContext, screen: MatLike,
+                           probe_list: List[ScreenIdProbe]) -> List[Tuple[bool, float]]:
+    """
+    识别多个画面标识区域 文本区域会一起批量OCR
+    判断逻辑与 find_area_in_screen 一致
+    :param ctx: 上下文
+    :param screen: 游戏截图
+    :param probe_list: 标识区域
+    :return: 每个区域的 (是否符合, 得分)
+    """
+    result_list: List[Tuple[bool, float]] = [(False, 0)] * len(probe_list)
+
+    text_idx_list: List[int] = []
+    for idx, probe in enumerate(probe_list):
+        area = probe.area
+        if area.is_text_area:
+            text_idx_list.append(idx)
+        elif area.is_template_area:
+            part = cv2_utils.crop_image_only(screen, area.rect)
+            mrl = ctx.tm.match_template(part, area.template_sub_dir, area.template_id,
+                                        threshold=area.template_match_threshold)
+            if mrl.max is not None:
+                result_list[idx] = (True, mrl.max.confidence)
+
+    if len(text_idx_list) == 1:
+        area = probe_list[text_idx_list[0]].area
+        to_ocr = ctx.analysis_cache.crop_by_color_range(screen, area.rect, area.color_range, dilate_k=2)
+        ocr_result_map_list = [ctx.ocr.run_ocr(to_ocr)]
+    elif len(text_idx_list) > 1:
+        region_list = []
+        for idx in text_idx_list:
+            area = probe_list[idx].area
+            to_ocr = ctx.analysis_cache.crop_by_color_range(screen, area.rect, area.color_range, dilate_k=2)
+            region_list.append((to_ocr, None))
+        ocr_result_map_list = ctx.ocr.run_ocr_batch(region_list)
     else:
-        for screen_info in ctx.screen_loader.screen_info_list:
-            if is_target_screen(ctx, screen, screen_info=screen_info):
-                return screen_info.screen_name
+        ocr_result_map_list = []
+
+    for idx, ocr_result_map in zip(text_idx_list, ocr_result_map_list):
+        area = probe_list[idx].area
+        target = gt(area.text)
+        find: bool = False
+        score: float = 0
+        for ocr_result in ocr_result_map.keys():
+            if str_utils.find_by_lcs(target, ocr_result, percent=area.lcs_percent):
+                find = True
+            if len(target) > 0:
+                lcs = str_utils.longest_common_subsequence_length(target.lower(), ocr_result.lower())
+                score = max(score, min(1.0, lcs / len(target)))
+        result_list[idx] = (find, score)
+
+    return result_list
 
 
 def is_target_screen(ctx: OneDragonContext, screen: MatLike,
@@ -214,10 +260,7 @@ def find_by_ocr(ctx: OneDragonContext, screen: MatLike, target_cn: str,
     """
     if lcs_percent is None:
         lcs_percent = area.lcs_percent
-    to_ocr_part = screen if area is None else cv2_utils.crop_image_only(screen, area.rect)
-    if color_range is not None:
-        mask = cv2.inRange(to_ocr_part, color_range[0], color_range[1])
-        to_ocr_part = cv2.bitwise_and(to_ocr_part, to_ocr_part, mask=mask)
+    to_ocr_part = ctx.analysis_cache.crop_by_color_range(screen, None if area is None else area.rect, color_range)
     ocr_result_map = ctx.ocr.run_ocr(to_ocr_part)
 
     to_click: Optional[Point] = None
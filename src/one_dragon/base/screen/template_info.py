@@ -11,12 +11,14 @@ from one_dragon.base.config.config_item import ConfigItem
 from one_dragon.base.config.yaml_operator import YamlOperator
 from one_dragon.base.geometry.point import Point
 from one_dragon.base.geometry.rectangle import Rect
+from one_dragon.base.screen.asset_bundle import AssetBundle
 from one_dragon.utils import os_utils, cal_utils, cv2_utils
 
 TEMPLATE_RAW_FILE_NAME = 'raw.png'
 TEMPLATE_MASK_FILE_NAME = 'mask.png'
 TEMPLATE_CONFIG_FILE_NAME = 'config.yml'
 TEMPLATE_FEATURES_FILE_NAME = 'features.xml'
+_KEY_POINT_BYTES = 64  # 一个cv2.KeyPoint大约占用的内存 用于估算
 
 
 class TemplateShapeEnum(Enum):
@@ -30,7 +32,12 @@ class TemplateShapeEnum(Enum):
 
 class TemplateInfo(YamlOperator):
 
-    def __init__(self, sub_dir: str, template_id: str):
+    def __init__(self, sub_dir: str, template_id: str, bundle: Optional[AssetBundle] = None):
+        """
+        :param sub_dir: 模板分类
+        :param template_id: 模板id
+        :param bundle: 资源包 包含这个模板时从资源包加载 不读取原文件
+        """
         # 旧的模板ID 在开发工具中使用 方便更改后迁移文件
         self.old_sub_dir: str = sub_dir
         self.old_template_id: str = template_id
@@ -40,7 +47,9 @@ class TemplateInfo(YamlOperator):
 
         self.screen_image: Optional[MatLike] = None
 
-        YamlOperator.__init__(self, file_path=self.get_yml_file_path())
+        bundle_item = bundle.get_template(sub_dir, template_id) if bundle is not None else None
+        YamlOperator.__init__(self, file_path=self.get_yml_file_path(),
+                              data=bundle_item['config'] if bundle_item is not None else None)
 
         self.template_name: str = self.get('template_name', '')
         self.template_shape: str = self.get('template_shape', TemplateShapeEnum.RECTANGLE.value.value)
@@ -52,13 +61,23 @@ class TemplateInfo(YamlOperator):
         self.auto_mask: bool = self.get('auto_mask', True)
         self.point_updated: bool = False  # 点位是否更改过 开发工具中用
 
-        self.raw: MatLike = cv2_utils.read_image(get_template_raw_path(self.sub_dir, self.template_id))  # 原图
-        self.mask: MatLike = cv2_utils.read_image(get_template_mask_path(self.sub_dir, self.template_id))  # 掩码
+        if bundle_item is not None:
+            self.raw: MatLike = bundle.get_array(bundle_item['raw'])  # 原图
+            self.mask: MatLike = bundle.get_array(bundle_item['mask'])  # 掩码
+        else:
+            self.raw: MatLike = cv2_utils.read_image(get_template_raw_path(self.sub_dir, self.template_id))  # 原图
+            self.mask: MatLike = cv2_utils.read_image(get_template_mask_path(self.sub_dir, self.template_id))  # 掩码
 
         # 运算后保存在内存的
         self._gray: MatLike = None  # 灰度图
         self._kps: List[cv2.KeyPoint] = None  # 关键点
         self._desc: MatLike = None  # 描述
+        self._pyramid_map: dict[Tuple[str, int, bool], Tuple[MatLike, Optional[MatLike]]] = {}  # 缩小后的模板 用于金字塔匹配
+        self.memory_version: int = 0  # 每次计算出新的灰度图、特征、金字塔时加1 缓存据此判断是否需要重新统计内存
+
+        # 资源包中预先计算的特征 使用时再转换
+        self._bundle: Optional[AssetBundle] = bundle if bundle_item is not None else None
+        self._bundle_item: Optional[dict] = bundle_item
 
     def get_yml_file_path(self) -> str:
         return get_template_config_path(self.sub_dir, self.template_id)
@@ -124,14 +143,39 @@ class TemplateInfo(YamlOperator):
         if self.raw is None:
             return None
         self._gray = cv2.cvtColor(self.raw, cv2.COLOR_RGB2GRAY)
+        self.memory_version += 1
         return self._gray
 
+    def get_pyramid(self, t: Optional[str], pyramid_level: int,
+                    with_mask: bool = True) -> Tuple[MatLike, Optional[MatLike]]:
+        """
+        获取缩小后的模板和掩码 用于金字塔匹配 计算后保存在内存
+        :param t: 模板类型
+        :param pyramid_level: 金字塔层数 每层缩小一半
+        :param with_mask: 是否需要掩码
+        :return: 缩小后的模板, 缩小后的掩码
+        """
+        key = ('raw' if t is None else t, pyramid_level, with_mask)
+        pyramid = self._pyramid_map.get(key)
+        if pyramid is None:
+            pyramid = cv2_utils.scale_down_template(self.get_image(t), self.mask if with_mask else None, pyramid_level)
+            self._pyramid_map[key] = pyramid
+            self.memory_version += 1
+        return pyramid
+
     @property
     def features(self) -> Tuple[List[cv2.KeyPoint], MatLike]:
         if self._kps is not None:
             return self._kps, self._desc
+        if self._bundle is not None:
+            bundle_features = self._bundle.get_template_features(self._bundle_item)
+            if bundle_features is not None:
+                self._kps, self._desc = bundle_features
+                self.memory_version += 1
+                return self._kps, self._desc
         if self.raw is not None:
             self._kps, self._desc = cv2_utils.feature_detect_and_compute(self.raw, self.mask)
+            self.memory_version += 1
         return self._kps, self._desc
 
     def make_template_dir(self) -> None:
@@ -484,13 +528,43 @@ class TemplateInfo(YamlOperator):
         ]
         self.point_updated = True
 
-    @lru_cache
     def get_template_features(self):
         """
-        获取特征
+        获取特征 计算后保存在模板中 模板被移出缓存时一起释放
         :return:
         """
-        return cv2_utils.feature_detect_and_compute(self.raw, self.mask)
+        return self.features
+
+    def get_memory_usage(self) -> Tuple[int, int]:
+        """
+        模板占用的内存 包括原图、掩码和已经计算的灰度图、特征、金字塔
+        从资源包加载的原图、掩码和特征是文件的内存映射 多个进程之间共享 单独统计
+        :return: 独占的字节数, 内存映射的字节数
+        """
+        owned: int = 0
+        mapped: int = 0
+        for arr in (self.raw, self.mask):
+            if arr is None:
+                continue
+            if self._bundle is not None:
+                mapped += arr.nbytes
+            else:
+                owned += arr.nbytes
+        if self._gray is not None:
+            owned += self._gray.nbytes
+        if self._kps is not None:
+            owned += len(self._kps) * _KEY_POINT_BYTES
+        if self._desc is not None:
+            if self._bundle is not None:
+                mapped += self._desc.nbytes
+            else:
+                owned += self._desc.nbytes
+        for pyramid_image, pyramid_mask in self._pyramid_map.values():
+            if pyramid_image is not None:
+                owned += pyramid_image.nbytes
+            if pyramid_mask is not None:
+                owned += pyramid_mask.nbytes
+        return owned, mapped
 
     def copy_new(self) -> None:
         """
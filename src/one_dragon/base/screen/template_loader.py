@@ -1,15 +1,66 @@
 import os
+from collections import OrderedDict
+
+import threading
 from cv2.typing import MatLike
-from typing import List, Optional
+from typing import List, Optional, Iterable, Tuple
 
+from one_dragon.base.screen.asset_bundle import AssetBundle, get_asset_bundle
 from one_dragon.base.screen.template_info import TemplateInfo, is_template_existed
 from one_dragon.utils import os_utils
+from one_dragon.utils.log_utils import log
 
 
 class TemplateLoader:
 
-    def __init__(self):
-        self.template: dict[str, TemplateInfo] = {}
+    DEFAULT_MAX_CACHE_BYTES: int = 128 * 1024 * 1024  # 默认最多缓存的模板内存
+
+    def __init__(self, max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+                 pinned_sub_dirs: Optional[Iterable[str]] = None):
+        """
+        模板的加载和缓存
+        缓存按最近使用淘汰 固定的分类不会被淘汰
+        :param max_cache_bytes: 最多缓存的内存 只统计独占的内存 资源包的内存映射在多个进程间共享 不计入
+        :param pinned_sub_dirs: 固定在缓存中的模板分类 例如战斗中高频使用的
+        """
+        self.template: OrderedDict[str, TemplateInfo] = OrderedDict()  # 按使用时间排序 最近使用的在最后
+        self.max_cache_bytes: int = max_cache_bytes
+        self.pinned_sub_dirs: set[str] = set(pinned_sub_dirs) if pinned_sub_dirs is not None else set()
+        self._cache_lock = threading.Lock()
+        self._usage_map: dict[str, Tuple[int, int]] = {}  # 每个模板上一次统计的内存和统计时的 memory_version 灰度图等使用时才计算 版本变化时重新统计
+        self._cache_bytes: int = 0  # 缓存的总内存 即 _usage_map 的合计
+        self.remove_version: int = 0  # 每次有模板被淘汰或替换时加1 其他地方保存了模板的 可以据此判断是否需要重新获取
+
+        # 统计
+        self._hit_cnt: int = 0
+        self._miss_cnt: int = 0
+        self._evict_cnt: int = 0
+        self._evict_bytes: int = 0
+
+        self._bundle: Optional[AssetBundle] = None  # 资源包 过期时为空
+        self._bundle_checked: bool = False  # 是否已经检查过资源包
+
+    @property
+    def bundle(self) -> Optional[AssetBundle]:
+        """
+        资源包 第一次使用时检查是否过期 之后不再检查
+        :return:
+        """
+        if not self._bundle_checked:
+            self._bundle = get_asset_bundle()
+            self._bundle_checked = True
+        return self._bundle
+
+    def pin_sub_dirs(self, *sub_dirs: str) -> None:
+        """
+        固定模板分类 这些分类的模板加载后不会被淘汰
+        :param sub_dirs: 模板分类
+        :return:
+        """
+        self.pinned_sub_dirs.update(sub_dirs)
+
+    def is_pinned(self, sub_dir: str) -> bool:
+        return sub_dir in self.pinned_sub_dirs
 
     def get_all_template_info_from_disk(self, need_raw: bool = True, need_config: bool = False) -> List[TemplateInfo]:
         """
@@ -50,14 +101,109 @@ class TemplateLoader:
         :param only_mask:
         :return: 模板图片
         """
-        if not is_template_existed(sub_dir, template_id, need_raw=not only_mask):
-            return None
-        template: TemplateInfo = TemplateInfo(sub_dir, template_id)
+        bundle = self.bundle
+        bundle_item = bundle.get_template(sub_dir, template_id) if bundle is not None else None
+        if bundle_item is not None:
+            # 资源包没有过期时 包含了全部模板 不需要再检查文件
+            if not only_mask and bundle_item['raw'] is None:
+                return None
+            template: TemplateInfo = TemplateInfo(sub_dir, template_id, bundle=bundle)
+        else:
+            if not is_template_existed(sub_dir, template_id, need_raw=not only_mask):
+                return None
+            template: TemplateInfo = TemplateInfo(sub_dir, template_id)
 
         key = '%s:%s' % (sub_dir, template_id)
-        self.template[key] = template
+        with self._cache_lock:
+            if key in self.template:
+                self.remove_version += 1
+            self.template[key] = template
+            self.template.move_to_end(key)
+            self._update_usage(key, template)
+            self._evict_if_needed(key)
         return template
 
+    def _update_usage(self, key: str, template: TemplateInfo) -> Tuple[int, int]:
+        """
+        重新统计一个模板的内存 需要在锁内调用
+        :param key: 模板的key
+        :param template: 模板
+        :return: 独占的字节数, 内存映射的字节数
+        """
+        owned, mapped = template.get_memory_usage()
+        old_owned, _ = self._usage_map.get(key, (0, 0))
+        self._cache_bytes += owned - old_owned
+        self._usage_map[key] = (owned, template.memory_version)
+        return owned, mapped
+
+    def _update_usage_if_changed(self, key: str, template: TemplateInfo) -> None:
+        """
+        模板计算出新的灰度图等之后 才重新统计内存 需要在锁内调用
+        :param key: 模板的key
+        :param template: 模板
+        :return:
+        """
+        usage = self._usage_map.get(key, None)
+        if usage is not None and usage[1] == template.memory_version:
+            return
+        self._update_usage(key, template)
+        self._evict_if_needed(key)
+
+    def _evict_if_needed(self, keep_key: str) -> None:
+        """
+        缓存超过上限时 从最久没使用的开始淘汰 需要在锁内调用
+        :param keep_key: 不淘汰的模板 即刚加入的
+        :return:
+        """
+        if self._cache_bytes <= self.max_cache_bytes:
+            return
+        for key in list(self.template.keys()):
+            if self._cache_bytes <= self.max_cache_bytes:
+                break
+            if key == keep_key or self.is_pinned(self.template[key].sub_dir):
+                continue
+            self.template.pop(key)
+            usage, _ = self._usage_map.pop(key, (0, 0))
+            self._cache_bytes -= usage
+            self._evict_cnt += 1
+            self._evict_bytes += usage
+            self.remove_version += 1
+
+    def preload_all(self) -> int:
+        """
+        将所有模板加载到内存 在启动时后台调用 之后使用模板时不需要再读取硬盘
+        资源包可用时只建立内存映射的视图 使用时才读取
+        固定的分类优先加载 其余的加载到缓存上限为止
+        已经加载的模板不会重复加载
+        :return: 新加载的模板数量
+        """
+        cnt: int = 0
+        key_list: List[Tuple[str, str]] = []
+        bundle = self.bundle
+        if bundle is not None:
+            for key in bundle.template_map:
+                sub_dir, template_id = key.split(':', 1)
+                key_list.append((sub_dir, template_id))
+        else:
+            template_dir = os_utils.get_path_under_work_dir('assets', 'template')
+            for sub_dir in os.listdir(template_dir):
+                sub_dir_path = os.path.join(template_dir, sub_dir)
+                if not os.path.isdir(sub_dir_path):
+                    continue
+                for template_id in os.listdir(sub_dir_path):
+                    key_list.append((sub_dir, template_id))
+
+        key_list.sort(key=lambda i: 0 if self.is_pinned(i[0]) else 1)  # 稳定排序 只把固定的分类放前面
+        for sub_dir, template_id in key_list:
+            key = '%s:%s' % (sub_dir, template_id)
+            if key in self.template:
+                continue
+            if not self.is_pinned(sub_dir) and self._cache_bytes >= self.max_cache_bytes:
+                continue
+            if self.load_template(sub_dir, template_id) is not None:
+                cnt += 1
+        return cnt
+
     def get_template(self, sub_dir: str, template_id: str) -> TemplateInfo:
         """
         获取某个模板 会存在内容
@@ -66,20 +212,83 @@ class TemplateLoader:
         :return: 模板图片
         """
         key = '%s:%s' % (sub_dir, template_id)
-        if key in self.template:
-            return self.template[key]
-        else:
-            return self.load_template(sub_dir, template_id)
+        with self._cache_lock:
+            template = self.template.get(key)
+            if template is not None:
+                self.template.move_to_end(key)
+                self._update_usage_if_changed(key, template)
+                self._hit_cnt += 1
+                return template
+            self._miss_cnt += 1
+        return self.load_template(sub_dir, template_id)
+
+    def is_template_cached(self, template: TemplateInfo) -> bool:
+        """
+        模板是否仍在缓存中 被淘汰或者被重新加载的模板 返回False
+        :param template: 模板
+        :return:
+        """
+        key = '%s:%s' % (template.sub_dir, template.template_id)
+        with self._cache_lock:
+            return self.template.get(key) is template
 
     def get_template_mask(self, sub_dir: str, template_id: str) -> MatLike:
         """
         获取某个模板的掩码
         :param sub_dir: 子文件夹
         :param template_id: 模板id
-        :return: 模板图片
+        :return: 模板图片 模板不存在时返回None
         """
         key = '%s:%s' % (sub_dir, template_id)
-        if key in self.template:
-            return self.template[key].mask
-        else:
-            return self.load_template(sub_dir, template_id, only_mask=True).mask
+        with self._cache_lock:
+            template = self.template.get(key)
+            if template is not None:
+                self.template.move_to_end(key)
+                self._update_usage_if_changed(key, template)
+                self._hit_cnt += 1
+                return template.mask
+            self._miss_cnt += 1
+        template = self.load_template(sub_dir, template_id, only_mask=True)
+        return template.mask if template is not None else None
+
+    def get_stats(self) -> dict:
+        """
+        :return: 缓存的统计 内存为当前重新统计的
+        """
+        with self._cache_lock:
+            owned_bytes: int = 0
+            mapped_bytes: int = 0
+            pinned_bytes: int = 0
+            pinned_cnt: int = 0
+            for key, template in self.template.items():
+                owned, mapped = self._update_usage(key, template)
+                owned_bytes += owned
+                mapped_bytes += mapped
+                if self.is_pinned(template.sub_dir):
+                    pinned_bytes += owned
+                    pinned_cnt += 1
+            request_cnt = self._hit_cnt + self._miss_cnt
+            return {
+                'template_cnt': len(self.template),
+                'pinned_cnt': pinned_cnt,
+                'bytes': owned_bytes,
+                'pinned_bytes': pinned_bytes,
+                'mapped_bytes': mapped_bytes,
+                'max_bytes': self.max_cache_bytes,
+                'hit_cnt': self._hit_cnt,
+                'miss_cnt': self._miss_cnt,
+                'hit_rate': self._hit_cnt / request_cnt if request_cnt > 0 else 0,
+                'evict_cnt': self._evict_cnt,
+                'evict_bytes': self._evict_bytes,
+            }
+
+    def log_stats(self) -> None:
+        """
+        输出缓存的统计
+        :return:
+        """
+        stats = self.get_stats()
+        log.info('模板缓存 %d 个 固定 %d 个 内存 %.2fMB/%.2fMB 内存映射 %.2fMB 命中率 %.2f%% 淘汰 %d 个',
+                 stats['template_cnt'], stats['pinned_cnt'],
+                 stats['bytes'] / 1024 / 1024, stats['max_bytes'] / 1024 / 1024,
+                 stats['mapped_bytes'] / 1024 / 1024, stats['hit_rate'] * 100, stats['evict_cnt'])
@@ -5,7 +5,7 @@ from qfluentwidgets import FluentIconBase, PrimaryPushButton, FluentIcon, PushBu
 from typing import Union, Optional
 
 from one_dragon.base.operation.application_base import Application
-from one_dragon.base.operation.context_event_bus import ContextEventItem
+from one_dragon.base.operation.context_event_bus import ContextEventItem, ContextEventDispatchModeEnum
 from one_dragon.base.operation.one_dragon_context import ContextKeyboardEventEnum, ContextRunningStateEventEnum, \
     OneDragonContext
 from one_dragon.gui.widgets.vertical_scroll_interface import VerticalScrollInterface
@@ -28,13 +28,19 @@ class AppRunner(QThread):
         运行 最后发送结束信号
         :return:
         """
-        self.ctx.listen_event(ContextRunningStateEventEnum.START_RUNNING.value, self._on_state_changed)
-        self.ctx.listen_event(ContextRunningStateEventEnum.PAUSE_RUNNING.value, self._on_state_changed)
-        self.ctx.listen_event(ContextRunningStateEventEnum.STOP_RUNNING.value, self._on_state_changed)
-        self.ctx.listen_event(ContextRunningStateEventEnum.RESUME_RUNNING.value, self._on_state_changed)
+        # 界面只需要按最新的状态刷新 合并连续的状态变化
+        for event_enum in [
+            ContextRunningStateEventEnum.START_RUNNING,
+            ContextRunningStateEventEnum.PAUSE_RUNNING,
+            ContextRunningStateEventEnum.STOP_RUNNING,
+            ContextRunningStateEventEnum.RESUME_RUNNING,
+        ]:
+            self.ctx.listen_event(event_enum.value, self._on_state_changed,
+                                  mode=ContextEventDispatchModeEnum.QUEUE, coalesce=True)
 
         self.app.execute()
 
+        self.ctx.log_event_metrics(self._on_state_changed)
         self.ctx.unlisten_all_event(self)
 
     def _on_state_changed(self, ignored) -> None:
@@ -119,7 +125,8 @@ class AppRunInterface(VerticalScrollInterface):
 
     def on_interface_shown(self) -> None:
         VerticalScrollInterface.on_interface_shown(self)
-        self.ctx.listen_event(ContextKeyboardEventEnum.PRESS.value, self._on_key_press)
+        self.ctx.listen_event(ContextKeyboardEventEnum.PRESS.value, self._on_key_press,
+                              mode=ContextEventDispatchModeEnum.QUEUE)
 
     def on_interface_hidden(self) -> None:
         VerticalScrollInterface.on_interface_hidden(self)
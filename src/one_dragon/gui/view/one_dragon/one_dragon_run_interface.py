@@ -6,7 +6,7 @@ from typing import List, Optional
 from one_dragon.base.config.one_dragon_app_config import OneDragonAppConfig
 from one_dragon.base.config.one_dragon_config import InstanceRun, AfterDoneOpEnum, OneDragonConfig
 from one_dragon.base.operation.application_base import Application, ApplicationEventId
-from one_dragon.base.operation.context_event_bus import ContextEventItem
+from one_dragon.base.operation.context_event_bus import ContextEventItem, ContextEventDispatchModeEnum
 from one_dragon.base.operation.one_dragon_app import OneDragonApp
 from one_dragon.base.operation.one_dragon_context import OneDragonContext, ContextKeyboardEventEnum, \
     ContextInstanceEventEnum
@@ -165,10 +165,14 @@ class OneDragonRunInterface(VerticalScrollInterface):
         VerticalScrollInterface.on_interface_shown(self)
         self._init_app_list()
 
-        self.ctx.listen_event(ContextKeyboardEventEnum.PRESS.value, self._on_key_press)
-        self.ctx.listen_event(ApplicationEventId.APPLICATION_START.value, self._on_app_state_changed)
-        self.ctx.listen_event(ApplicationEventId.APPLICATION_STOP.value, self._on_app_state_changed)
-        self.ctx.listen_event(ContextInstanceEventEnum.instance_active.value, self._on_instance_event)
+        self.ctx.listen_event(ContextKeyboardEventEnum.PRESS.value, self._on_key_press,
+                              mode=ContextEventDispatchModeEnum.QUEUE)
+        self.ctx.listen_event(ApplicationEventId.APPLICATION_START.value, self._on_app_state_changed,
+                              mode=ContextEventDispatchModeEnum.QUEUE, coalesce=True)
+        self.ctx.listen_event(ApplicationEventId.APPLICATION_STOP.value, self._on_app_state_changed,
+                              mode=ContextEventDispatchModeEnum.QUEUE, coalesce=True)
+        self.ctx.listen_event(ContextInstanceEventEnum.instance_active.value, self._on_instance_event,
+                              mode=ContextEventDispatchModeEnum.QUEUE, coalesce=True)
 
         self.instance_run_opt.value_changed.disconnect(self._on_instance_run_changed)
 
@@ -149,6 +149,112 @@ def match_template(source: MatLike, template: MatLike, threshold,
     return match_result_list
 
 
+def scale_down_template(template: MatLike, mask: Optional[MatLike], pyramid_level: int) -> Tuple[MatLike, Optional[MatLike]]:
+    """
+    缩小模板 用于金字塔匹配中的粗略匹配
+    :param template: 模板
+    :param mask: 掩码
+    :param pyramid_level: 金字塔层数 每层缩小一半
+    :return: 缩小后的模板, 缩小后的掩码
+    """
+    scale = 2 ** pyramid_level
+    size = (max(template.shape[1] // scale, 1), max(template.shape[0] // scale, 1))
+    small_template = cv2.resize(template, size, interpolation=cv2.INTER_AREA)
+    small_mask = None if mask is None else cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+    return small_template, small_mask
+
+
+def match_template_coarse_to_fine(source: MatLike, template: MatLike, threshold,
+                                  mask: np.ndarray = None, only_best: bool = True,
+                                  ignore_inf: bool = False,
+                                  pyramid_level: int = 1,
+                                  small_template: Optional[MatLike] = None,
+                                  small_mask: Optional[MatLike] = None,
+                                  coarse_threshold_diff: float = 0.2,
+                                  max_candidate_cnt: int = 4) -> MatchResultList:
+    """
+    金字塔匹配 先在缩小的图中粗略匹配 再只在候选位置附近用原图精确匹配
+    用于较大区域的匹配 结果与 match_template 基本一致
+    以下情况会退化为 match_template
+    - 缩小后模板太小 (短边小于8像素)
+    - 不是只返回最好的结果 并且粗略匹配的候选位置过多
+    :param source: 原图
+    :param template: 模板
+    :param threshold: 阈值
+    :param mask: 掩码
+    :param only_best: 只返回最好的结果
+    :param ignore_inf: 是否忽略无限大的结果
+    :param pyramid_level: 金字塔层数 每层缩小一半
+    :param small_template: 预先缩小的模板 为空时现场缩小
+    :param small_mask: 预先缩小的掩码
+    :param coarse_threshold_diff: 缩小后匹配度会下降 粗略匹配使用的阈值比 threshold 低这个值
+    :param max_candidate_cnt: 最多精确匹配多少个候选位置
+    :return: 所有匹配结果
+    """
+    scale = 2 ** pyramid_level
+    sh, sw = source.shape[0], source.shape[1]
+    th, tw = template.shape[0], template.shape[1]
+    if pyramid_level <= 0 or min(th, tw) // scale < 8 or sh < th or sw < tw:
+        return match_template(source, template, threshold, mask=mask, only_best=only_best, ignore_inf=ignore_inf)
+
+    if small_template is None:
+        small_template, small_mask = scale_down_template(template, mask, pyramid_level)
+
+    small_source = cv2.resize(source, (sw // scale, sh // scale), interpolation=cv2.INTER_AREA)
+    if (small_source.shape[0] < small_template.shape[0]
+            or small_source.shape[1] < small_template.shape[1]):
+        return match_template(source, template, threshold, mask=mask, only_best=only_best, ignore_inf=ignore_inf)
+
+    coarse_result = cv2.matchTemplate(small_source, small_template, cv2.TM_CCOEFF_NORMED, mask=small_mask)
+    # 无限大的结果在 match_template 中会被认为是匹配的 这里同样作为候选
+    coarse_result = np.nan_to_num(coarse_result, nan=-1, posinf=-1 if ignore_inf else 1, neginf=-1)
+
+    # 选出候选峰值 每选一个 就把其邻域排除
+    coarse_threshold = threshold - coarse_threshold_diff
+    candidate_list: List[Tuple[int, int]] = []
+    while len(candidate_list) < max_candidate_cnt:
+        _, max_val, _, max_loc = cv2.minMaxLoc(coarse_result)
+        if max_val < coarse_threshold:
+            break
+        if only_best and len(candidate_list) == 0:
+            # 只需要最好的结果时 明显比最高峰值差的位置不需要精确匹配
+            coarse_threshold = max(coarse_threshold, max_val - coarse_threshold_diff / 2)
+        candidate_list.append(max_loc)
+        cx, cy = max_loc
+        coarse_result[max(cy - 1, 0):cy + 2, max(cx - 1, 0):cx + 2] = -1
+
+    if len(candidate_list) == 0:
+        return MatchResultList(only_best=only_best)
+
+    if not only_best and np.max(coarse_result) >= coarse_threshold:
+        # 候选位置太多 无法保证找到所有结果
+        return match_template(source, template, threshold, mask=mask, only_best=only_best, ignore_inf=ignore_inf)
+
+    # 在原图中 候选位置附近精确匹配 合法的左上角范围是 [0, sw - tw] x [0, sh - th]
+    result_map: dict[Tuple[int, int], float] = {}
+    for cx, cy in candidate_list:
+        x1 = max(cx * scale - scale, 0)
+        y1 = max(cy * scale - scale, 0)
+        x2 = min(cx * scale + scale * 2, sw - tw)
+        y2 = min(cy * scale + scale * 2, sh - th)
+        if x1 > x2 or y1 > y2:
+            continue
+        part = source[y1:y2 + th, x1:x2 + tw]
+        result = cv2.matchTemplate(part, template, cv2.TM_CCOEFF_NORMED, mask=mask)
+        filtered_locations = np.where(np.logical_and(
+            result >= threshold,
+            np.isfinite(result) if ignore_inf else np.ones_like(result))
+        )
+        for pt in zip(*filtered_locations[::-1]):
+            result_map[(x1 + pt[0], y1 + pt[1])] = result[pt[1], pt[0]]
+
+    match_result_list = MatchResultList(only_best=only_best)
+    for pos in sorted(result_map.keys(), key=lambda i: (i[1], i[0])):
+        match_result_list.append(MatchResult(result_map[pos], pos[0], pos[1], tw, th))
+
+    return match_result_list
+
+
 def concat_vertically(img: MatLike, next_img: MatLike, decision_height: int = 150):
     """
     垂直拼接图片。
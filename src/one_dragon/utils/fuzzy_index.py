@@ -0,0 +1,193 @@
+import difflib
+import heapq
+
+from typing import List, Optional, Set, Tuple
+
+from one_dragon.utils import str_utils
+from one_dragon.utils.i18_utils import gt, get_default_lang
+
+
+class FuzzyMatchResult:
+
+    def __init__(self, idx: int, word: str, score: float):
+        """
+        模糊匹配的一个结果
+        :param idx: 在词语列表中的下标
+        :param word: 词语
+        :param score: 匹配分数 0~1
+        """
+        self.idx: int = idx
+        self.word: str = word
+        self.score: float = score
+
+
+class FuzzyIndex:
+
+    def __init__(self, word_list: List[str], ignore_case: bool = True):
+        """
+        对一组固定的词语建立索引 用于OCR结果与游戏数据的多次匹配
+        - 每个词语预先计算字符位掩码 用位并行算法计算最长公共子序列
+        - 字符倒排索引 没有任何相同字符的词语 最长公共子序列和difflib的相似度都为0 可以直接跳过
+        :param word_list: 词语列表 通常是翻译后的游戏数据名称
+        :param ignore_case: 最长公共子序列匹配时是否忽略大小写 difflib匹配时与 difflib.get_close_matches 一致 区分大小写
+        """
+        self.word_list: List[str] = word_list
+        self.ignore_case: bool = ignore_case
+
+        self._first_idx_map: dict[str, int] = {}  # 词语第一次出现的下标 与 list.index 一致
+        self._lcs_word_list: List[str] = []  # 用于最长公共子序列的词语
+        self._char_mask_list: List[dict[str, int]] = []
+        self._char_index: dict[str, List[int]] = {}  # 区分大小写的字符 -> 包含它的词语下标
+        self._lcs_char_index: dict[str, List[int]] = {}  # 用于最长公共子序列的字符 -> 包含它的词语下标
+        self._empty_idx_list: List[int] = []  # 空字符串的下标 与空文本的difflib相似度为1
+
+        for idx, word in enumerate(word_list):
+            if word not in self._first_idx_map:
+                self._first_idx_map[word] = idx
+            if len(word) == 0:
+                self._empty_idx_list.append(idx)
+
+            lcs_word = word.lower() if ignore_case else word
+            self._lcs_word_list.append(lcs_word)
+            self._char_mask_list.append(str_utils.build_char_mask(lcs_word))
+
+            for c in set(word):
+                self._char_index.setdefault(c, []).append(idx)
+            for c in set(lcs_word):
+                self._lcs_char_index.setdefault(c, []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self.word_list)
+
+    def get_candidate_idx_set(self, text: str, for_lcs: bool = True) -> Set[int]:
+        """
+        获取与文本至少有一个相同字符的词语下标
+        :param text: 文本
+        :param for_lcs: 是否用于最长公共子序列匹配 是的话按 ignore_case 处理大小写
+        :return:
+        """
+        if for_lcs:
+            char_index = self._lcs_char_index
+            if self.ignore_case:
+                text = text.lower()
+        else:
+            char_index = self._char_index
+
+        result: Set[int] = set()
+        for c in set(text):
+            idx_list = char_index.get(c)
+            if idx_list is not None:
+                result.update(idx_list)
+        return result
+
+    def lcs_length(self, idx: int, text: str) -> int:
+        """
+        计算某个词语与文本的最长公共子序列长度
+        :param idx: 词语下标
+        :param text: 文本
+        :return:
+        """
+        if self.ignore_case:
+            text = text.lower()
+        return str_utils.lcs_length_by_char_mask(self._char_mask_list[idx], len(self._lcs_word_list[idx]), text)
+
+    def is_lcs_matched(self, idx: int, text: str, percent: float = 0.3) -> bool:
+        """
+        与 str_utils.find_by_lcs(word_list[idx], text, percent) 结果一致
+        :param idx: 词语下标
+        :param text: 文本 通常是OCR结果
+        :param percent: 最长公共子序列长度 需要占 词语长度 的百分比
+        :return:
+        """
+        word = self.word_list[idx]
+        if text is None or len(word) == 0 or len(text) == 0:
+            return False
+        return self.lcs_length(idx, text) >= len(word) * percent
+
+    def match_by_lcs(self, text: str, top_k: int = 1,
+                     lcs_percent_threshold: Optional[float] = None) -> List[FuzzyMatchResult]:
+        """
+        按最长公共子序列长度占词语长度的比例 找出最匹配的词语
+        ignore_case=False 且 top_k=1 时 与 str_utils.find_best_match_by_lcs 结果一致
+        :param text: 文本 通常是OCR结果
+        :param top_k: 最多返回的数量
+        :param lcs_percent_threshold: 要求的比例
+        :return: 按分数从高到低 分数相同时下标小的在前
+        """
+        if text is None or len(text) == 0:
+            return []
+        text_usage = text.lower() if self.ignore_case else text
+
+        scored_list: List[Tuple[float, int]] = []
+        for idx in self.get_candidate_idx_set(text_usage, for_lcs=True):
+            word = self._lcs_word_list[idx]
+            lcs = str_utils.lcs_length_by_char_mask(self._char_mask_list[idx], len(word), text_usage)
+            if lcs == 0:
+                continue
+            score = lcs * 1.0 / len(word)
+            if lcs_percent_threshold is not None and score < lcs_percent_threshold:
+                continue
+            scored_list.append((score, idx))
+
+        top_list = heapq.nsmallest(top_k, scored_list, key=lambda i: (-i[0], i[1]))
+        return [FuzzyMatchResult(idx, self.word_list[idx], score) for score, idx in top_list]
+
+    def match_by_difflib(self, text: str, top_k: int = 1, cutoff: float = 0.6) -> List[FuzzyMatchResult]:
+        """
+        按difflib的相似度 找出最匹配的词语
+        结果与 difflib.get_close_matches(text, word_list, n=top_k, cutoff=cutoff) 一致 下标为词语第一次出现的位置
+        :param text: 文本 通常是OCR结果
+        :param top_k: 最多返回的数量
+        :param cutoff: 最低的相似度
+        :return: 按分数从高到低
+        """
+        if text is None:
+            return []
+        if cutoff > 0:
+            idx_list = self.get_candidate_idx_set(text, for_lcs=False)
+            if len(text) == 0:
+                idx_list.update(self._empty_idx_list)
+        else:
+            idx_list = range(len(self.word_list))
+
+        s = difflib.SequenceMatcher()
+        s.set_seq2(text)
+        scored_list: List[Tuple[float, str]] = []
+        for idx in idx_list:
+            word = self.word_list[idx]
+            s.set_seq1(word)
+            if s.real_quick_ratio() >= cutoff and s.quick_ratio() >= cutoff:
+                ratio = s.ratio()
+                if ratio >= cutoff:
+                    scored_list.append((ratio, word))
+
+        top_list = heapq.nlargest(top_k, scored_list)
+        return [FuzzyMatchResult(self._first_idx_map[word], word, score) for score, word in top_list]
+
+
+class GtFuzzyIndexCache:
+
+    def __init__(self):
+        """
+        缓存翻译后的词语索引 按当前语言区分
+        游戏数据重新加载时 需要调用 clear
+        """
+        self._index_map: dict[Tuple[str, str], FuzzyIndex] = {}
+
+    def get(self, key: str, cn_word_list: List[str], ignore_case: bool = True) -> FuzzyIndex:
+        """
+        获取一组中文词语翻译后的索引 第一次获取时构建
+        :param key: 这组词语的唯一标识
+        :param cn_word_list: 中文词语列表
+        :param ignore_case: 最长公共子序列匹配时是否忽略大小写
+        :return:
+        """
+        cache_key = (key, get_default_lang())
+        index = self._index_map.get(cache_key)
+        if index is None:
+            index = FuzzyIndex([gt(i) for i in cn_word_list], ignore_case=ignore_case)
+            self._index_map[cache_key] = index
+        return index
+
+    def clear(self) -> None:
+        self._index_map.clear()
@@ -46,25 +46,42 @@ def find_by_lcs(source: str, target: str, percent: float = 0.3,
 def longest_common_subsequence_length(str1: str, str2: str) -> int:
     """
     找两个字符串的最长公共子序列长度
+    使用位并行的算法 每个字符串只需要遍历一次
     :param str1:
     :param str2:
     :return: 长度
     """
-    m = len(str1)
-    n = len(str2)
+    if len(str1) > len(str2):  # 用短的做位掩码
+        str1, str2 = str2, str1
+    return lcs_length_by_char_mask(build_char_mask(str1), len(str1), str2)
 
-    # 创建一个二维数组用于存储中间结果
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
 
-    # 动态规划求解
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            if str1[i - 1] == str2[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1] + 1
-            else:
-                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
+def build_char_mask(s: str) -> dict[str, int]:
+    """
+    构建字符的位掩码 用于位并行计算最长公共子序列
+    :param s: 字符串
+    :return: key=字符 value=该字符出现的位置 第i位为1表示第i个字符是它
+    """
+    char_mask: dict[str, int] = {}
+    for i, c in enumerate(s):
+        char_mask[c] = char_mask.get(c, 0) | (1 << i)
+    return char_mask
+
 
-    return dp[m][n]
+def lcs_length_by_char_mask(char_mask: dict[str, int], length: int, target: str) -> int:
+    """
+    位并行计算最长公共子序列长度 Hyyrö 的算法
+    :param char_mask: 字符串1的字符位掩码 build_char_mask 的结果
+    :param length: 字符串1的长度
+    :param target: 字符串2
+    :return: 长度
+    """
+    full = (1 << length) - 1
+    v = full  # 为0的位表示 字符串1的对应字符在公共子序列中
+    for c in target:
+        u = v & char_mask.get(c, 0)
+        v = ((v + u) | (v - u)) & full
+    return length - bin(v).count('1')
 
 
 def get_positive_digits(v: str, err: Optional[int] = None) -> Optional[int]:
@@ -102,15 +102,69 @@ class DetectObjectResult:
         return self.y2 - self.y1
 
 
+class DetectResultArrays:
+
+    def __init__(self,
+                 boxes: np.ndarray,
+                 scores: np.ndarray,
+                 class_ids: np.ndarray,
+                 idx_2_class: dict[int, DetectClass]
+                 ):
+        """
+        一帧画面的识别结果 每个字段一个数组 下标相同的是同一个结果
+        需要逐个使用时 再转化成 DetectObjectResult
+        :param boxes: 目标的位置 xyxy shape=(n, 4)
+        :param scores: 得分（置信度） shape=(n,)
+        :param class_ids: 类别的下标 shape=(n,)
+        :param idx_2_class: 类别下标对应的类别
+        """
+        self.boxes: np.ndarray = boxes
+        """目标的位置 xyxy"""
+
+        self.scores: np.ndarray = scores
+        """得分（置信度）"""
+
+        self.class_ids: np.ndarray = class_ids
+        """类别的下标"""
+
+        self.idx_2_class: dict[int, DetectClass] = idx_2_class
+        """类别下标对应的类别"""
+
+    @staticmethod
+    def empty(idx_2_class: dict[int, DetectClass]) -> 'DetectResultArrays':
+        return DetectResultArrays(
+            boxes=np.zeros((0, 4), dtype=np.float32),
+            scores=np.zeros((0,), dtype=np.float32),
+            class_ids=np.zeros((0,), dtype=np.int64),
+            idx_2_class=idx_2_class
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def to_object_list(self) -> List[DetectObjectResult]:
+        """
+        :return: 每个结果一个对象
+        """
+        return [
+            DetectObjectResult(rect=rect,
+                               score=score,
+                               detect_class=self.idx_2_class[class_id])
+            for rect, score, class_id in zip(self.boxes.tolist(), self.scores.tolist(), self.class_ids.tolist())
+        ]
+
+
 class DetectFrameResult:
 
     def __init__(self,
                  raw_image: MatLike,
-                 results: List[DetectObjectResult],
+                 results: Optional[List[DetectObjectResult]] = None,
                  run_time: Optional[float] = None,
+                 result_arrays: Optional[DetectResultArrays] = None,
                  ):
         """
         一帧画面的识别结果
+        传入 result_arrays 时 results 在第一次使用时才创建
         """
         self.run_time: float = time.time() if run_time is None else run_time
         """识别时间"""
@@ -118,8 +172,19 @@ class DetectFrameResult:
         self.raw_image: MatLike = raw_image
         """识别的原始图片"""
 
-        self.results: List[DetectObjectResult] = results
-        """识别的结果"""
+        self.result_arrays: Optional[DetectResultArrays] = result_arrays
+        """识别的结果 按字段的数组"""
+
+        self._results: Optional[List[DetectObjectResult]] = results
+
+    @property
+    def results(self) -> List[DetectObjectResult]:
+        """
+        识别的结果
+        """
+        if self._results is None:
+            self._results = [] if self.result_arrays is None else self.result_arrays.to_object_list()
+        return self._results
 
 
 def nms(boxes, scores, iou_threshold):
@@ -144,7 +209,29 @@ def nms(boxes, scores, iou_threshold):
     return keep_boxes
 
 
-def multiclass_nms(boxes, scores, class_ids, iou_threshold):
+def multiclass_nms(boxes, scores, class_ids, iou_threshold) -> np.ndarray:
+    """
+    按类别分别进行NMS
+    使用 cv2.dnn.NMSBoxesBatched 不同类别的框加上偏移后一次完成 与 multiclass_nms_by_loop 的结果一致
+    :param boxes: xyxy shape=(n, 4)
+    :param scores: 得分 shape=(n,)
+    :param class_ids: 类别 shape=(n,)
+    :param iou_threshold: iou阈值
+    :return: 保留的下标 按类别排序 同类别的按得分从高到低
+    """
+    if len(boxes) == 0:
+        return np.zeros((0,), dtype=np.int64)
+
+    xywh = np.array(boxes, dtype=np.float32)
+    xywh[:, 2:] -= xywh[:, :2]
+    keep = np.asarray(cv2.dnn.NMSBoxesBatched(xywh, scores, class_ids, 0, iou_threshold),
+                      dtype=np.int64).reshape(-1)
+
+    # 与原来逐个类别处理的顺序一致
+    return keep[np.lexsort((-scores[keep], class_ids[keep]))]
+
+
+def multiclass_nms_by_loop(boxes, scores, class_ids, iou_threshold):
 
     unique_class_ids = np.unique(class_ids)
 
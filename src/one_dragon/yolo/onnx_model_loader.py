@@ -1,5 +1,6 @@
 import time
 
+import numpy as np
 import onnxruntime as ort
 import os
 import urllib.request
@@ -7,6 +8,8 @@ import zipfile
 from typing import Optional, List
 
 from one_dragon.yolo.log_utils import log
+from one_dragon.yolo.onnx_utils import InputTensorBuffer
+from one_dragon.yolo.onnx_session_manager import onnx_session_manager
 
 _GH_PROXY_URL = 'https://ghp.ci'
 
@@ -36,6 +39,9 @@ class OnnxModelLoader:
         self.input_names: List[str] = []
         self.onnx_input_width: int = 0
         self.onnx_input_height: int = 0
+        self.onnx_input_uint8: bool = False  # 输入是否为 uint8 即归一化已经合并到模型中
+        self.onnx_input_dynamic_batch: bool = False  # 输入的批次大小是否可变 可变时多张图片可以一次推理
+        self.input_buffer: Optional[InputTensorBuffer] = None  # 预处理复用的输入内存
         self.output_names: List[str] = []
 
         if not self.check_and_download_model():  # 新模型不ok
@@ -122,18 +128,10 @@ class OnnxModelLoader:
         加载模型
         :return:
         """
-        availables = ort.get_available_providers()
-        providers = ['DmlExecutionProvider' if self.gpu else 'CPUExecutionProvider']
-        if self.gpu and 'DmlExecutionProvider' not in availables:
-            log.error('机器未支持DirectML 使用CPU')
-            providers = ['CPUExecutionProvider']
-
+        providers = get_providers(self.gpu)
         onnx_path = os.path.join(self.model_dir_path, 'model.onnx')
         log.info('加载模型 %s', onnx_path)
-        self.session = ort.InferenceSession(
-            onnx_path,
-            providers=providers
-        )
+        self.session = onnx_session_manager.get_session(onnx_path, model_name=self.model_name, providers=providers)
         self.get_input_details()
         self.get_output_details()
 
@@ -144,7 +142,54 @@ class OnnxModelLoader:
         shape = model_inputs[0].shape
         self.onnx_input_height = shape[2]
         self.onnx_input_width = shape[3]
+        self.onnx_input_uint8 = model_inputs[0].type == 'tensor(uint8)'
+        self.onnx_input_dynamic_batch = not isinstance(shape[0], int) or shape[0] <= 0
+        self.input_buffer = InputTensorBuffer(self.onnx_input_width, self.onnx_input_height,
+                                              uint8_input=self.onnx_input_uint8)
+
+    def inference_batch(self, input_tensor: np.ndarray) -> List[np.ndarray]:
+        """
+        多张图片的推理 返回每个输出合并后的结果 第一维是图片
+        批次大小固定的模型 逐张推理后再合并
+        :param input_tensor: 多张图片的输入 NCHW
+        :return: onnx模型推理得到的结果
+        """
+        if self.onnx_input_dynamic_batch or len(input_tensor) == 1:
+            return self.session.run(self.output_names, {self.input_names[0]: input_tensor})
+
+        output_list = [self.session.run(self.output_names, {self.input_names[0]: input_tensor[i:i + 1]})
+                       for i in range(len(input_tensor))]
+        return [np.concatenate([i[idx] for i in output_list], axis=0) for idx in range(len(self.output_names))]
 
     def get_output_details(self):
         model_outputs = self.session.get_outputs()
         self.output_names = [model_outputs[i].name for i in range(len(model_outputs))]
+
+
+def get_providers(gpu: bool) -> List[str]:
+    """
+    获取推理方式
+    :param gpu: 是否使用GPU加速
+    :return:
+    """
+    if gpu:
+        if 'DmlExecutionProvider' in ort.get_available_providers():
+            return ['DmlExecutionProvider']
+        log.error('机器未支持DirectML 使用CPU')
+    return ['CPUExecutionProvider']
+
+
+def preload_model(model_parent_dir_path: str, model_name: str, gpu: bool = False) -> bool:
+    """
+    预先创建模型的推理会话 之后创建 OnnxModelLoader 时可以直接使用
+    模型未下载时不会下载
+    :param model_parent_dir_path: 放置所有模型的根目录
+    :param model_name: 模型名称
+    :param gpu: 是否使用GPU加速
+    :return: 是否加载成功
+    """
+    onnx_path = os.path.join(model_parent_dir_path, model_name, 'model.onnx')
+    if not os.path.exists(onnx_path):
+        return False
+    onnx_session_manager.get_session(onnx_path, model_name=model_name, providers=get_providers(gpu))
+    return True
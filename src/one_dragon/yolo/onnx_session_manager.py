@@ -0,0 +1,294 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import Future
+from typing import Optional, List, Tuple
+
+import onnxruntime as ort
+
+from one_dragon.yolo.log_utils import log
+
+
+class OnnxSessionProfile:
+
+    def __init__(self,
+                 use_global_thread_pool: bool = True,
+                 intra_op_num_threads: int = 0,
+                 inter_op_num_threads: int = 0,
+                 graph_optimization_level: Optional[ort.GraphOptimizationLevel] = None):
+        """
+        单个模型的会话配置
+        onnxruntime 在使用全局线程池后 不允许再创建使用独立线程池的会话
+        因此是否使用全局线程池 在创建第一个会话时就整体决定 见 OnnxSessionManager.get_thread_pool_mode
+        :param use_global_thread_pool: 是否使用全局线程池 在第一个会话创建前有模型设置为False时 所有模型都使用独立线程池
+        :param intra_op_num_threads: 使用独立线程池时 单个算子内的并行线程数 0为管理器的默认值
+        :param inter_op_num_threads: 使用独立线程池时 算子间的并行线程数 0为管理器的默认值
+        :param graph_optimization_level: 图优化等级 为空时使用管理器的默认值
+        """
+        self.use_global_thread_pool: bool = use_global_thread_pool
+        self.intra_op_num_threads: int = intra_op_num_threads
+        self.inter_op_num_threads: int = inter_op_num_threads
+        self.graph_optimization_level: Optional[ort.GraphOptimizationLevel] = graph_optimization_level
+
+
+class OnnxSessionManager:
+
+    def __init__(self):
+        """
+        统一创建 onnxruntime 的推理会话
+        - 默认所有模型共用一个全局线程池 避免各模型各自创建线程池后互相抢占CPU
+        - 需要对单个模型指定线程数时 所有模型都使用独立线程池 两种方式不能混用
+        - CPU推理时 在缓存目录保存优化后的模型 之后启动不需要再次优化
+        """
+        self._lock = threading.Lock()
+        self._session_map: dict[Tuple[str, Tuple[str, ...]], Future] = {}  # 值为创建会话的Future
+        self._profile_map: dict[str, OnnxSessionProfile] = {}
+
+        cpu_cnt = os.cpu_count() or 1
+        self.global_intra_op_num_threads: int = min(4, max(1, cpu_cnt // 2))
+        self.global_inter_op_num_threads: int = 1
+        self.graph_optimization_level: ort.GraphOptimizationLevel = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.save_optimized_model: bool = True
+        self.optimized_model_dir: str = get_default_optimized_model_dir()
+        self.use_global_thread_pool: bool = True
+
+        self._global_thread_pool_ready: Optional[bool] = None  # 为空时还没有决定线程池的方式 决定后不再改变
+
+    def configure(self,
+                  global_intra_op_num_threads: Optional[int] = None,
+                  global_inter_op_num_threads: Optional[int] = None,
+                  graph_optimization_level: Optional[ort.GraphOptimizationLevel] = None,
+                  save_optimized_model: Optional[bool] = None,
+                  optimized_model_dir: Optional[str] = None,
+                  use_global_thread_pool: Optional[bool] = None) -> None:
+        """
+        修改默认配置 线程池相关的需要在创建第一个会话前设置
+        :param global_intra_op_num_threads: 单个算子内的并行线程数 全局线程池和没有单独设置的模型使用
+        :param global_inter_op_num_threads: 算子间的并行线程数 全局线程池和没有单独设置的模型使用
+        :param graph_optimization_level: 默认的图优化等级
+        :param save_optimized_model: 是否保存优化后的模型
+        :param optimized_model_dir: 优化后模型的保存目录
+        :param use_global_thread_pool: 是否使用全局线程池
+        """
+        with self._lock:
+            if use_global_thread_pool is not None:
+                if self._global_thread_pool_ready is not None:
+                    log.error('已经创建过推理会话 线程池的方式不能再修改')
+                else:
+                    self.use_global_thread_pool = use_global_thread_pool
+            if optimized_model_dir is not None:
+                self.optimized_model_dir = optimized_model_dir
+            if global_intra_op_num_threads is not None:
+                self.global_intra_op_num_threads = global_intra_op_num_threads
+            if global_inter_op_num_threads is not None:
+                self.global_inter_op_num_threads = global_inter_op_num_threads
+            if graph_optimization_level is not None:
+                self.graph_optimization_level = graph_optimization_level
+            if save_optimized_model is not None:
+                self.save_optimized_model = save_optimized_model
+
+    def set_profile(self, model_name: str, profile: OnnxSessionProfile) -> None:
+        """
+        设置单个模型的会话配置 需要在创建这个模型的会话前设置
+        不使用全局线程池的配置 需要在创建第一个会话前设置 之后设置的只能使用已经决定的线程池方式
+        :param model_name: 模型名称
+        :param profile: 配置
+        """
+        with self._lock:
+            if not profile.use_global_thread_pool and self._global_thread_pool_ready:
+                log.error('已经使用全局线程池 模型 %s 的独立线程数不会生效', model_name)
+            self._profile_map[model_name] = profile
+
+    def get_session(self, model_path: str, model_name: Optional[str] = None,
+                    providers: Optional[List[str]] = None) -> ort.InferenceSession:
+        """
+        获取推理会话 同一个模型文件和推理方式只会创建一次
+        多个线程同时获取同一个会话时 只有一个线程创建 其余线程等待
+        :param model_path: 模型文件路径
+        :param model_name: 模型名称 用于获取单独的配置 为空时使用文件名
+        :param providers: 推理方式 为空时使用CPU
+        :return:
+        """
+        if providers is None or len(providers) == 0:
+            providers = ['CPUExecutionProvider']
+        if model_name is None:
+            model_name = os.path.splitext(os.path.basename(model_path))[0]
+
+        key = (os.path.abspath(model_path), tuple(providers))
+        with self._lock:
+            future = self._session_map.get(key)
+            is_creator = future is None
+            if is_creator:
+                future = Future()
+                self._session_map[key] = future
+                use_global = self.get_thread_pool_mode()
+
+        if not is_creator:  # 其他线程正在创建时 等待创建完毕即可
+            return future.result()
+
+        # 在锁外创建 不同模型可以并行加载
+        try:
+            session = self._create_session(model_path, model_name, providers, use_global)
+        except Exception as e:
+            with self._lock:
+                self._session_map.pop(key, None)
+            future.set_exception(e)
+            raise
+        future.set_result(session)
+        return session
+
+    def release_session(self, model_path: str, providers: Optional[List[str]] = None) -> None:
+        """
+        释放推理会话
+        :param model_path: 模型文件路径
+        :param providers: 推理方式
+        """
+        if providers is None or len(providers) == 0:
+            providers = ['CPUExecutionProvider']
+        with self._lock:
+            self._session_map.pop((os.path.abspath(model_path), tuple(providers)), None)
+
+    def _create_session(self, model_path: str, model_name: str, providers: List[str],
+                        use_global: bool) -> ort.InferenceSession:
+        """
+        创建推理会话
+        :param model_path: 模型文件路径
+        :param model_name: 模型名称
+        :param providers: 推理方式
+        :param use_global: 是否使用全局线程池 所有会话一致
+        :return:
+        """
+        profile = self._profile_map.get(model_name, OnnxSessionProfile())
+        level = self.graph_optimization_level if profile.graph_optimization_level is None else profile.graph_optimization_level
+        is_cpu = providers == ['CPUExecutionProvider']
+
+        load_path = model_path
+        optimized_path: Optional[str] = None
+        if is_cpu and self.save_optimized_model and level != ort.GraphOptimizationLevel.ORT_DISABLE_ALL:
+            optimized_path = get_optimized_model_path(model_path, self.optimized_model_dir)
+            if is_optimized_model_valid(model_path, optimized_path):
+                load_path = optimized_path
+                optimized_path = None  # 已经有了 不需要再保存
+
+        options = self._create_options(profile, use_global, level, providers, optimized_path)
+        try:
+            session = ort.InferenceSession(load_path, options, providers=providers)
+        except Exception:
+            if optimized_path is None and load_path == model_path:
+                raise
+            # 优化后的模型有问题时 使用原模型重试 线程池的方式不能改变
+            # 读取缓存失败的 重新保存覆盖 保存失败的 不再保存
+            log.error('创建推理会话失败 使用原模型重试 %s', model_path, exc_info=True)
+            retry_optimized_path = None
+            if load_path != model_path:
+                retry_optimized_path = load_path
+            load_path = model_path
+            options = self._create_options(profile, use_global, level, providers, retry_optimized_path)
+            session = ort.InferenceSession(model_path, options, providers=providers)
+
+        log.info('加载模型 %s 推理方式 %s 全局线程池 %s 使用优化后模型 %s',
+                 model_name, providers, use_global, load_path != model_path)
+        return session
+
+    def _create_options(self, profile: OnnxSessionProfile,
+                        use_global: bool,
+                        level: ort.GraphOptimizationLevel,
+                        providers: List[str],
+                        optimized_path: Optional[str]) -> ort.SessionOptions:
+        """
+        创建会话配置
+        :param profile: 模型配置
+        :param use_global: 是否使用全局线程池
+        :param level: 图优化等级
+        :param providers: 推理方式
+        :param optimized_path: 保存优化后模型的路径 为空时不保存
+        :return:
+        """
+        options = ort.SessionOptions()
+        options.graph_optimization_level = level
+        if use_global:
+            options.use_per_session_threads = False
+        else:
+            options.intra_op_num_threads = (profile.intra_op_num_threads if profile.intra_op_num_threads > 0
+                                            else self.global_intra_op_num_threads)
+            options.inter_op_num_threads = (profile.inter_op_num_threads if profile.inter_op_num_threads > 0
+                                            else self.global_inter_op_num_threads)
+
+        if 'DmlExecutionProvider' in providers:
+            # DirectML 不支持内存模式和并行执行
+            options.enable_mem_pattern = False
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+
+        if optimized_path is not None:
+            # 保存的模型只做和硬件无关的优化 加载时再做剩下的
+            options.graph_optimization_level = min(level, ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+                                                   key=lambda i: int(i))
+            options.optimized_model_filepath = optimized_path
+
+        return options
+
+    def get_thread_pool_mode(self) -> bool:
+        """
+        决定是否使用全局线程池 第一次调用时决定 之后不再改变 需要在持有锁时调用
+        - 配置为不使用 或者已经有模型设置了不使用全局线程池时 所有会话使用独立线程池
+        - 否则初始化全局线程池 所有会话都使用它
+        :return: 是否使用全局线程池
+        """
+        if self._global_thread_pool_ready is not None:
+            return self._global_thread_pool_ready
+
+        if not self.use_global_thread_pool or any(not i.use_global_thread_pool for i in self._profile_map.values()):
+            log.info('所有模型使用独立线程池')
+            self._global_thread_pool_ready = False
+            return self._global_thread_pool_ready
+
+        try:
+            from onnxruntime.capi import _pybind_state
+            _pybind_state.set_global_thread_pool_sizes(self.global_intra_op_num_threads,
+                                                       self.global_inter_op_num_threads)
+            self._global_thread_pool_ready = True
+        except Exception:
+            log.error('当前onnxruntime不支持全局线程池 各模型使用独立线程池', exc_info=True)
+            self._global_thread_pool_ready = False
+        return self._global_thread_pool_ready
+
+
+def get_default_optimized_model_dir() -> str:
+    """
+    优化后模型的默认保存目录 在用户的缓存目录下 不修改模型所在的目录
+    :return:
+    """
+    cache_dir = os.getenv('LOCALAPPDATA')
+    if cache_dir is None or len(cache_dir) == 0:
+        cache_dir = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'OneDragon', 'onnx_optimized')
+
+
+def get_optimized_model_path(model_path: str, optimized_model_dir: str) -> str:
+    """
+    优化后模型的保存路径 文件名带上原模型路径的摘要 不同目录下的同名模型不会冲突
+    :param model_path: 原模型路径
+    :param optimized_model_dir: 保存目录 不存在时创建
+    :return:
+    """
+    os.makedirs(optimized_model_dir, exist_ok=True)
+    abs_path = os.path.abspath(model_path)
+    digest = hashlib.md5(abs_path.encode('utf-8')).hexdigest()[:12]
+    model_dir_name = os.path.basename(os.path.dirname(abs_path))
+    base, ext = os.path.splitext(os.path.basename(abs_path))
+    return os.path.join(optimized_model_dir, f'{model_dir_name}.{base}.{digest}.optimized{ext}')
+
+
+def is_optimized_model_valid(model_path: str, optimized_path: str) -> bool:
+    """
+    优化后的模型是否可用 原模型更新后需要重新优化
+    :param model_path: 原模型路径
+    :param optimized_path: 优化后模型路径
+    :return:
+    """
+    if not os.path.exists(optimized_path):
+        return False
+    return os.path.getmtime(optimized_path) >= os.path.getmtime(model_path)
+
+
+onnx_session_manager = OnnxSessionManager()
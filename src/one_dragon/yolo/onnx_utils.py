@@ -1,40 +1,189 @@
-from typing import Tuple
+import threading
+from typing import Tuple, Optional, List
 
 import cv2
 import numpy as np
 from cv2.typing import MatLike
 
+_PAD_VALUE: int = 114  # ultralytics 补边使用的颜色
+
+
+def get_scale_size(img_width: int, img_height: int,
+                   onnx_input_width: int, onnx_input_height: int) -> Tuple[int, int]:
+    """
+    按照 ultralytics 的方式 计算图片保持比例缩放后的大小
+    :return: 缩放后的宽度, 高度
+    """
+    # 将图像缩放到模型的输入尺寸中较短的一边
+    min_scale = min(onnx_input_height / img_height, onnx_input_width / img_width)
+
+    # 未进行padding之前的尺寸
+    scale_height = int(round(img_height * min_scale))
+    scale_width = int(round(img_width * min_scale))
+    return scale_width, scale_height
+
 
 def scale_input_image_u(image: MatLike, onnx_input_width: int, onnx_input_height: int) -> Tuple[np.ndarray, int, int]:
     """
     按照 ultralytics 的方式，将图片缩放至模型使用的大小
     参考 https://github.com/orgs/ultralytics/discussions/6994?sort=new#discussioncomment-8382661
+    每次调用都会新建输入 频繁调用的应该使用 InputTensorBuffer
     :param image: 输入的图片 RBG通道
     :param onnx_input_width: 模型需要的图片宽度
     :param onnx_input_height: 模型需要的图片高度
     :return: 缩放后的图片 RGB通道
     """
-    img_height, img_width = image.shape[:2]
+    buffer = InputTensorBuffer(onnx_input_width, onnx_input_height)
+    input_tensor, scale_height, scale_width = buffer.prepare(image)
+    return input_tensor, scale_height, scale_width
 
-    # 将图像缩放到模型的输入尺寸中较短的一边
-    min_scale = min(onnx_input_height / img_height, onnx_input_width / img_width)
 
-    # 未进行padding之前的尺寸
-    scale_height = int(round(img_height * min_scale))
-    scale_width = int(round(img_width * min_scale))
+class _InputBufferItem:
 
-    # 缩放到目标尺寸
-    if onnx_input_height != img_height or onnx_input_width != img_width:  # 需要缩放
-        input_img = np.full(shape=(onnx_input_height, onnx_input_width, 3),
-                            fill_value=114, dtype=np.uint8)
-        scale_img = cv2.resize(image, (scale_width, scale_height), interpolation=cv2.INTER_LINEAR)
-        input_img[0:scale_height, 0:scale_width, :] = scale_img
-    else:
-        input_img = image
+    def __init__(self):
+        self.canvas: Optional[np.ndarray] = None  # 补边后的图片 HWC uint8
+        self.planes: Optional[np.ndarray] = None  # 按通道分开的图片 CHW uint8 连续内存的类型转换更快
+        self.tensor: Optional[np.ndarray] = None  # 模型输入 NCHW
 
-    # 缩放后最后的处理
-    input_img = input_img / 255.0
-    input_img = input_img.transpose(2, 0, 1)
-    input_tensor = input_img[np.newaxis, :, :, :].astype(np.float32)
 
-    return input_tensor, scale_height, scale_width
+class InputTensorBuffer:
+
+    def __init__(self, onnx_input_width: int, onnx_input_height: int, uint8_input: bool = False):
+        """
+        模型输入的预处理 复用预先分配的内存
+        - 图片直接缩放到补边画布中 再按通道写入 NCHW 的输入中 在原地归一化
+        - 模型输入为 uint8 时(归一化已经合并到模型中 见 fold_input_normalization) 跳过归一化
+        - 每个线程使用各自的内存 多个线程可以同时推理同一个模型
+        返回的输入是内存的视图 下一次调用 prepare 时会被覆盖
+        :param onnx_input_width: 模型需要的图片宽度
+        :param onnx_input_height: 模型需要的图片高度
+        :param uint8_input: 模型的输入是否为 uint8
+        """
+        self.onnx_input_width: int = onnx_input_width
+        self.onnx_input_height: int = onnx_input_height
+        self.uint8_input: bool = uint8_input
+        self._local = threading.local()
+
+    def _get_item(self, batch_size: int) -> _InputBufferItem:
+        """
+        获取当前线程的内存 批次大小不够时重新分配
+        :param batch_size: 批次大小
+        :return:
+        """
+        item: Optional[_InputBufferItem] = getattr(self._local, 'item', None)
+        if item is None:
+            item = _InputBufferItem()
+            item.canvas = np.empty((self.onnx_input_height, self.onnx_input_width, 3), dtype=np.uint8)
+            if not self.uint8_input:
+                item.planes = np.empty((3, self.onnx_input_height, self.onnx_input_width), dtype=np.uint8)
+            self._local.item = item
+        if item.tensor is None or item.tensor.shape[0] < batch_size:
+            item.tensor = np.empty((batch_size, 3, self.onnx_input_height, self.onnx_input_width),
+                                   dtype=np.uint8 if self.uint8_input else np.float32)
+        return item
+
+    def prepare(self, image: MatLike) -> Tuple[np.ndarray, int, int]:
+        """
+        单张图片的预处理
+        :param image: 输入的图片 RGB通道
+        :return: 模型输入, 缩放后的高度, 缩放后的宽度
+        """
+        input_tensor, scale_size_list = self.prepare_batch([image])
+        scale_height, scale_width = scale_size_list[0]
+        return input_tensor, scale_height, scale_width
+
+    def prepare_batch(self, image_list: List[MatLike]) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+        """
+        多张图片的预处理 按顺序放在同一个输入中
+        :param image_list: 输入的图片 RGB通道
+        :return: 模型输入, 每张图片缩放后的(高度, 宽度)
+        """
+        batch_size = len(image_list)
+        item = self._get_item(batch_size)
+        input_tensor = item.tensor[:batch_size]
+        scale_size_list: List[Tuple[int, int]] = []
+        for idx, image in enumerate(image_list):
+            scale_size_list.append(self._fill_input(image, item, input_tensor[idx]))
+
+        if not self.uint8_input:
+            # float32 下直接除 与原来 float64 下除再转 float32 的结果一致
+            np.divide(input_tensor, 255, out=input_tensor)
+
+        return input_tensor, scale_size_list
+
+    def _fill_input(self, image: MatLike, item: _InputBufferItem, chw: np.ndarray) -> Tuple[int, int]:
+        """
+        将一张图片缩放补边后 写入输入中
+        :param image: 输入的图片 RGB通道
+        :param item: 当前线程的内存
+        :param chw: 这张图片对应的输入 CHW
+        :return: 缩放后的高度, 缩放后的宽度
+        """
+        canvas = item.canvas
+        img_height, img_width = image.shape[:2]
+        if img_height == self.onnx_input_height and img_width == self.onnx_input_width:
+            hwc = image
+            scale_height, scale_width = img_height, img_width
+        else:
+            scale_width, scale_height = get_scale_size(img_width, img_height,
+                                                       self.onnx_input_width, self.onnx_input_height)
+            scale_area = canvas[:scale_height, :scale_width]
+            scale_img = cv2.resize(image, (scale_width, scale_height), dst=scale_area,
+                                   interpolation=cv2.INTER_LINEAR)
+            if scale_img is not scale_area:  # 图片类型和画布不一致时 opencv 会新建结果
+                scale_area[:] = scale_img
+            # 只需要重新填充补边的部分
+            canvas[scale_height:, :, :] = _PAD_VALUE
+            canvas[:scale_height, scale_width:, :] = _PAD_VALUE
+            hwc = canvas
+
+        if self.uint8_input:
+            np.copyto(chw, hwc.transpose(2, 0, 1))
+        else:
+            # 先在 uint8 下转成 CHW 再转换类型 比直接从 HWC 转换快
+            np.copyto(item.planes, hwc.transpose(2, 0, 1))
+            np.copyto(chw, item.planes)
+
+        return scale_height, scale_width
+
+
+def fold_input_normalization(model_path: str, save_path: str) -> None:
+    """
+    将输入的归一化合并到模型中 模型的输入改为 uint8 的 NCHW
+    推理时 InputTensorBuffer 会跳过归一化 并且输入的内存只有原来的1/4
+    需要安装 onnx 只在开发时使用
+    :param model_path: 原模型路径
+    :param save_path: 保存路径
+    """
+    import onnx
+    from onnx import helper, TensorProto
+
+    model = onnx.load(model_path)
+    graph = model.graph
+    graph_input = graph.input[0]
+    if graph_input.type.tensor_type.elem_type == TensorProto.UINT8:
+        onnx.save(model, save_path)
+        return
+
+    input_name = graph_input.name
+    float_name = f'{input_name}_float'
+    normalized_name = f'{input_name}_normalized'
+    scale_name = f'{input_name}_scale'
+
+    # 原来使用输入的节点 改为使用归一化后的结果
+    for node in graph.node:
+        for idx, name in enumerate(node.input):
+            if name == input_name:
+                node.input[idx] = normalized_name
+
+    graph_input.type.tensor_type.elem_type = TensorProto.UINT8
+    graph.initializer.append(helper.make_tensor(scale_name, TensorProto.FLOAT, [], [255.0]))
+    cast_node = helper.make_node('Cast', [input_name], [float_name], to=TensorProto.FLOAT,
+                                 name=f'{input_name}_cast')
+    div_node = helper.make_node('Div', [float_name, scale_name], [normalized_name],
+                                name=f'{input_name}_normalize')
+    graph.node.insert(0, div_node)
+    graph.node.insert(0, cast_node)
+
+    onnx.checker.check_model(model)
+    onnx.save(model, save_path)
@@ -4,7 +4,6 @@ import numpy as np
 from cv2.typing import MatLike
 from typing import Optional, List
 
-from one_dragon.yolo import onnx_utils
 from one_dragon.yolo.onnx_model_loader import OnnxModelLoader
 
 
@@ -105,11 +104,53 @@ class Yolov8Classifier(OnnxModelLoader):
         self.record_result(context, result)
         return result
 
+    def run_batch(self, image_list: List[MatLike], conf: float = 0.9,
+                  run_time_list: Optional[List[float]] = None) -> List[ClassificationResult]:
+        """
+        对多张图片进行识别 批次大小可变的模型只推理一次
+        每张图片的结果都会按顺序记录到历史识别结果中
+        :param image_list: 使用 opencv 读取的图片 RGB通道
+        :param conf: 置信度阈值
+        :param run_time_list: 每张图片的识别时间 为空时都使用当前时间
+        :return: 每张图片的识别结果
+        """
+        if len(image_list) == 0:
+            return []
+        if run_time_list is None:
+            now = time.time()
+            run_time_list = [now] * len(image_list)
+
+        context_list: List[RunContext] = []
+        for image, run_time in zip(image_list, run_time_list):
+            context = RunContext(image, run_time)
+            context.conf = conf
+            context_list.append(context)
+
+        input_tensor = self.prepare_input_batch(context_list)
+        outputs = self.inference_batch(input_tensor)
+
+        result_list: List[ClassificationResult] = []
+        for idx, context in enumerate(context_list):
+            result = self.process_output([i[idx:idx + 1] for i in outputs], context)
+            self.record_result(context, result)
+            result_list.append(result)
+        return result_list
+
+    def prepare_input_batch(self, context_list: List[RunContext]) -> np.ndarray:
+        """
+        多张图片推理前的预处理
+        """
+        input_tensor, scale_size_list = self.input_buffer.prepare_batch([i.img for i in context_list])
+        for context, (scale_height, scale_width) in zip(context_list, scale_size_list):
+            context.scale_height = scale_height
+            context.scale_width = scale_width
+        return input_tensor
+
     def prepare_input(self, context: RunContext) -> np.ndarray:
         """
         推理前的预处理
         """
-        input_tensor, scale_height, scale_width = onnx_utils.scale_input_image_u(context.img, self.onnx_input_width, self.onnx_input_height)
+        input_tensor, scale_height, scale_width = self.input_buffer.prepare(context.img)
         context.scale_height = scale_height
         context.scale_width = scale_width
         return input_tensor
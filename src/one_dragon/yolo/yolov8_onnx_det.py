@@ -4,10 +4,9 @@ import csv
 import numpy as np
 import os
 from cv2.typing import MatLike
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
-from one_dragon.yolo import onnx_utils
-from one_dragon.yolo.detect_utils import DetectFrameResult, DetectClass, DetectContext, DetectObjectResult, xywh2xyxy, \
+from one_dragon.yolo.detect_utils import DetectFrameResult, DetectClass, DetectContext, DetectResultArrays, xywh2xyxy, \
     multiclass_nms
 from one_dragon.yolo.onnx_model_loader import OnnxModelLoader
 
@@ -52,6 +51,9 @@ class Yolov8Detector(OnnxModelLoader):
         self.category_2_idx: dict[str, List[int]] = {}
         self._load_detect_classes(self.model_dir_path)
 
+        # 按标签和分类筛选时 需要保留的类别下标 key=(标签, 分类)
+        self._class_filter_cache: dict[Tuple[Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]], np.ndarray] = {}
+
     def run(self, image: MatLike, conf: float = 0.6, iou: float = 0.5, run_time: Optional[float] = None,
             label_list: Optional[List[str]] = None,
             category_list: Optional[List[str]] = None) -> DetectFrameResult:
@@ -60,6 +62,8 @@ class Yolov8Detector(OnnxModelLoader):
         :param image: 使用 opencv 读取的图片 RGB通道
         :param conf: 置信度阈值
         :param iou: iou阈值
+        :param label_list: 只检测特定的标签 见 labels.csv 的label
+        :param category_list: 只检测特定分类的标签 见 labels.csv 的category
         :return: 识别结果
         """
         t1 = time.time()
@@ -82,11 +86,60 @@ class Yolov8Detector(OnnxModelLoader):
 
         return self.record_result(context, results)
 
+    def run_batch(self, image_list: List[MatLike], conf: float = 0.6, iou: float = 0.5,
+                  run_time_list: Optional[List[float]] = None,
+                  label_list: Optional[List[str]] = None,
+                  category_list: Optional[List[str]] = None) -> List[DetectFrameResult]:
+        """
+        对多张图片进行识别 批次大小可变的模型只推理一次
+        每张图片的结果都会按顺序记录到历史识别结果中
+        :param image_list: 使用 opencv 读取的图片 RGB通道
+        :param conf: 置信度阈值
+        :param iou: iou阈值
+        :param run_time_list: 每张图片的识别时间 为空时都使用当前时间
+        :param label_list: 只检测特定的标签 见 labels.csv 的label
+        :param category_list: 只检测特定分类的标签 见 labels.csv 的category
+        :return: 每张图片的识别结果
+        """
+        if len(image_list) == 0:
+            return []
+        if run_time_list is None:
+            now = time.time()
+            run_time_list = [now] * len(image_list)
+
+        context_list: List[DetectContext] = []
+        for image, run_time in zip(image_list, run_time_list):
+            context = DetectContext(image, run_time)
+            context.conf = conf
+            context.iou = iou
+            context.label_list = label_list
+            context.category_list = category_list
+            context_list.append(context)
+
+        input_tensor = self.prepare_input_batch(context_list)
+        outputs = self.inference_batch(input_tensor)
+
+        frame_list: List[DetectFrameResult] = []
+        for idx, context in enumerate(context_list):
+            results = self.process_output([i[idx:idx + 1] for i in outputs], context)
+            frame_list.append(self.record_result(context, results))
+        return frame_list
+
+    def prepare_input_batch(self, context_list: List[DetectContext]) -> np.ndarray:
+        """
+        多张图片推理前的预处理
+        """
+        input_tensor, scale_size_list = self.input_buffer.prepare_batch([i.img for i in context_list])
+        for context, (scale_height, scale_width) in zip(context_list, scale_size_list):
+            context.scale_height = scale_height
+            context.scale_width = scale_width
+        return input_tensor
+
     def prepare_input(self, context: DetectContext) -> np.ndarray:
         """
         推理前的预处理
         """
-        input_tensor, scale_height, scale_width = onnx_utils.scale_input_image_u(context.img, self.onnx_input_width, self.onnx_input_height)
+        input_tensor, scale_height, scale_width = self.input_buffer.prepare(context.img)
         context.scale_height = scale_height
         context.scale_width = scale_width
         return input_tensor
@@ -100,45 +153,37 @@ class Yolov8Detector(OnnxModelLoader):
         outputs = self.session.run(self.output_names, {self.input_names[0]: input_tensor})
         return outputs
 
-    def process_output(self, output, context: DetectContext) -> List[DetectObjectResult]:
+    def process_output(self, output, context: DetectContext) -> DetectResultArrays:
         """
         :param output: 推理结果
         :param context: 上下文
         :return: 最终得到的识别结果
         """
-        predictions = np.squeeze(output[0]).T
-
-        keep = np.ones(shape=(predictions.shape[1]), dtype=bool)
-
-        if context.label_list is not None or context.category_list is not None:
-            keep[4:] = False  # 前4位是坐标 先把所有标签都设置为False
-            if context.label_list is not None:
-                for label in context.label_list:
-                    idx = self.class_2_idx.get(label)
-                    if idx is not None:
-                        keep[idx + 4] = True
-
-            if context.category_list is not None:
-                for category in context.category_list:
-                    for idx in self.category_2_idx.get(category, []):
-                        keep[idx + 4] = True
-
-        predictions[:, keep == False] = 0
+        predictions = output[0][0]  # shape=(4 + 类别数, 候选框数)
+
+        # 只取需要的类别 不修改推理结果
+        class_idx_arr = self.get_class_filter(context.label_list, context.category_list)
+        if class_idx_arr is None:
+            class_scores = predictions[4:]
+        elif len(class_idx_arr) == 0:
+            return DetectResultArrays.empty(self.idx_2_class)
+        else:
+            class_scores = predictions[4 + class_idx_arr]
 
         # 按置信度阈值进行基本的过滤
-        scores = np.max(predictions[:, 4:], axis=1)
-        predictions = predictions[scores > context.conf, :]
-        scores = scores[scores > context.conf]
-
-        results: List[DetectObjectResult] = []
-        if len(scores) == 0:
-            return results
+        scores = np.max(class_scores, axis=0)
+        candidate = scores > context.conf
+        if not np.any(candidate):
+            return DetectResultArrays.empty(self.idx_2_class)
+        scores = scores[candidate]
 
         # 选择置信度最高的类别
-        class_ids = np.argmax(predictions[:, 4:], axis=1)
+        class_ids = np.argmax(class_scores[:, candidate], axis=0)
+        if class_idx_arr is not None:
+            class_ids = class_idx_arr[class_ids]
 
         # 提取Bounding box
-        boxes = predictions[:, :4]  # 原始推理结果 xywh
+        boxes = predictions[:4, candidate].T  # 原始推理结果 xywh
         scale_shape = np.array([context.scale_width, context.scale_height, context.scale_width, context.scale_height])  # 缩放后图片的大小
         boxes = np.divide(boxes, scale_shape, dtype=np.float32)  # 转化到 0~1
         boxes *= np.array([context.img_width, context.img_height, context.img_width, context.img_height])  # 恢复到原图的坐标
@@ -147,16 +192,46 @@ class Yolov8Detector(OnnxModelLoader):
         # 进行NMS 获取最后的结果
         indices = multiclass_nms(boxes, scores, class_ids, context.iou)
 
-        for idx in indices:
-            result = DetectObjectResult(rect=boxes[idx].tolist(),
-                                        score=float(scores[idx]),
-                                        detect_class=self.idx_2_class[int(class_ids[idx])]
-                                        )
-            results.append(result)
+        return DetectResultArrays(
+            boxes=boxes[indices],
+            scores=scores[indices],
+            class_ids=class_ids[indices],
+            idx_2_class=self.idx_2_class
+        )
+
+    def get_class_filter(self, label_list: Optional[List[str]],
+                         category_list: Optional[List[str]]) -> Optional[np.ndarray]:
+        """
+        按标签和分类筛选时 需要保留的类别下标 同样的筛选条件只计算一次
+        :param label_list: 只检测特定的标签
+        :param category_list: 只检测特定分类的标签
+        :return: 从小到大的类别下标 不需要筛选时返回None
+        """
+        if label_list is None and category_list is None:
+            return None
+
+        key = (None if label_list is None else tuple(label_list),
+               None if category_list is None else tuple(category_list))
+        class_idx_arr = self._class_filter_cache.get(key)
+        if class_idx_arr is not None:
+            return class_idx_arr
+
+        class_idx_set = set()
+        if label_list is not None:
+            for label in label_list:
+                idx = self.class_2_idx.get(label)
+                if idx is not None:
+                    class_idx_set.add(idx)
+
+        if category_list is not None:
+            for category in category_list:
+                class_idx_set.update(self.category_2_idx.get(category, []))
 
-        return results
+        class_idx_arr = np.array(sorted(class_idx_set), dtype=np.int64)
+        self._class_filter_cache[key] = class_idx_arr
+        return class_idx_arr
 
-    def record_result(self, context: DetectContext, results: List[DetectObjectResult]) -> DetectFrameResult:
+    def record_result(self, context: DetectContext, results: DetectResultArrays) -> DetectFrameResult:
         """
         记录本帧识别结果
         :param context: 识别上下文
@@ -165,8 +240,8 @@ class Yolov8Detector(OnnxModelLoader):
         """
         new_frame = DetectFrameResult(
             raw_image=context.img,
-            results=results,
-            run_time=context.run_time
+            run_time=context.run_time,
+            result_arrays=results
         )
         self.run_result_history.append(new_frame)
         self.run_result_history = [i for i in self.run_result_history
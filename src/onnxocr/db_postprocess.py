@@ -66,7 +66,7 @@ class DBPostProcess(object):
         boxes = []
         scores = []
 
-        contours, _ = cv2.findContours((bitmap * 255).astype(np.uint8),
+        contours, _ = cv2.findContours(bitmap.astype(np.uint8),
                                        cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
 
         for contour in contours[:self.max_candidates]:
@@ -110,7 +110,7 @@ class DBPostProcess(object):
         bitmap = _bitmap
         height, width = bitmap.shape
 
-        outs = cv2.findContours((bitmap * 255).astype(np.uint8), cv2.RETR_LIST,
+        outs = cv2.findContours(bitmap.astype(np.uint8), cv2.RETR_LIST,
                                 cv2.CHAIN_APPROX_SIMPLE)
         if len(outs) == 3:
             img, contours, _ = outs[0], outs[1], outs[2]
@@ -119,46 +119,79 @@ class DBPostProcess(object):
 
         num_contours = min(len(contours), self.max_candidates)
 
-        boxes = []
-        scores = []
+        # 先得到所有候选框 再批量计算分数和扩展距离
+        contour_idx_list = []
+        points_list = []
         for index in range(num_contours):
-            contour = contours[index]
-            points, sside = self.get_mini_boxes(contour)
+            points, sside = self.get_mini_boxes(contours[index])
             if sside < self.min_size:
                 continue
-            points = np.array(points)
-            if self.score_mode == "fast":
-                score = self.box_score_fast(pred, points.reshape(-1, 2))
-            else:
-                score = self.box_score_slow(pred, contour)
-            if self.box_thresh > score:
-                continue
+            contour_idx_list.append(index)
+            points_list.append(points)
+        if len(points_list) == 0:
+            return np.array([], dtype="int32"), []
+
+        points_arr = np.array(points_list)
+        if self.score_mode == "fast":
+            score_arr = self.box_score_fast_batch(pred, points_arr)
+        else:
+            score_arr = np.array([self.box_score_slow(pred, contours[i]) for i in contour_idx_list])
+        keep = score_arr >= self.box_thresh
+        points_arr = points_arr[keep]
+        score_arr = score_arr[keep]
+        distance_arr = self.get_unclip_distance_batch(points_arr, self.unclip_ratio)
 
-            box = self.unclip(points, self.unclip_ratio).reshape(-1, 1, 2)
+        box_list = []
+        scores = []
+        for points, distance, score in zip(points_arr, distance_arr, score_arr):
+            box = self.unclip_by_distance(points, distance).reshape(-1, 1, 2)
             box, sside = self.get_mini_boxes(box)
             if sside < self.min_size + 2:
                 continue
-            box = np.array(box)
-
-            box[:, 0] = np.clip(
-                np.round(box[:, 0] / width * dest_width), 0, dest_width)
-            box[:, 1] = np.clip(
-                np.round(box[:, 1] / height * dest_height), 0, dest_height)
-            boxes.append(box.astype("int32"))
-            scores.append(score)
-        return np.array(boxes, dtype="int32"), scores
+            box_list.append(box)
+            scores.append(float(score))
+        if len(box_list) == 0:
+            return np.array([], dtype="int32"), []
+
+        boxes = np.array(box_list)
+        boxes[:, :, 0] = np.clip(
+            np.round(boxes[:, :, 0] / width * dest_width), 0, dest_width)
+        boxes[:, :, 1] = np.clip(
+            np.round(boxes[:, :, 1] / height * dest_height), 0, dest_height)
+        return boxes.astype("int32"), scores
 
     def unclip(self, box, unclip_ratio):
         poly = Polygon(box)
         distance = poly.area * unclip_ratio / poly.length
+        return self.unclip_by_distance(box, distance)
+
+    @staticmethod
+    def unclip_by_distance(box, distance):
         offset = pyclipper.PyclipperOffset()
         offset.AddPath(box, pyclipper.JT_ROUND, pyclipper.ET_CLOSEDPOLYGON)
         expanded = np.array(offset.Execute(distance))
         return expanded
 
+    @staticmethod
+    def get_unclip_distance_batch(boxes, unclip_ratio):
+        '''
+        与 unclip 中的扩展距离一致 面积 * unclip_ratio / 周长
+        boxes: shape (N, 4, 2) 的四边形
+        '''
+        boxes = boxes.astype(np.float64)
+        x = boxes[:, :, 0]
+        y = boxes[:, :, 1]
+        next_x = np.roll(x, -1, axis=1)
+        next_y = np.roll(y, -1, axis=1)
+        area = np.abs(np.sum(x * next_y - next_x * y, axis=1)) / 2
+        length = np.sum(np.hypot(next_x - x, next_y - y), axis=1)
+        # 退化的框 Polygon.length 为0时会除0 这里给0距离 后续会因为尺寸太小被过滤
+        return np.divide(area * unclip_ratio, length, out=np.zeros_like(area), where=length > 0)
+
     def get_mini_boxes(self, contour):
         bounding_box = cv2.minAreaRect(contour)
-        points = sorted(list(cv2.boxPoints(bounding_box)), key=lambda x: x[0])
+        box_points = cv2.boxPoints(bounding_box)
+        points = box_points[np.argsort(box_points[:, 0], kind='stable')]
 
         index_1, index_2, index_3, index_4 = 0, 1, 2, 3
         if points[1][1] > points[0][1]:
@@ -174,9 +207,7 @@ class DBPostProcess(object):
             index_2 = 3
             index_3 = 2
 
-        box = [
-            points[index_1], points[index_2], points[index_3], points[index_4]
-        ]
+        box = points[[index_1, index_2, index_3, index_4]]
         return box, min(bounding_box[1])
 
     def box_score_fast(self, bitmap, _box):
@@ -196,6 +227,61 @@ class DBPostProcess(object):
         cv2.fillPoly(mask, box.reshape(1, -1, 2).astype("int32"), 1)
         return cv2.mean(bitmap[ymin:ymax + 1, xmin:xmax + 1], mask)[0]
 
+    def box_score_fast_batch(self, bitmap, boxes):
+        '''
+        box_score_fast for a batch of boxes with shape (N, 4, 2)
+        与 box_score_fast 结果一致
+        - 水平的矩形框 填充区域就是矩形 用积分图计算
+        - 其它框 复用同一块掩码 不再每个框新建
+        '''
+        h, w = bitmap.shape[:2]
+        box_cnt = boxes.shape[0]
+        scores = np.zeros(box_cnt, dtype=np.float64)
+        if box_cnt == 0:
+            return scores
+
+        xmin = np.clip(np.floor(boxes[:, :, 0].min(axis=1)).astype("int32"), 0, w - 1)
+        xmax = np.clip(np.ceil(boxes[:, :, 0].max(axis=1)).astype("int32"), 0, w - 1)
+        ymin = np.clip(np.floor(boxes[:, :, 1].min(axis=1)).astype("int32"), 0, h - 1)
+        ymax = np.clip(np.ceil(boxes[:, :, 1].max(axis=1)).astype("int32"), 0, h - 1)
+
+        # 相对外接矩形的坐标 取整方式与 box_score_fast 一致
+        local = boxes.astype(np.float32)
+        local[:, :, 0] -= xmin[:, None]
+        local[:, :, 1] -= ymin[:, None]
+        local = local.astype("int32")
+
+        # 每条边都水平或垂直 且顶点都在外接矩形的角上
+        lx = local[:, :, 0]
+        ly = local[:, :, 1]
+        lx_min, lx_max = lx.min(axis=1), lx.max(axis=1)
+        ly_min, ly_max = ly.min(axis=1), ly.max(axis=1)
+        on_corner = np.all(((lx == lx_min[:, None]) | (lx == lx_max[:, None]))
+                           & ((ly == ly_min[:, None]) | (ly == ly_max[:, None])), axis=1)
+        axis_aligned = np.all((lx == np.roll(lx, -1, axis=1)) | (ly == np.roll(ly, -1, axis=1)), axis=1)
+        is_rect = on_corner & axis_aligned
+
+        if np.any(is_rect):
+            integral = cv2.integral(bitmap, sdepth=cv2.CV_64F)
+            x0 = xmin + np.maximum(lx_min, 0)
+            x1 = xmin + np.minimum(lx_max, xmax - xmin)
+            y0 = ymin + np.maximum(ly_min, 0)
+            y1 = ymin + np.minimum(ly_max, ymax - ymin)
+            valid = is_rect & (x0 <= x1) & (y0 <= y1)
+            x0, x1, y0, y1 = x0[valid], x1[valid] + 1, y0[valid], y1[valid] + 1
+            area_sum = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+            scores[valid] = area_sum / ((x1 - x0) * (y1 - y0))
+
+        mask_buffer = None
+        for idx in np.nonzero(~is_rect)[0]:
+            if mask_buffer is None:
+                mask_buffer = np.zeros((h, w), dtype=np.uint8)
+            mask = mask_buffer[:ymax[idx] - ymin[idx] + 1, :xmax[idx] - xmin[idx] + 1]
+            mask.fill(0)
+            cv2.fillPoly(mask, local[idx].reshape(1, -1, 2), 1)
+            scores[idx] = cv2.mean(bitmap[ymin[idx]:ymax[idx] + 1, xmin[idx]:xmax[idx] + 1], mask)[0]
+        return scores
+
     def box_score_slow(self, bitmap, contour):
         '''
         box_score_slow: use polyon mean score as the mean score
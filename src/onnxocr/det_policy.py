@@ -0,0 +1,182 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import threading
+
+
+class TextDetPolicy(object):
+    def __init__(self, single_line_max_height=0, single_line_max_aspect=10.0,
+                 limit_side_len=960, box_cache_size=0, hash_cell_size=4, hash_diff_thresh=8,
+                 hash_max_distance=8):
+        """
+        文本检测的策略 决定一张图片是否需要跑检测模型 以及用什么尺寸跑
+        - 高度很小的单行文本区域 直接把整张图作为一个文本框 不跑检测
+        - 不超过检测尺寸上限的图片 补边到32的倍数 以原始尺寸检测 不做缩放
+        - 图片内容没有变化时 复用上一次的检测框 识别仍会重新进行
+        跳过检测和复用检测框 在真实模型上验证前默认关闭 需要通过参数开启
+        :param single_line_max_height: 高度不超过这个值的图片认为是单行文本 0为不跳过检测
+        :param single_line_max_aspect: 宽高比超过这个值的 可能一行有多段文本 仍然检测
+        :param limit_side_len: 检测模型的最大边长 超过的图片按原逻辑缩小 不缓存检测框
+        :param box_cache_size: 缓存检测框的图片数量 0为不缓存
+        :param hash_cell_size: 计算图片指纹时 每个格子的边长
+        :param hash_diff_thresh: 计算图片指纹时 相邻格子灰度差超过这个值才记为1 避免噪点影响
+        :param hash_max_distance: 指纹不同的位数不超过这个值时 认为图片没有变化 噪点通常只有几位不同 文字变化会有几十位
+        """
+        self.single_line_max_height = single_line_max_height
+        self.single_line_max_aspect = single_line_max_aspect
+        self.limit_side_len = limit_side_len
+        self.box_cache_size = box_cache_size
+        self.hash_cell_size = hash_cell_size
+        self.hash_diff_thresh = hash_diff_thresh
+        self.hash_max_distance = hash_max_distance
+
+        self._box_cache = OrderedDict()  # key=(高, 宽, 指纹bytes) value=(指纹, 检测框)
+        self._cache_lock = threading.Lock()
+
+        # 统计 多个线程会同时识别 需要加锁
+        self._stats_lock = threading.Lock()
+        self.det_cnt = 0  # 实际跑检测模型的次数
+        self.skip_cnt = 0  # 单行文本跳过检测的次数
+        self.cache_hit_cnt = 0  # 复用检测框的次数
+
+    @staticmethod
+    def from_args(args):
+        return TextDetPolicy(
+            single_line_max_height=getattr(args, 'det_single_line_max_height', 0),
+            single_line_max_aspect=getattr(args, 'det_single_line_max_aspect', 10.0),
+            limit_side_len=int(args.det_limit_side_len) if args.det_limit_type == 'max' else 0,
+            box_cache_size=getattr(args, 'det_box_cache_size', 0),
+        )
+
+    def is_single_line(self, img):
+        """
+        是否小的单行文本图片 可以跳过检测
+        """
+        h, w = img.shape[:2]
+        return 0 < h <= self.single_line_max_height and w <= h * self.single_line_max_aspect
+
+    @staticmethod
+    def get_whole_image_boxes(img):
+        """
+        整张图片作为一个文本框
+        :return: shape=(1, 4, 2) 与检测结果格式一致
+        """
+        h, w = img.shape[:2]
+        return np.array([[[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]]], dtype=np.float32)
+
+    def detect(self, text_detector, img):
+        """
+        按策略进行文本检测
+        :param text_detector: 检测模型
+        :param img: 图片
+        :return: 检测框 与 text_detector(img) 格式一致
+        """
+        if self.is_single_line(img):
+            self.add_stats('skip_cnt')
+            return self.get_whole_image_boxes(img)
+
+        h, w = img.shape[:2]
+        if self.limit_side_len <= 0 or max(h, w) > self.limit_side_len:
+            self.add_stats('det_cnt')
+            return text_detector(img)
+
+        cache_key = None
+        if self.box_cache_size > 0:
+            image_hash = self.get_image_hash(img)
+            cache_key = (h, w, image_hash.tobytes())
+            with self._cache_lock:
+                dt_boxes = self._get_cached_boxes(cache_key, image_hash)
+            if dt_boxes is not None:
+                self.add_stats('cache_hit_cnt')
+                return dt_boxes
+
+        self.add_stats('det_cnt')
+        dt_boxes = self._detect_in_natural_size(text_detector, img)
+
+        if cache_key is not None and dt_boxes is not None:
+            with self._cache_lock:
+                self._box_cache[cache_key] = (image_hash, dt_boxes)
+                if len(self._box_cache) > self.box_cache_size:
+                    self._box_cache.popitem(last=False)
+
+        return dt_boxes
+
+    def add_stats(self, name):
+        """
+        统计次数加1
+        """
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _get_cached_boxes(self, cache_key, image_hash):
+        """
+        找相同尺寸 指纹相近的图片的检测框 需要在锁内调用
+        """
+        cache_item = self._box_cache.get(cache_key)
+        if cache_item is None and self.hash_max_distance > 0:
+            for key, item in self._box_cache.items():
+                if key[0] != cache_key[0] or key[1] != cache_key[1]:
+                    continue
+                distance = int(np.unpackbits(np.bitwise_xor(item[0], image_hash)).sum())
+                if distance <= self.hash_max_distance:
+                    cache_key = key
+                    cache_item = item
+                    break
+        if cache_item is None:
+            return None
+        self._box_cache.move_to_end(cache_key)
+        return cache_item[1]
+
+    def _detect_in_natural_size(self, text_detector, img):
+        """
+        右下补边到32的倍数后检测 检测模型内部不会再缩放
+        原来的逻辑会四舍五入到32的倍数 小图会被拉伸或压缩
+        """
+        h, w = img.shape[:2]
+        pad_h = max(32, (h + 31) // 32 * 32)
+        pad_w = max(32, (w + 31) // 32 * 32)
+        if pad_h == h and pad_w == w:
+            return text_detector(img)
+
+        pad_img = cv2.copyMakeBorder(img, 0, pad_h - h, 0, pad_w - w, cv2.BORDER_CONSTANT, value=0)
+        dt_boxes = text_detector(pad_img)
+        if dt_boxes is None or len(dt_boxes) == 0:
+            return dt_boxes
+
+        # 裁剪回原图范围 去掉太小的框 与检测模型内部的过滤一致
+        dt_boxes[:, :, 0] = np.clip(dt_boxes[:, :, 0], 0, w - 1)
+        dt_boxes[:, :, 1] = np.clip(dt_boxes[:, :, 1], 0, h - 1)
+        box_width = np.linalg.norm(dt_boxes[:, 0] - dt_boxes[:, 1], axis=1).astype(np.int32)
+        box_height = np.linalg.norm(dt_boxes[:, 0] - dt_boxes[:, 3], axis=1).astype(np.int32)
+        return dt_boxes[(box_width > 3) & (box_height > 3)]
+
+    def get_image_hash(self, img):
+        """
+        图片指纹 缩小后相邻格子的灰度差是否超过阈值
+        文字的笔画变化会改变较多位 画面的轻微噪点只会改变几位
+        :return: np.uint8 数组 每个元素8位
+        """
+        h, w = img.shape[:2]
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        small_w = max(2, w // self.hash_cell_size)
+        small_h = max(1, h // self.hash_cell_size)
+        small = cv2.resize(gray, (small_w, small_h), interpolation=cv2.INTER_AREA).astype(np.int16)
+        diff_x = (small[:, 1:] - small[:, :-1]) > self.hash_diff_thresh
+        diff_x_neg = (small[:, :-1] - small[:, 1:]) > self.hash_diff_thresh
+        bits = [diff_x, diff_x_neg]
+        if small_h > 1:
+            bits.append((small[1:, :] - small[:-1, :]) > self.hash_diff_thresh)
+            bits.append((small[:-1, :] - small[1:, :]) > self.hash_diff_thresh)
+        return np.concatenate([np.packbits(i) for i in bits])
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = {
+                'det_cnt': self.det_cnt,
+                'skip_cnt': self.skip_cnt,
+                'cache_hit_cnt': self.cache_hit_cnt,
+            }
+        with self._cache_lock:
+            stats['cache_size'] = len(self._box_cache)
+        return stats
@@ -8,23 +8,28 @@ import sys
 
 
 class ONNXPaddleOcr(TextSystem):
-    def __init__(self, **kwargs):
+    def __init__(self, text_detector=None, text_recognizer=None, **kwargs):
+        params = ONNXPaddleOcr.build_params(**kwargs)
+
+        # 初始化模型
+        super().__init__(params, text_detector=text_detector, text_recognizer=text_recognizer)
+
+    @staticmethod
+    def build_params(**kwargs):
         # 默认参数
         parser = init_args()
         inference_args_dict = {}
         for action in parser._actions:
             inference_args_dict[action.dest] = action.default
         params = argparse.Namespace(**inference_args_dict)
-        
+
 
         # params.rec_image_shape = "3, 32, 320"
         params.rec_image_shape = "3, 48, 320"
 
         # 根据传入的参数覆盖更新默认参数
         params.__dict__.update(**kwargs)
-
-        # 初始化模型
-        super().__init__(params)
+        return params
 
     def ocr(self, img, det=True, rec=True, cls=True):
         if cls == True and self.use_angle_cls == False:
@@ -59,6 +64,21 @@ class ONNXPaddleOcr(TextSystem):
                 return cls_res
             return ocr_res
 
+    def ocr_batch(self, img_list, cls=True):
+        """
+        多张图片一起进行检测+识别
+        :param img_list: 图片列表
+        :param cls: 是否使用方向分类
+        :return: 每张图片的结果 格式与 ocr()[0] 一致
+        """
+        if cls == True and self.use_angle_cls == False:
+            print('Since the angle classifier is not initialized, the angle classifier will not be uesd during the forward process')
+
+        ocr_res = []
+        for dt_boxes, rec_res in self.batch_call(img_list, cls):
+            ocr_res.append([[box.tolist(), res] for box, res in zip(dt_boxes, rec_res)])
+        return ocr_res
+
 
 def sav2Img(org_img, result, name="draw_ocr.jpg"):
     # 显示结果
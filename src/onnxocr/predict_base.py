@@ -4,13 +4,17 @@ class PredictBase(object):
     def __init__(self):
         pass
 
-    def get_onnx_session(self, model_dir, use_gpu):
+    def get_onnx_session(self, model_dir, use_gpu, session_creator=None):
         # 使用gpu
         if use_gpu:
             providers = providers=['CUDAExecutionProvider']
         else:
             providers = providers = ['CPUExecutionProvider']
 
+        # 由调用方统一管理会话时 使用调用方的创建方法
+        if session_creator is not None:
+            return session_creator(model_dir, providers=providers)
+
         onnx_session = onnxruntime.InferenceSession(model_dir, None,providers=providers)
 
         # print("providers:", onnxruntime.get_device())
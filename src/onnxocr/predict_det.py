@@ -44,7 +44,8 @@ class TextDetector(PredictBase):
         self.postprocess_op = DBPostProcess(**postprocess_params)
 
         # 初始化模型
-        self.det_onnx_session = self.get_onnx_session(args.det_model_dir, args.use_gpu)
+        self.det_onnx_session = self.get_onnx_session(args.det_model_dir, args.use_gpu,
+                                                      getattr(args, 'session_creator', None))
         self.det_input_name = self.get_input_name(self.det_onnx_session)
         self.det_output_name = self.get_output_name(self.det_onnx_session)
 
@@ -96,16 +97,15 @@ class TextDetector(PredictBase):
         return dt_boxes
 
     def __call__(self, img):
-        ori_im = img.copy()
+        ori_shape = img.shape  # 预处理不会修改原图 只需要记录尺寸
         data = {'image': img}
 
         data = transform(data, self.preprocess_op)
         img, shape_list = data
         if img is None:
             return None, 0
-        img = np.expand_dims(img, axis=0)
+        img = np.ascontiguousarray(np.expand_dims(img, axis=0))
         shape_list = np.expand_dims(shape_list, axis=0)
-        img = img.copy()
 
 
         input_feed = self.get_input_feed(self.det_input_name, img)
@@ -118,9 +118,9 @@ class TextDetector(PredictBase):
         dt_boxes = post_result[0]['points']
 
         if self.args.det_box_type == 'poly':
-            dt_boxes = self.filter_tag_det_res_only_clip(dt_boxes, ori_im.shape)
+            dt_boxes = self.filter_tag_det_res_only_clip(dt_boxes, ori_shape)
         else:
-            dt_boxes = self.filter_tag_det_res(dt_boxes, ori_im.shape)
+            dt_boxes = self.filter_tag_det_res(dt_boxes, ori_shape)
 
         return dt_boxes
 
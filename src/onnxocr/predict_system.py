@@ -1,16 +1,18 @@
 import os
 import cv2
-import copy
+import numpy as np
 import onnxocr.predict_det as predict_det
 import onnxocr.predict_cls as predict_cls
 import onnxocr.predict_rec as predict_rec
+from onnxocr.det_policy import TextDetPolicy
 from onnxocr.utils import get_rotate_crop_image, get_minarea_rect_crop
 
 
 class TextSystem(object):
-    def __init__(self, args):
-        self.text_detector = predict_det.TextDetector(args)
-        self.text_recognizer = predict_rec.TextRecognizer(args)
+    def __init__(self, args, text_detector=None, text_recognizer=None):
+        # 可以传入已经加载好的模型 用于分别并行加载
+        self.text_detector = predict_det.TextDetector(args) if text_detector is None else text_detector
+        self.text_recognizer = predict_rec.TextRecognizer(args) if text_recognizer is None else text_recognizer
         self.use_angle_cls = args.use_angle_cls
         self.drop_score = args.drop_score
         if self.use_angle_cls:
@@ -18,6 +20,7 @@ class TextSystem(object):
 
         self.args = args
         self.crop_image_res_index = 0
+        self.det_policy = TextDetPolicy.from_args(args)  # 是否跳过检测 检测尺寸 检测框缓存
 
 
     def draw_crop_rec_res(self, output_dir, img_crop_list, rec_res):
@@ -32,9 +35,8 @@ class TextSystem(object):
         self.crop_image_res_index += bbox_num
 
     def __call__(self, img, cls=True):
-        ori_im = img.copy()
         # 文字检测
-        dt_boxes = self.text_detector(img)
+        dt_boxes = self.det_policy.detect(self.text_detector, img)
 
         if dt_boxes is None:
             return None, None
@@ -43,13 +45,12 @@ class TextSystem(object):
 
         dt_boxes = sorted_boxes(dt_boxes)
 
-        # 图片裁剪
-        for bno in range(len(dt_boxes)):
-            tmp_box = copy.deepcopy(dt_boxes[bno])
+        # 图片裁剪 裁剪不会修改原图和文本框 不需要复制
+        for box in dt_boxes:
             if self.args.det_box_type == "quad":
-                img_crop = get_rotate_crop_image(ori_im, tmp_box)
+                img_crop = get_rotate_crop_image(img, box)
             else:
-                img_crop = get_minarea_rect_crop(ori_im, tmp_box)
+                img_crop = get_minarea_rect_crop(img, box)
             img_crop_list.append(img_crop)
 
         # 方向分类
@@ -70,6 +71,135 @@ class TextSystem(object):
 
         return filter_boxes, filter_rec_res
 
+    def batch_call(self, img_list, cls=True):
+        """
+        多张图片一起识别
+        小图会先拼接到若干张大图上 只跑一次检测模型 再把所有文本框放在一起识别
+        :param img_list: 图片列表
+        :param cls: 是否使用方向分类
+        :return: 每张图片对应的 (filter_boxes, filter_rec_res)
+        """
+        img_num = len(img_list)
+        boxes_list = [[] for _ in range(img_num)]
+
+        # 小的单行文本不需要检测
+        to_det_idx_list = []
+        for img_idx, img in enumerate(img_list):
+            if self.det_policy.is_single_line(img):
+                self.det_policy.add_stats('skip_cnt')
+                boxes_list[img_idx].extend(self.det_policy.get_whole_image_boxes(img))
+            else:
+                to_det_idx_list.append(img_idx)
+
+        # 文字检测
+        pages = pack_images_to_pages([img_list[i] for i in to_det_idx_list], int(self.args.det_limit_side_len))
+        for page_img, placements in pages:
+            placements = [(to_det_idx_list[idx], x, y) for idx, x, y in placements]
+            dt_boxes = self.text_detector(page_img)
+            if dt_boxes is None or len(dt_boxes) == 0:
+                continue
+            for box in dt_boxes:
+                center_x = np.mean(box[:, 0])
+                center_y = np.mean(box[:, 1])
+                for img_idx, x, y in placements:
+                    h, w = img_list[img_idx].shape[:2]
+                    if x <= center_x < x + w and y <= center_y < y + h:
+                        local_box = box - np.array([x, y], dtype=box.dtype)
+                        local_box[:, 0] = np.clip(local_box[:, 0], 0, w - 1)
+                        local_box[:, 1] = np.clip(local_box[:, 1], 0, h - 1)
+                        boxes_list[img_idx].append(local_box)
+                        break
+
+        # 图片裁剪
+        img_crop_list = []
+        crop_owner = []  # 每个裁剪对应的 (图片下标, 文本框)
+        for img_idx in range(img_num):
+            if len(boxes_list[img_idx]) == 0:
+                continue
+            for box in sorted_boxes(np.array(boxes_list[img_idx])):
+                if self.args.det_box_type == "quad":
+                    img_crop = get_rotate_crop_image(img_list[img_idx], box)
+                else:
+                    img_crop = get_minarea_rect_crop(img_list[img_idx], box)
+                img_crop_list.append(img_crop)
+                crop_owner.append((img_idx, box))
+
+        result_list = [([], []) for _ in range(img_num)]
+        if len(img_crop_list) == 0:
+            return result_list
+
+        # 方向分类
+        if self.use_angle_cls and cls:
+            img_crop_list, angle_list = self.text_classifier(img_crop_list)
+
+        # 图像识别 所有图片的文本框一起按宽度排序后分批识别
+        rec_res = self.text_recognizer(img_crop_list)
+
+        for (img_idx, box), rec_result in zip(crop_owner, rec_res):
+            text, score = rec_result
+            if score >= self.drop_score:
+                result_list[img_idx][0].append(box)
+                result_list[img_idx][1].append(rec_result)
+
+        return result_list
+
+
+def pack_images_to_pages(img_list, max_side_len, gap=32):
+    """
+    将多张小图按行拼接到若干张大图上 图片之间留有黑色间隔 避免检测框跨图片
+    大图的边长不超过 max_side_len 保证检测时不会被缩小
+    :param img_list: 图片列表
+    :param max_side_len: 大图最大边长
+    :param gap: 图片之间的间隔
+    :return: [(大图, [(图片下标, 左上角x, 左上角y)])]
+    """
+    pages = []
+
+    # 放不下的图片单独检测
+    to_pack = []
+    for idx, img in enumerate(img_list):
+        h, w = img.shape[:2]
+        if h + gap * 2 > max_side_len or w + gap * 2 > max_side_len:
+            pages.append((img, [(idx, 0, 0)]))
+        else:
+            to_pack.append(idx)
+
+    # 按高度排序 同一行的高度接近 减少空白
+    to_pack.sort(key=lambda i: img_list[i].shape[0], reverse=True)
+
+    page_placements = []
+    placements = []
+    x, y, row_h = gap, gap, 0
+    for idx in to_pack:
+        h, w = img_list[idx].shape[:2]
+        if x + w + gap > max_side_len:  # 换行
+            x = gap
+            y += row_h + gap
+            row_h = 0
+        if y + h + gap > max_side_len:  # 换页
+            page_placements.append(placements)
+            placements = []
+            x, y, row_h = gap, gap, 0
+        placements.append((idx, x, y))
+        x += w + gap
+        row_h = max(row_h, h)
+    if len(placements) > 0:
+        page_placements.append(placements)
+
+    for placements in page_placements:
+        page_w = max(x + img_list[idx].shape[1] for idx, x, y in placements) + gap
+        page_h = max(y + img_list[idx].shape[0] for idx, x, y in placements) + gap
+        page_img = np.zeros((page_h, page_w, 3), dtype=np.uint8)
+        for idx, x, y in placements:
+            img = img_list[idx]
+            if img.ndim == 2:
+                img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+            h, w = img.shape[:2]
+            page_img[y:y + h, x:x + w] = img[:, :, :3]
+        pages.append((page_img, placements))
+
+    return pages
+
 
 def sorted_boxes(dt_boxes):
     """
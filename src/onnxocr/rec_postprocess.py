@@ -34,6 +34,7 @@ class BaseRecLabelDecode(object):
         for i, char in enumerate(dict_character):
             self.dict[char] = i
         self.character = dict_character
+        self._character_arr = np.array(dict_character, dtype=object)  # 用于按下标批量取字符
 
     def pred_reverse(self, pred):
         pred_re = []
@@ -86,6 +87,40 @@ class BaseRecLabelDecode(object):
             result_list.append((text, np.mean(conf_list).tolist()))
         return result_list
 
+    def decode_batch(self, text_index, text_prob=None, is_remove_duplicate=False):
+        """
+        与 decode 结果一致 整个批次一起计算
+        去重、去掉忽略字符、置信度求平均 都是数组运算 只有拼接字符串按行进行
+        :param text_index: shape (批次, 时间步)
+        :param text_prob: shape (批次, 时间步) 或 None
+        """
+        text_index = np.asarray(text_index)
+        batch_size, step_cnt = text_index.shape
+        selection = np.ones(text_index.shape, dtype=bool)
+        if is_remove_duplicate:
+            selection[:, 1:] = text_index[:, 1:] != text_index[:, :-1]
+        for ignored_token in self.get_ignored_tokens():
+            selection &= text_index != ignored_token
+
+        char_cnt = np.count_nonzero(selection, axis=1)
+        if text_prob is not None:
+            conf_sum = np.sum(np.where(selection, text_prob, 0), axis=1, dtype=np.float64)
+            conf_arr = np.divide(conf_sum, char_cnt, out=np.zeros(batch_size), where=char_cnt > 0)
+        else:
+            conf_arr = np.full(batch_size, 1.0 if step_cnt > 0 else 0.0)
+
+        char_arr = self._character_arr[text_index[selection]]
+        end_list = np.cumsum(char_cnt).tolist()
+        result_list = []
+        start = 0
+        for end, conf in zip(end_list, conf_arr.tolist()):
+            text = ''.join(char_arr[start:end])
+            start = end
+            if self.reverse:  # for arabic rec
+                text = self.pred_reverse(text)
+            result_list.append((text, conf))
+        return result_list
+
     def get_ignored_tokens(self):
         return [0]  # for ctc blank
 
@@ -104,8 +139,8 @@ class CTCLabelDecode(BaseRecLabelDecode):
         # if isinstance(preds, paddle.Tensor):
         #     preds = preds.numpy()
         preds_idx = preds.argmax(axis=2)
-        preds_prob = preds.max(axis=2)
-        text = self.decode(preds_idx, preds_prob, is_remove_duplicate=True)
+        preds_prob = np.take_along_axis(preds, preds_idx[:, :, None], axis=2)[:, :, 0]
+        text = self.decode_batch(preds_idx, preds_prob, is_remove_duplicate=True)
         if label is None:
             return text
         label = self.decode(label)
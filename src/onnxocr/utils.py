@@ -241,6 +241,9 @@ def infer_args():
     parser.add_argument("--det_limit_side_len", type=float, default=960)
     parser.add_argument("--det_limit_type", type=str, default='max')
     parser.add_argument("--det_box_type", type=str, default='quad')
+    parser.add_argument("--det_single_line_max_height", type=int, default=0)  # 不超过这个高度的单行文本跳过检测 0为不跳过 如48
+    parser.add_argument("--det_single_line_max_aspect", type=float, default=10.0)
+    parser.add_argument("--det_box_cache_size", type=int, default=0)  # 图片内容不变时复用检测框 0为不缓存 如64
 
     # DB parmas
     parser.add_argument("--det_db_thresh", type=float, default=0.3)
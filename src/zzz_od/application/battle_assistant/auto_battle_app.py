@@ -1,5 +1,3 @@
-import time
-
 from typing import Optional, ClassVar
 
 from one_dragon.base.controller.pc_button import pc_button_utils
@@ -70,6 +68,9 @@ class AutoBattleApp(ZApplication):
                                                 self.ctx.battle_assistant_config.auto_battle_config)
 
         if result.is_success:
+            if self.ctx.battle_assistant_config.async_screenshot:
+                interval = self.ctx.battle_assistant_config.screenshot_interval
+                self.ctx.controller.start_async_capture(fps=1.0 / interval if interval > 0 else 50)
             self.ctx.dispatch_event(
                 AutoBattleApp.EVENT_OP_LOADED,
                 self.auto_op,
@@ -85,9 +86,8 @@ class AutoBattleApp(ZApplication):
         识别当前画面 并进行点击
         :return:
         """
-        now = time.time()
-
         screen = self.screenshot()
+        now = self.ctx.controller.last_screenshot_time  # 使用后台截图时 为实际的截图时间
         self.auto_op.auto_battle_context.check_battle_state(screen, now)
 
         return self.round_wait(wait_round_time=self.ctx.battle_assistant_config.screenshot_interval)
@@ -102,6 +102,7 @@ class AutoBattleApp(ZApplication):
 
     def after_operation_done(self, result: OperationResult):
         ZApplication.after_operation_done(self, result)
+        self.ctx.controller.stop_async_capture()
         if self.auto_op is not None:
             self.auto_op.dispose()
             self.auto_op = None
@@ -31,6 +31,17 @@ class BattleAssistantConfig(YamlConfig):
     def screenshot_interval(self, new_value: float) -> None:
         self.update('screenshot_interval', new_value)
 
+    @property
+    def async_screenshot(self) -> bool:
+        """
+        是否使用后台截图 需要安装mss
+        """
+        return self.get('async_screenshot', False)
+
+    @async_screenshot.setter
+    def async_screenshot(self, new_value: bool) -> None:
+        self.update('async_screenshot', new_value)
+
     @property
     def gamepad_type(self) -> str:
         return self.get('gamepad_type', GamepadTypeEnum.NONE.value.value)
@@ -5,8 +5,8 @@ from typing import Optional, List, Tuple
 from one_dragon.base.config.yaml_operator import YamlOperator
 from one_dragon.base.matcher.match_result import MatchResult
 from one_dragon.base.screen import screen_utils
-from one_dragon.utils import os_utils, str_utils
-from one_dragon.utils.i18_utils import gt
+from one_dragon.utils import os_utils
+from one_dragon.utils.fuzzy_index import GtFuzzyIndexCache
 from zzz_od.application.hollow_zero.lost_void.context.lost_void_artifact import LostVoidArtifact
 from zzz_od.application.hollow_zero.lost_void.context.lost_void_detector import LostVoidDetector
 from zzz_od.application.hollow_zero.lost_void.lost_void_challenge_config import LostVoidRegionType, \
@@ -31,6 +31,7 @@ class LostVoidContext:
         self.all_artifact_list: List[LostVoidArtifact] = []  # 武备 + 鸣徽
         self.gear_by_name: dict[str, LostVoidArtifact] = {}  # key=名称 value=武备
         self.cate_2_artifact: dict[str, List[LostVoidArtifact]] = {}  # key=分类 value=藏品
+        self._fuzzy_index_cache: GtFuzzyIndexCache = GtFuzzyIndexCache()  # 翻译后的藏品分类和名称 用于匹配OCR结果
 
     def init_before_run(self) -> None:
         self.init_lost_void_det_model()
@@ -46,6 +47,7 @@ class LostVoidContext:
         self.all_artifact_list = []
         self.gear_by_name = {}
         self.cate_2_artifact = {}
+        self._fuzzy_index_cache.clear()
         file_path = os.path.join(
             os_utils.get_path_under_work_dir('assets', 'game_data', 'hollow_zero', 'lost_void'),
             'lost_void_artifact_data.yml'
@@ -136,8 +138,10 @@ class LostVoidContext:
         name_full_str = name_full_str.replace('【', '')
         name_full_str = name_full_str.replace('】', '')
 
-        for cate, art_list in self.cate_2_artifact.items():
-            cate_name = gt(cate)
+        cate_list = list(self.cate_2_artifact.keys())
+        cate_index = self._fuzzy_index_cache.get('category', cate_list)
+        for cate_idx, cate in enumerate(cate_list):
+            cate_name = cate_index.word_list[cate_idx]
 
             if cate not in ['卡牌', '无详情']:
                 if len(name_full_str) < len(cate_name):
@@ -145,14 +149,20 @@ class LostVoidContext:
                 # 取出与分类名称长度一致的前缀 用来判断是否符合分类
                 prefix = name_full_str[:len(cate_name)]
 
-                if not str_utils.find_by_lcs(cate_name, prefix, percent=0.5):
+                if not cate_index.is_lcs_matched(cate_idx, prefix, percent=0.5):
                     continue
 
             # 符合分类的情况下 判断后缀和藏品名字是否一致
-            for art in art_list:
-                art_name = gt(art.name)
+            art_list = self.cate_2_artifact[cate]
+            art_index = self._fuzzy_index_cache.get(f'name.{cate}', [art.name for art in art_list])
+            # 与识别文本没有相同字符的藏品 不可能符合
+            candidate_idx_set = art_index.get_candidate_idx_set(name_full_str)
+            for art_idx, art in enumerate(art_list):
+                if art_idx not in candidate_idx_set:
+                    continue
+                art_name = art_index.word_list[art_idx]
                 suffix = name_full_str[-len(art_name):]
-                if str_utils.find_by_lcs(art_name, suffix, percent=0.5):
+                if art_index.is_lcs_matched(art_idx, suffix, percent=0.5):
                     return art
 
     def check_artifact_priority_input(self, input_str: str) -> Tuple[List[str], str]:
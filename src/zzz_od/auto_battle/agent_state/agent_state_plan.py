@@ -0,0 +1,449 @@
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from typing import Optional, List, Callable, Tuple
+
+from one_dragon.base.conditional_operation.state_recorder import StateRecord
+from one_dragon.base.geometry.rectangle import Rect
+from one_dragon.base.screen.template_info import TemplateInfo
+from one_dragon.utils import cv2_utils
+from zzz_od.auto_battle.agent_state import agent_state_checker
+from zzz_od.context.zzz_context import ZContext
+from zzz_od.game_data.agent import AgentStateCheckWay, AgentStateDef
+
+# 无法批量识别时 使用单个状态的识别方法
+_agent_state_check_method: dict[AgentStateCheckWay, Callable] = {
+    AgentStateCheckWay.COLOR_RANGE_CONNECT: agent_state_checker.check_cnt_by_color_range,
+    AgentStateCheckWay.COLOR_RANGE_EXIST: agent_state_checker.check_exist_by_color_range,
+    AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH: agent_state_checker.check_length_by_background_gray,
+    AgentStateCheckWay.FOREGROUND_GRAY_RANGE_LENGTH: agent_state_checker.check_length_by_foreground_gray,
+    AgentStateCheckWay.FOREGROUND_COLOR_RANGE_LENGTH: agent_state_checker.check_length_by_foreground_color,
+    AgentStateCheckWay.TEMPLATE_NOT_FOUND: agent_state_checker.check_template_not_found,
+    AgentStateCheckWay.TEMPLATE_FOUND: agent_state_checker.check_template_found,
+    AgentStateCheckWay.COLOR_CHANNEL_MAX_RANGE_EXIST: agent_state_checker.check_exist_by_color_channel_max_range,
+}
+
+# 按灰度计算横条长度的
+_GRAY_LENGTH_WAYS = [
+    AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH,
+    AgentStateCheckWay.FOREGROUND_GRAY_RANGE_LENGTH,
+]
+
+# 按颜色范围找连通块的
+_BLOB_WAYS = [
+    AgentStateCheckWay.COLOR_RANGE_CONNECT,
+    AgentStateCheckWay.COLOR_RANGE_EXIST,
+    AgentStateCheckWay.COLOR_CHANNEL_MAX_RANGE_EXIST,
+]
+
+# 叠放多个区域时 区域之间空出的行数 保证膨胀和连通块不会跨区域
+_STACK_GAP = 2
+
+
+class CheckAgentState:
+
+    def __init__(self, state: AgentStateDef, total: Optional[int] = None, pos: Optional[int] = None):
+        self.state: AgentStateDef = state
+        self.total: int = total
+        self.pos: int = pos
+
+
+class _PlanItem:
+
+    def __init__(self, idx: int, to_check: CheckAgentState,
+                 template: Optional[TemplateInfo], rect: Optional[Rect]):
+        """
+        识别计划中的一个状态
+        :param idx: 在识别列表中的下标
+        :param to_check: 需要识别的状态
+        :param template: 状态对应的模板
+        :param rect: 模板在游戏画面的位置
+        """
+        self.idx: int = idx
+        self.to_check: CheckAgentState = to_check
+        self.template: Optional[TemplateInfo] = template
+        self.rect: Optional[Rect] = rect
+
+    @property
+    def state(self) -> AgentStateDef:
+        return self.to_check.state
+
+
+class AgentStatePlan:
+
+    def __init__(self, ctx: ZContext, to_check_list: List[CheckAgentState]):
+        """
+        预先编译好的角色状态识别计划 一次识别所有位置的所有状态 不需要再为每个状态提交一个线程任务
+        - 灰度横条 在所有区域的并集上只转换一次灰度 按预先计算的下标取出所有横条 用numpy同时计算长度
+        - 彩色横条 按预先计算的下标取出所有横条的像素 一次计算颜色范围 再按横条统计数量
+        - 连通块 所有区域叠放成一张图 一次计算颜色范围 一次膨胀 一次查找连通块 再按区域统计
+        - 模板匹配 无法合并 逐个识别
+        结果与 agent_state_checker 中逐个识别的一致
+        :param ctx: 上下文
+        :param to_check_list: 需要识别的状态 与 check 返回的结果顺序一致
+        """
+        self.ctx: ZContext = ctx
+        self.to_check_list: List[CheckAgentState] = to_check_list
+
+        self._gray_item_list: List[_PlanItem] = []
+        self._length_item_list: List[_PlanItem] = []
+        self._blob_item_list: List[_PlanItem] = []
+        self._single_item_list: List[_PlanItem] = []  # 逐个识别的
+        self._zero_item_list: List[_PlanItem] = []  # 没有模板的 固定为0
+
+        for idx, to_check in enumerate(to_check_list):
+            template = agent_state_checker.get_template(ctx, to_check.state, to_check.total, to_check.pos)
+            if template is None:
+                self._zero_item_list.append(_PlanItem(idx, to_check, None, None))
+                continue
+
+            rect = template.get_template_rect_by_point()
+            item = _PlanItem(idx, to_check, template, rect)
+            check_way = to_check.state.check_way
+            if rect is None:
+                self._single_item_list.append(item)
+            elif check_way in _GRAY_LENGTH_WAYS:
+                self._gray_item_list.append(item)
+            elif check_way == AgentStateCheckWay.FOREGROUND_COLOR_RANGE_LENGTH:
+                self._length_item_list.append(item)
+            elif check_way in _BLOB_WAYS and _is_mask_matched(item):
+                self._blob_item_list.append(item)
+            else:
+                self._single_item_list.append(item)
+
+        self._init_gray_param()
+        self._init_blob_param()
+
+        # 取像素的下标与画面大小有关 第一次识别时再计算
+        self._screen_shape: Optional[tuple] = None
+
+    def _init_gray_param(self) -> None:
+        """
+        灰度横条的参数 每个横条一行
+        """
+        item_list = self._gray_item_list
+        n = len(item_list)
+
+        def to_column(values: list) -> np.ndarray:
+            return np.array(values, dtype=np.float64).reshape(n, 1)
+
+        self._gray_lower: np.ndarray = to_column([i.state.lower_color for i in item_list])
+        self._gray_upper: np.ndarray = to_column([i.state.upper_color for i in item_list])
+        self._gray_has_split: np.ndarray = np.array([i.state.split_color_range is not None for i in item_list],
+                                                    dtype=bool).reshape(n, 1)
+        self._gray_split_lower: np.ndarray = to_column([i.state.split_color_range[0] if i.state.split_color_range is not None else 0
+                                                        for i in item_list])
+        self._gray_split_upper: np.ndarray = to_column([i.state.split_color_range[1] if i.state.split_color_range is not None else 0
+                                                        for i in item_list])
+        self._gray_is_bg: np.ndarray = np.array([i.state.check_way == AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH
+                                                 for i in item_list], dtype=bool)
+        self._gray_max_length: np.ndarray = np.array([100 if i.state.check_way == AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH
+                                                      else i.state.max_length
+                                                      for i in item_list], dtype=np.float64)
+
+    def _init_blob_param(self) -> None:
+        """
+        连通块的参数 所有区域从上往下叠放 区域之间空出 _STACK_GAP 行
+        """
+        item_list = self._blob_item_list
+        self._blob_row_start: np.ndarray = np.zeros(len(item_list), dtype=np.int64)
+        row = 0
+        for i, item in enumerate(item_list):
+            self._blob_row_start[i] = row
+            row += item.rect.height + _STACK_GAP
+        self._blob_height: int = row
+        self._blob_width: int = max([i.rect.width for i in item_list], default=0)
+
+        # 每一行使用的颜色范围
+        self._blob_lower: np.ndarray = np.zeros((self._blob_height, 1, 3), dtype=np.uint8)
+        self._blob_upper: np.ndarray = np.zeros((self._blob_height, 1, 3), dtype=np.uint8)
+        self._blob_channel_max_row: np.ndarray = np.zeros((self._blob_height, 1), dtype=bool)
+        for item, row in zip(item_list, self._blob_row_start):
+            rows = slice(row, row + item.rect.height)
+            self._blob_lower[rows, 0, :] = np.broadcast_to(np.array(item.state.lower_color), (3,))
+            self._blob_upper[rows, 0, :] = np.broadcast_to(np.array(item.state.upper_color), (3,))
+            self._blob_channel_max_row[rows] = item.state.check_way == AgentStateCheckWay.COLOR_CHANNEL_MAX_RANGE_EXIST
+        self._blob_has_channel_max: bool = bool(self._blob_channel_max_row.any())
+
+        self._blob_connect_cnt: np.ndarray = np.array([i.state.connect_cnt if i.state.connect_cnt is not None else 0
+                                                       for i in item_list], dtype=np.int64)
+        self._blob_is_cnt: np.ndarray = np.array([i.state.check_way == AgentStateCheckWay.COLOR_RANGE_CONNECT
+                                                  for i in item_list], dtype=bool)
+
+    def _init_pixel_idx(self, screen_shape: tuple) -> None:
+        """
+        计算从画面中取出各个区域像素的下标
+        区域超出画面的部分会被裁剪 与 cv2_utils.crop_image 一致 剩余部分靠左上对齐
+        :param screen_shape: 画面大小
+        """
+        self._screen_shape = screen_shape
+        screen_height, screen_width = screen_shape[0], screen_shape[1]
+        screen_rect = Rect(0, 0, screen_width, screen_height)
+
+        # 灰度横条 下标是在并集灰度图中的下标
+        rect_list = [_clip_rect(i.rect, screen_width, screen_height) for i in self._gray_item_list]
+        self._gray_union: Optional[Rect] = _get_union_rect(rect_list)
+        n = len(rect_list)
+        max_h = max([i.height for i in rect_list], default=0)
+        max_w = max([i.width for i in rect_list], default=0)
+        self._gray_idx: np.ndarray = np.zeros((n, max_h, max_w), dtype=np.int64)
+        self._gray_row_weight: np.ndarray = np.zeros((n, max_h, 1), dtype=np.int64)
+        self._gray_valid: np.ndarray = np.zeros((n, max_w), dtype=bool)
+        self._gray_part_height: np.ndarray = np.ones((n, 1), dtype=np.float64)
+        for i, rect in enumerate(rect_list):
+            if rect.width == 0 or rect.height == 0:
+                continue
+            self._gray_idx[i, :rect.height, :rect.width] = _get_flat_idx(rect, self._gray_union)
+            self._gray_row_weight[i, :rect.height] = 1
+            self._gray_valid[i, :rect.width] = True
+            self._gray_part_height[i] = rect.height
+
+        # 彩色横条 所有像素排成一列 下标是在画面中的下标
+        self._length_part_width: np.ndarray = np.zeros(len(self._length_item_list), dtype=np.int64)
+        idx_list: List[np.ndarray] = [np.zeros(0, dtype=np.int64)]
+        pixel_item_list: List[np.ndarray] = [np.zeros(0, dtype=np.int64)]
+        lower_list: List[np.ndarray] = [np.zeros((0, 3), dtype=np.uint8)]
+        upper_list: List[np.ndarray] = [np.zeros((0, 3), dtype=np.uint8)]
+        for i, item in enumerate(self._length_item_list):
+            rect = _clip_rect(item.rect, screen_width, screen_height)
+            self._length_part_width[i] = rect.width
+            pixel_idx = _get_flat_idx(rect, screen_rect).ravel()
+            idx_list.append(pixel_idx)
+            pixel_item_list.append(np.full(len(pixel_idx), i, dtype=np.int64))
+            lower_list.append(np.broadcast_to(np.array(item.state.lower_color, dtype=np.uint8), (len(pixel_idx), 3)))
+            upper_list.append(np.broadcast_to(np.array(item.state.upper_color, dtype=np.uint8), (len(pixel_idx), 3)))
+        self._length_idx: np.ndarray = np.concatenate(idx_list)
+        self._length_pixel_item: np.ndarray = np.concatenate(pixel_item_list)  # 每个像素属于哪个横条
+        self._length_lower: np.ndarray = np.concatenate(lower_list)
+        self._length_upper: np.ndarray = np.concatenate(upper_list)
+
+        # 连通块 下标是在画面中的下标
+        self._blob_idx: np.ndarray = np.zeros((self._blob_height, self._blob_width), dtype=np.int64)
+        self._blob_masked: np.ndarray = np.ones((self._blob_height, self._blob_width), dtype=bool)
+        self._blob_valid: np.ndarray = np.zeros((self._blob_height, self._blob_width), dtype=bool)
+        for item, row in zip(self._blob_item_list, self._blob_row_start):
+            rect = _clip_rect(item.rect, screen_width, screen_height)
+            if rect.width == 0 or rect.height == 0:
+                continue
+            rows = slice(row, row + rect.height)
+            self._blob_idx[rows, :rect.width] = _get_flat_idx(rect, screen_rect)
+            self._blob_valid[rows, :rect.width] = True
+            mask = item.template.mask
+            if mask is not None:
+                mask = mask[rect.y1 - item.rect.y1:rect.y2 - item.rect.y1, rect.x1 - item.rect.x1:rect.x2 - item.rect.x1]
+                self._blob_masked[rows, :rect.width] = mask == 0
+            else:
+                self._blob_masked[rows, :rect.width] = False
+        # 掩码以外的像素 与 cv2.bitwise_and 一样按黑色计算
+        self._blob_black_in_range: np.ndarray = self._get_blob_in_range(np.zeros((1, 1, 3), dtype=np.uint8))
+
+    def check(self, screen: MatLike, screenshot_time: float) -> List[StateRecord]:
+        """
+        识别所有状态
+        :param screen: 游戏画面
+        :param screenshot_time: 截图时间
+        :return: 达到触发值的状态记录 顺序与识别列表一致
+        """
+        value_list = self.check_values(screen)
+        result_list: List[StateRecord] = []
+        for to_check, value in zip(self.to_check_list, value_list):
+            if value > -1 and value >= to_check.state.min_value_trigger_state:
+                result_list.append(StateRecord(to_check.state.state_name, screenshot_time, value))
+        return result_list
+
+    def check_values(self, screen: MatLike) -> List[int]:
+        """
+        识别所有状态的值
+        :param screen: 游戏画面
+        :return: 每个状态的值 识别失败时为-1
+        """
+        if self._screen_shape != screen.shape:
+            self._init_pixel_idx(screen.shape)
+
+        value_list: List[int] = [-1] * len(self.to_check_list)
+
+        for item in self._zero_item_list:
+            value_list[item.idx] = 0
+
+        for item_list, check_method in [
+            (self._gray_item_list, self._check_gray_length),
+            (self._length_item_list, self._check_color_length),
+            (self._blob_item_list, self._check_blob),
+        ]:
+            if len(item_list) == 0:
+                continue
+            for item, value in zip(item_list, check_method(screen)):
+                value_list[item.idx] = value
+
+        for item in self._single_item_list:
+            to_check = item.to_check
+            check_method = _agent_state_check_method[to_check.state.check_way]
+            value_list[item.idx] = int(check_method(ctx=self.ctx, screen=screen, state_def=to_check.state,
+                                                    total=to_check.total, pos=to_check.pos))
+
+        return value_list
+
+    def _check_gray_length(self, screen: MatLike) -> List[int]:
+        """
+        按灰度计算所有横条的长度
+        :param screen: 游戏画面
+        :return:
+        """
+        union_part = cv2_utils.crop_image_only(screen, self._gray_union)
+        union_gray = cv2.cvtColor(union_part, cv2.COLOR_RGB2GRAY).ravel()
+
+        # 每个横条按列求平均 叠放成一个矩阵 不足的部分标记为无效
+        valid = self._gray_valid
+        gray = (union_gray[self._gray_idx] * self._gray_row_weight).sum(axis=1) / self._gray_part_height
+        in_range = valid & (gray >= self._gray_lower) & (gray <= self._gray_upper)
+
+        # 背景灰度 如果前景色的左边能找到背景色 说明前景色是分隔条 用背景色来判断长度
+        total_cnt = valid.sum(axis=1)
+        bg_left, bg_right = _first_last_idx(in_range, total_cnt)
+        lg_left, lg_right = _first_last_idx(valid & ~in_range, total_cnt)
+        bg_fg_cnt = np.where(bg_left < lg_left,
+                             total_cnt - np.clip(bg_right - bg_left + 1, 0, total_cnt),
+                             np.clip(lg_right - lg_left + 1, 0, total_cnt))
+
+        # 前景灰度 先去掉分隔的颜色 剩下的按顺序重新编号
+        keep = valid & ~(self._gray_has_split & (gray >= self._gray_split_lower) & (gray <= self._gray_split_upper))
+        keep_idx = np.cumsum(keep, axis=1) - 1
+        keep_cnt = keep.sum(axis=1)
+        fg_left_col, fg_right_col = _first_last_idx(keep & in_range, keep_cnt)
+        has_fg = fg_right_col >= fg_left_col
+        row_idx = np.arange(len(keep))
+        fg_left = np.where(has_fg, keep_idx[row_idx, np.minimum(fg_left_col, keep.shape[1] - 1)], keep_cnt + 1)
+        fg_right = np.where(has_fg, keep_idx[row_idx, fg_right_col], 0)
+        fg_fg_cnt = np.clip(fg_right - fg_left + 1, 0, keep_cnt)
+
+        fg_cnt = np.where(self._gray_is_bg, bg_fg_cnt, fg_fg_cnt)
+        cnt = np.where(self._gray_is_bg, total_cnt, keep_cnt)
+        # 数量为0时 区域在画面外或全部是分隔色 无法识别
+        value = (fg_cnt * self._gray_max_length / np.maximum(cnt, 1)).astype(np.int64)
+        return np.where(cnt > 0, value, -1).tolist()
+
+    def _check_color_length(self, screen: MatLike) -> List[int]:
+        """
+        按前景色计算所有横条的长度
+        :param screen: 游戏画面
+        :return:
+        """
+        pixel = np.take(screen.reshape(-1, 3), self._length_idx, axis=0)
+        in_range = _in_range(pixel, self._length_lower, self._length_upper)
+        fg_cnt = np.bincount(self._length_pixel_item, weights=in_range, minlength=len(self._length_item_list))
+
+        # 宽度为0时 区域在画面外 无法识别
+        width = self._length_part_width
+        value = (fg_cnt * 100.0 / np.maximum(width, 1)).astype(np.int64)
+        return np.where(width > 0, value, -1).tolist()
+
+    def _check_blob(self, screen: MatLike) -> List[int]:
+        """
+        按颜色范围计算所有区域的连通块数量
+        :param screen: 游戏画面
+        :return:
+        """
+        stack = np.take(screen.reshape(-1, 3), self._blob_idx, axis=0)
+        in_range = np.where(self._blob_masked, self._blob_black_in_range, self._get_blob_in_range(stack))
+
+        # 膨胀后去掉溢出到区域外的部分 区域之间有空行 不会连在一起
+        mask = (in_range & self._blob_valid).astype(np.uint8) * 255
+        mask = cv2_utils.dilate(mask, 2)
+        mask[~self._blob_valid] = 0
+        num_labels, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+        # 按连通块最上方的行 找到所属的区域
+        label_item_idx = np.searchsorted(self._blob_row_start, stats[1:num_labels, cv2.CC_STAT_TOP], side='right') - 1
+        enough = stats[1:num_labels, cv2.CC_STAT_AREA] >= self._blob_connect_cnt[label_item_idx]
+        blob_cnt = np.bincount(label_item_idx[enough], minlength=len(self._blob_item_list))
+
+        return np.where(self._blob_is_cnt, blob_cnt, (blob_cnt > 0).astype(np.int64)).tolist()
+
+    def _get_blob_in_range(self, stack: np.ndarray) -> np.ndarray:
+        """
+        按每一行的颜色范围 判断像素是否在范围内
+        :param stack: 叠放后的图 或者可以广播的单个像素
+        :return:
+        """
+        lower, upper = self._blob_lower, self._blob_upper
+        in_range = _in_range(stack, lower, upper)
+        if self._blob_has_channel_max:
+            max_channel = np.maximum(np.maximum(stack[..., 0], stack[..., 1]), stack[..., 2])
+            channel_max_in_range = (max_channel >= lower[..., 0]) & (max_channel <= upper[..., 0])
+            in_range = np.where(self._blob_channel_max_row, channel_max_in_range, in_range)
+        return in_range
+
+
+def _in_range(pixel: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """
+    与 cv2.inRange 一致 但每个像素可以使用不同的颜色范围
+    逐个通道比较 比在通道维度上使用 np.all 快很多
+    :param pixel: 像素 最后一维是通道
+    :param lower: 下限 可以广播到像素
+    :param upper: 上限 可以广播到像素
+    :return:
+    """
+    result = (pixel[..., 0] >= lower[..., 0]) & (pixel[..., 0] <= upper[..., 0])
+    for c in range(1, pixel.shape[-1]):
+        result &= (pixel[..., c] >= lower[..., c]) & (pixel[..., c] <= upper[..., c])
+    return result
+
+
+def _get_flat_idx(rect: Rect, base_rect: Rect) -> np.ndarray:
+    """
+    区域内每个像素 在另一个区域中按行展开后的下标
+    :param rect: 区域
+    :param base_rect: 所在的区域
+    :return: 与区域大小一致的二维下标
+    """
+    ys, xs = np.mgrid[rect.y1:rect.y2, rect.x1:rect.x2]
+    return (ys - base_rect.y1) * base_rect.width + (xs - base_rect.x1)
+
+
+def _clip_rect(rect: Rect, width: int, height: int) -> Rect:
+    """
+    裁剪到画面范围内 与 cv2_utils.crop_image 一致
+    :param rect: 区域
+    :param width: 画面宽度
+    :param height: 画面高度
+    :return:
+    """
+    x1, y1 = max(0, rect.x1), max(0, rect.y1)
+    x2, y2 = min(width, rect.x2), min(height, rect.y2)
+    return Rect(x1, y1, max(x1, x2), max(y1, y2))
+
+
+def _get_union_rect(rect_list: List[Rect]) -> Optional[Rect]:
+    """
+    多个区域的并集
+    :param rect_list: 区域列表
+    :return:
+    """
+    if len(rect_list) == 0:
+        return None
+    return Rect(min(i.x1 for i in rect_list), min(i.y1 for i in rect_list),
+                max(i.x2 for i in rect_list), max(i.y2 for i in rect_list))
+
+
+def _is_mask_matched(item: _PlanItem) -> bool:
+    """
+    找连通块时需要使用掩码 掩码大小与区域不一致时无法叠放
+    :param item: 识别计划中的一个状态
+    :return:
+    """
+    if item.template.mask is None:
+        return True
+    return item.template.mask.shape[:2] == (item.rect.height, item.rect.width)
+
+
+def _first_last_idx(mask: np.ndarray, total_cnt: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每一行第一个和最后一个为True的下标
+    :param mask: 二维的掩码
+    :param total_cnt: 每一行的有效数量
+    :return: 第一个下标 没有时为 total_cnt+1; 最后一个下标 没有时为 0
+    """
+    has_any = mask.any(axis=1)
+    first = np.where(has_any, mask.argmax(axis=1), total_cnt + 1)
+    last = np.where(has_any, mask.shape[1] - 1 - mask[:, ::-1].argmax(axis=1), 0)
+    return first, last
@@ -2,9 +2,10 @@ import time
 
 import threading
 from enum import Enum
-from typing import Callable
+from typing import Callable, Optional
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
+from one_dragon.base.conditional_operation.op_timer_wheel import OpTimerWheel, OpTimerEvent
 from one_dragon.base.conditional_operation.operation_def import OperationDef
 from zzz_od.auto_battle.auto_battle_context import AutoBattleContext
 from zzz_od.auto_battle.auto_battle_state import BattleStateEnum
@@ -52,6 +53,8 @@ class AtomicBtnCommon(AtomicOp):
 
         self._status = BtnRunStatus.WAIT
         self._update_lock = threading.Lock()
+        self._run_id: int = 0  # 每次开始加1 停止后旧的回调发现不一致时不再继续
+        self._delay_event: Optional[OpTimerEvent] = None  # 正在等待的前后延迟
         self._method: Callable[[bool, float, bool], None] = None
         if op_name == BattleStateEnum.BTN_DODGE.value:
             self._method = self.ctx.dodge
@@ -106,10 +109,85 @@ class AtomicBtnCommon(AtomicOp):
         with self._update_lock:
             self._status = BtnRunStatus.WAIT
 
+    def start(self, timer: OpTimerWheel, on_done: Callable[[], None]) -> None:
+        """
+        前后延迟交给时间轮等待 只有按键本身在线程池中执行
+        """
+        with self._update_lock:
+            if self._status != BtnRunStatus.WAIT:
+                on_done()
+                return
+            self._status = BtnRunStatus.RUNNING
+            self._run_id += 1
+            run_id = self._run_id
+
+        self._run_repeat(timer, on_done, run_id, 0)
+
+    def _is_current_run(self, run_id: int) -> bool:
+        return self._status == BtnRunStatus.RUNNING and self._run_id == run_id
+
+    def _run_repeat(self, timer: OpTimerWheel, on_done: Callable[[], None], run_id: int, repeat_idx: int) -> None:
+        """
+        执行一次按键 等待前延迟 -> 按键 -> 等待后延迟 -> 下一次按键
+        :param timer: 时间轮
+        :param on_done: 全部完成后的回调
+        :param run_id: 本次执行的id
+        :param repeat_idx: 第几次按键
+        """
+        if not self._is_current_run(run_id) or repeat_idx >= self.repeat_times:
+            self._finish(on_done, run_id)
+            return
+
+        def after_press() -> None:
+            if not self._is_current_run(run_id):
+                self._finish(on_done, run_id)
+                return
+            self._delay(timer, self.post_delay,
+                        lambda: self._run_repeat(timer, on_done, run_id, repeat_idx + 1))
+
+        def press() -> None:
+            if not self._is_current_run(run_id):
+                self._finish(on_done, run_id)
+                return
+            AtomicOp.run_in_thread(
+                lambda: self._method(press=self.is_press, press_time=self.press_time, release=self.is_release),
+                after_press
+            )
+
+        self._delay(timer, self.pre_delay, press)
+
+    def _delay(self, timer: OpTimerWheel, delay: float, callback: Callable[[], None]) -> None:
+        """
+        延迟后执行
+        :param timer: 时间轮
+        :param delay: 延迟秒数
+        :param callback: 执行的方法
+        """
+        if delay > 0:
+            self._delay_event = timer.schedule(delay, callback)
+        else:
+            callback()
+
+    def _finish(self, on_done: Callable[[], None], run_id: int) -> None:
+        """
+        结束本次执行
+        :param on_done: 完成后的回调
+        :param run_id: 本次执行的id
+        """
+        with self._update_lock:
+            if self._run_id == run_id:
+                self._status = BtnRunStatus.WAIT
+        on_done()
+
     def stop(self) -> None:
         with self._update_lock:
             if self._status == BtnRunStatus.RUNNING:
-                self._status = BtnRunStatus.STOP
-        
+                # 直接取消正在等待的延迟 旧的回调因为 run_id 不一致不会继续
+                self._status = BtnRunStatus.WAIT
+                self._run_id += 1
+                if self._delay_event is not None:
+                    self._delay_event.cancel()
+                    self._delay_event = None
+
         if self.is_press:
             self._method(release=True)
@@ -1,8 +1,9 @@
 import time
 
-from typing import ClassVar
+from typing import ClassVar, Callable, Optional
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
+from one_dragon.base.conditional_operation.op_timer_wheel import OpTimerWheel, OpTimerEvent
 from one_dragon.base.conditional_operation.operation_def import OperationDef
 
 
@@ -17,6 +18,15 @@ class AtomicWait(AtomicOp):
                 wait_seconds = float(op_def.data[0])
         AtomicOp.__init__(self, op_name='%s %.2f' % (AtomicWait.OP_NAME, wait_seconds))
         self.wait_seconds: float = wait_seconds
+        self._wait_event: Optional[OpTimerEvent] = None
 
     def execute(self):
         time.sleep(self.wait_seconds)
+
+    def start(self, timer: OpTimerWheel, on_done: Callable[[], None]) -> None:
+        self._wait_event = timer.schedule(self.wait_seconds, on_done)
+
+    def stop(self) -> None:
+        event = self._wait_event
+        if event is not None:
+            event.cancel()
@@ -2,29 +2,19 @@ from concurrent.futures import ThreadPoolExecutor, Future
 
 import threading
 from cv2.typing import MatLike
-from typing import Optional, List, Union, Tuple, Callable
+from typing import Optional, List, Union, Tuple
 
 from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
 from one_dragon.base.conditional_operation.state_recorder import StateRecord, StateRecorder
 from one_dragon.base.screen.screen_area import ScreenArea
 from one_dragon.utils import cv2_utils, cal_utils
 from one_dragon.utils.log_utils import log
-from zzz_od.auto_battle.agent_state import agent_state_checker
+from zzz_od.auto_battle.agent_state.agent_state_plan import AgentStatePlan, CheckAgentState
 from zzz_od.auto_battle.auto_battle_state import BattleStateEnum
 from zzz_od.context.zzz_context import ZContext
-from zzz_od.game_data.agent import Agent, AgentEnum, AgentStateCheckWay, CommonAgentStateEnum, AgentStateDef
+from zzz_od.game_data.agent import Agent, AgentEnum, CommonAgentStateEnum
 
 _battle_agent_context_executor = ThreadPoolExecutor(thread_name_prefix='od_battle_agent_context', max_workers=16)
-_agent_state_check_method: dict[AgentStateCheckWay, Callable] = {
-    AgentStateCheckWay.COLOR_RANGE_CONNECT: agent_state_checker.check_cnt_by_color_range,
-    AgentStateCheckWay.COLOR_RANGE_EXIST: agent_state_checker.check_exist_by_color_range,
-    AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH: agent_state_checker.check_length_by_background_gray,
-    AgentStateCheckWay.FOREGROUND_GRAY_RANGE_LENGTH: agent_state_checker.check_length_by_foreground_gray,
-    AgentStateCheckWay.FOREGROUND_COLOR_RANGE_LENGTH: agent_state_checker.check_length_by_foreground_color,
-    AgentStateCheckWay.TEMPLATE_NOT_FOUND: agent_state_checker.check_template_not_found,
-    AgentStateCheckWay.TEMPLATE_FOUND: agent_state_checker.check_template_found,
-    AgentStateCheckWay.COLOR_CHANNEL_MAX_RANGE_EXIST: agent_state_checker.check_exist_by_color_channel_max_range,
-}
 
 
 class AgentInfo:
@@ -259,14 +249,6 @@ class TeamInfo:
 
 
 
-class CheckAgentState:
-
-    def __init__(self, state: AgentStateDef, total: Optional[int] = None, pos: Optional[int] = None):
-        self.state: AgentStateDef = state
-        self.total: int = total
-        self.pos: int = pos
-
-
 class AutoBattleAgentContext:
 
     def __init__(self, ctx: ZContext):
@@ -277,6 +259,9 @@ class AutoBattleAgentContext:
         # 识别锁 保证每种类型只有1实例在进行识别
         self._check_agent_lock = threading.Lock()
 
+        # 角色状态的识别计划 key为需要识别的状态列表
+        self._agent_state_plan_cache: dict[tuple, AgentStatePlan] = {}
+
     def init_battle_agent_context(
             self,
             auto_op: ConditionalOperator,
@@ -302,6 +287,9 @@ class AutoBattleAgentContext:
         # 上一次识别的时间
         self._last_check_agent_time: float = 0
 
+        # 需要识别的状态可能变化 重新生成识别计划
+        self._agent_state_plan_cache.clear()
+
         # 初始化需要检测的状态
         for agent_enum in AgentEnum:
             agent = agent_enum.value
@@ -353,31 +341,38 @@ class AutoBattleAgentContext:
                 return
             self._last_check_agent_time = screenshot_time
 
-            screen_agent_list = self._check_agent_in_parallel(screen)
-            energy_state_list, special_state_list, ultimate_state_list, other_state_list = self._check_all_agent_state(screen, screenshot_time, screen_agent_list)
-
-            update_state_record_list = []
-            # 尝试更新代理人列表 成功的话 更新状态记录
-            if self.team_info.update_agent_list(
-                    screen_agent_list,
-                    [(i.value if i is not None else 0) for i in energy_state_list],
-                    [(i.value if i is not None else 0) for i in special_state_list],
-                    [(i.value if i is not None else 0) for i in ultimate_state_list],
-                    screenshot_time):
-
-                for i in self._get_agent_state_records(screenshot_time):
-                    update_state_record_list.append(i)
-
-                # 只有代理人列表更新成功 本次识别的状态才可用
-                for i in other_state_list:
-                    update_state_record_list.append(i)
-
-            self.auto_op.batch_update_states(update_state_record_list)
+            self._check_agent_related(screen, screenshot_time)
         except Exception:
             log.error('识别画面角色失败', exc_info=True)
         finally:
             self._check_agent_lock.release()
 
+    def _check_agent_related(self, screen: MatLike, screenshot_time: float) -> None:
+        """
+        判断角色相关内容 并发送事件 不判断识别间隔
+        :return:
+        """
+        screen_agent_list = self._check_agent_in_parallel(screen)
+        energy_state_list, special_state_list, ultimate_state_list, other_state_list = self._check_all_agent_state(screen, screenshot_time, screen_agent_list)
+
+        update_state_record_list = []
+        # 尝试更新代理人列表 成功的话 更新状态记录
+        if self.team_info.update_agent_list(
+                screen_agent_list,
+                [(i.value if i is not None else 0) for i in energy_state_list],
+                [(i.value if i is not None else 0) for i in special_state_list],
+                [(i.value if i is not None else 0) for i in ultimate_state_list],
+                screenshot_time):
+
+            for i in self._get_agent_state_records(screenshot_time):
+                update_state_record_list.append(i)
+
+            # 只有代理人列表更新成功 本次识别的状态才可用
+            for i in other_state_list:
+                update_state_record_list.append(i)
+
+        self.auto_op.batch_update_states(update_state_record_list)
+
     def _check_agent_in_parallel(self, screen: MatLike) -> List[Agent]:
         """
         并发识别角色
@@ -439,53 +434,33 @@ class AutoBattleAgentContext:
         :return:
         """
         prefix = 'avatar_1_' if is_front else 'avatar_2_'
-        for agent in possible_agents:
-            mrl = self.ctx.tm.match_template(img, 'battle', prefix + agent.agent_id, threshold=0.8)
-            if mrl.max is not None:
-                return agent
+        agent_map: dict[str, Agent] = {prefix + agent.agent_id: agent for agent in possible_agents}
+        result_list = self.ctx.tm.match_template_bank(img, 'battle', list(agent_map.keys()), threshold=0.8)
+        if len(result_list) == 0:
+            return None
 
-        return None
+        return agent_map[result_list[0][0]]
 
-    def _check_agent_state_in_parallel(self, screen: MatLike, screenshot_time: float, agent_state_list: List[CheckAgentState]) -> List[StateRecord]:
+    def _check_agent_state_by_plan(self, screen: MatLike, screenshot_time: float, agent_state_list: List[CheckAgentState]) -> List[StateRecord]:
         """
-        并行识别多个角色状态
+        使用识别计划 一次识别多个角色状态
+        相同的状态列表 只在第一次使用时生成识别计划
         :param screen: 游戏画面
         :param screenshot_time: 截图时间
         :param agent_state_list: 需要识别的状态列表
         :return:
         """
-        future_list: List[Future] = []
-        for state in agent_state_list:
-            if not state.state.should_check_in_battle:
-                continue
-            future_list.append(_battle_agent_context_executor.submit(self._check_agent_state, screen, screenshot_time, state))
-
-        result_list: List[Optional[StateRecord]] = []
-        for future in future_list:
-            try:
-                record = future.result()
-                if record is not None:
-                    result_list.append(record)
-            except Exception:
-                log.error('识别角色状态失败', exc_info=True)
-
-        return result_list
-
-    def _check_agent_state(self, screen: MatLike, screenshot_time: float, to_check: CheckAgentState) -> Optional[StateRecord]:
-        """
-        识别一个角色状态
-        :param screen:
-        :param screenshot_time:
-        :param to_check: 需要识别的状态
-        :return:
-        """
-        value: int = -1
-        state = to_check.state
-        check_method = _agent_state_check_method[state.check_way]
-        value = check_method(ctx=self.ctx, screen=screen, state_def=state, total=to_check.total, pos=to_check.pos)
-
-        if value > -1 and value >= state.min_value_trigger_state:
-            return StateRecord(state.state_name, screenshot_time, value)
+        to_check_list = [i for i in agent_state_list if i.state.should_check_in_battle]
+        key = tuple((id(i.state), i.total, i.pos) for i in to_check_list)
+        plan = self._agent_state_plan_cache.get(key)
+        try:
+            if plan is None:
+                plan = AgentStatePlan(self.ctx, to_check_list)
+                self._agent_state_plan_cache[key] = plan
+            return plan.check(screen, screenshot_time)
+        except Exception:
+            log.error('识别角色状态失败', exc_info=True)
+            return []
 
     def _check_all_agent_state(self, screen: MatLike, screenshot_time: float,
                                screen_agent_list: List[Agent]
@@ -567,7 +542,7 @@ class AutoBattleAgentContext:
             state = CommonAgentStateEnum.LIFE_DEDUCTION_21.value
         to_check_list.append(CheckAgentState(state))
 
-        all_state_result_list = self._check_agent_state_in_parallel(screen, screenshot_time, to_check_list)
+        all_state_result_list = self._check_agent_state_by_plan(screen, screenshot_time, to_check_list)
         energy_len = len(energy_state_list)
         special_len = len(special_state_list)
         ultimate_len = len(ultimate_state_list)
@@ -1,17 +1,18 @@
 import time
-from concurrent.futures import ThreadPoolExecutor, Future
 
 import threading
+from enum import Enum
 from cv2.typing import MatLike
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Tuple
 
 from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
+from one_dragon.base.conditional_operation.perception_scheduler import PerceptionScheduler, PerceptionStage
 from one_dragon.base.conditional_operation.state_recorder import StateRecord
 from one_dragon.base.matcher.match_result import MatchResult
 from one_dragon.base.screen import screen_utils
 from one_dragon.base.screen.screen_area import ScreenArea
 from one_dragon.base.screen.screen_utils import FindAreaResultEnum
-from one_dragon.utils import cv2_utils, thread_utils, cal_utils, str_utils
+from one_dragon.utils import cv2_utils, cal_utils, str_utils
 from one_dragon.utils.log_utils import log
 from zzz_od.auto_battle.auto_battle_agent_context import AutoBattleAgentContext
 from zzz_od.auto_battle.auto_battle_custom_context import AutoBattleCustomContext
@@ -20,7 +21,16 @@ from zzz_od.auto_battle.auto_battle_state import BattleStateEnum
 from zzz_od.context.zzz_context import ZContext
 from zzz_od.game_data.agent import Agent
 
-_battle_state_check_executor = ThreadPoolExecutor(thread_name_prefix='od_battle_state_check', max_workers=16)
+
+class BattlePerceptionStageEnum(Enum):
+
+    DODGE_AUDIO: str = '闪避-声音'
+    DODGE_FLASH: str = '闪避-画面'
+    AGENT: str = '角色'
+    QUICK_ASSIST: str = '快速支援'
+    DISTANCE: str = '距离'
+    CHAIN: str = '连携技'
+    BATTLE_END: str = '战斗结束'
 
 
 class AutoBattleContext:
@@ -53,6 +63,11 @@ class AutoBattleContext:
         self._last_check_end_time: float = 0
         self._last_check_distance_time: float = 0
 
+        # 识别调度 各类识别使用固定的线程 每帧只需要把截图交过去
+        self.perception: PerceptionScheduler = PerceptionScheduler('自动战斗')
+        self._check_battle_end_flags: Tuple[bool, bool, bool] = (False, False, False)  # 普通战斗、空洞、防卫战 是否识别战斗结束
+        self._init_perception_stages()
+
         # 识别结果
         self.last_check_in_battle: bool = False  # 是否在战斗画面
         self.last_check_end_result: Optional[str] = None
@@ -374,6 +389,33 @@ class AutoBattleContext:
         self.with_distance_times: int = 0  # 有显示距离的次数
         self.last_check_distance = -1
 
+    def _init_perception_stages(self) -> None:
+        """
+        注册各类识别
+        budget 为预计耗时 max_frame_age 为截图最多允许过时多少秒 过时的截图识别出来也没有意义
+        """
+        # 识别方法和间隔都在使用时再获取 子类替换角色、闪避上下文后也能生效
+        for stage in [
+            PerceptionStage(BattlePerceptionStageEnum.DODGE_AUDIO.value,
+                            lambda screen, t: self.dodge_context.check_dodge_audio_and_update(screen, t),
+                            period=lambda: self.dodge_context._check_audio_interval, budget=0.01, max_frame_age=0.1),
+            PerceptionStage(BattlePerceptionStageEnum.DODGE_FLASH.value,
+                            lambda screen, t: self.dodge_context._check_dodge_flash(screen, t),
+                            period=lambda: self.dodge_context._check_dodge_interval, budget=0.02, max_frame_age=0.1),
+            PerceptionStage(BattlePerceptionStageEnum.AGENT.value,
+                            lambda screen, t: self.agent_context._check_agent_related(screen, t),
+                            period=lambda: self.agent_context._check_agent_interval, budget=0.05, max_frame_age=0.3),
+            PerceptionStage(BattlePerceptionStageEnum.QUICK_ASSIST.value, self._check_quick_assist,
+                            period=lambda: self._check_quick_interval, budget=0.02, max_frame_age=0.3),
+            PerceptionStage(BattlePerceptionStageEnum.DISTANCE.value, self.check_battle_distance,
+                            period=lambda: self._check_distance_interval, budget=0.1, max_frame_age=1),
+            PerceptionStage(BattlePerceptionStageEnum.CHAIN.value, self._check_chain_attack_in_parallel,
+                            period=lambda: self._check_chain_interval, budget=0.02, max_frame_age=0.3),
+            PerceptionStage(BattlePerceptionStageEnum.BATTLE_END.value, self._check_battle_end_by_flags,
+                            period=lambda: self._check_end_interval, budget=0.2, max_frame_age=1),
+        ]:
+            self.perception.register_stage(stage)
+
     def check_battle_state(
             self, screen: MatLike, screenshot_time: float,
             check_battle_end_normal_result: bool = False,
@@ -389,32 +431,23 @@ class AutoBattleContext:
         in_battle = self.is_normal_attack_btn_available(screen)
         self.last_check_in_battle = in_battle
 
-        future_list: List[Future] = []
-
+        stage_names: List[str] = []
         if in_battle:
-            audio_future = _battle_state_check_executor.submit(self.dodge_context.check_dodge_audio, screenshot_time)
-            future_list.append(audio_future)
-            future_list.append(_battle_state_check_executor.submit(self.dodge_context.check_dodge_flash, screen, screenshot_time, audio_future))
-
-            agent_future = _battle_state_check_executor.submit(self.agent_context.check_agent_related, screen, screenshot_time)
-            future_list.append(agent_future)
-            future_list.append(_battle_state_check_executor.submit(self.check_quick_assist, screen, screenshot_time))
+            stage_names.append(BattlePerceptionStageEnum.DODGE_AUDIO.value)
+            stage_names.append(BattlePerceptionStageEnum.DODGE_FLASH.value)
+            stage_names.append(BattlePerceptionStageEnum.AGENT.value)
+            stage_names.append(BattlePerceptionStageEnum.QUICK_ASSIST.value)
             if check_distance:
-                future_list.append(_battle_state_check_executor.submit(self._check_distance_with_lock, screen, screenshot_time))
+                stage_names.append(BattlePerceptionStageEnum.DISTANCE.value)
         else:
-            future_list.append(_battle_state_check_executor.submit(self.check_chain_attack, screen, screenshot_time))
+            stage_names.append(BattlePerceptionStageEnum.CHAIN.value)
             check_battle_end = check_battle_end_normal_result or check_battle_end_hollow_result or check_battle_end_defense_result
             if check_battle_end:
-                future_list.append(_battle_state_check_executor.submit(
-                    self._check_battle_end, screen, screenshot_time,
-                    check_battle_end_normal_result, check_battle_end_hollow_result, check_battle_end_defense_result
-                ))
-        for future in future_list:
-            future.add_done_callback(thread_utils.handle_future_result)
+                self._check_battle_end_flags = (check_battle_end_normal_result, check_battle_end_hollow_result,
+                                                check_battle_end_defense_result)
+                stage_names.append(BattlePerceptionStageEnum.BATTLE_END.value)
 
-        if sync:
-            for future in future_list:
-                future.result()
+        self.perception.submit_frame(screen, screenshot_time, stage_names, sync=sync)
 
         return in_battle
 
@@ -439,23 +472,18 @@ class AutoBattleContext:
 
     def _check_chain_attack_in_parallel(self, screen: MatLike, screenshot_time: float):
         """
-        并行识别连携技角色
+        识别连携技角色
         """
         c1 = cv2_utils.crop_image_only(screen, self.area_chain_1.rect)
         c2 = cv2_utils.crop_image_only(screen, self.area_chain_2.rect)
 
         possible_agents = self.agent_context.get_possible_agent_list()
 
+        # 使用模板组匹配 两个头像各只需要1~2ms 不需要再分线程
         result_agent_list: List[Optional[Agent]] = []
-        future_list: List[Future] = []
-        future_list.append(_battle_state_check_executor.submit(self._match_chain_agent_in, c1, possible_agents))
-        future_list.append(_battle_state_check_executor.submit(self._match_chain_agent_in, c2, possible_agents))
-
-        for future in future_list:
+        for img in [c1, c2]:
             try:
-                future.add_done_callback(thread_utils.handle_future_result)
-                result = future.result()
-                result_agent_list.append(result)
+                result_agent_list.append(self._match_chain_agent_in(img, possible_agents))
             except Exception:
                 log.error('识别连携技角色头像失败', exc_info=True)
                 result_agent_list.append(None)
@@ -482,12 +510,12 @@ class AutoBattleContext:
         在候选列表重匹配角色
         :return:
         """
-        for agent in possible_agents:
-            mrl = self.ctx.tm.match_template(img, 'battle', 'avatar_chain_' + agent.agent_id, threshold=0.8)
-            if mrl.max is not None:
-                return agent
+        agent_map: dict[str, Agent] = {'avatar_chain_' + agent.agent_id: agent for agent in possible_agents}
+        result_list = self.ctx.tm.match_template_bank(img, 'battle', list(agent_map.keys()), threshold=0.8)
+        if len(result_list) == 0:
+            return None
 
-        return None
+        return agent_map[result_list[0][0]]
 
     def check_quick_assist(self, screen: MatLike, screenshot_time: float) -> None:
         """
@@ -502,35 +530,41 @@ class AutoBattleContext:
                 return
             self._last_check_quick_time = screenshot_time
 
-            part = cv2_utils.crop_image_only(screen, self.area_btn_switch.rect)
-
-            possible_agents = self.agent_context.get_possible_agent_list()
-
-            agent = self._match_quick_assist_agent_in(part, possible_agents)
-
-            if agent is not None:
-                state_records: List[StateRecord] = [
-                    StateRecord(f'快速支援-{agent.agent_name}', screenshot_time),
-                    StateRecord(f'快速支援-{agent.agent_type.value}', screenshot_time),
-                    StateRecord(BattleStateEnum.STATUS_QUICK_ASSIST_READY.value, screenshot_time),
-                ]
-                self.auto_op.batch_update_states(state_records)
+            self._check_quick_assist(screen, screenshot_time)
         except Exception:
             log.error('识别快速支援失败', exc_info=True)
         finally:
             self._check_quick_lock.release()
 
+    def _check_quick_assist(self, screen: MatLike, screenshot_time: float) -> None:
+        """
+        识别快速支援 不判断识别间隔
+        """
+        part = cv2_utils.crop_image_only(screen, self.area_btn_switch.rect)
+
+        possible_agents = self.agent_context.get_possible_agent_list()
+
+        agent = self._match_quick_assist_agent_in(part, possible_agents)
+
+        if agent is not None:
+            state_records: List[StateRecord] = [
+                StateRecord(f'快速支援-{agent.agent_name}', screenshot_time),
+                StateRecord(f'快速支援-{agent.agent_type.value}', screenshot_time),
+                StateRecord(BattleStateEnum.STATUS_QUICK_ASSIST_READY.value, screenshot_time),
+            ]
+            self.auto_op.batch_update_states(state_records)
+
     def _match_quick_assist_agent_in(self, img: MatLike, possible_agents: Optional[List[Agent]] = None) -> Optional[Agent]:
         """
         在候选列表重匹配角色
         :return:
         """
-        for agent in possible_agents:
-            mrl = self.ctx.tm.match_template(img, 'battle', 'avatar_quick_' + agent.agent_id, threshold=0.9)
-            if mrl.max is not None:
-                return agent
+        agent_map: dict[str, Agent] = {'avatar_quick_' + agent.agent_id: agent for agent in possible_agents}
+        result_list = self.ctx.tm.match_template_bank(img, 'battle', list(agent_map.keys()), threshold=0.9)
+        if len(result_list) == 0:
+            return None
 
-        return None
+        return agent_map[result_list[0][0]]
 
     def _check_battle_end(self, screen: MatLike, screenshot_time: float,
                           check_battle_end_normal_result: bool,
@@ -545,62 +579,79 @@ class AutoBattleContext:
                 return
             self._last_check_end_time = screenshot_time
 
-            if check_battle_end_hollow_result:
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-战斗', area_name='挑战结果')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '零号空洞-挑战结果'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-事件', area_name='背包')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '零号空洞-背包'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-战斗', area_name='鸣徽-确定')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '鸣徽-确定'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-战斗', area_name='结算周期上限-确认')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '零号空洞-结算周期上限'
-                    return
-
-            if check_battle_end_defense_result:
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='式舆防卫战', area_name='战斗结束-退出')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '战斗结束-退出'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='式舆防卫战', area_name='战斗结束-撤退')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '战斗结束-撤退'
-                    return
-
-            if check_battle_end_normal_result:
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='战斗画面', area_name='战斗结果-完成')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '普通战斗-完成'
-                    return
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='战斗画面', area_name='战斗结果-撤退')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '普通战斗-撤退'
-                    return
-
-            self.last_check_end_result = None
+            self._do_check_battle_end(screen, check_battle_end_normal_result, check_battle_end_hollow_result,
+                                      check_battle_end_defense_result)
         except Exception:
             log.error('识别战斗结束失败', exc_info=True)
         finally:
             self._check_end_lock.release()
 
+    def _check_battle_end_by_flags(self, screen: MatLike, screenshot_time: float) -> None:
+        """
+        按最近一次 check_battle_state 传入的类型 识别战斗结束 用于识别调度
+        """
+        normal, hollow, defense = self._check_battle_end_flags
+        self._do_check_battle_end(screen, normal, hollow, defense)
+
+    def _do_check_battle_end(self, screen: MatLike,
+                             check_battle_end_normal_result: bool,
+                             check_battle_end_hollow_result: bool,
+                             check_battle_end_defense_result: bool) -> None:
+        """
+        识别战斗结束 不判断识别间隔
+        """
+        if check_battle_end_hollow_result:
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='零号空洞-战斗', area_name='挑战结果')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '零号空洞-挑战结果'
+                return
+
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='零号空洞-事件', area_name='背包')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '零号空洞-背包'
+                return
+
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='零号空洞-战斗', area_name='鸣徽-确定')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '鸣徽-确定'
+                return
+
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='零号空洞-战斗', area_name='结算周期上限-确认')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '零号空洞-结算周期上限'
+                return
+
+        if check_battle_end_defense_result:
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='式舆防卫战', area_name='战斗结束-退出')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '战斗结束-退出'
+                return
+
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='式舆防卫战', area_name='战斗结束-撤退')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '战斗结束-撤退'
+                return
+
+        if check_battle_end_normal_result:
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='战斗画面', area_name='战斗结果-完成')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '普通战斗-完成'
+                return
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='战斗画面', area_name='战斗结果-撤退')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '普通战斗-撤退'
+                return
+
+        self.last_check_end_result = None
+
     def _check_distance_with_lock(self, screen: MatLike, screenshot_time: float) -> None:
         if not self._check_distance_lock.acquire(blocking=False):
             return
@@ -685,6 +736,7 @@ class AutoBattleContext:
         :return:
         """
         self.dodge_context.start_context()
+        self.perception.start()
 
     def stop_context(self) -> None:
         """
@@ -692,6 +744,7 @@ class AutoBattleContext:
         :return:
         """
         self.dodge_context.stop_context()
+        self.perception.stop()
 
         log.info('松开所有按键')
         self.dodge(release=True)
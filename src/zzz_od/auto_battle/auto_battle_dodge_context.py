@@ -6,8 +6,7 @@ import os
 import threading
 from cv2.typing import MatLike
 from enum import Enum
-from scipy.signal import correlate, butter, filtfilt
-from sklearn.preprocessing import scale
+from scipy.signal import butter, sosfilt
 from typing import Optional, List, Union
 
 from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
@@ -15,6 +14,7 @@ from one_dragon.base.conditional_operation.state_recorder import StateRecord
 from one_dragon.utils import cal_utils, yolo_config_utils
 from one_dragon.utils import thread_utils, os_utils
 from one_dragon.utils.log_utils import log
+from zzz_od.auto_battle.dodge_audio_matcher import AudioRingBuffer, DodgeAudioMatcher
 from zzz_od.context.zzz_context import ZContext
 from zzz_od.yolo.flash_classifier import FlashClassifier
 
@@ -41,11 +41,14 @@ class AudioRecorder:
         self._filter_degree = 4  # 四阶bathworth多项式, 越大阻带区域滤波程度越大
         self._cut_off = 1000  # Hz,截止频率,对该频率一下的声音进行滤波,若需要识别人声可适当降低
 
-        self.filter_b, self.filter_a = butter(self._filter_degree, self._cut_off, btype='highpass', output='ba',
-                                              fs=self._sample_rate)  # Butterworth高通滤波
+        filter_sos = butter(self._filter_degree, self._cut_off, btype='highpass', output='sos',
+                            fs=self._sample_rate)  # Butterworth高通滤波
+        # 录音时只能因果滤波 滤波两次 幅频响应与原来的 filtfilt 一致 模板使用同样的滤波后 互相关的结果也一致
+        self.filter_sos = np.vstack([filter_sos, filter_sos])
+        self._filter_state = np.zeros((self.filter_sos.shape[0], 2))
 
-        self.latest_audio = np.empty(shape=(0,), dtype=np.float64)  # 存储最新的音频数据
-        self._update_audio_lock = threading.Lock()
+        self.window_size: int = int(self._sample_rate // 2)  # 识别时使用最近0.5秒的音频
+        self.ring_buffer: AudioRingBuffer = AudioRingBuffer(self._sample_rate * 2)  # 滤波后的音频
 
     def start_running_async(self) -> None:
         """
@@ -57,7 +60,7 @@ class AudioRecorder:
 
             self.running = True
 
-        self.latest_audio = np.zeros(int(self._sample_rate // 2))  # 初始化音频数据缓冲区，长度为0.5秒
+        self._filter_state = np.zeros((self.filter_sos.shape[0], 2))
         future = _dodge_check_executor.submit(self._record_loop)
         future.add_done_callback(thread_utils.handle_future_result)
 
@@ -82,10 +85,9 @@ class AudioRecorder:
                 else:
                     stream_data = stream_data.T
 
-                with self._update_audio_lock:
-                    # 更新 latest_audio
-                    self.latest_audio[:-len(stream_data)] = self.latest_audio[len(stream_data):]
-                    self.latest_audio[-len(stream_data):] = stream_data
+                # 每块只滤波一次 写入后识别方只需要处理新的部分
+                filtered, self._filter_state = sosfilt(self.filter_sos, stream_data, zi=self._filter_state)
+                self.ring_buffer.write(filtered)
 
     def stop_running(self) -> None:
         """
@@ -93,12 +95,13 @@ class AudioRecorder:
         """
         self.running = False
 
-    def clear_audio(self) -> None:
+    def filter_wave(self, x: np.ndarray) -> np.ndarray:
         """
-        清楚当前录音
+        使用与录音相同的方式滤波
+        :param x: 音频信号
+        :return: 滤波后波形
         """
-        with self._update_audio_lock:
-            self.latest_audio = np.zeros(int(self._sample_rate // 2))
+        return sosfilt(self.filter_sos, x)
 
 
 class YoloStateEventEnum(Enum):
@@ -122,10 +125,12 @@ class AutoBattleDodgeContext:
         self._flash_model: Optional[FlashClassifier] = None  # 闪避分类器
         self._audio_recorder: AudioRecorder = AudioRecorder()  # 音频录制器
         self._audio_template: Optional[np.ndarray] = None  # 音频模板
+        self._audio_matcher: Optional[DodgeAudioMatcher] = None  # 音频模板匹配
 
         # 识别锁，保证每种类型只有一个实例在进行识别
         self._check_dodge_flash_lock = threading.Lock()
         self._check_audio_lock = threading.Lock()
+        self._dodge_event_lock = threading.Lock()  # 画面闪光和音频分开识别时 保证两者判断是否触发闪避时不会交错
 
         # 识别间隔
         self._check_dodge_interval: Union[float, List[float]] = 0
@@ -138,6 +143,7 @@ class AutoBattleDodgeContext:
         # 音频事件去重时间间隔
         self._audio_event_interval: float = 0.1
         self._last_audio_event_time: float = 0
+        self._last_flash_event_time: float = 0  # 上一次画面识别到闪光的时间
 
     def init_battle_dodge_context(
             self,
@@ -172,6 +178,7 @@ class AutoBattleDodgeContext:
         # 上一次识别的时间
         self._last_check_dodge_time = 0
         self._last_check_audio_time = 0
+        self._last_flash_event_time = 0
 
         # 异步加载音频模板
         _dodge_check_executor.submit(self.init_audio_template)
@@ -188,7 +195,9 @@ class AutoBattleDodgeContext:
             'template_1.wav'
         ), sr=32000)
 
-        self._audio_template = self._get_filter_wave(self._audio_template)  # 滤波
+        self._audio_template = self._audio_recorder.filter_wave(self._audio_template)  # 滤波
+        self._audio_matcher = DodgeAudioMatcher(self._audio_template, self._audio_recorder.window_size)
+        self._audio_matcher.reset(self._audio_recorder.ring_buffer.write_pos)
 
         log.info('加载声音模板完成')
 
@@ -210,27 +219,40 @@ class AutoBattleDodgeContext:
 
             self._last_check_dodge_time = screenshot_time
 
-            result = self._flash_model.run(screen)
-            state_name: Optional[str] = None
-            if result.class_idx == 1:
-                state_name = YoloStateEventEnum.DODGE_RED.value
-            elif result.class_idx == 2:
-                state_name = YoloStateEventEnum.DODGE_YELLOW.value
-            elif audio_future is not None:
-                audio_result = audio_future.result()
-                if audio_result:
-                    state_name = YoloStateEventEnum.DODGE_AUDIO.value
-
-            should_dodge = state_name is not None
-            if should_dodge:
-                self.auto_op.update_state(StateRecord(state_name, screenshot_time))
-
-            return should_dodge
+            return self._check_dodge_flash(screen, screenshot_time, audio_future)
         except Exception:
             log.error('识别画面闪光失败', exc_info=True)
         finally:
             self._check_dodge_flash_lock.release()
 
+    def _check_dodge_flash(self, screen: MatLike, screenshot_time: float, audio_future: Optional[Future[bool]] = None) -> bool:
+        """
+        识别画面是否有闪光 不判断识别间隔
+        :param screen: 屏幕截图
+        :param screenshot_time: 截图时间
+        :param audio_future: 音频识别结果的Future对象
+        :return: 是否应该闪避 （识别到闪光或者声音）
+        """
+        result = self._flash_model.run(screen)
+        state_name: Optional[str] = None
+        if result.class_idx == 1:
+            state_name = YoloStateEventEnum.DODGE_RED.value
+        elif result.class_idx == 2:
+            state_name = YoloStateEventEnum.DODGE_YELLOW.value
+        elif audio_future is not None:
+            audio_result = audio_future.result()
+            if audio_result:
+                state_name = YoloStateEventEnum.DODGE_AUDIO.value
+
+        should_dodge = state_name is not None
+        if should_dodge:
+            with self._dodge_event_lock:
+                if state_name != YoloStateEventEnum.DODGE_AUDIO.value:
+                    self._last_flash_event_time = max(self._last_flash_event_time, screenshot_time)
+                self.auto_op.update_state(StateRecord(state_name, screenshot_time))
+
+        return should_dodge
+
     def check_dodge_audio(self, screenshot_time: float) -> bool:
         """
         识别音频是否有闪避提示。
@@ -248,57 +270,52 @@ class AutoBattleDodgeContext:
                 return False
             self._last_check_audio_time = screenshot_time
 
-            if self._audio_recorder.latest_audio.size == 0:
-                return False
-
-            corr = self.get_max_corr(self._audio_template, self._audio_recorder.latest_audio)
-            # log.debug('声音相似度 %.2f' % corr)
-
-            # 事件去重逻辑
-            if corr > self._audio_recorder.trigger_threshold:
-                self._last_audio_event_time = screenshot_time
-                self._audio_recorder.clear_audio()
-                return True
-
-            return False
+            return self._check_dodge_audio(screenshot_time)
         except Exception:
             log.error('识别画面闪光失败', exc_info=True)
         finally:
             self._check_audio_lock.release()
 
-    def get_max_corr(self, x: np.ndarray, y: np.ndarray):
+    def _check_dodge_audio(self, screenshot_time: float) -> bool:
         """
-        计算两个音频信号的最大相关性。
-        :param x: 音频信号x
-        :param y: 音频信号y
-        :return: 最大相关性系数
+        识别音频是否有闪避提示 不判断识别间隔
+        :param screenshot_time: 截图时间
+        :return: 是否识别到音频提示
         """
-        y = self._get_filter_wave(y)  # 滤波
-
-        # 标准化
-        wx = scale(x, with_mean=False)
-        wy = scale(y, with_mean=False)
+        matcher = self._audio_matcher
+        if matcher is None:
+            return False
 
-        # 计算NCC
-        if wx.shape[0] > wy.shape[0]:
-            correlation = correlate(wx, wy, mode='same', method='fft') / wx.shape[0]
-        else:
-            correlation = correlate(wy, wx, mode='same', method='fft') / wy.shape[0]
+        ring_buffer = self._audio_recorder.ring_buffer
+        matcher.update(ring_buffer)  # 只处理上次识别后的新音频
+        corr = matcher.get_max_corr()
+        # log.debug('声音相似度 %.2f' % corr)
 
-        max_corr = np.max(correlation)
+        # 事件去重逻辑
+        if corr > self._audio_recorder.trigger_threshold:
+            self._last_audio_event_time = screenshot_time
+            matcher.reset(ring_buffer.write_pos)  # 清除当前录音
+            return True
 
-        return max_corr
+        return False
 
-    def _get_filter_wave(self, x: np.ndarray):
+    def check_dodge_audio_and_update(self, screen: MatLike, screenshot_time: float) -> bool:
         """
-        音频滤波。
-        :param x: 音频信号x
-        :return: 滤波后波形
+        识别音频 识别到时直接更新闪避状态 用于与画面闪光分开调度的情况
+        画面刚识别到闪光时 不再重复触发
+        :param screen: 屏幕截图 不使用 只是为了与其它识别方法的入参一致
+        :param screenshot_time: 截图时间
+        :return: 是否识别到音频提示
         """
-        wx = filtfilt(self._audio_recorder.filter_b,
-                      self._audio_recorder.filter_a,
-                      x)
-        return wx
+        if not self._check_dodge_audio(screenshot_time):
+            return False
+        # 判断和更新状态在同一个锁内 画面闪光的识别不会在两者之间插入
+        # 两个阶段识别的截图先后不定 前后间隔内有闪光的都不再触发
+        with self._dodge_event_lock:
+            if abs(screenshot_time - self._last_flash_event_time) < self._audio_event_interval:
+                return False
+            self.auto_op.update_state(StateRecord(YoloStateEventEnum.DODGE_AUDIO.value, screenshot_time))
+        return True
 
     def start_context(self) -> None:
         """
@@ -2,6 +2,7 @@ import time
 from concurrent.futures import ThreadPoolExecutor
 
 import os
+from functools import lru_cache
 from typing import List, Optional, Tuple
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
@@ -133,6 +134,10 @@ class AutoBattleOperator(ConditionalOperator):
         for i in range(1, 3):
             self._mutex_list[f'连携技-{i}-邦布'] = [f'连携技-{i}-{agent_enum.value.agent_name}' for agent_enum in AgentEnum]
 
+        # 预先加入状态表 运行期间不需要扩容
+        for state_name in AutoBattleOperator.get_all_state_event_ids():
+            self.state_recorder_table.add_state(state_name, self._mutex_list.get(state_name, None))
+
         ConditionalOperator.init(
             self,
             op_getter=self.get_atomic_op,
@@ -196,6 +201,15 @@ class AutoBattleOperator(ConditionalOperator):
 
         return event_ids
 
+    @staticmethod
+    @lru_cache
+    def get_all_state_event_id_set() -> frozenset[str]:
+        """
+        目前可用的状态事件ID 用于快速判断
+        :return:
+        """
+        return frozenset(AutoBattleOperator.get_all_state_event_ids())
+
     def get_state_recorder(self, state_name: str) -> Optional[StateRecorder]:
         """
         获取状态记录器
@@ -206,7 +220,8 @@ class AutoBattleOperator(ConditionalOperator):
             if state_name in self.state_recorders:
                 return self.state_recorders[state_name]
             else:
-                r = StateRecorder(state_name, mutex_list=self._mutex_list.get(state_name, None))
+                r = StateRecorder(state_name, mutex_list=self._mutex_list.get(state_name, None),
+                                  table=self.state_recorder_table)
                 self.state_recorders[state_name] = r
                 return r
         else:
@@ -219,7 +234,7 @@ class AutoBattleOperator(ConditionalOperator):
         :param state_name:
         :return:
         """
-        if state_name in AutoBattleOperator.get_all_state_event_ids():
+        if state_name in AutoBattleOperator.get_all_state_event_id_set():
             return True
         elif state_name.startswith('自定义-'):
             return True
@@ -345,6 +360,7 @@ class AutoBattleOperator(ConditionalOperator):
         for sr in self.state_recorders.values():
             sr.dispose()
         self.state_recorders.clear()
+        self.state_recorder_table.reset()
 
     def stop_running(self) -> None:
         """
@@ -0,0 +1,268 @@
+import argparse
+import json
+import time
+
+import numpy as np
+from cv2.typing import MatLike
+from typing import Callable, List, Optional
+
+from one_dragon.base.conditional_operation.state_record_collector import StateRecordCollector, load_state_records, \
+    diff_state_records
+from one_dragon.base.controller.replay_controller import ReplayFrameSource
+from one_dragon.utils.log_utils import log
+from zzz_od.auto_battle.auto_battle_context import AutoBattleContext
+from zzz_od.context.zzz_context import ZContext
+from zzz_od.controller.zzz_replay_controller import ZReplayController
+
+
+class DetectorLatency:
+
+    def __init__(self, name: str):
+        """
+        一个识别方法的耗时记录
+        :param name: 识别方法名称
+        """
+        self.name: str = name
+        self.seconds_list: List[float] = []
+
+    def wrap(self, func: Callable[[MatLike, float], None]) -> Callable[[MatLike, float], None]:
+        """
+        包装识别方法 每次调用都记录耗时
+        :param func: 识别方法
+        :return:
+        """
+        def timed_func(screen: MatLike, screenshot_time: float):
+            start_time = time.perf_counter()
+            try:
+                return func(screen, screenshot_time)
+            finally:
+                self.seconds_list.append(time.perf_counter() - start_time)
+
+        return timed_func
+
+    def to_dict(self) -> dict:
+        """
+        :return: 调用次数 平均值 分位数 最大值 单位毫秒
+        """
+        if len(self.seconds_list) == 0:
+            return {'name': self.name, 'cnt': 0}
+        ms = np.array(self.seconds_list) * 1000
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+        return {
+            'name': self.name,
+            'cnt': len(ms),
+            'mean_ms': float(np.mean(ms)),
+            'p50_ms': float(p50),
+            'p90_ms': float(p90),
+            'p99_ms': float(p99),
+            'max_ms': float(np.max(ms)),
+        }
+
+
+class AutoBattleReplay:
+
+    DETECTOR_BATTLE_STATE: str = 'battle_state'
+    DETECTOR_AGENT: str = 'agent'
+    DETECTOR_DODGE_FLASH: str = 'dodge_flash'
+    ALL_DETECTORS: List[str] = [DETECTOR_BATTLE_STATE, DETECTOR_AGENT, DETECTOR_DODGE_FLASH]
+    # battle_state 的识别阶段中已经包含的单独识别方法 同时选择时只保留 battle_state 避免重复识别和重复产生状态
+    BATTLE_STATE_INCLUDED_DETECTORS: List[str] = [DETECTOR_AGENT, DETECTOR_DODGE_FLASH]
+
+    def __init__(self, ctx: ZContext, frame_source: ReplayFrameSource,
+                 detector_list: Optional[List[str]] = None,
+                 use_gpu: bool = False,
+                 check_battle_end: bool = False,
+                 agent_names: Optional[List[str]] = None):
+        """
+        使用录制好的截图回放自动战斗的识别 不需要游戏
+        每张截图在当前线程依次执行各个识别方法 记录耗时和产生的状态
+        :param ctx: 上下文 控制器会被替换为回放控制器
+        :param frame_source: 截图序列
+        :param detector_list: 需要测量的识别方法 为空时只测量 battle_state 包含 battle_state 时 其中已有的识别方法不再单独测量 耗时见各识别阶段
+        :param use_gpu: 闪光识别是否使用GPU
+        :param check_battle_end: battle_state 中是否识别战斗结束 需要OCR
+        :param agent_names: 配队 为空时自动识别
+        """
+        self.ctx: ZContext = ctx
+        self.controller: ZReplayController = ZReplayController(frame_source)
+        self.ctx.controller = self.controller
+        if detector_list is None:
+            detector_list = [AutoBattleReplay.DETECTOR_BATTLE_STATE]
+        if AutoBattleReplay.DETECTOR_BATTLE_STATE in detector_list:
+            included_list = [i for i in detector_list if i in AutoBattleReplay.BATTLE_STATE_INCLUDED_DETECTORS]
+            if len(included_list) > 0:
+                log.info('%s 已包含 %s 不再单独测量 耗时见各识别阶段',
+                         AutoBattleReplay.DETECTOR_BATTLE_STATE, ','.join(included_list))
+                detector_list = [i for i in detector_list if i not in included_list]
+        self.detector_list: List[str] = detector_list
+        self.check_battle_end: bool = check_battle_end
+
+        self.collector: StateRecordCollector = StateRecordCollector()
+        self.battle: AutoBattleContext = AutoBattleContext(ctx)
+        # 间隔都设置为0 每张截图都识别
+        self.battle.init_battle_context(
+            auto_op=self.collector,
+            use_gpu=use_gpu,
+            check_dodge_interval=0,
+            agent_names=agent_names,
+            check_agent_interval=0,
+            check_chain_interval=0,
+            check_quick_interval=0,
+            check_end_interval=0,
+        )
+        self.battle.dodge_context._check_audio_interval = 0
+        # 截图时间是录制时的时间 不能和当前时间比较判断是否过时
+        self.battle.perception.set_check_frame_age(False)
+
+        self.latency_map: dict[str, DetectorLatency] = {}
+        self._detector_func_map: dict[str, Callable[[MatLike, float], None]] = {
+            AutoBattleReplay.DETECTOR_BATTLE_STATE: self._check_battle_state,
+            AutoBattleReplay.DETECTOR_AGENT: self.battle.agent_context.check_agent_related,
+            AutoBattleReplay.DETECTOR_DODGE_FLASH: self.battle.dodge_context.check_dodge_flash,
+        }
+        for name in self.detector_list:
+            self.latency_map[name] = DetectorLatency(name)
+        # battle_state 中的各个识别阶段 单独记录耗时
+        if AutoBattleReplay.DETECTOR_BATTLE_STATE in self.detector_list:
+            for stage in self.battle.perception.stage_map.values():
+                latency = DetectorLatency(f'{AutoBattleReplay.DETECTOR_BATTLE_STATE}.{stage.name}')
+                self.latency_map[latency.name] = latency
+                stage.check_func = latency.wrap(stage.check_func)
+
+        self.frame_cnt: int = 0
+        self.total_seconds: float = 0
+
+    def _check_battle_state(self, screen: MatLike, screenshot_time: float) -> None:
+        self.battle.check_battle_state(screen, screenshot_time,
+                                       check_battle_end_normal_result=self.check_battle_end,
+                                       sync=True)
+
+    def run(self, max_frame_cnt: Optional[int] = None, warmup_frame_cnt: int = 0) -> None:
+        """
+        回放所有截图
+        :param max_frame_cnt: 最多回放多少张 为空时回放全部
+        :param warmup_frame_cnt: 前多少张截图只用于预热 不计入耗时和状态
+        """
+        func_list = [self.latency_map[name].wrap(self._detector_func_map[name]) for name in self.detector_list]
+        start_time = time.perf_counter()
+        idx = 0
+        while max_frame_cnt is None or idx < max_frame_cnt + warmup_frame_cnt:
+            frame = self.controller.read_next_frame()
+            if frame is None:
+                break
+
+            for func in func_list:
+                func(frame.image, frame.create_time)
+
+            idx += 1
+            if idx == warmup_frame_cnt:
+                # 预热结束 清空之前的记录
+                for latency in self.latency_map.values():
+                    latency.seconds_list.clear()
+                self.collector.clear()
+                start_time = time.perf_counter()
+
+        self.frame_cnt = idx - min(idx, warmup_frame_cnt)
+        self.total_seconds = time.perf_counter() - start_time
+
+    def get_report(self, golden_path: Optional[str] = None) -> dict:
+        """
+        获取回放的结果
+        :param golden_path: 作为标准的状态记录文件 为空时不对比
+        :return:
+        """
+        report = {
+            'frame_cnt': self.frame_cnt,
+            'total_seconds': self.total_seconds,
+            'fps': self.frame_cnt / self.total_seconds if self.total_seconds > 0 else 0,
+            'detectors': [i.to_dict() for i in self.latency_map.values()],
+            'state_record_cnt': len(self.collector.record_list),
+            'btn_record_cnt': len(self.controller.btn_record_list),
+        }
+
+        if golden_path is not None:
+            missing_list, extra_list = diff_state_records(load_state_records(golden_path),
+                                                          self.collector.record_list)
+            report['golden_diff'] = {
+                'missing_cnt': len(missing_list),
+                'extra_cnt': len(extra_list),
+                'missing': [list(i) for i in missing_list[:50]],
+                'extra': [list(i) for i in extra_list[:50]],
+            }
+
+        return report
+
+
+def log_report(report: dict) -> None:
+    """
+    输出回放结果
+    :param report: get_report 的结果
+    """
+    log.info('回放截图 %d 张 耗时 %.2f秒 %.2f帧/秒 产生状态 %d 个',
+             report['frame_cnt'], report['total_seconds'], report['fps'], report['state_record_cnt'])
+    for detector in report['detectors']:
+        if detector['cnt'] == 0:
+            continue
+        log.info('%s 次数 %d 平均 %.2fms p50 %.2fms p90 %.2fms p99 %.2fms 最大 %.2fms',
+                 detector['name'], detector['cnt'], detector['mean_ms'],
+                 detector['p50_ms'], detector['p90_ms'], detector['p99_ms'], detector['max_ms'])
+
+    diff = report.get('golden_diff')
+    if diff is not None:
+        log.info('与标准记录对比 缺少 %d 个 多出 %d 个', diff['missing_cnt'], diff['extra_cnt'])
+        for i in diff['missing'][:10]:
+            log.info('缺少 %s', i)
+        for i in diff['extra'][:10]:
+            log.info('多出 %s', i)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='使用录制的截图回放自动战斗识别 测量耗时并与标准记录对比')
+    parser.add_argument('source', help='截图文件夹或视频文件')
+    parser.add_argument('--fps', type=float, default=30, help='无法获取截图时间时使用的帧率')
+    parser.add_argument('--detectors', default=AutoBattleReplay.DETECTOR_BATTLE_STATE,
+                        help='需要测量的识别方法 逗号分隔 可选 %s 选择 %s 时 其中已包含的不再单独测量'
+                             % (','.join(AutoBattleReplay.ALL_DETECTORS), AutoBattleReplay.DETECTOR_BATTLE_STATE))
+    parser.add_argument('--agents', default=None, help='配队 逗号分隔 为空时自动识别')
+    parser.add_argument('--gpu', action='store_true', help='闪光识别使用GPU')
+    parser.add_argument('--check-end', action='store_true', help='识别战斗结束 需要加载OCR')
+    parser.add_argument('--max-frames', type=int, default=None, help='最多回放多少张截图')
+    parser.add_argument('--warmup', type=int, default=5, help='预热的截图数量')
+    parser.add_argument('--golden', default=None, help='作为标准的状态记录文件 对比产生的状态')
+    parser.add_argument('--save-records', default=None, help='保存产生的状态记录 可作为之后的标准记录')
+    parser.add_argument('--report', default=None, help='保存结果的json文件')
+    args = parser.parse_args(argv)
+
+    detector_list = [i.strip() for i in args.detectors.split(',') if len(i.strip()) > 0]
+    for name in detector_list:
+        if name not in AutoBattleReplay.ALL_DETECTORS:
+            parser.error(f'未知的识别方法 {name}')
+
+    ctx = ZContext()
+    if args.check_end:
+        ctx.ocr.init_model()
+
+    replay = AutoBattleReplay(
+        ctx,
+        ReplayFrameSource(args.source, fps=args.fps),
+        detector_list=detector_list,
+        use_gpu=args.gpu,
+        check_battle_end=args.check_end,
+        agent_names=args.agents.split(',') if args.agents is not None else None
+    )
+    replay.run(max_frame_cnt=args.max_frames, warmup_frame_cnt=args.warmup)
+
+    report = replay.get_report(args.golden)
+    log_report(report)
+    if args.save_records is not None:
+        replay.collector.save(args.save_records)
+    if args.report is not None:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    diff = report.get('golden_diff')
+    return 1 if diff is not None and (diff['missing_cnt'] > 0 or diff['extra_cnt'] > 0) else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,240 @@
+from collections import deque
+
+import numpy as np
+import threading
+from scipy import fft as sp_fft
+from typing import Deque, Optional
+
+
+class AudioRingBuffer:
+
+    def __init__(self, capacity: int):
+        """
+        音频环形缓冲区
+        只有录音线程写入 写入完毕后才更新写入位置 读取方按自己记录的位置读取 不需要加锁
+        :param capacity: 最多保存的采样数
+        """
+        self.capacity: int = capacity
+        self._data: np.ndarray = np.zeros(capacity, dtype=np.float32)
+        self.write_pos: int = 0  # 累计写入的采样数
+
+    def write(self, samples: np.ndarray) -> None:
+        """
+        写入新的采样
+        :param samples: 采样
+        """
+        n = len(samples)
+        if n == 0:
+            return
+        if n > self.capacity:
+            self.write_pos += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        if first < n:
+            self._data[:n - first] = samples[first:]
+        self.write_pos += n
+
+    def read(self, start_pos: int, end_pos: int) -> np.ndarray:
+        """
+        读取 [start_pos, end_pos) 的采样 调用方需要保证这段采样还没有被覆盖
+        :param start_pos: 开始位置
+        :param end_pos: 结束位置
+        :return:
+        """
+        return np.take(self._data, np.arange(start_pos, end_pos), mode='wrap')
+
+
+class _AudioBlock:
+
+    def __init__(self, start_pos: int, length: int, sample_sum: float, sample_sqr_sum: float,
+                 corr_start_pos: int, corr: np.ndarray):
+        """
+        已经处理的一批采样
+        :param start_pos: 第一个采样的位置
+        :param length: 采样数
+        :param sample_sum: 采样之和
+        :param sample_sqr_sum: 采样平方之和
+        :param corr_start_pos: 互相关结果中 第一个值对应的模板开始位置
+        :param corr: 这批采样对各个模板开始位置的互相关
+        """
+        self.start_pos: int = start_pos
+        self.length: int = length
+        self.sample_sum: float = sample_sum
+        self.sample_sqr_sum: float = sample_sqr_sum
+        self.corr_start_pos: int = corr_start_pos
+        self.corr: np.ndarray = corr
+
+
+class DodgeAudioMatcher:
+
+    def __init__(self, template: np.ndarray, window_size: int, max_block_size: Optional[int] = None):
+        """
+        流式的音频模板匹配
+        结果与 对最近 window_size 个采样 和模板做 scale 后的 correlate(mode='same') 一致 但每次只处理新的采样
+        - 以 模板开始的采样位置 为下标 累加每批新采样与模板的互相关 使用预先计算的模板频谱
+        - 离开窗口的批次 直接减去之前的互相关结果
+        - 窗口的标准差 由每批采样的和与平方和得到
+        :param template: 模板 需要与音频流使用相同的滤波
+        :param window_size: 窗口的采样数
+        :param max_block_size: 每批最多处理的采样数 为空时使用窗口的四分之一
+        """
+        self.template_len: int = len(template)
+        self.window_size: int = window_size
+        self.max_block_size: int = max_block_size if max_block_size is not None else max(1, window_size // 4)
+
+        template_std = float(np.std(template))
+        self.template_std: float = template_std if template_std > 0 else 1
+
+        # 与模板的互相关 = 与倒序模板的卷积
+        self._fft_len: int = sp_fft.next_fast_len(self.max_block_size + self.template_len - 1, real=True)
+        self._template_spectrum: np.ndarray = sp_fft.rfft(template[::-1].astype(np.float32), self._fft_len)
+
+        acc_size = 1
+        while acc_size < 2 * (window_size + self.template_len + 2 * self.max_block_size):
+            acc_size *= 2
+        self._acc: np.ndarray = np.zeros(acc_size, dtype=np.float64)  # 下标为模板开始位置 % acc_size
+
+        self._block_list: Deque[_AudioBlock] = deque()
+        self._window_sum: float = 0
+        self._window_sqr_sum: float = 0
+        self.processed_pos: int = 0  # 已经处理到的采样位置
+
+        self._update_lock = threading.Lock()
+
+    def reset(self, pos: int) -> None:
+        """
+        丢弃之前的所有采样 从指定位置开始重新处理
+        :param pos: 采样位置
+        """
+        with self._update_lock:
+            self._reset(pos)
+
+    def _reset(self, pos: int) -> None:
+        self._acc[:] = 0
+        self._block_list.clear()
+        self._window_sum = 0
+        self._window_sqr_sum = 0
+        self.processed_pos = pos
+
+    def update(self, ring: AudioRingBuffer) -> None:
+        """
+        处理环形缓冲区中新写入的采样
+        :param ring: 音频流的环形缓冲区
+        """
+        with self._update_lock:
+            write_pos = ring.write_pos
+            if write_pos < self.processed_pos:
+                # 缓冲区被重新创建了
+                self._reset(write_pos)
+            elif write_pos - self.processed_pos > ring.capacity - self.max_block_size:
+                # 落后太多 中间的采样可能已经被覆盖 只处理最新的窗口
+                self._reset(max(0, write_pos - self.window_size))
+
+            block_start_list = list(range(self.processed_pos, write_pos, self.max_block_size))
+            if len(block_start_list) > 0:
+                block_list = [ring.read(start, min(start + self.max_block_size, write_pos))
+                              for start in block_start_list]
+                self._add_blocks(block_start_list, block_list)
+                self.processed_pos = write_pos
+
+            window_start = self.processed_pos - self.window_size
+            while len(self._block_list) > 0:
+                block = self._block_list[0]
+                if block.start_pos + block.length > window_start:
+                    break
+                self._remove_block(self._block_list.popleft())
+
+    def _add_blocks(self, start_list: list[int], block_list: list[np.ndarray]) -> None:
+        """
+        计算多批采样与模板的互相关 并累加
+        :param start_list: 每批采样的开始位置
+        :param block_list: 每批采样
+        """
+        padded = np.zeros((len(block_list), self.max_block_size), dtype=np.float32)
+        for i, block in enumerate(block_list):
+            padded[i, :len(block)] = block
+        spectrum = sp_fft.rfft(padded, self._fft_len, axis=1)
+        corr_all = sp_fft.irfft(spectrum * self._template_spectrum, self._fft_len, axis=1)
+
+        for start_pos, block, corr in zip(start_list, block_list, corr_all):
+            # 第k个值 对应模板开始于 start_pos - template_len + 1 + k
+            corr = corr[:len(block) + self.template_len - 1]
+            corr_start_pos = start_pos - self.template_len + 1
+            self._add_to_acc(corr_start_pos, corr)
+
+            sample_sum = float(np.sum(block, dtype=np.float64))
+            sample_sqr_sum = float(np.dot(block, block))
+            self._window_sum += sample_sum
+            self._window_sqr_sum += sample_sqr_sum
+            self._block_list.append(_AudioBlock(start_pos, len(block), sample_sum, sample_sqr_sum,
+                                                corr_start_pos, corr))
+
+    def _remove_block(self, block: _AudioBlock) -> None:
+        """
+        减去离开窗口的一批采样
+        :param block: 一批采样
+        """
+        self._add_to_acc(block.corr_start_pos, -block.corr)
+        self._window_sum -= block.sample_sum
+        self._window_sqr_sum -= block.sample_sqr_sum
+
+    def _add_to_acc(self, start_pos: int, values: np.ndarray) -> None:
+        """
+        累加到累加器的连续一段上 超过末尾时从头开始
+        :param start_pos: 第一个值对应的模板开始位置
+        :param values: 累加的值
+        """
+        start = start_pos % len(self._acc)
+        first = min(len(values), len(self._acc) - start)
+        self._acc[start:start + first] += values[:first]
+        if first < len(values):
+            self._acc[:len(values) - first] += values[first:]
+
+    def _max_in_acc(self, start_pos: int, end_pos: int) -> float:
+        """
+        累加器中 [start_pos, end_pos] 的最大值
+        :param start_pos: 开始的模板开始位置
+        :param end_pos: 结束的模板开始位置
+        :return:
+        """
+        start = start_pos % len(self._acc)
+        length = end_pos - start_pos + 1
+        first = min(length, len(self._acc) - start)
+        max_value = float(np.max(self._acc[start:start + first]))
+        if first < length:
+            max_value = max(max_value, float(np.max(self._acc[:length - first])))
+        return max_value
+
+    def get_max_corr(self) -> float:
+        """
+        当前窗口与模板的最大相关性
+        窗口中还没有采样的部分按0计算 与原来的缓冲区初始化一致
+        :return:
+        """
+        with self._update_lock:
+            if len(self._block_list) == 0:
+                return 0
+
+            window_len = max(self.window_size, self.processed_pos - self._block_list[0].start_pos)
+            mean = self._window_sum / window_len
+            var = self._window_sqr_sum / window_len - mean * mean
+            if var <= 1e-12:
+                return 0
+
+            # 与 correlate(mode='same') 的输出范围一致
+            m, n = self.template_len, self.window_size
+            t = self.processed_pos - 1
+            if m > n:
+                hi = t - (n - 1) // 2
+                lo = hi - m + 1
+                norm = m
+            else:
+                lo = t - n - m + 2 + (m - 1) // 2
+                hi = lo + n - 1
+                norm = n
+
+            return self._max_in_acc(lo, hi) / (norm * self.template_std * np.sqrt(var))
@@ -47,14 +47,12 @@ class HollowContext:
         prefix = 'avatar_'
         if possible_agents is None:
             possible_agents = [agent_enum.value for agent_enum in AgentEnum]
-        for agent in possible_agents:
-            if agent is None:
-                continue
-            mrl = self.ctx.tm.match_template(img, 'hollow', prefix + agent.agent_id, threshold=0.8)
-            if mrl.max is not None:
-                return agent
+        agent_map: dict[str, Agent] = {prefix + agent.agent_id: agent for agent in possible_agents if agent is not None}
+        result_list = self.ctx.tm.match_template_bank(img, 'hollow', list(agent_map.keys()), threshold=0.8)
+        if len(result_list) == 0:
+            return None
 
-        return None
+        return agent_map[result_list[0][0]]
 
     def get_next_to_move(self, current_map: HollowZeroMap) -> Optional[HollowZeroMapNode]:
         """
@@ -9,6 +9,9 @@ class ZContext(OneDragonContext):
     def __init__(self,):
         OneDragonContext.__init__(self)
 
+        # 战斗中高频使用的模板 不被淘汰
+        self.template_loader.pin_sub_dirs('agent_state', 'battle')
+
         from zzz_od.context.hollow_context import HollowContext
         self.hollow: HollowContext = HollowContext(self)
         from zzz_od.application.hollow_zero.lost_void.context.lost_void_context import LostVoidContext
@@ -49,6 +52,26 @@ class ZContext(OneDragonContext):
         self.hollow.data_service.reload()
         self.init_hollow_config()
 
+    def async_preload(self) -> None:
+        """
+        启动时在后台并行加载各项资源 包括已经下载的YOLO模型
+        :return:
+        """
+        OneDragonContext.async_preload(self)
+
+        from one_dragon.utils import yolo_config_utils
+        from one_dragon.yolo.onnx_model_loader import preload_model
+        yolo_list = [
+            ('flash_classifier', self.yolo_config.flash_classifier, self.yolo_config.flash_classifier_gpu),
+            ('hollow_zero_event', self.yolo_config.hollow_zero_event, self.yolo_config.hollow_zero_event_gpu),
+            ('lost_void_det', self.yolo_config.lost_void_det, self.yolo_config.lost_void_det_gpu),
+        ]
+        for category, model_name, gpu in yolo_list:
+            self.startup_loader.submit(
+                f'yolo_{category}',
+                lambda c=category, m=model_name, g=gpu: preload_model(yolo_config_utils.get_model_category_dir(c), m, g)
+            )
+
     def init_hollow_config(self) -> None:
         """
         对空洞配置进行初始化
@@ -0,0 +1,96 @@
+from typing import Optional, List
+
+from one_dragon.base.controller.replay_controller import ReplayController, ReplayFrameSource
+
+
+class ReplayButtonRecord:
+
+    def __init__(self, btn_name: str, screenshot_time: float,
+                 press: bool = False, press_time: Optional[float] = None, release: bool = False):
+        """
+        回放时的一次按键
+        :param btn_name: 按键名称 与控制器的方法名一致
+        :param screenshot_time: 按键时 最近一张截图的时间
+        :param press: 是否按下
+        :param press_time: 按下的时间
+        :param release: 是否松开
+        """
+        self.btn_name: str = btn_name
+        self.screenshot_time: float = screenshot_time
+        self.press: bool = press
+        self.press_time: Optional[float] = press_time
+        self.release: bool = release
+
+
+class ZReplayController(ReplayController):
+
+    def __init__(self, frame_source: ReplayFrameSource,
+                 standard_width: int = 1920,
+                 standard_height: int = 1080):
+        """
+        绝区零的回放控制器 提供与 ZPcController 相同的战斗按键 只记录不执行
+        """
+        ReplayController.__init__(self, frame_source,
+                                  standard_width=standard_width,
+                                  standard_height=standard_height)
+        self.btn_record_list: List[ReplayButtonRecord] = []
+        self.is_moving: bool = False
+
+    def _record_btn(self, btn_name: str, press: bool = False, press_time: Optional[float] = None,
+                    release: bool = False) -> None:
+        self.btn_record_list.append(ReplayButtonRecord(btn_name, self.last_screenshot_time,
+                                                       press=press, press_time=press_time, release=release))
+
+    def dodge(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('dodge', press, press_time, release)
+
+    def switch_next(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('switch_next', press, press_time, release)
+
+    def switch_prev(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('switch_prev', press, press_time, release)
+
+    def normal_attack(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('normal_attack', press, press_time, release)
+
+    def special_attack(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('special_attack', press, press_time, release)
+
+    def ultimate(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('ultimate', press, press_time, release)
+
+    def chain_left(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('chain_left', press, press_time, release)
+
+    def chain_right(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('chain_right', press, press_time, release)
+
+    def move_w(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('move_w', press, press_time, release)
+
+    def move_s(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('move_s', press, press_time, release)
+
+    def move_a(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('move_a', press, press_time, release)
+
+    def move_d(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('move_d', press, press_time, release)
+
+    def interact(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('interact', press, press_time, release)
+
+    def lock(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('lock', press, press_time, release)
+
+    def chain_cancel(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_btn('chain_cancel', press, press_time, release)
+
+    def turn_by_distance(self, d: float):
+        self._record_btn('turn_by_distance')
+
+    def start_moving_forward(self) -> None:
+        self.is_moving = True
+
+    def stop_moving_forward(self) -> None:
+        self.is_moving = False
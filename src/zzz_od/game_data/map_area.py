@@ -1,11 +1,9 @@
-import difflib
-
 import os
 import yaml
 from typing import List, Optional
 
 from one_dragon.utils import os_utils
-from one_dragon.utils.i18_utils import gt
+from one_dragon.utils.fuzzy_index import GtFuzzyIndexCache
 from one_dragon.utils.log_utils import log
 
 
@@ -29,6 +27,7 @@ class MapAreaService:
         """
         self.area_list: List[MapArea] = []
         self.area_name_map: dict[str, MapArea] = {}
+        self._fuzzy_index_cache: GtFuzzyIndexCache = GtFuzzyIndexCache()  # 翻译后的区域和传送点名称 用于匹配OCR结果
         self.reload()
 
     def reload(self) -> None:
@@ -40,6 +39,7 @@ class MapAreaService:
             os_utils.get_path_under_work_dir('assets', 'game_data'),
             'map_area.yml'
         )
+        self._fuzzy_index_cache.clear()
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
                 area_list: List[dict] = yaml.safe_load(file)
@@ -58,12 +58,11 @@ class MapAreaService:
         :param ocr_result: OCR结果
         :return:
         """
-        target_list = [gt(area.area_name) for area in self.area_list]
-        results = difflib.get_close_matches(ocr_result, target_list, n=1)
+        index = self._fuzzy_index_cache.get('area', [area.area_name for area in self.area_list])
+        results = index.match_by_difflib(ocr_result, top_k=1)
 
-        if results is not None and len(results) > 0:
-            idx = target_list.index(results[0])
-            return self.area_list[idx]
+        if len(results) > 0:
+            return self.area_list[results[0].idx]
         else:
             return None
 
@@ -94,11 +93,10 @@ class MapAreaService:
         :return:
         """
         area = self.area_name_map[area_name]
-        target_list = [gt(tp) for tp in area.tp_list]
-        results = difflib.get_close_matches(ocr_result, target_list, n=1)
+        index = self._fuzzy_index_cache.get(f'tp.{area_name}', area.tp_list)
+        results = index.match_by_difflib(ocr_result, top_k=1)
 
-        if results is not None and len(results) > 0:
-            idx = target_list.index(results[0])
-            return area.tp_list[idx]
+        if len(results) > 0:
+            return area.tp_list[results[0].idx]
         else:
             return None
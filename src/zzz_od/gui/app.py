@@ -4,6 +4,7 @@ try:
     from PySide6.QtWidgets import QApplication
     from qfluentwidgets import NavigationItemPosition, setTheme, Theme
     from one_dragon.gui.view.like_interface import LikeInterface
+    from one_dragon.base.operation.context_event_bus import ContextEventDispatchModeEnum
     from one_dragon.base.operation.one_dragon_context import ContextInstanceEventEnum
 
     from phosdeiz.gui.services import PhosStyleSheet
@@ -64,6 +65,8 @@ try:
             self.ctx.listen_event(
                 ContextInstanceEventEnum.instance_active.value,
                 self._on_instance_active_event,
+                mode=ContextEventDispatchModeEnum.QUEUE,
+                coalesce=True,
             )
             self._context_event_signal: ContextEventSignal = ContextEventSignal()
             self._context_event_signal.instance_changed.connect(
@@ -204,8 +207,8 @@ if __name__ == "__main__":
     # 加载配置
     _ctx.init_by_config()
 
-    # 异步加载OCR
-    _ctx.async_init_ocr()
+    # 后台并行加载OCR、模板、YOLO模型
+    _ctx.async_preload()
 
     # 设置主题
     setTheme(Theme[_ctx.env_config.theme.upper()])
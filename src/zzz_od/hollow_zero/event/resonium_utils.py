@@ -2,7 +2,8 @@ from cv2.typing import MatLike
 from typing import List
 
 from one_dragon.base.matcher.match_result import MatchResult
-from one_dragon.utils import cv2_utils, str_utils
+from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.utils import str_utils
 from one_dragon.utils.i18_utils import gt
 from zzz_od.context.zzz_context import ZContext
 from zzz_od.hollow_zero.game_data.hollow_zero_resonium import Resonium
@@ -17,14 +18,21 @@ def get_to_choose_list(ctx: ZContext, screen: MatLike, target_cn: str, target_lc
     """
     result_list: List[MatchResult] = []
 
+    name_area_list: List[ScreenArea] = []
+    confirm_area_list: List[ScreenArea] = []
     for i in range(1, 4):
-        name_area = ctx.screen_loader.get_area('零号空洞-事件', '鸣徽名称-%d' % i)
-        confirm_area = ctx.screen_loader.get_area('零号空洞-事件', '鸣徽选择-%d' % i)
-
-        name_full_str = ctx.ocr.run_ocr_single_line(cv2_utils.crop_image_only(screen, name_area.rect))
-
-        confirm_str = ctx.ocr.run_ocr_single_line(cv2_utils.crop_image_only(screen, confirm_area.rect))
-        confirm_str = confirm_str.strip()
+        name_area_list.append(ctx.screen_loader.get_area('零号空洞-事件', '鸣徽名称-%d' % i))
+        confirm_area_list.append(ctx.screen_loader.get_area('零号空洞-事件', '鸣徽选择-%d' % i))
+
+    # 所有区域一起识别
+    ocr_str_list = ctx.ocr.run_ocr_single_line_batch(
+        [(screen, area.rect) for area in name_area_list + confirm_area_list]
+    )
+
+    for i in range(3):
+        confirm_area = confirm_area_list[i]
+        name_full_str = ocr_str_list[i]
+        confirm_str = ocr_str_list[i + 3].strip()
 
         if not str_utils.find_by_lcs(gt(target_cn), confirm_str, percent=target_lcs_percent):
             continue
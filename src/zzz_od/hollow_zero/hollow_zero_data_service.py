@@ -1,10 +1,9 @@
-import difflib
 import os
 import yaml
 from typing import List, Optional, Tuple
 
 from one_dragon.utils import os_utils
-from one_dragon.utils.i18_utils import gt
+from one_dragon.utils.fuzzy_index import GtFuzzyIndexCache
 from one_dragon.utils.log_utils import log
 from zzz_od.hollow_zero.game_data.hollow_zero_event import HallowZeroEvent, HollowZeroEntry
 from zzz_od.hollow_zero.game_data.hollow_zero_resonium import Resonium
@@ -22,6 +21,7 @@ class HallowZeroDataService:
         self.resonium_list: List[Resonium] = []
         self.resonium_cate_list: List[str] = []
         self.cate_2_resonium: dict[str, List[Resonium]] = {}
+        self._fuzzy_index_cache: GtFuzzyIndexCache = GtFuzzyIndexCache()  # 翻译后的鸣徽分类和名称 用于匹配OCR结果
 
         self.reload()
 
@@ -82,6 +82,7 @@ class HallowZeroDataService:
         self.resonium_list = []
         self.resonium_cate_list = []
         self.cate_2_resonium = {}
+        self._fuzzy_index_cache.clear()
 
         file_path = os_utils.get_path_under_work_dir('assets', 'game_data', 'hollow_zero', 'resonium.yml')
         if not os.path.exists(file_path):
@@ -103,41 +104,41 @@ class HallowZeroDataService:
 
     def match_resonium_by_ocr(self, cate_ocr: str, name_ocr: str) -> Optional[Resonium]:
         log.info('当前识别 %s %s', cate_ocr, name_ocr)
-        category_list = [gt(i) for i in self.resonium_cate_list]
-        results = difflib.get_close_matches(cate_ocr, category_list, n=2, cutoff=0.5)
+        category_index = self._fuzzy_index_cache.get('category', self.resonium_cate_list)
+        results = category_index.match_by_difflib(cate_ocr, top_k=2, cutoff=0.5)
 
-        if results is None or len(results) == 0:
+        if len(results) == 0:
             log.info('匹配结果 无')
             return None
 
         # 强x会同时匹配到强袭和顽强 这里用字符顺序顺序额外判断一下
         if len(results) == 2:
             if len(cate_ocr) > 1 and cate_ocr[1] == '_':
-                if results[0].startswith(cate_ocr[0]):
-                    category_idx = category_list.index(results[0])
+                if results[0].word.startswith(cate_ocr[0]):
+                    category_idx = results[0].idx
                 else:
-                    category_idx = category_list.index(results[1])
+                    category_idx = results[1].idx
             elif cate_ocr[0] == '_':
-                if results[0].endswith(cate_ocr[1]):
-                    category_idx = category_list.index(results[0])
+                if results[0].word.endswith(cate_ocr[1]):
+                    category_idx = results[0].idx
                 else:
-                    category_idx = category_list.index(results[1])
+                    category_idx = results[1].idx
             else:
-                category_idx = category_list.index(results[0])
+                category_idx = results[0].idx
         else:
-            category_idx = category_list.index(results[0])
+            category_idx = results[0].idx
 
-        resonium_list = self.cate_2_resonium[self.resonium_cate_list[category_idx]]
+        category = self.resonium_cate_list[category_idx]
+        resonium_list = self.cate_2_resonium[category]
 
-        resonium_name_list = [gt(i.name) for i in resonium_list]
-        results = difflib.get_close_matches(name_ocr, resonium_name_list, n=1)
+        name_index = self._fuzzy_index_cache.get(f'name.{category}', [i.name for i in resonium_list])
+        results = name_index.match_by_difflib(name_ocr, top_k=1)
 
-        if results is None or len(results) == 0:
+        if len(results) == 0:
             log.info('匹配结果 无')
             return None
 
-        resonium_idx = resonium_name_list.index(results[0])
-        r = resonium_list[resonium_idx]
+        r = resonium_list[results[0].idx]
         log.info('匹配结果 %s %s', r.category, r.name)
         return r
 